@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark du re-classement personnalisé d'un lot d'offres candidates
+
+Compare :
+  - le score offre par offre (await par offre, listes Python)
+  - le score vectorisé NumPy (offres encodées une fois, score par lot)
+  - rerank_offers du service, avec le lot de candidats encodé en cache
+
+Usage:
+    python benchmark_personalization.py [--candidates 5000] [--repeat 50]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.batch_scorer import BatchPersonalizationScorer
+from chatbot.services.personalization_service import PersonalizationService
+
+CATEGORIES = [f"Catégorie {i}" for i in range(40)]
+BRANDS = [f"Marque {i}" for i in range(200)]
+
+USER_CONTEXT = {
+    "preferred_categories": CATEGORIES[:5],
+    "preferred_brands": BRANDS[:12],
+    "price_range": {"min": 100, "max": 800},
+    "interaction_history": [{"action": "viewed", "count": 12}]
+}
+
+
+def make_offers(count: int):
+    rng = random.Random(42)
+    return [
+        {
+            "id": i,
+            "category": {"nameFr": rng.choice(CATEGORIES)},
+            "brand": {"nameFr": rng.choice(BRANDS)},
+            "price": rng.choice([0, rng.uniform(10, 2000)])
+        }
+        for i in range(count)
+    ]
+
+
+async def legacy_score(offer, user_context):
+    """Calcul historique, une offre à la fois"""
+    score = 0.0
+    if user_context.get("preferred_categories"):
+        if offer.get("category", {}).get("nameFr", "") in user_context["preferred_categories"]:
+            score += 0.3
+    if user_context.get("preferred_brands"):
+        if offer.get("brand", {}).get("nameFr", "") in user_context["preferred_brands"]:
+            score += 0.3
+    if user_context.get("price_range") and offer.get("price"):
+        price_range = user_context["price_range"]
+        offer_price = offer["price"]
+        if price_range["min"] <= offer_price <= price_range["max"]:
+            score += 0.2
+        elif offer_price < price_range["min"]:
+            score += 0.1
+        elif offer_price > price_range["max"]:
+            score -= 0.1
+    if user_context.get("interaction_history"):
+        score += 0.2
+    return min(max(score, 0.0), 1.0)
+
+
+async def legacy_rerank(offers, user_context):
+    scored = []
+    for offer in offers:
+        scored.append((await legacy_score(offer, user_context), offer))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+
+def timed(fn, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du re-classement personnalisé")
+    parser.add_argument("--candidates", type=int, default=5000, help="Nombre d'offres candidates")
+    parser.add_argument("--repeat", type=int, default=50, help="Nombre de répétitions")
+    args = parser.parse_args()
+
+    offers = make_offers(args.candidates)
+    scorer = BatchPersonalizationScorer()
+
+    legacy_ms = timed(lambda: asyncio.run(legacy_rerank(offers, USER_CONTEXT)), max(args.repeat // 10, 3))
+    encode_ms = timed(lambda: scorer.encode(offers), args.repeat)
+    features = scorer.encode(offers)
+    rank_ms = timed(lambda: scorer.rank(features, USER_CONTEXT), args.repeat)
+    top_ms = timed(lambda: scorer.rank(features, USER_CONTEXT, top_k=20), args.repeat)
+
+    service = PersonalizationService()
+    service.rerank_offers(offers, USER_CONTEXT, top_k=20)
+    cached_ms = timed(lambda: service.rerank_offers(offers, USER_CONTEXT, top_k=20), args.repeat)
+
+    # Vérifier que les deux calculs donnent les mêmes scores
+    legacy_scores = [asyncio.run(legacy_score(offer, USER_CONTEXT)) for offer in offers[:200]]
+    _, batch_scores = scorer.rank(scorer.encode(offers[:200]), USER_CONTEXT)
+    assert all(abs(a - b) < 1e-9 for a, b in zip(legacy_scores, batch_scores.tolist()))
+
+    print(f"\n📊 Re-classement de {args.candidates} offres (médiane)")
+    print(f"{'Méthode':<40}{'ms':>10}")
+    print(f"{'Offre par offre (historique)':<40}{legacy_ms:>10.3f}")
+    print(f"{'Encodage des offres (une fois par lot)':<40}{encode_ms:>10.3f}")
+    print(f"{'Score + tri NumPy':<40}{rank_ms:>10.3f}")
+    print(f"{'Score + top 20 NumPy':<40}{top_ms:>10.3f}")
+    print(f"{'rerank_offers top 20 (lot en cache)':<40}{cached_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'empreinte mémoire des sessions actives
+
+Compare, pour N sessions à l'historique plein (max_context_length messages) :
+  - l'ancienne représentation (liste de dicts, horodatages ISO, découpage de liste)
+  - la représentation compacte (messages à slots, tampon circulaire, intents internés)
+
+La mémoire est mesurée avec tracemalloc, en octets par session active.
+
+Usage:
+    python benchmark_session_memory.py [--sessions 2000]
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.context_manager import ContextManager
+
+INTENTS = ["product_search", "price_inquiry", "recommendation", "greeting"]
+
+
+def make_message(session_index: int, turn: int) -> dict:
+    """Message de conversation réaliste (contenu unique, intent répété)"""
+    intent = INTENTS[turn % len(INTENTS)]
+    if turn % 2 == 0:
+        return {"role": "user", "content": f"Je cherche un iPhone {session_index}-{turn} pas cher",
+                "intent": intent, "entities": {"brand": "apple", "price_range": "low"}}
+    return {"role": "bot", "content": f"J'ai trouvé {turn} offres pour la session {session_index}.",
+            "type": "product_list", "intent": intent}
+
+
+def build_legacy_sessions(sessions: int, turns: int, max_length: int) -> dict:
+    """Reproduit l'ancienne représentation : dicts libres et historique en liste"""
+    store = {}
+    for i in range(sessions):
+        session_id = str(uuid.uuid4())
+        session = {
+            "session_id": session_id,
+            "user_id": i,
+            "created_at": datetime.now().isoformat(),
+            "last_activity": datetime.now().isoformat(),
+            "context": {
+                "current_intent": None,
+                "entities": {},
+                "conversation_history": [],
+                "user_preferences": {},
+                "active_filters": {},
+                "current_offers": []
+            },
+            "metadata": {"language": "fr", "conversation_style": "casual", "message_count": 0}
+        }
+        for turn in range(turns):
+            message = make_message(i, turn)
+            # Les chaînes décodées depuis le stockage ne sont pas partagées
+            message["intent"] = "".join(message["intent"])
+            history = session["context"]["conversation_history"]
+            history.append({**message, "timestamp": datetime.now().isoformat()})
+            if len(history) > max_length:
+                session["context"]["conversation_history"] = history[-max_length:]
+            session["metadata"]["message_count"] += 1
+        store[session_id] = session
+    return store
+
+
+async def build_compact_sessions(sessions: int, turns: int) -> ContextManager:
+    """Construit les sessions via le ContextManager (cache local)"""
+    manager = ContextManager(max_sessions=sessions * 2, max_sessions_bytes=1 << 40)
+    for i in range(sessions):
+        session_id = await manager.create_session(user_id=i)
+        async with manager.unit_of_work(session_id) as uow:
+            for turn in range(turns):
+                message = make_message(i, turn)
+                message["intent"] = "".join(message["intent"])
+                uow.add_message(message)
+    return manager
+
+
+def measure(build) -> int:
+    """Mesure les octets alloués et conservés par build()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mémoire des sessions actives")
+    parser.add_argument("--sessions", type=int, default=2000, help="Nombre de sessions actives")
+    parser.add_argument("--turns", type=int, default=20, help="Messages ajoutés par session")
+    args = parser.parse_args()
+
+    max_length = ContextManager().max_context_length
+
+    legacy = measure(lambda: build_legacy_sessions(args.sessions, args.turns, max_length))
+    compact = measure(lambda: asyncio.run(build_compact_sessions(args.sessions, args.turns)))
+
+    print(f"\n📊 {args.sessions} sessions actives, {args.turns} messages par session "
+          f"(historique borné à {max_length})")
+    print(f"{'Représentation':<28}{'octets/session':>16}{'total Mo':>12}")
+    for name, total in (("Dicts + ISO (avant)", legacy), ("Slots + tampon (après)", compact)):
+        print(f"{name:<28}{total / args.sessions:>16.0f}{total / (1024 * 1024):>12.1f}")
+    print(f"\n💾 Gain : {(1 - compact / legacy) * 100:.1f}% de mémoire par session")
+
+
+if __name__ == "__main__":
+    main()
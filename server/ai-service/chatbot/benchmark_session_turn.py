@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la latence de persistance de session pour un tour de chat
+
+Compare, pour un tour (intent + message utilisateur + réponse du bot) :
+  - les appels séparés au ContextManager (une écriture par appel)
+  - l'unité de travail (une seule écriture en fin de tour)
+  - l'unité de travail en write-behind (écriture après la réponse)
+
+Le Redis est simulé en mémoire avec une latence réseau configurable.
+
+Usage:
+    python benchmark_session_turn.py [--turns 500] [--latency-ms 0.5]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.context_manager import ContextManager
+from chatbot.test_redis_session_backend import InMemoryRedis
+
+INTENT = "product_search"
+ENTITIES = {"brand": "apple", "price_range": "low"}
+USER_MESSAGE = {"role": "user", "content": "Je cherche un iPhone pas cher", "intent": INTENT, "entities": ENTITIES}
+BOT_MESSAGE = {"role": "bot", "content": "J'ai trouvé 3 offres correspondant à votre recherche.",
+               "type": "product_list", "intent": INTENT}
+
+
+async def turn_separate_calls(manager: ContextManager, session_id: str):
+    await manager.update_intent_context(session_id, INTENT, ENTITIES)
+    await manager.add_message_to_context(session_id, USER_MESSAGE)
+    await manager.add_message_to_context(session_id, BOT_MESSAGE)
+
+
+async def turn_unit_of_work(manager: ContextManager, session_id: str):
+    async with manager.unit_of_work(session_id) as uow:
+        uow.update_intent_context(INTENT, ENTITIES)
+        uow.add_message(USER_MESSAGE)
+        uow.add_message(BOT_MESSAGE)
+
+
+async def turn_write_behind(manager: ContextManager, session_id: str):
+    async with manager.unit_of_work(session_id, write_behind=True) as uow:
+        uow.update_intent_context(INTENT, ENTITIES)
+        uow.add_message(USER_MESSAGE)
+        uow.add_message(BOT_MESSAGE)
+
+
+async def run_strategy(name, turn, turns: int, latency: float, use_redis: bool):
+    redis = InMemoryRedis(latency=latency) if use_redis else None
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session(user_id=1)
+    await manager.get_session(session_id)  # Session chaude dans le cache local
+
+    if redis:
+        redis.round_trips = 0
+
+    durations = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        await turn(manager, session_id)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    await manager.flush_pending_commits()
+
+    durations.sort()
+    return {
+        "name": name,
+        "mean": statistics.mean(durations),
+        "p50": durations[len(durations) // 2],
+        "p95": durations[int(len(durations) * 0.95) - 1],
+        "round_trips": (redis.round_trips / turns) if redis else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latence de session par tour")
+    parser.add_argument("--turns", type=int, default=500, help="Nombre de tours simulés")
+    parser.add_argument("--latency-ms", type=float, default=0.5, help="Latence simulée par aller-retour Redis")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    strategies = [
+        ("Appels séparés", turn_separate_calls),
+        ("Unité de travail", turn_unit_of_work),
+        ("Unité de travail (write-behind)", turn_write_behind),
+    ]
+
+    for backend, use_redis in (("Cache local", False), (f"Redis simulé ({args.latency_ms} ms/RTT)", True)):
+        print(f"\n📊 {backend} - {args.turns} tours")
+        print(f"{'Stratégie':<34}{'moy. ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'RTT/tour':>10}")
+        for name, turn in strategies:
+            result = await run_strategy(name, turn, args.turns, latency, use_redis)
+            print(f"{result['name']:<34}{result['mean']:>10.3f}{result['p50']:>10.3f}"
+                  f"{result['p95']:>10.3f}{result['round_trips']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
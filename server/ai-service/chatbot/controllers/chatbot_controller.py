@@ -3,9 +3,11 @@ Contrôleur principal du Chatbot MyReprise
 """
 
 import logging
+import os
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from datetime import datetime
+import redis.asyncio as redis
 
 from ..models.chat_models import (
     ChatRequest, ChatResponse, SessionCreateRequest, SessionCreateResponse,
@@ -17,22 +19,41 @@ from ..services.rag_service import RAGService
 from ..services.personalization_service import PersonalizationService
 from ..services.context_manager import ContextManager
 from ..services.response_generator import ResponseGenerator
+from ..services.bounded_cache import cache_registry
+from ..services.graph_preferences_service import graph_preferences_service
+from ..services.learning_queue import LearningQueue
 
 logger = logging.getLogger(__name__)
 
+# Redis partagé des sessions et des statistiques (vide : sessions en mémoire, un seul worker)
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD") or None
+
+def create_redis_client() -> Optional[redis.Redis]:
+    """Client Redis configuré par REDIS_URL, ou None si non configuré"""
+    if not REDIS_URL:
+        return None
+    return redis.from_url(REDIS_URL, password=REDIS_PASSWORD)
+
 class ChatbotController:
     """Contrôleur principal du chatbot"""
     
     def __init__(self):
         self.intent_classifier = IntentClassifier()
         self.embedding_service = EmbeddingService()
-        self.personalization_service = PersonalizationService()
-        self.context_manager = ContextManager()
+        self.personalization_service = PersonalizationService(
+            embedding_service=self.embedding_service
+        )
+        self.redis_client = create_redis_client()
+        self.context_manager = ContextManager(redis_client=self.redis_client)
         self.rag_service = RAGService(
             self.embedding_service, 
             self.personalization_service
         )
         self.response_generator = ResponseGenerator()
+        self.session_write_behind = True  # Persister la session après l'envoi de la réponse
+        # Apprentissage hors requête, regroupé par utilisateur
+        self.learning_queue = LearningQueue(self.personalization_service.learn_from_interaction)
         
         # Initialiser les services
         self._initialize_services()
@@ -41,11 +62,30 @@ class ChatbotController:
         """Initialise tous les services"""
         try:
             await self.embedding_service.initialize()
+            if self.redis_client is not None:
+                # Échouer au démarrage plutôt qu'à la première session
+                await self.redis_client.ping()
+                logger.info("Sessions partagées via Redis")
             logger.info("Services du chatbot initialisés avec succès")
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation des services: {e}")
             raise
     
+    async def start_background_tasks(self):
+        """Démarre les tâches de fond du chatbot"""
+        await self.context_manager.start_cleanup_task()
+        self.learning_queue.start()
+        cache_registry.start_sweeper()
+    
+    async def stop_background_tasks(self):
+        """Arrête proprement les tâches de fond du chatbot"""
+        await self.context_manager.stop_cleanup_task()
+        await self.learning_queue.stop()
+        await cache_registry.stop_sweeper()
+        await graph_preferences_service.close()
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+    
     async def process_chat_message(self, request: ChatRequest) -> ChatResponse:
         """
         Traite un message de chat et retourne une réponse
@@ -71,54 +111,53 @@ class ChatbotController:
                 request.user_id
             )
             
-            # 3. Mettre à jour le contexte de la session
-            await self.context_manager.update_intent_context(
-                session_id, 
-                intent_result["intent"], 
-                intent_result["entities"]
-            )
-            
-            # 4. Générer la réponse avec RAG
-            rag_response = await self.rag_service.generate_response(
-                query=request.message,
-                user_id=request.user_id,
-                intent=intent_result["intent"],
-                entities=intent_result["entities"]
-            )
-            
-            # 5. Générer la réponse finale
-            final_response = await self.response_generator.generate_response(
-                query=request.message,
-                context=rag_response["context"],
-                intent=intent_result["intent"],
-                entities=intent_result["entities"],
-                user_context=rag_response.get("user_context")
-            )
-            
-            # 6. Ajouter le message à l'historique
-            await self.context_manager.add_message_to_context(
+            # Les mutations de session du tour sont regroupées et persistées
+            # en une seule écriture à la sortie du bloc
+            async with self.context_manager.unit_of_work(
                 session_id,
-                {
+                write_behind=self.session_write_behind
+            ) as session_uow:
+                # 3. Mettre à jour le contexte de la session
+                session_uow.update_intent_context(
+                    intent_result["intent"], 
+                    intent_result["entities"]
+                )
+                
+                # 4. Générer la réponse avec RAG
+                rag_response = await self.rag_service.generate_response(
+                    query=request.message,
+                    user_id=request.user_id,
+                    intent=intent_result["intent"],
+                    entities=intent_result["entities"]
+                )
+                
+                # 5. Générer la réponse finale
+                final_response = await self.response_generator.generate_response(
+                    query=request.message,
+                    context=rag_response["context"],
+                    intent=intent_result["intent"],
+                    entities=intent_result["entities"],
+                    user_context=rag_response.get("user_context")
+                )
+                
+                # 6. Ajouter le message à l'historique
+                session_uow.add_message({
                     "role": "user",
                     "content": request.message,
                     "intent": intent_result["intent"],
                     "entities": intent_result["entities"]
-                }
-            )
-            
-            await self.context_manager.add_message_to_context(
-                session_id,
-                {
+                })
+                
+                session_uow.add_message({
                     "role": "bot",
                     "content": final_response["message"],
                     "type": final_response["type"],
                     "intent": intent_result["intent"]
-                }
-            )
+                })
             
             # 7. Apprendre de l'interaction (en arrière-plan)
             if request.user_id:
-                await self._learn_from_interaction(request.user_id, {
+                self._learn_from_interaction(request.user_id, {
                     "message": request.message,
                     "intent": intent_result["intent"],
                     "response": final_response,
@@ -428,10 +467,13 @@ class ChatbotController:
             session_stats = await self.context_manager.get_session_stats()
             
             return ChatbotStats(
-                total_sessions=session_stats.get("active_sessions", 0),
+                total_sessions=session_stats.get("total_sessions", 0),
                 total_messages=session_stats.get("total_messages", 0),
                 active_sessions=session_stats.get("active_sessions", 0),
-                average_messages_per_session=session_stats.get("average_messages_per_session", 0.0)
+                average_messages_per_session=session_stats.get("average_messages_per_session", 0.0),
+                most_common_intents=session_stats.get("most_common_intents", []),
+                cache_stats=cache_registry.stats(),
+                learning_stats=self.learning_queue.stats()
             )
             
         except Exception as e:
@@ -475,12 +517,10 @@ class ChatbotController:
                 services={"error": str(e)}
             )
     
-    async def _learn_from_interaction(self, user_id: int, interaction_data: Dict[str, Any]):
-        """Apprend des interactions utilisateur en arrière-plan"""
-        try:
-            await self.personalization_service.learn_from_interaction(user_id, interaction_data)
-        except Exception as e:
-            logger.error(f"Erreur lors de l'apprentissage: {e}")
+    def _learn_from_interaction(self, user_id: int, interaction_data: Dict[str, Any]):
+        """Met l'interaction en file d'apprentissage (la réponse n'attend jamais l'apprentissage)"""
+        if not self.learning_queue.submit(user_id, interaction_data):
+            logger.warning(f"File d'apprentissage pleine, interaction de l'utilisateur {user_id} ignorée")
 
 # Instance globale du contrôleur
 chatbot_controller = ChatbotController()
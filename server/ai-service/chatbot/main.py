@@ -29,6 +29,9 @@ async def lifespan(app: FastAPI):
         await chatbot_controller._initialize_services()
         logger.info("✅ Services du chatbot initialisés avec succès")
         
+        # Démarrer les tâches de fond (nettoyage des sessions expirées)
+        await chatbot_controller.start_background_tasks()
+        
         yield
         
     except Exception as e:
@@ -37,6 +40,7 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("🔄 Arrêt du service Chatbot MyReprise...")
+        await chatbot_controller.stop_background_tasks()
         logger.info("✅ Service Chatbot arrêté proprement")
 
 # Création de l'application FastAPI
@@ -157,6 +157,8 @@ class ChatbotStats(BaseChatModel):
     average_messages_per_session: float = 0.0
     most_common_intents: List[Dict[str, Any]] = Field(default_factory=list)
     response_times: Dict[str, float] = Field(default_factory=dict)
+    cache_stats: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    learning_stats: Dict[str, Any] = Field(default_factory=dict)
 
 # Modèles pour les requêtes API
 class ChatRequest(BaseModel):
@@ -0,0 +1,265 @@
+"""
+Cache borné partagé
+Espaces de noms avec éviction LRU/TTL, limites en entrées et en octets,
+cache négatif, service de valeurs périmées et métriques par espace
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class CacheEntry:
+    """Entrée de cache (valeur, échéances et taille estimée)"""
+
+    __slots__ = ("value", "expires_at", "stale_until", "size", "negative")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float, size: int, negative: bool):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.size = size
+        self.negative = negative
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return now >= self.expires_at
+
+
+class CacheNamespace:
+    """
+    Espace de noms du cache, avec sa propre politique d'expiration
+
+    Les entrées sont ordonnées par dernier accès (OrderedDict) : au-delà de
+    max_entries ou max_bytes, les moins récemment utilisées sont évincées.
+    Une entrée expirée peut encore être servie pendant stale_ttl à qui le
+    demande explicitement (allow_stale), le temps d'être rafraîchie.
+    Les entrées négatives (ex. utilisateur inconnu) expirent après negative_ttl.
+    """
+
+    def __init__(self,
+                 name: str,
+                 ttl: float,
+                 max_entries: int = 10000,
+                 max_bytes: int = 16 * 1024 * 1024,
+                 negative_ttl: float = 60,
+                 stale_ttl: float = 0):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "sets": 0,
+            "evictions": {"expired": 0, "lru": 0}
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and not entry.is_stale()
+
+    def get_entry(self, key: Hashable, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Retourne l'entrée d'une clé (positive ou négative) et met à jour les métriques
+
+        Args:
+            key: Clé dans l'espace de noms
+            allow_stale: Accepter une entrée expirée encore dans sa fenêtre stale_ttl
+
+        Returns:
+            L'entrée, ou None en cas d'absence
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.metrics["misses"] += 1
+            return None
+
+        if now >= entry.stale_until:
+            self._remove(key, reason="expired")
+            self.metrics["misses"] += 1
+            return None
+
+        if entry.is_stale(now):
+            if not allow_stale:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["stale_hits"] += 1
+        elif entry.negative:
+            self.metrics["negative_hits"] += 1
+        else:
+            self.metrics["hits"] += 1
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retourne la valeur fraîche d'une clé, ou default"""
+        entry = self.get_entry(key)
+        return default if entry is None else entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, negative: bool = False,
+            size: Optional[int] = None):
+        """Ajoute ou remplace une entrée (size : taille en octets si connue, sinon estimée)"""
+        now = time.monotonic()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl
+        # Pas de fenêtre périmée pour les entrées négatives
+        stale_until = expires_at if negative else expires_at + self.stale_ttl
+        size = self._estimate_size(key, value) if size is None else size
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+
+        self._entries[key] = CacheEntry(value, expires_at, stale_until, size, negative)
+        self.total_bytes += size
+        self.metrics["sets"] += 1
+        self._enforce_limits(protected=key)
+
+    def set_negative(self, key: Hashable, value: Any = None):
+        """Mémorise une absence (ex. utilisateur inconnu) pour negative_ttl"""
+        self.set(key, value, ttl=self.negative_ttl, negative=True)
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Supprime une entrée ; retourne True si elle existait"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry.size
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def evict_expired(self) -> int:
+        """Supprime les entrées sorties de leur fenêtre de validité"""
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now >= entry.stale_until]
+        for key in expired:
+            self._remove(key, reason="expired")
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne l'occupation et les métriques de l'espace de noms"""
+        lookups = self.metrics["hits"] + self.metrics["stale_hits"] + self.metrics["negative_hits"] + self.metrics["misses"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.metrics["hits"],
+            "misses": self.metrics["misses"],
+            "stale_hits": self.metrics["stale_hits"],
+            "negative_hits": self.metrics["negative_hits"],
+            "sets": self.metrics["sets"],
+            "evictions": dict(self.metrics["evictions"]),
+            "hit_ratio": (lookups - self.metrics["misses"]) / lookups if lookups > 0 else 0.0
+        }
+
+    def _remove(self, key: Hashable, reason: str):
+        if self.invalidate(key):
+            self.metrics["evictions"][reason] += 1
+
+    def _enforce_limits(self, protected: Optional[Hashable] = None):
+        """Évince les entrées les moins récemment utilisées au-delà des limites"""
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            if oldest_key == protected:
+                # Une seule entrée plus grosse que la limite : on la conserve
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(oldest_key)
+                continue
+            self._remove(oldest_key, reason="lru")
+
+    @staticmethod
+    def _estimate_size(key: Hashable, value: Any) -> int:
+        """Estime la taille sérialisée d'une entrée en octets"""
+        try:
+            return len(str(key)) + len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        except Exception:
+            return 0
+
+
+class CacheRegistry:
+    """Registre des espaces de noms du cache partagé"""
+
+    def __init__(self, sweep_interval: float = 60):
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self.sweep_interval = sweep_interval  # Intervalle du balayage des entrées expirées
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def namespace(self, name: str, **options) -> CacheNamespace:
+        """
+        Retourne l'espace de noms demandé, en le créant au premier appel
+
+        Args:
+            name: Nom de l'espace (ex. "graph.user_preferences")
+            **options: Politique de l'espace (ttl, max_entries, max_bytes, negative_ttl, stale_ttl)
+        """
+        if name not in self._namespaces:
+            self._namespaces[name] = CacheNamespace(name, **options)
+        elif options:
+            logger.debug(f"Espace de cache {name} déjà créé, options ignorées")
+        return self._namespaces[name]
+
+    def evict_expired(self) -> int:
+        """Supprime les entrées expirées de tous les espaces de noms"""
+        return sum(namespace.evict_expired() for namespace in self._namespaces.values())
+
+    def start_sweeper(self):
+        """Démarre le balayage périodique des entrées expirées"""
+        if self._sweep_task and not self._sweep_task.done():
+            return
+        self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self):
+        """Arrête le balayage périodique"""
+        if not self._sweep_task:
+            return
+        self._sweep_task.cancel()
+        try:
+            await self._sweep_task
+        except asyncio.CancelledError:
+            pass
+        self._sweep_task = None
+
+    async def _sweep_loop(self):
+        """Boucle de balayage exécutée en arrière-plan"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                expired = self.evict_expired()
+                if expired:
+                    logger.debug(f"Entrées de cache expirées supprimées: {expired}")
+            except Exception as e:
+                logger.error(f"Erreur lors du balayage du cache: {e}")
+
+    def clear(self):
+        for namespace in self._namespaces.values():
+            namespace.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Métriques de chaque espace de noms"""
+        return {name: namespace.stats() for name, namespace in self._namespaces.items()}
+
+# Instance globale du cache partagé
+cache_registry = CacheRegistry()
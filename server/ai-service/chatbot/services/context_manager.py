@@ -3,23 +3,209 @@ Service de Gestion de Contexte
 Responsable de la gestion des sessions et du contexte conversationnel
 """
 
+import copy
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
 import uuid
 from datetime import datetime, timedelta
 import asyncio
 
+from .session_store import SessionStore
+from .redis_session_backend import RedisSessionBackend
+from .session_stats import SessionStats, RedisStatsPublisher
+from .conversation_history import ConversationHistory, ConversationMessage
+
 logger = logging.getLogger(__name__)
 
+# Valeur d'origine d'un champ absent de la session (journal d'annulation)
+_MISSING = object()
+
+class SessionUnitOfWork:
+    """
+    Unité de travail regroupant les mutations d'une session pendant un tour de chat
+
+    La session est chargée une seule fois, les mutations sont appliquées en
+    mémoire, puis persistées en une seule écriture (un seul pipeline Redis)
+    au moment du commit. Si le tour échoue, rien n'est écrit : les champs
+    touchés reprennent leur valeur d'origine (rollback).
+    """
+    
+    def __init__(self, context_manager: "ContextManager", session_id: str, write_behind: bool = False):
+        self.context_manager = context_manager
+        self.session_id = session_id
+        self.write_behind = write_behind
+        self.session: Optional[Dict] = None
+        self._touched_fields: set = set()
+        self._touched_context: set = set()
+        self._new_messages: List[Dict] = []
+        self._originals: Dict[Tuple[str, ...], Any] = {}  # Valeurs avant le premier changement
+    
+    async def __aenter__(self) -> "SessionUnitOfWork":
+        await self.load()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.rollback()
+        elif self.write_behind:
+            self.context_manager.schedule_commit(self)
+        else:
+            await self.commit()
+        return False
+    
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._touched_fields or self._touched_context or self._new_messages)
+    
+    async def load(self) -> Optional[Dict]:
+        """Charge la session (une seule fois par unité de travail)"""
+        if self.session is None:
+            self.session = await self.context_manager.get_session(self.session_id)
+        return self.session
+    
+    def _remember(self, *path: str):
+        """Mémorise la valeur d'origine d'un champ avant sa première modification"""
+        if path in self._originals:
+            return
+        container = self.session
+        for name in path[:-1]:
+            container = container.get(name, {})
+        value = container.get(path[-1], _MISSING)
+        if isinstance(value, ConversationHistory):
+            # Copie du tampon seul : les messages ne sont jamais modifiés
+            value = ConversationHistory(value.max_length, value)
+        elif value is not _MISSING:
+            value = copy.deepcopy(value)
+        self._originals[path] = value
+    
+    def rollback(self):
+        """Rend aux champs touchés leur valeur d'origine ; rien n'est persisté"""
+        if self.session:
+            for path, value in self._originals.items():
+                container = self.session
+                for name in path[:-1]:
+                    container = container.setdefault(name, {})
+                if value is _MISSING:
+                    container.pop(path[-1], None)
+                else:
+                    container[path[-1]] = value
+        self._originals.clear()
+        self._touched_fields.clear()
+        self._touched_context.clear()
+        self._new_messages.clear()
+    
+    def update(self, updates: Dict) -> bool:
+        """Applique des mises à jour profondes à la session en mémoire"""
+        if not self.session:
+            return False
+        
+        for name, value in updates.items():
+            if name == "context" and isinstance(value, dict):
+                for context_name in value:
+                    self._remember("context", context_name)
+            else:
+                self._remember(name)
+        self.context_manager._apply_updates(self.session, updates)
+        self.context_manager._normalize_history(self.session)
+        for name, value in updates.items():
+            if name == "context" and isinstance(value, dict):
+                self._touched_context.update(value.keys())
+            else:
+                self._touched_fields.add(name)
+        return True
+    
+    def update_intent_context(self, intent: str, entities: Dict) -> bool:
+        """Met à jour l'intent et les entités courantes"""
+        return self.update({"context": {"current_intent": intent, "entities": entities}})
+    
+    def add_message(self, message: Dict) -> bool:
+        """Ajoute un message horodaté à l'historique borné de la session"""
+        if not self.session:
+            return False
+        
+        # Le tampon circulaire évince lui-même les messages au-delà de la limite
+        history = self.context_manager._normalize_history(self.session)
+        self._remember("context", "conversation_history")
+        self._remember("metadata", "message_count")
+        message_with_timestamp = history.append(ConversationMessage.from_dict({
+            **message,
+            "timestamp": None
+        }))
+        
+        # Mettre à jour le compteur de messages
+        self.session["metadata"]["message_count"] += 1
+        self._new_messages.append(message_with_timestamp)
+        self.context_manager.stats.message_added(message.get("intent"))
+        return True
+    
+    async def commit(self) -> bool:
+        """Persiste en une seule écriture toutes les mutations accumulées"""
+        if not self.session or not self.is_dirty:
+            return bool(self.session)
+        
+        try:
+            self.session["last_activity"] = datetime.now().isoformat()
+            self._touched_fields.add("last_activity")
+            
+            backend = self.context_manager.redis_backend
+            if backend:
+                batch = backend.batch(self.session_id)
+                for name in self._touched_fields:
+                    batch.set_meta_field(name, self.session.get(name))
+                for name in self._touched_context:
+                    batch.set_context_field(name, self.session["context"].get(name))
+                if "conversation_history" not in self._touched_context:
+                    for message in self._new_messages:
+                        batch.append_message(message)
+                elif self._new_messages:
+                    # L'historique a été remplacé : on réécrit aussi le compteur
+                    batch.set_message_count(self.session["metadata"]["message_count"])
+                await batch.execute()
+            
+            # Mettre à jour le cache local
+            self.context_manager.sessions[self.session_id] = self.session
+            
+            self._originals.clear()
+            self._touched_fields.clear()
+            self._touched_context.clear()
+            self._new_messages.clear()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erreur lors du commit de la session {self.session_id}: {e}")
+            raise
+
 class ContextManager:
     """Gestionnaire de contexte pour les conversations du chatbot"""
     
-    def __init__(self, redis_client=None):
+    def __init__(self,
+                 redis_client=None,
+                 max_sessions: int = 10000,
+                 max_sessions_bytes: int = 64 * 1024 * 1024,
+                 cleanup_interval: float = 60):
         self.redis_client = redis_client
-        self.sessions = {}  # Cache local des sessions
         self.session_ttl = 3600  # 1 heure en secondes
         self.max_context_length = 10  # Nombre maximum de messages dans le contexte
+        self.redis_backend = RedisSessionBackend(  # Stockage Redis par champs
+            redis_client,
+            session_ttl=self.session_ttl,
+            max_history=self.max_context_length
+        ) if redis_client else None
+        self.cleanup_interval = cleanup_interval  # Intervalle du nettoyage en secondes
+        self.stats = SessionStats()  # Compteurs incrémentaux (O(1) en lecture)
+        self.stats_publisher = RedisStatsPublisher(  # Partage des compteurs entre workers
+            redis_client,
+            ttl=int(cleanup_interval * 3)
+        ) if redis_client else None
+        self.sessions = SessionStore(  # Cache local des sessions (borné, LRU + TTL)
+            ttl_seconds=self.session_ttl,
+            max_entries=max_sessions,
+            max_bytes=max_sessions_bytes,
+            on_evict=self._on_session_evicted
+        )
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._pending_commits: set = set()  # Commits différés (write-behind) en cours
         
     async def create_session(self, user_id: Optional[int] = None, session_data: Optional[Dict] = None) -> str:
         """
@@ -43,7 +229,7 @@ class ContextManager:
                 "context": {
                     "current_intent": None,
                     "entities": {},
-                    "conversation_history": [],
+                    "conversation_history": ConversationHistory(self.max_context_length),
                     "user_preferences": {},
                     "active_filters": {},
                     "current_offers": []
@@ -61,6 +247,7 @@ class ContextManager:
             
             # Sauvegarder la session
             await self._save_session(session)
+            self.stats.session_created()
             
             logger.info(f"Session créée: {session_id} pour l'utilisateur {user_id}")
             return session_id
@@ -81,16 +268,16 @@ class ContextManager:
         """
         try:
             # Vérifier le cache local
-            if session_id in self.sessions:
-                session = self.sessions[session_id]
-                if self._is_session_valid(session):
-                    return session
+            session = self.sessions.get(session_id)
+            if session and self._is_session_valid(session):
+                return session
             
             # Récupérer depuis Redis ou base de données
             session = await self._load_session(session_id)
             
             if session and self._is_session_valid(session):
                 # Mettre en cache
+                self._normalize_history(session)
                 self.sessions[session_id] = session
                 return session
             
@@ -112,21 +299,9 @@ class ContextManager:
             True si la mise à jour a réussi
         """
         try:
-            session = await self.get_session(session_id)
-            if not session:
-                return False
-            
-            # Appliquer les mises à jour
-            self._apply_updates(session, updates)
-            
-            # Mettre à jour la dernière activité
-            session["last_activity"] = datetime.now().isoformat()
-            
-            # Sauvegarder
-            await self._save_session(session)
-            
-            # Mettre à jour le cache
-            self.sessions[session_id] = session
+            async with self.unit_of_work(session_id) as uow:
+                if not uow.update(updates):
+                    return False
             
             return True
             
@@ -146,27 +321,9 @@ class ContextManager:
             True si l'ajout a réussi
         """
         try:
-            session = await self.get_session(session_id)
-            if not session:
-                return False
-            
-            # Ajouter le message à l'historique
-            message_with_timestamp = {
-                **message,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            session["context"]["conversation_history"].append(message_with_timestamp)
-            
-            # Limiter la taille de l'historique
-            if len(session["context"]["conversation_history"]) > self.max_context_length:
-                session["context"]["conversation_history"] = session["context"]["conversation_history"][-self.max_context_length:]
-            
-            # Mettre à jour le compteur de messages
-            session["metadata"]["message_count"] += 1
-            
-            # Sauvegarder
-            await self._save_session(session)
+            async with self.unit_of_work(session_id) as uow:
+                if not uow.add_message(message):
+                    return False
             
             return True
             
@@ -174,6 +331,40 @@ class ContextManager:
             logger.error(f"Erreur lors de l'ajout de message à la session {session_id}: {e}")
             return False
     
+    def unit_of_work(self, session_id: str, write_behind: bool = False) -> SessionUnitOfWork:
+        """
+        Ouvre une unité de travail sur une session
+        
+        Args:
+            session_id: ID de la session
+            write_behind: Persister en arrière-plan à la sortie du bloc
+            
+        Returns:
+            Unité de travail à utiliser avec `async with`
+        """
+        return SessionUnitOfWork(self, session_id, write_behind=write_behind)
+    
+    def schedule_commit(self, uow: SessionUnitOfWork):
+        """Planifie le commit d'une unité de travail sans bloquer l'appelant"""
+        if not uow.is_dirty:
+            return
+        
+        task = asyncio.create_task(self._run_deferred_commit(uow))
+        self._pending_commits.add(task)
+        task.add_done_callback(self._pending_commits.discard)
+    
+    async def _run_deferred_commit(self, uow: SessionUnitOfWork):
+        """Exécute un commit différé (l'erreur est déjà journalisée par commit)"""
+        try:
+            await uow.commit()
+        except Exception:
+            pass
+    
+    async def flush_pending_commits(self):
+        """Attend la fin des commits différés en cours"""
+        if self._pending_commits:
+            await asyncio.gather(*list(self._pending_commits), return_exceptions=True)
+    
     async def get_conversation_context(self, session_id: str) -> Dict:
         """
         Récupère le contexte de conversation d'une session
@@ -189,7 +380,12 @@ class ContextManager:
             if not session:
                 return {}
             
-            return session["context"]
+            # Copie sérialisable : l'historique est rendu sous sa forme liste de dicts
+            context = dict(session["context"])
+            history = context.get("conversation_history")
+            if isinstance(history, ConversationHistory):
+                context["conversation_history"] = history.to_list()
+            return context
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du contexte {session_id}: {e}")
@@ -308,12 +504,15 @@ class ContextManager:
         """
         try:
             # Supprimer de Redis
-            if self.redis_client:
-                await self.redis_client.delete(f"session:{session_id}")
+            removed = False
+            if self.redis_backend:
+                removed = bool(await self.redis_backend.delete_session(session_id))
             
             # Supprimer du cache local
-            if session_id in self.sessions:
-                del self.sessions[session_id]
+            removed = self.sessions.pop(session_id) is not None or removed
+            # Terminer une session inconnue ou déjà terminée reste un succès, sans être compté
+            if removed:
+                self.stats.session_closed("ended")
             
             logger.info(f"Session terminée: {session_id}")
             return True
@@ -322,6 +521,24 @@ class ContextManager:
             logger.error(f"Erreur lors de la fin de session {session_id}: {e}")
             return False
     
+    def _normalize_history(self, session: Dict) -> ConversationHistory:
+        """Garantit que l'historique de la session est un tampon circulaire borné"""
+        context = session.setdefault("context", {})
+        history = ConversationHistory.coerce(context.get("conversation_history"), self.max_context_length)
+        context["conversation_history"] = history
+        return history
+    
+    def _on_session_evicted(self, session_id: str, session: Dict, reason: str):
+        """
+        Comptabilise les sessions expirées du cache local
+        
+        Une éviction LRU ne ferme pas la session. Avec Redis, le cache local
+        n'est qu'une copie : les expirations sont comptées depuis l'index
+        partagé (cleanup_expired_sessions).
+        """
+        if reason == "expired" and not self.redis_backend:
+            self.stats.session_closed("expired")
+    
     def _is_session_valid(self, session: Dict) -> bool:
         """Vérifie si une session est encore valide"""
         try:
@@ -345,13 +562,9 @@ class ContextManager:
     async def _save_session(self, session: Dict):
         """Sauvegarde une session"""
         try:
-            if self.redis_client:
-                # Sauvegarder dans Redis
-                await self.redis_client.setex(
-                    f"session:{session['session_id']}",
-                    self.session_ttl,
-                    json.dumps(session, ensure_ascii=False)
-                )
+            if self.redis_backend:
+                # Sauvegarder dans Redis (écriture complète, à la création)
+                await self.redis_backend.save_session(session)
             else:
                 # Sauvegarder dans le cache local
                 self.sessions[session["session_id"]] = session
@@ -363,11 +576,9 @@ class ContextManager:
     async def _load_session(self, session_id: str) -> Optional[Dict]:
         """Charge une session depuis le stockage"""
         try:
-            if self.redis_client:
+            if self.redis_backend:
                 # Charger depuis Redis
-                session_data = await self.redis_client.get(f"session:{session_id}")
-                if session_data:
-                    return json.loads(session_data)
+                return await self.redis_backend.load_session(session_id)
             else:
                 # Charger depuis le cache local
                 return self.sessions.get(session_id)
@@ -379,39 +590,94 @@ class ContextManager:
             return None
     
     async def cleanup_expired_sessions(self):
-        """Nettoie les sessions expirées"""
+        """Nettoie les sessions expirées du cache local"""
         try:
-            expired_sessions = []
-            
-            for session_id, session in self.sessions.items():
-                if not self._is_session_valid(session):
-                    expired_sessions.append(session_id)
-            
-            for session_id in expired_sessions:
-                await self.end_session(session_id)
+            # Le tas d'expiration ne renvoie que les sessions arrivées à échéance ;
+            # les clés Redis expirent d'elles-mêmes via leur TTL
+            expired_sessions = self.sessions.evict_expired()
             
             if expired_sessions:
                 logger.info(f"Sessions expirées nettoyées: {len(expired_sessions)}")
+            
+            if self.redis_backend:
+                # Expirations réelles (TTL Redis), comptées une seule fois tous workers confondus
+                expired_count = await self.redis_backend.expire_sessions()
+                if expired_count:
+                    self.stats.session_closed("expired", expired_count)
                 
         except Exception as e:
             logger.error(f"Erreur lors du nettoyage des sessions: {e}")
     
+    async def start_cleanup_task(self):
+        """Démarre le nettoyage périodique des sessions expirées"""
+        if self._cleanup_task and not self._cleanup_task.done():
+            return
+        
+        self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        logger.info(f"Nettoyage des sessions planifié toutes les {self.cleanup_interval}s")
+    
+    async def stop_cleanup_task(self):
+        """Arrête le nettoyage périodique des sessions"""
+        await self.flush_pending_commits()
+        
+        if not self._cleanup_task:
+            return
+        
+        self._cleanup_task.cancel()
+        try:
+            await self._cleanup_task
+        except asyncio.CancelledError:
+            pass
+        self._cleanup_task = None
+    
+    async def _cleanup_loop(self):
+        """Boucle de nettoyage exécutée en arrière-plan"""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            await self.cleanup_expired_sessions()
+            await self.publish_stats()
+    
+    def _local_stats(self) -> SessionStats:
+        """
+        Compteurs de ce worker
+        
+        Sans Redis, les sessions actives sont celles du cache local. Avec Redis,
+        une même session peut être en cache dans plusieurs workers : le nombre
+        publié reste nul et get_session_stats lit celui de l'index partagé.
+        """
+        self.stats.sessions_active = 0 if self.redis_backend else len(self.sessions)
+        return self.stats
+    
+    async def publish_stats(self):
+        """Publie les compteurs de ce worker pour les autres workers"""
+        if not self.stats_publisher:
+            return
+        
+        try:
+            await self.stats_publisher.publish(self._local_stats())
+        except Exception as e:
+            logger.error(f"Erreur lors de la publication des statistiques: {e}")
+    
     async def get_session_stats(self) -> Dict:
-        """Récupère les statistiques des sessions"""
+        """
+        Récupère les statistiques des sessions
+        
+        Lues depuis les compteurs incrémentaux : le coût ne dépend pas du
+        nombre de sessions. Avec Redis, les compteurs des autres workers
+        sont additionnés à ceux de ce worker et les sessions actives sont
+        lues dans l'index partagé.
+        """
         try:
-            active_sessions = len(self.sessions)
-            
-            # Calculer les statistiques
-            total_messages = sum(
-                session["metadata"]["message_count"] 
-                for session in self.sessions.values()
-            )
-            
-            return {
-                "active_sessions": active_sessions,
-                "total_messages": total_messages,
-                "average_messages_per_session": total_messages / active_sessions if active_sessions > 0 else 0
-            }
+            stats = self._local_stats()
+            
+            if self.stats_publisher:
+                other_workers = await self.stats_publisher.collect()
+                stats = stats.merge(SessionStats.merge_all(other_workers))
+            
+            if self.redis_backend:
+                stats.sessions_active = await self.redis_backend.count_active_sessions()
+            
+            return stats.summary()
             
         except Exception as e:
             logger.error(f"Erreur lors du calcul des statistiques: {e}")
@@ -0,0 +1,193 @@
+"""
+Historique de conversation compact
+Messages à slots et tampon circulaire borné pour l'historique des sessions
+"""
+
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Interne les chaînes répétées (rôles, intents, types) pour les partager"""
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _to_epoch(timestamp: Any) -> float:
+    """Convertit un horodatage ISO ou numérique en secondes epoch"""
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.fromisoformat(str(timestamp)).timestamp()
+
+
+class ConversationMessage:
+    """Message d'historique compact (sans dictionnaire d'instance)"""
+
+    __slots__ = ("role", "content", "intent", "type", "entities", "timestamp")
+
+    def __init__(self, role: str, content: str, intent: Optional[str] = None,
+                 type: Optional[str] = None, entities: Optional[Dict] = None,
+                 timestamp: Optional[float] = None):
+        self.role = _intern(role)
+        self.content = content
+        self.intent = _intern(intent)
+        self.type = _intern(type)
+        self.entities = entities or None
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "ConversationMessage":
+        return cls(
+            role=message.get("role"),
+            content=message.get("content", ""),
+            intent=message.get("intent"),
+            type=message.get("type"),
+            entities=message.get("entities"),
+            timestamp=_to_epoch(message.get("timestamp"))
+        )
+
+    @classmethod
+    def from_record(cls, record: Union[List, Dict]) -> "ConversationMessage":
+        """Reconstruit un message depuis to_record() (ou un ancien dict)"""
+        if isinstance(record, dict):
+            return cls.from_dict(record)
+        role, content, intent, message_type, entities, timestamp = record
+        return cls(role, content, intent, message_type, entities, timestamp)
+
+    def to_record(self) -> List:
+        """Forme positionnelle compacte, utilisée pour la sérialisation"""
+        return [self.role, self.content, self.intent, self.type, self.entities, self.timestamp]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forme dictionnaire historique (horodatage ISO), pour l'API"""
+        message = {"role": self.role, "content": self.content}
+        if self.intent is not None:
+            message["intent"] = self.intent
+        if self.type is not None:
+            message["type"] = self.type
+        if self.entities is not None:
+            message["entities"] = self.entities
+        message["timestamp"] = datetime.fromtimestamp(self.timestamp).isoformat()
+        return message
+
+    def __getitem__(self, key: str) -> Any:
+        # Compatibilité avec l'accès message["content"] des anciens dicts
+        if key == "timestamp":
+            return datetime.fromtimestamp(self.timestamp).isoformat()
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ConversationMessage):
+            return self.to_record() == other.to_record()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ConversationMessage(role={self.role!r}, intent={self.intent!r}, content={self.content[:30]!r})"
+
+
+def _record_size(message: ConversationMessage) -> int:
+    """Taille sérialisée (JSON, UTF-8) d'un message, séparateur compris"""
+    return len(json.dumps(message.to_record(), ensure_ascii=False, default=str).encode("utf-8")) + 2
+
+
+class ConversationHistory:
+    """
+    Tampon circulaire des derniers messages, borné à max_length
+
+    La taille sérialisée (nbytes) est tenue à jour message par message, à
+    l'ajout et à l'éviction, sans resérialiser l'historique.
+    """
+
+    __slots__ = ("_messages", "_sizes", "nbytes")
+
+    def __init__(self, max_length: int, messages: Optional[Iterable] = None):
+        self._messages = deque(maxlen=max_length)
+        self._sizes = deque(maxlen=max_length)
+        self.nbytes = 0
+        if messages:
+            self.extend(messages)
+
+    @classmethod
+    def coerce(cls, value: Any, max_length: int) -> "ConversationHistory":
+        """Convertit une liste (dicts ou records) en historique borné"""
+        if isinstance(value, cls) and value.max_length == max_length:
+            return value
+        return cls(max_length, value or [])
+
+    @property
+    def max_length(self) -> int:
+        return self._messages.maxlen
+
+    def append(self, message: Union[ConversationMessage, Dict, List]) -> ConversationMessage:
+        """Ajoute un message ; le plus ancien est évincé au-delà de la limite"""
+        if not isinstance(message, ConversationMessage):
+            message = ConversationMessage.from_record(message)
+        if len(self._sizes) == self._sizes.maxlen:
+            self.nbytes -= self._sizes[0]
+        size = _record_size(message)
+        self._messages.append(message)
+        self._sizes.append(size)
+        self.nbytes += size
+        return message
+
+    def extend(self, messages: Iterable):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        self._messages.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [message.to_dict() for message in self._messages]
+
+    def to_record(self) -> List[List]:
+        return [message.to_record() for message in self._messages]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[ConversationMessage]:
+        return iter(self._messages)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ConversationMessage, List[ConversationMessage]]:
+        if isinstance(index, slice):
+            # Les deques n'acceptent pas les tranches : history[-5:] comme sur une liste
+            start, stop, step = index.indices(len(self._messages))
+            if step > 0:
+                return list(itertools.islice(self._messages, start, stop, step))
+            return list(self._messages)[index]
+        return self._messages[index]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ConversationHistory):
+            return list(self._messages) == list(other._messages)
+        if isinstance(other, list):
+            return self.to_list() == other or self.to_record() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ConversationHistory({len(self)}/{self.max_length})"
+
+
+def serialize_default(value: Any) -> Any:
+    """Hook de sérialisation (JSON/msgpack) pour les objets d'historique"""
+    if hasattr(value, "to_record"):
+        return value.to_record()
+    return str(value)
@@ -13,6 +13,8 @@ import json
 import os
 from datetime import datetime
 
+from .bounded_cache import cache_registry
+
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
@@ -24,6 +26,13 @@ class EmbeddingService:
         self.faiss_index = None
         self.dimension = 384  # Dimension pour le modèle multilingue
         self.embeddings_metadata = {}
+        # Embeddings des requêtes déjà encodées (texte nettoyé -> vecteur)
+        self.query_cache = cache_registry.namespace(
+            "embeddings.queries",
+            ttl=3600,
+            max_entries=5000,
+            max_bytes=16 * 1024 * 1024
+        )
         
     async def initialize(self):
         """Initialise le service d'embedding"""
@@ -135,41 +144,60 @@ class EmbeddingService:
             logger.error(f"Erreur lors de la génération d'embedding d'offre: {e}")
             raise
     
-    async def generate_user_query_embedding(self, query: str, user_context: Optional[Dict] = None) -> np.ndarray:
+    async def generate_query_embedding(self, query: str) -> np.ndarray:
         """
-        Génère un embedding pour une requête utilisateur avec contexte
+        Génère l'embedding d'une requête utilisateur seule
+        
+        La requête n'est pas enrichie avec le profil utilisateur : la
+        personnalisation se fait dans l'espace vectoriel (voir
+        PersonalizationService.personalize_query_embedding). Le même texte
+        donne donc le même embedding pour tous les utilisateurs et est mis en cache.
         
         Args:
             query: Requête de l'utilisateur
-            user_context: Contexte utilisateur (préférences, historique)
             
         Returns:
             Vecteur d'embedding numpy
         """
         try:
-            # Construire le texte enrichi
-            enriched_text = query
-            
-            if user_context:
-                # Ajouter les préférences de l'utilisateur
-                if user_context.get('preferred_categories'):
-                    categories = ", ".join(user_context['preferred_categories'])
-                    enriched_text += f" Préférences catégories: {categories}"
-                
-                if user_context.get('preferred_brands'):
-                    brands = ", ".join(user_context['preferred_brands'])
-                    enriched_text += f" Préférences marques: {brands}"
-                
-                if user_context.get('price_range'):
-                    price_range = user_context['price_range']
-                    enriched_text += f" Budget: {price_range.get('min', 0)}-{price_range.get('max', 'illimité')}€"
+            cache_key = self._clean_text(query)
+            embedding = self.query_cache.get(cache_key)
+            if embedding is None:
+                embedding = await self.generate_text_embedding(query)
+                self.query_cache.set(cache_key, embedding, size=embedding.nbytes + len(cache_key))
             
-            return await self.generate_text_embedding(enriched_text)
+            return embedding
             
         except Exception as e:
             logger.error(f"Erreur lors de la génération d'embedding de requête: {e}")
             raise
     
+    def get_offer_embeddings(self, offer_ids: List[int]) -> Dict[int, np.ndarray]:
+        """
+        Relit dans l'index FAISS les embeddings d'offres déjà indexées
+        
+        Args:
+            offer_ids: IDs des offres
+            
+        Returns:
+            Embeddings par ID d'offre (les offres non indexées sont ignorées)
+        """
+        embeddings = {}
+        if self.faiss_index is None:
+            return embeddings
+        
+        for offer_id in offer_ids:
+            # Les clés sont des chaînes après rechargement de l'index (JSON)
+            metadata = self.embeddings_metadata.get(offer_id) or self.embeddings_metadata.get(str(offer_id))
+            if not metadata:
+                continue
+            try:
+                embeddings[offer_id] = self.faiss_index.reconstruct(int(metadata['index_position']))
+            except Exception as e:
+                logger.debug(f"Embedding de l'offre {offer_id} indisponible: {e}")
+        
+        return embeddings
+    
     async def add_offer_to_index(self, offer_id: int, embedding: np.ndarray, metadata: Dict):
         """
         Ajoute une offre à l'index FAISS
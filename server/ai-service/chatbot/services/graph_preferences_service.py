@@ -3,20 +3,89 @@ Service de récupération des préférences utilisateur depuis le Graph Service
 """
 
 import logging
-import axios
+import os
+import httpx
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import asyncio
 
+from .bounded_cache import cache_registry
+
 logger = logging.getLogger(__name__)
 
+class GraphServiceUnavailable(Exception):
+    """Le Graph Service n'a pas pu répondre (erreur réseau ou statut inattendu)"""
+
 class GraphPreferencesService:
     """Service pour récupérer les préférences utilisateur depuis Neo4j via Graph Service"""
     
-    def __init__(self, graph_service_url: str = "http://localhost:8002"):
+    # Statuts transitoires pour lesquels une requête est rejouée
+    RETRY_STATUSES = (502, 503, 504)
+    
+    def __init__(self,
+                 graph_service_url: str = os.getenv("GRAPH_SERVICE_URL", "http://localhost:8002"),
+                 connect_timeout: float = 2.0,
+                 read_timeout: float = 5.0,
+                 max_retries: int = 2,
+                 retry_backoff: float = 0.1,
+                 max_connections: int = 20,
+                 max_keepalive_connections: int = 10):
         self.graph_service_url = graph_service_url
-        self.cache = {}
-        self.cache_ttl = 300  # 5 minutes en secondes
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        # 5 minutes ; les utilisateurs inconnus du graphe sont mémorisés 1 minute
+        self.cache = cache_registry.namespace(
+            "graph.user_preferences",
+            ttl=300,
+            negative_ttl=60,
+            max_entries=10000,
+            max_bytes=32 * 1024 * 1024
+        )
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Client HTTP partagé (connexions keep-alive réutilisées entre requêtes)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.graph_service_url,
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return self._client
+    
+    async def _request(self, method: str, path: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """
+        Envoie une requête au Graph Service avec un nombre borné de nouvelles tentatives
+        
+        Les erreurs de transport (connexion, timeout) et les statuts 502/503/504
+        sont rejoués avec un backoff exponentiel ; les autres réponses sont
+        retournées telles quelles.
+        """
+        retries = self.max_retries if retries is None else retries
+        
+        for attempt in range(retries + 1):
+            try:
+                response = await self._get_client().request(method, path, **kwargs)
+                if response.status_code not in self.RETRY_STATUSES or attempt == retries:
+                    return response
+                logger.warning(f"Graph Service {method} {path}: statut {response.status_code}, nouvelle tentative")
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Graph Service {method} {path}: {e!r}, nouvelle tentative")
+            
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+    
+    async def close(self):
+        """Ferme le client HTTP et ses connexions"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
         
     async def get_user_preferences(self, user_id: int, use_cache: bool = True) -> Optional[Dict[str, Any]]:
         """
@@ -30,40 +99,107 @@ class GraphPreferencesService:
             Préférences utilisateur ou None si erreur
         """
         try:
-            # Vérifier le cache
-            if use_cache and user_id in self.cache:
-                cached_data = self.cache[user_id]
-                if datetime.now().timestamp() - cached_data['timestamp'] < self.cache_ttl:
-                    logger.debug(f"Préférences utilisateur {user_id} récupérées du cache")
-                    return cached_data['preferences']
+            return await self.fetch_user_preferences(user_id, use_cache)
+        except GraphServiceUnavailable as e:
+            logger.warning(f"Préférences de l'utilisateur {user_id} indisponibles: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des préférences utilisateur {user_id}: {e}")
+            return None
+    
+    async def fetch_user_preferences(self, user_id: int, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Comme get_user_preferences, en distinguant utilisateur inconnu et panne
+        
+        Returns:
+            Préférences utilisateur, ou None si le Graph Service ne connaît pas l'utilisateur (404)
+            
+        Raises:
+            GraphServiceUnavailable: Graph Service injoignable ou réponse inattendue
+        """
+        # Vérifier le cache
+        if use_cache:
+            cached_entry = self.cache.get_entry(user_id)
+            if cached_entry is not None:
+                logger.debug(f"Préférences utilisateur {user_id} récupérées du cache")
+                return cached_entry.value
+        
+        # Récupérer le profil complet depuis le Graph Service (un seul aller-retour)
+        try:
+            response = await self._request("GET", f"/user-preferences/{user_id}/chatbot-profile")
+        except httpx.HTTPError as e:
+            logger.error(f"Erreur HTTP lors de la récupération des préférences: {e!r}")
+            raise GraphServiceUnavailable(repr(e)) from e
+        
+        if response.status_code == 200:
+            preferences = response.json()
+            
+            # Mettre en cache (négatif si le graphe ne connaît pas l'utilisateur)
+            if self._is_unknown_user(preferences):
+                self.cache.set_negative(user_id, preferences)
+            else:
+                self.cache.set(user_id, preferences)
+            
+            logger.info(f"Préférences utilisateur {user_id} récupérées depuis Graph Service")
+            return preferences
+        elif response.status_code == 404:
+            self.cache.set_negative(user_id)
+            logger.info(f"Utilisateur {user_id} inconnu du Graph Service")
+            return None
+        
+        logger.warning(f"Erreur lors de la récupération des préférences: {response.status_code}")
+        raise GraphServiceUnavailable(f"statut {response.status_code}")
+    
+    async def get_users_preferences_batch(self, user_ids: List[int], use_cache: bool = True,
+                                          chunk_size: int = 200) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Récupère les préférences de plusieurs utilisateurs (ex. préchauffage du cache)
+        
+        Les utilisateurs absents du cache sont demandés au Graph Service par
+        paquets de chunk_size, en une requête POST /user-preferences/batch par paquet.
+        
+        Args:
+            user_ids: IDs des utilisateurs
+            use_cache: Utiliser le cache si disponible
+            chunk_size: Nombre d'utilisateurs par requête
             
-            # Récupérer depuis le Graph Service
+        Returns:
+            Préférences par ID d'utilisateur (None si indisponibles)
+        """
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        missing = []
+        
+        for user_id in dict.fromkeys(user_ids):
+            cached_entry = self.cache.get_entry(user_id) if use_cache else None
+            if cached_entry is not None:
+                results[user_id] = cached_entry.value
+            else:
+                missing.append(user_id)
+        
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
             try:
-                response = await axios.get(f"{self.graph_service_url}/user-preferences/{user_id}", {
-                    'timeout': 10000  # 10 secondes
-                })
+                response = await self._request("POST", "/user-preferences/batch", json={"user_ids": chunk})
                 
-                if response.status == 200:
-                    preferences = response.data
-                    
-                    # Mettre en cache
-                    self.cache[user_id] = {
-                        'preferences': preferences,
-                        'timestamp': datetime.now().timestamp()
-                    }
-                    
-                    logger.info(f"Préférences utilisateur {user_id} récupérées depuis Graph Service")
-                    return preferences
-                else:
-                    logger.warning(f"Erreur lors de la récupération des préférences: {response.status}")
-                    return None
-            except axios.AxiosError as e:
-                logger.error(f"Erreur axios lors de la récupération des préférences: {e}")
-                return None
+                if response.status_code != 200:
+                    logger.warning(f"Erreur lors de la récupération des préférences en batch: {response.status_code}")
+                    results.update({user_id: None for user_id in chunk})
+                    continue
+                
+                for preferences in response.json():
+                    user_id = preferences["user_id"]
+                    if self._is_unknown_user(preferences):
+                        self.cache.set_negative(user_id, preferences)
+                    else:
+                        self.cache.set(user_id, preferences)
+                    results[user_id] = preferences
                     
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération des préférences utilisateur {user_id}: {e}")
-            return None
+            except Exception as e:
+                logger.error(f"Erreur lors de la récupération des préférences en batch: {e}")
+                results.update({user_id: None for user_id in chunk})
+        
+        logger.info(f"Préférences de {len(user_ids)} utilisateurs récupérées ({len(missing)} depuis Graph Service)")
+        return results
     
     async def get_user_category_preferences(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -77,15 +213,13 @@ class GraphPreferencesService:
             Liste des préférences de catégories
         """
         try:
-            response = await axios.get(f"{self.graph_service_url}/user-preferences/{user_id}/categories", {
-                'params': {"limit": limit},
-                'timeout': 10000
-            })
+            response = await self._request("GET", f"/user-preferences/{user_id}/categories",
+                                           params={"limit": limit})
             
-            if response.status == 200:
-                return response.data
+            if response.status_code == 200:
+                return response.json()
             else:
-                logger.warning(f"Erreur lors de la récupération des catégories: {response.status}")
+                logger.warning(f"Erreur lors de la récupération des catégories: {response.status_code}")
                 return []
                     
         except Exception as e:
@@ -104,15 +238,13 @@ class GraphPreferencesService:
             Liste des préférences de marques
         """
         try:
-            response = await axios.get(f"{self.graph_service_url}/user-preferences/{user_id}/brands", {
-                'params': {"limit": limit},
-                'timeout': 10000
-            })
+            response = await self._request("GET", f"/user-preferences/{user_id}/brands",
+                                           params={"limit": limit})
             
-            if response.status == 200:
-                return response.data
+            if response.status_code == 200:
+                return response.json()
             else:
-                logger.warning(f"Erreur lors de la récupération des marques: {response.status}")
+                logger.warning(f"Erreur lors de la récupération des marques: {response.status_code}")
                 return []
                     
         except Exception as e:
@@ -130,14 +262,12 @@ class GraphPreferencesService:
             Gamme de prix (min, max)
         """
         try:
-            response = await axios.get(f"{self.graph_service_url}/user-preferences/{user_id}/price-range", {
-                'timeout': 10000
-            })
+            response = await self._request("GET", f"/user-preferences/{user_id}/price-range")
             
-            if response.status == 200:
-                return response.data
+            if response.status_code == 200:
+                return response.json()
             else:
-                logger.warning(f"Erreur lors de la récupération de la gamme de prix: {response.status}")
+                logger.warning(f"Erreur lors de la récupération de la gamme de prix: {response.status_code}")
                 return {"min": 0, "max": 10000}
                     
         except Exception as e:
@@ -155,14 +285,12 @@ class GraphPreferencesService:
             Statistiques d'interaction
         """
         try:
-            response = await axios.get(f"{self.graph_service_url}/user-preferences/{user_id}/interaction-stats", {
-                'timeout': 10000
-            })
+            response = await self._request("GET", f"/user-preferences/{user_id}/interaction-stats")
             
-            if response.status == 200:
-                return response.data
+            if response.status_code == 200:
+                return response.json()
             else:
-                logger.warning(f"Erreur lors de la récupération des statistiques: {response.status}")
+                logger.warning(f"Erreur lors de la récupération des statistiques: {response.status_code}")
                 return {}
                     
         except Exception as e:
@@ -184,29 +312,55 @@ class GraphPreferencesService:
             if not preferences:
                 return None
             
-            # Convertir au format du chatbot
-            chatbot_preferences = {
-                "user_id": user_id,
-                "preferred_categories": [
-                    cat["category_name_fr"] for cat in preferences.get("preferred_categories", [])
-                ],
-                "preferred_brands": [
-                    brand["brand_name_fr"] for brand in preferences.get("preferred_brands", [])
-                ],
-                "price_range": preferences.get("price_range", {"min": 0, "max": 10000}),
-                "interaction_history": self._convert_interaction_history(preferences.get("interaction_stats", {})),
-                "conversation_style": self._determine_conversation_style(preferences.get("interaction_stats", {})),
-                "language_preference": "fr",  # Par défaut
-                "last_interaction": preferences.get("last_updated"),
-                "preferences_updated_at": preferences.get("last_updated")
-            }
-            
-            return chatbot_preferences
+            return self.to_chatbot_format(user_id, preferences)
             
         except Exception as e:
             logger.error(f"Erreur lors de la conversion des préférences: {e}")
             return None
     
+    async def fetch_chatbot_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Profil au format du chatbot, en distinguant utilisateur inconnu et panne
+        
+        Returns:
+            Profil au format chatbot, ou None si le graphe ne connaît pas l'utilisateur
+            
+        Raises:
+            GraphServiceUnavailable: Graph Service injoignable ou réponse inattendue
+        """
+        preferences = await self.fetch_user_preferences(user_id)
+        if not preferences or self._is_unknown_user(preferences):
+            return None
+        return self.to_chatbot_format(user_id, preferences)
+    
+    def to_chatbot_format(self, user_id: int, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertit des préférences du Graph Service au format du chatbot"""
+        return {
+            "user_id": user_id,
+            "preferred_categories": [
+                cat["category_name_fr"] for cat in preferences.get("preferred_categories", [])
+            ],
+            "preferred_brands": [
+                brand["brand_name_fr"] for brand in preferences.get("preferred_brands", [])
+            ],
+            "price_range": preferences.get("price_range", {"min": 0, "max": 10000}),
+            "interaction_history": self._convert_interaction_history(preferences.get("interaction_stats", {})),
+            "conversation_style": self._determine_conversation_style(preferences.get("interaction_stats", {})),
+            "language_preference": "fr",  # Par défaut
+            "last_interaction": preferences.get("last_updated"),
+            "preferences_updated_at": preferences.get("last_updated")
+        }
+    
+    @staticmethod
+    def _is_unknown_user(preferences: Dict[str, Any]) -> bool:
+        """Vrai si le graphe ne contient aucune préférence ni interaction pour l'utilisateur"""
+        stats = preferences.get("interaction_stats") or {}
+        return (
+            not preferences.get("preferred_categories")
+            and not preferences.get("preferred_brands")
+            and not any(stats.get(name, 0) for name in ("total_views", "total_likes", "total_searches"))
+        )
+    
     def _convert_interaction_history(self, stats: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Convertit les statistiques en historique d'interaction"""
         history = []
@@ -247,8 +401,7 @@ class GraphPreferencesService:
     
     async def clear_user_cache(self, user_id: int):
         """Vide le cache d'un utilisateur"""
-        if user_id in self.cache:
-            del self.cache[user_id]
+        if self.cache.invalidate(user_id):
             logger.info(f"Cache vidé pour l'utilisateur {user_id}")
     
     async def clear_all_cache(self):
@@ -259,10 +412,9 @@ class GraphPreferencesService:
     async def health_check(self) -> bool:
         """Vérifie la santé du Graph Service"""
         try:
-            response = await axios.get(f"{self.graph_service_url}/health", {
-                'timeout': 5000
-            })
-            return response.status == 200
+            # Pas de nouvelle tentative : la sonde doit refléter l'état réel
+            response = await self._request("GET", "/health", retries=0)
+            return response.status_code == 200
         except Exception as e:
             logger.error(f"Erreur lors de la vérification de santé du Graph Service: {e}")
             return False
@@ -0,0 +1,170 @@
+"""
+File d'apprentissage hors requête
+Regroupe les interactions par utilisateur et les applique en arrière-plan,
+une mise à jour par utilisateur et par intervalle de vidage
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Clés dont les listes sont concaténées lors du regroupement
+LIST_FIELDS = ("viewed_offers", "liked_offers", "price_interactions")
+
+
+def merge_interactions(interactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fusionne plusieurs interactions d'un même utilisateur en une seule
+
+    Les listes d'offres et de prix sont concaténées, les offres présentées
+    (context.offers) sont cumulées ; pour les autres champs, la dernière valeur l'emporte.
+    """
+    merged: Dict[str, Any] = {}
+    shown_offers: List[Dict[str, Any]] = []
+
+    for interaction in interactions:
+        for key, value in interaction.items():
+            if key in LIST_FIELDS and isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            elif key == "context" and isinstance(value, dict):
+                shown_offers.extend(value.get("offers") or [])
+                merged["context"] = {**value, "offers": shown_offers}
+            else:
+                merged[key] = value
+
+    merged["coalesced_interactions"] = len(interactions)
+    return merged
+
+
+class LearningQueue:
+    """
+    File bornée d'interactions à apprendre, vidée par un worker en arrière-plan
+
+    submit() ne bloque jamais : au-delà de max_pending_users utilisateurs en
+    attente, les interactions de nouveaux utilisateurs sont rejetées (et
+    comptées) ; au-delà de max_events_per_user, les plus anciennes
+    interactions d'un utilisateur sont abandonnées.
+    """
+
+    def __init__(self,
+                 handler: Callable[[int, Dict[str, Any]], Awaitable[Any]],
+                 flush_interval: float = 2.0,
+                 max_pending_users: int = 1000,
+                 max_events_per_user: int = 50,
+                 merge: Callable[[List[Dict[str, Any]]], Dict[str, Any]] = merge_interactions):
+        self.handler = handler
+        self.flush_interval = flush_interval
+        self.max_pending_users = max_pending_users
+        self.max_events_per_user = max_events_per_user
+        self.merge = merge
+
+        self._pending: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.metrics = {
+            "submitted": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped": {"queue_full": 0, "user_overflow": 0},
+            "last_flush_ms": 0.0
+        }
+
+    @property
+    def pending_users(self) -> int:
+        return len(self._pending)
+
+    def submit(self, user_id: int, interaction: Dict[str, Any]) -> bool:
+        """
+        Met une interaction en attente d'apprentissage (sans attendre)
+
+        Returns:
+            False si l'interaction a été rejetée faute de place
+        """
+        events = self._pending.get(user_id)
+        if events is None:
+            if len(self._pending) >= self.max_pending_users:
+                self.metrics["dropped"]["queue_full"] += 1
+                return False
+            events = self._pending[user_id] = []
+        elif len(events) >= self.max_events_per_user:
+            events.pop(0)
+            self.metrics["dropped"]["user_overflow"] += 1
+
+        events.append(interaction)
+        self.metrics["submitted"] += 1
+        return True
+
+    async def flush(self) -> int:
+        """
+        Applique les interactions en attente, une mise à jour par utilisateur
+
+        Returns:
+            Nombre d'utilisateurs traités
+        """
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, OrderedDict()
+        start = time.perf_counter()
+
+        for user_id, events in batch.items():
+            self.metrics["coalesced"] += len(events) - 1
+            try:
+                await self.handler(user_id, self.merge(events))
+                self.metrics["processed"] += 1
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logger.error(f"Erreur lors de l'apprentissage pour l'utilisateur {user_id}: {e}")
+
+        self.metrics["last_flush_ms"] = (time.perf_counter() - start) * 1000
+        return len(batch)
+
+    def start(self):
+        """Démarre le worker de vidage périodique"""
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"File d'apprentissage démarrée (vidage toutes les {self.flush_interval}s)")
+
+    async def stop(self, drain: bool = True):
+        """Arrête le worker ; applique les interactions restantes si drain"""
+        if self._worker is not None:
+            # Le worker termine le vidage en cours avant de s'arrêter
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+
+        if drain:
+            await self.flush()
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.flush_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erreur lors du vidage de la file d'apprentissage: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne l'état et les métriques de la file"""
+        return {
+            "pending_users": len(self._pending),
+            "pending_events": sum(len(events) for events in self._pending.values()),
+            "max_pending_users": self.max_pending_users,
+            "submitted": self.metrics["submitted"],
+            "coalesced": self.metrics["coalesced"],
+            "processed": self.metrics["processed"],
+            "failed": self.metrics["failed"],
+            "dropped": dict(self.metrics["dropped"]),
+            "last_flush_ms": self.metrics["last_flush_ms"]
+        }
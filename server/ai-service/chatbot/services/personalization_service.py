@@ -10,21 +10,66 @@ from datetime import datetime, timedelta
 import asyncio
 
 from .graph_preferences_service import graph_preferences_service
+from .bounded_cache import cache_registry
+from .batch_scorer import BatchPersonalizationScorer, OfferFeatures
+from .preference_vectors import UserPreferenceVectors
 
 logger = logging.getLogger(__name__)
 
 class PersonalizationService:
     """Service de personnalisation pour le chatbot MyReprise"""
     
-    def __init__(self, database_service=None):
+    # Poids des interactions dans le vecteur de préférence
+    INTERACTION_WEIGHTS = {
+        "liked_offers": 2.0,
+        "viewed_offers": 1.0,
+        "shown_offers": 0.25  # Offres présentées dans une réponse du chatbot
+    }
+    
+    def __init__(self, database_service=None, embedding_service=None):
         self.database_service = database_service
-        self.user_profiles_cache = {}
-        self.cache_ttl = 3600  # 1 heure en secondes
+        self.embedding_service = embedding_service
+        # Profils valides 1 heure ; au-delà, un profil périmé reste servi
+        # 24 heures le temps qu'un rafraîchissement en arrière-plan le remplace.
+        # Les profils par défaut (utilisateur inconnu) sont un cache négatif court.
+        self.user_profiles_cache = cache_registry.namespace(
+            "personalization.user_profiles",
+            ttl=3600,
+            stale_ttl=24 * 3600,
+            negative_ttl=300,
+            max_entries=10000,
+            max_bytes=32 * 1024 * 1024
+        )
+        
+        # Un seul chargement en cours par utilisateur (single-flight)
+        self._inflight: Dict[int, asyncio.Task] = {}
+        
+        # Score de personnalisation vectorisé sur des lots d'offres
+        self.scorer = BatchPersonalizationScorer()
+        
+        # Lots de candidats déjà encodés, par liste d'IDs d'offres : un même lot
+        # re-classé pour plusieurs utilisateurs n'est encodé qu'une fois. TTL
+        # court, un changement de prix ou de catégorie est repris en une minute.
+        self.offer_features_cache = cache_registry.namespace(
+            "personalization.offer_features",
+            ttl=60,
+            max_entries=256,
+            max_bytes=16 * 1024 * 1024
+        )
+        
+        # Vecteurs de préférence (moyenne décroissante des offres consultées/aimées)
+        self.preference_vectors = UserPreferenceVectors(
+            dimension=getattr(embedding_service, "dimension", 384)
+        )
         
     async def get_user_context(self, user_id: int) -> Optional[Dict]:
         """
         Récupère le contexte utilisateur pour la personnalisation
         
+        Un profil expiré mais encore dans la fenêtre stale_ttl est renvoyé
+        immédiatement et rafraîchi en arrière-plan : l'expiration du cache
+        n'ajoute jamais la latence du Graph Service à un tour de chat.
+        
         Args:
             user_id: ID de l'utilisateur
             
@@ -33,53 +78,106 @@ class PersonalizationService:
         """
         try:
             # Vérifier le cache
-            if user_id in self.user_profiles_cache:
-                cached_data = self.user_profiles_cache[user_id]
-                if datetime.now().timestamp() - cached_data['timestamp'] < self.cache_ttl:
-                    return cached_data['context']
-            
-            # Récupérer le profil depuis la base de données
-            user_context = await self._fetch_user_profile(user_id)
+            cached_entry = self.user_profiles_cache.get_entry(user_id, allow_stale=True)
+            if cached_entry is not None:
+                if cached_entry.is_stale():
+                    # Stale-while-revalidate : servir le profil périmé et rafraîchir en fond
+                    self._load_user_context(user_id)
+                return cached_entry.value
             
-            # Mettre en cache
-            self.user_profiles_cache[user_id] = {
-                'context': user_context,
-                'timestamp': datetime.now().timestamp()
-            }
-            
-            return user_context
+            # Aucun profil exploitable : attendre le chargement partagé
+            return await asyncio.shield(self._load_user_context(user_id))
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du contexte utilisateur {user_id}: {e}")
             return None
     
-    async def _fetch_user_profile(self, user_id: int) -> Dict:
-        """Récupère le profil utilisateur depuis le Graph Service"""
+    def _load_user_context(self, user_id: int) -> asyncio.Task:
+        """
+        Retourne la tâche de chargement du profil, en la créant si besoin
+        
+        Les requêtes concurrentes pour un même utilisateur attendent la même
+        tâche : un seul appel au Graph Service par utilisateur à la fois.
+        """
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache_user_context(user_id))
+            self._inflight[user_id] = task
+        return task
+    
+    async def _fetch_and_cache_user_context(self, user_id: int) -> Dict:
+        """
+        Charge le profil depuis le Graph Service et le met en cache
+        
+        Seul un utilisateur confirmé inconnu par le graphe est mis en cache
+        négatif. En cas de panne, le profil en cache (même périmé) est conservé
+        et servi ; à défaut, le profil par défaut est renvoyé sans être mis en cache.
+        """
+        task = asyncio.current_task()
         try:
-            # Récupérer les préférences depuis le Graph Service
-            graph_preferences = await graph_preferences_service.convert_to_chatbot_format(user_id)
-            
-            if graph_preferences:
-                logger.info(f"Profil utilisateur {user_id} récupéré depuis Graph Service")
-                return graph_preferences
-            
-            # Fallback vers un profil par défaut si Graph Service indisponible
-            logger.warning(f"Graph Service indisponible, utilisation du profil par défaut pour l'utilisateur {user_id}")
-            return {
-                "user_id": user_id,
-                "preferred_categories": [],
-                "preferred_brands": [],
-                "price_range": {"min": 0, "max": 10000},
-                "interaction_history": [],
-                "conversation_style": "casual",
-                "language_preference": "fr",
-                "last_interaction": None,
-                "preferences_updated_at": None
-            }
+            try:
+                user_context = await self._fetch_user_profile(user_id)
+            except Exception as e:
+                logger.warning(f"Profil de l'utilisateur {user_id} non rafraîchi, Graph Service indisponible: {e}")
+                cached_entry = self.user_profiles_cache.get_entry(user_id, allow_stale=True)
+                return cached_entry.value if cached_entry is not None else self._default_user_profile(user_id)
+            
+            if user_context is None:
+                user_context = self._default_user_profile(user_id)
+                negative = True
+            else:
+                negative = False
             
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération du profil utilisateur: {e}")
-            return {}
+            # Ne pas repeupler le cache si le profil a été invalidé entre-temps
+            if self._inflight.get(user_id) is task:
+                if negative:
+                    self.user_profiles_cache.set_negative(user_id, user_context)
+                else:
+                    self.user_profiles_cache.set(user_id, user_context)
+            
+            return user_context
+            
+        finally:
+            if self._inflight.get(user_id) is task:
+                del self._inflight[user_id]
+    
+    def _invalidate_user_context(self, user_id: int):
+        """Supprime le profil en cache et détache un éventuel chargement en cours"""
+        self.user_profiles_cache.invalidate(user_id)
+        self._inflight.pop(user_id, None)
+    
+    @staticmethod
+    def _default_user_profile(user_id: int) -> Dict:
+        """Profil utilisé lorsque le Graph Service ne connaît pas l'utilisateur"""
+        return {
+            "user_id": user_id,
+            "preferred_categories": [],
+            "preferred_brands": [],
+            "price_range": {"min": 0, "max": 10000},
+            "interaction_history": [],
+            "conversation_style": "casual",
+            "language_preference": "fr",
+            "last_interaction": None,
+            "preferences_updated_at": None
+        }
+    
+    async def _fetch_user_profile(self, user_id: int) -> Optional[Dict]:
+        """
+        Récupère le profil utilisateur depuis le Graph Service
+        
+        Returns:
+            Profil au format chatbot, ou None si le graphe ne connaît pas l'utilisateur
+            
+        Raises:
+            GraphServiceUnavailable: Graph Service injoignable ou réponse inattendue
+        """
+        graph_preferences = await graph_preferences_service.fetch_chatbot_profile(user_id)
+        
+        if graph_preferences:
+            logger.info(f"Profil utilisateur {user_id} récupéré depuis Graph Service")
+        else:
+            logger.info(f"Utilisateur {user_id} inconnu du Graph Service, profil par défaut")
+        return graph_preferences
     
     async def update_user_preferences(self, user_id: int, preferences: Dict) -> bool:
         """
@@ -101,8 +199,7 @@ class PersonalizationService:
             
             if success:
                 # Invalider le cache
-                if user_id in self.user_profiles_cache:
-                    del self.user_profiles_cache[user_id]
+                self._invalidate_user_context(user_id)
                 
                 logger.info(f"Préférences mises à jour pour l'utilisateur {user_id}")
                 return True
@@ -180,11 +277,14 @@ class PersonalizationService:
             True si l'apprentissage a réussi
         """
         try:
+            # Mettre à jour le vecteur de préférence à partir des offres concernées
+            vector_updated = self._update_preference_vector(user_id, interaction_data)
+            
             # Extraire les informations d'apprentissage
             learning_data = await self._extract_learning_data(interaction_data)
             
             if not learning_data:
-                return False
+                return vector_updated
             
             # Mettre à jour le profil utilisateur
             await self._update_profile_from_interaction(user_id, learning_data)
@@ -196,6 +296,53 @@ class PersonalizationService:
             logger.error(f"Erreur lors de l'apprentissage: {e}")
             return False
     
+    def _update_preference_vector(self, user_id: int, interaction_data: Dict) -> bool:
+        """Intègre les embeddings des offres de l'interaction au vecteur de l'utilisateur"""
+        if not self.embedding_service:
+            return False
+        
+        offers_by_kind = {
+            "liked_offers": interaction_data.get("liked_offers") or [],
+            "viewed_offers": interaction_data.get("viewed_offers") or [],
+            "shown_offers": (interaction_data.get("context") or {}).get("offers") or []
+        }
+        
+        weighted_ids = []
+        for kind, offers in offers_by_kind.items():
+            for offer in offers:
+                offer_id = offer.get("id", offer.get("offer_id")) if isinstance(offer, dict) else offer
+                if offer_id is not None:
+                    weighted_ids.append((offer_id, self.INTERACTION_WEIGHTS[kind]))
+        
+        if not weighted_ids:
+            return False
+        
+        embeddings = self.embedding_service.get_offer_embeddings([offer_id for offer_id, _ in weighted_ids])
+        return self.preference_vectors.update(
+            user_id,
+            ((embeddings.get(offer_id), weight) for offer_id, weight in weighted_ids)
+        )
+    
+    def personalize_query_embedding(self, user_id: Optional[int], query_embedding):
+        """
+        Personnalise l'embedding d'une requête dans l'espace vectoriel
+        
+        L'embedding de la requête seule est mélangé au vecteur de préférence
+        de l'utilisateur (pondéré par sa confiance) : aucun encodage supplémentaire.
+        
+        Args:
+            user_id: ID de l'utilisateur
+            query_embedding: Embedding normalisé de la requête
+            
+        Returns:
+            Embedding personnalisé
+        """
+        try:
+            return self.preference_vectors.blend(query_embedding, user_id)
+        except Exception as e:
+            logger.error(f"Erreur lors de la personnalisation de l'embedding {user_id}: {e}")
+            return query_embedding
+    
     async def _extract_learning_data(self, interaction_data: Dict) -> Optional[Dict]:
         """Extrait les données d'apprentissage d'une interaction"""
         try:
@@ -303,58 +450,59 @@ class PersonalizationService:
             if not user_context:
                 return base_offers
             
-            # Calculer les scores de personnalisation
-            personalized_offers = []
-            
-            for offer in base_offers:
-                score = await self._calculate_personalization_score(offer, user_context)
-                offer["personalization_score"] = score
-                personalized_offers.append(offer)
-            
-            # Trier par score de personnalisation
-            personalized_offers.sort(key=lambda x: x["personalization_score"], reverse=True)
-            
-            return personalized_offers
+            return self.rerank_offers(base_offers, user_context)
             
         except Exception as e:
             logger.error(f"Erreur lors de la personnalisation des recommandations: {e}")
             return base_offers
     
+    def rerank_offers(self,
+                      offers: List[Dict],
+                      user_context: Dict,
+                      features: Optional[OfferFeatures] = None,
+                      top_k: Optional[int] = None) -> List[Dict]:
+        """
+        Trie un lot d'offres par score de personnalisation (calcul vectorisé)
+        
+        Args:
+            offers: Offres candidates
+            user_context: Contexte utilisateur
+            features: Offres déjà encodées par self.scorer.encode ; sinon encodées
+                une fois par lot de candidats (cache offer_features)
+            top_k: Ne conserver que les top_k meilleures offres
+            
+        Returns:
+            Offres triées, chacune annotée de son personalization_score
+        """
+        if features is None:
+            features = self._encode_candidates(offers)
+        
+        order, scores = self.scorer.rank(features, user_context, top_k=top_k)
+        
+        ranked_offers = []
+        for index in order.tolist():
+            offer = offers[index]
+            offer["personalization_score"] = float(scores[index])
+            ranked_offers.append(offer)
+        
+        return ranked_offers
+    
+    def _encode_candidates(self, offers: List[Dict]) -> OfferFeatures:
+        """Encode un lot d'offres, ou le reprend du cache si le même lot vient d'être encodé"""
+        offer_ids = tuple(offer.get("id") for offer in offers)
+        if None in offer_ids:
+            return self.scorer.encode(offers)
+        
+        features = self.offer_features_cache.get(offer_ids)
+        if features is None:
+            features = self.scorer.encode(offers)
+            self.offer_features_cache.set(offer_ids, features, size=features.nbytes + 8 * len(offer_ids))
+        return features
+    
     async def _calculate_personalization_score(self, offer: Dict, user_context: Dict) -> float:
         """Calcule le score de personnalisation d'une offre"""
         try:
-            score = 0.0
-            
-            # Score basé sur les catégories préférées
-            if user_context.get("preferred_categories"):
-                offer_category = offer.get("category", {}).get("nameFr", "")
-                if offer_category in user_context["preferred_categories"]:
-                    score += 0.3
-            
-            # Score basé sur les marques préférées
-            if user_context.get("preferred_brands"):
-                offer_brand = offer.get("brand", {}).get("nameFr", "")
-                if offer_brand in user_context["preferred_brands"]:
-                    score += 0.3
-            
-            # Score basé sur la gamme de prix
-            if user_context.get("price_range") and offer.get("price"):
-                price_range = user_context["price_range"]
-                offer_price = offer["price"]
-                
-                if price_range["min"] <= offer_price <= price_range["max"]:
-                    score += 0.2
-                elif offer_price < price_range["min"]:
-                    score += 0.1  # Prix inférieur peut être acceptable
-                elif offer_price > price_range["max"]:
-                    score -= 0.1  # Prix supérieur pénalisé
-            
-            # Score basé sur l'historique d'interactions
-            if user_context.get("interaction_history"):
-                # Analyser l'historique pour des patterns
-                score += 0.2
-            
-            return min(max(score, 0.0), 1.0)  # Normaliser entre 0 et 1
+            return float(self.scorer.score(self.scorer.encode([offer]), user_context)[0])
             
         except Exception as e:
             logger.error(f"Erreur lors du calcul du score de personnalisation: {e}")
@@ -362,13 +510,15 @@ class PersonalizationService:
     
     async def clear_user_cache(self, user_id: int):
         """Vide le cache d'un utilisateur"""
-        if user_id in self.user_profiles_cache:
-            del self.user_profiles_cache[user_id]
+        was_cached = self.user_profiles_cache.invalidate(user_id)
+        self._inflight.pop(user_id, None)
+        if was_cached:
             logger.info(f"Cache vidé pour l'utilisateur {user_id}")
     
     async def clear_all_cache(self):
         """Vide tout le cache"""
         self.user_profiles_cache.clear()
+        self._inflight.clear()
         await graph_preferences_service.clear_all_cache()
         logger.info("Cache de personnalisation vidé")
     
@@ -384,14 +534,13 @@ class PersonalizationService:
         """
         try:
             # Vider le cache local
-            if user_id in self.user_profiles_cache:
-                del self.user_profiles_cache[user_id]
+            self._invalidate_user_context(user_id)
             
             # Vider le cache du Graph Service
             await graph_preferences_service.clear_user_cache(user_id)
             
-            # Récupérer les nouvelles préférences
-            new_preferences = await self._fetch_user_profile(user_id)
+            # Récupérer les nouvelles préférences (et les remettre en cache)
+            new_preferences = await self._load_user_context(user_id)
             
             if new_preferences:
                 logger.info(f"Préférences utilisateur {user_id} mises à jour depuis Graph Service")
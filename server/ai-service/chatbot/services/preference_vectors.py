@@ -0,0 +1,142 @@
+"""
+Vecteurs de préférence utilisateur
+Moyenne à décroissance temporelle des embeddings des offres consultées ou aimées,
+utilisée pour personnaliser la requête directement dans l'espace vectoriel
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class _PreferenceState:
+    """Somme pondérée décroissante des embeddings d'un utilisateur"""
+
+    __slots__ = ("vector_sum", "weight_sum", "updated_at")
+
+    def __init__(self, dimension: int, now: float):
+        self.vector_sum = np.zeros(dimension, dtype=np.float32)
+        self.weight_sum = 0.0
+        self.updated_at = now
+
+
+class UserPreferenceVectors:
+    """
+    Vecteurs de préférence par utilisateur, bornés en nombre (LRU)
+
+    Chaque interaction ajoute l'embedding de l'offre avec un poids ; les
+    contributions passées décroissent de moitié toutes les half_life secondes.
+    Le vecteur de l'utilisateur est la moyenne pondérée normalisée.
+    """
+
+    def __init__(self,
+                 dimension: int = 384,
+                 half_life: float = 7 * 24 * 3600,
+                 max_users: int = 50000,
+                 confidence_weight: float = 3.0):
+        self.dimension = dimension
+        self.half_life = half_life
+        self.max_users = max_users
+        # Poids cumulé à partir duquel le vecteur compte pour moitié de sa part maximale
+        self.confidence_weight = confidence_weight
+        self._states: "OrderedDict[int, _PreferenceState]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _decay(self, state: _PreferenceState, now: float):
+        elapsed = now - state.updated_at
+        if elapsed > 0:
+            factor = math.pow(0.5, elapsed / self.half_life)
+            state.vector_sum *= factor
+            state.weight_sum *= factor
+            state.updated_at = now
+
+    def update(self, user_id: int, weighted_embeddings: Iterable[Tuple[np.ndarray, float]],
+               now: Optional[float] = None) -> bool:
+        """
+        Intègre des embeddings d'offres au vecteur de l'utilisateur
+
+        Args:
+            user_id: ID de l'utilisateur
+            weighted_embeddings: Couples (embedding, poids de l'interaction)
+            now: Horodatage de l'interaction (par défaut maintenant)
+
+        Returns:
+            True si le vecteur a été modifié
+        """
+        now = time.time() if now is None else now
+        state = self._states.get(user_id)
+        updated = False
+
+        for embedding, weight in weighted_embeddings:
+            if embedding is None or weight <= 0:
+                continue
+            if state is None:
+                state = _PreferenceState(self.dimension, now)
+                self._states[user_id] = state
+            self._decay(state, now)
+            state.vector_sum += weight * np.asarray(embedding, dtype=np.float32).reshape(-1)
+            state.weight_sum += weight
+            updated = True
+
+        if updated:
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+
+        return updated
+
+    def get(self, user_id: int, now: Optional[float] = None) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Retourne le vecteur normalisé de l'utilisateur et sa confiance (0-1)
+
+        La confiance croît avec le poids cumulé (après décroissance) des interactions.
+        """
+        state = self._states.get(user_id)
+        if state is None or state.weight_sum <= 0:
+            return None
+
+        now = time.time() if now is None else now
+        elapsed = max(now - state.updated_at, 0.0)
+        weight_sum = state.weight_sum * math.pow(0.5, elapsed / self.half_life)
+
+        norm = np.linalg.norm(state.vector_sum)
+        if norm == 0:
+            return None
+
+        confidence = weight_sum / (weight_sum + self.confidence_weight)
+        return state.vector_sum / norm, confidence
+
+    def blend(self, query_embedding: np.ndarray, user_id: Optional[int], max_weight: float = 0.3) -> np.ndarray:
+        """
+        Mélange l'embedding de la requête avec le vecteur de préférence
+
+        Args:
+            query_embedding: Embedding (normalisé) de la requête seule
+            user_id: ID de l'utilisateur
+            max_weight: Part maximale du vecteur utilisateur dans le mélange
+
+        Returns:
+            Embedding personnalisé, normalisé (la requête seule si aucun vecteur)
+        """
+        preference = self.get(user_id) if user_id is not None else None
+        if preference is None:
+            return query_embedding
+
+        user_vector, confidence = preference
+        weight = max_weight * confidence
+        blended = (1.0 - weight) * query_embedding + weight * user_vector.astype(query_embedding.dtype)
+        norm = np.linalg.norm(blended)
+        return blended / norm if norm > 0 else query_embedding
+
+    def forget(self, user_id: int):
+        self._states.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        return {"users": len(self._states), "max_users": self.max_users, "half_life": self.half_life}
@@ -43,10 +43,12 @@ class RAGService:
             if user_id and self.personalization_service:
                 user_context = await self.personalization_service.get_user_context(user_id)
             
-            # 2. Générer l'embedding de la requête
-            query_embedding = await self.embedding_service.generate_user_query_embedding(
-                query, user_context
-            )
+            # 2. Générer l'embedding de la requête, personnalisé dans l'espace vectoriel
+            query_embedding = await self.embedding_service.generate_query_embedding(query)
+            if user_id and self.personalization_service:
+                query_embedding = self.personalization_service.personalize_query_embedding(
+                    user_id, query_embedding
+                )
             
             # 3. Construire les filtres basés sur l'intent et les entités
             filters = await self._build_filters(intent, entities, user_context)
@@ -0,0 +1,225 @@
+"""
+Backend Redis des sessions
+Stocke chaque session par champs (hash) et son historique en liste bornée,
+afin de n'écrire que ce qui change au lieu de réécrire tout le JSON de session
+"""
+
+import logging
+import json
+import time
+from typing import Dict, List, Optional, Any
+
+from .conversation_history import serialize_default
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack est listé dans requirements.txt
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Champs de premier niveau stockés dans le hash de la session
+META_FIELDS = ("session_id", "user_id", "created_at", "last_activity", "metadata")
+CONTEXT_PREFIX = "ctx:"
+MESSAGE_COUNT_FIELD = "message_count"
+HISTORY_FIELD = "conversation_history"
+
+
+def pack(value: Any) -> bytes:
+    """Sérialise une valeur dans un format binaire compact (msgpack, sinon JSON)"""
+    if msgpack is not None:
+        return msgpack.packb(value, use_bin_type=True, default=serialize_default)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=serialize_default).encode("utf-8")
+
+
+def unpack(data: Optional[bytes]) -> Any:
+    """Désérialise une valeur produite par pack()"""
+    if data is None:
+        return None
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+class SessionMutationBatch:
+    """
+    Lot de mutations d'une session exécuté en un seul pipeline Redis
+
+    Les mutations sont accumulées en mémoire puis envoyées en un aller-retour
+    unique par execute(). Les TTL des clés sont renouvelés une seule fois.
+    """
+
+    def __init__(self, backend: "RedisSessionBackend", session_id: str):
+        self.backend = backend
+        self.session_id = session_id
+        self._fields: Dict[str, bytes] = {}
+        self._messages: List[bytes] = []
+        self._message_count_delta = 0
+        self._reset_history = False
+
+    def __len__(self) -> int:
+        return len(self._fields) + len(self._messages) + int(self._reset_history)
+
+    def set_context_field(self, name: str, value: Any) -> "SessionMutationBatch":
+        """Met à jour un champ du contexte de la session"""
+        if name == HISTORY_FIELD:
+            self.replace_history(value or [])
+        else:
+            self._fields[CONTEXT_PREFIX + name] = pack(value)
+        return self
+
+    def set_meta_field(self, name: str, value: Any) -> "SessionMutationBatch":
+        """Met à jour un champ de premier niveau de la session"""
+        if name == "metadata" and isinstance(value, dict):
+            # Le compteur de messages vit dans son propre champ (HINCRBY)
+            value = {k: v for k, v in value.items() if k != MESSAGE_COUNT_FIELD}
+        self._fields[name] = pack(value)
+        return self
+
+    def set_message_count(self, count: int) -> "SessionMutationBatch":
+        """Fixe le compteur de messages (stocké en entier brut pour HINCRBY)"""
+        self._fields[MESSAGE_COUNT_FIELD] = str(int(count)).encode("utf-8")
+        self._message_count_delta = 0
+        return self
+
+    def append_message(self, message: Dict) -> "SessionMutationBatch":
+        """Ajoute un message à l'historique et incrémente le compteur"""
+        self._messages.append(pack(message))
+        self._message_count_delta += 1
+        return self
+
+    def replace_history(self, messages: List[Dict]) -> "SessionMutationBatch":
+        """Remplace intégralement l'historique de conversation"""
+        self._reset_history = True
+        self._messages = [pack(message) for message in messages]
+        return self
+
+    async def execute(self) -> bool:
+        """Envoie toutes les mutations accumulées en un seul pipeline"""
+        if not len(self):
+            return True
+
+        key = self.backend.session_key(self.session_id)
+        history_key = self.backend.history_key(self.session_id)
+
+        pipe = self.backend.redis_client.pipeline(transaction=False)
+        if self._fields:
+            pipe.hset(key, mapping=self._fields)
+        if self._message_count_delta:
+            pipe.hincrby(key, MESSAGE_COUNT_FIELD, self._message_count_delta)
+        if self._reset_history:
+            pipe.delete(history_key)
+        if self._messages:
+            pipe.rpush(history_key, *self._messages)
+            pipe.ltrim(history_key, -self.backend.max_history, -1)
+        pipe.expire(key, self.backend.session_ttl)
+        pipe.expire(history_key, self.backend.session_ttl)
+        pipe.zadd(self.backend.active_key, {self.session_id: time.time() + self.backend.session_ttl})
+        await pipe.execute()
+
+        self._fields.clear()
+        self._messages.clear()
+        self._message_count_delta = 0
+        self._reset_history = False
+        return True
+
+
+class RedisSessionBackend:
+    """
+    Stockage Redis des sessions du chatbot
+
+    Disposition des clés :
+        chat:session:{id}          hash  champs de session et ctx:<champ> du contexte
+        chat:session:{id}:history  liste messages sérialisés, bornée à max_history
+        chat:session:active        zset  sessions actives, score = échéance du TTL
+    """
+
+    def __init__(self, redis_client, session_ttl: int = 3600, max_history: int = 10,
+                 key_prefix: str = "chat:session:"):
+        self.redis_client = redis_client
+        self.session_ttl = session_ttl
+        self.max_history = max_history
+        self.key_prefix = key_prefix
+
+    def session_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    def history_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}:history"
+
+    @property
+    def active_key(self) -> str:
+        return f"{self.key_prefix}active"
+
+    def batch(self, session_id: str) -> SessionMutationBatch:
+        """Crée un lot de mutations pour une session"""
+        return SessionMutationBatch(self, session_id)
+
+    async def save_session(self, session: Dict):
+        """Écrit une session complète (création ou réinitialisation)"""
+        session_id = session["session_id"]
+        batch = self.batch(session_id)
+
+        for name in META_FIELDS:
+            if name in session:
+                batch.set_meta_field(name, session[name])
+
+        for name, value in session.get("context", {}).items():
+            batch.set_context_field(name, value)
+        if HISTORY_FIELD not in session.get("context", {}):
+            batch.replace_history([])
+
+        batch.set_message_count(session.get("metadata", {}).get("message_count", 0))
+        await batch.execute()
+
+    async def load_session(self, session_id: str) -> Optional[Dict]:
+        """Reconstruit une session à partir du hash et de la liste d'historique"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hgetall(self.session_key(session_id))
+        pipe.lrange(self.history_key(session_id), 0, -1)
+        fields, history = await pipe.execute()
+
+        if not fields:
+            return None
+
+        fields = {
+            (name.decode("utf-8") if isinstance(name, bytes) else name): value
+            for name, value in fields.items()
+        }
+
+        session: Dict[str, Any] = {"context": {}}
+        for name, value in fields.items():
+            if name == MESSAGE_COUNT_FIELD:
+                continue
+            if name.startswith(CONTEXT_PREFIX):
+                session["context"][name[len(CONTEXT_PREFIX):]] = unpack(value)
+            else:
+                session[name] = unpack(value)
+
+        session["context"][HISTORY_FIELD] = [unpack(message) for message in history]
+
+        metadata = session.setdefault("metadata", {})
+        metadata["message_count"] = int(fields.get(MESSAGE_COUNT_FIELD) or 0)
+
+        return session
+
+    async def delete_session(self, session_id: str) -> int:
+        """Supprime toutes les clés d'une session ; retourne le nombre de clés supprimées"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(self.session_key(session_id), self.history_key(session_id))
+        pipe.zrem(self.active_key, session_id)
+        deleted, _ = await pipe.execute()
+        return deleted
+
+    async def expire_sessions(self) -> int:
+        """
+        Retire de l'index les sessions dont le TTL est échu
+
+        Chaque session expirée n'est retirée qu'une fois, quel que soit le
+        worker qui appelle : le nombre retourné peut être compté sans doublon.
+        """
+        return await self.redis_client.zremrangebyscore(self.active_key, "-inf", time.time())
+
+    async def count_active_sessions(self) -> int:
+        """Nombre de sessions actives, tous workers confondus"""
+        return await self.redis_client.zcount(self.active_key, time.time(), "+inf")
@@ -0,0 +1,148 @@
+"""
+Statistiques des sessions
+Compteurs incrémentaux des sessions et messages, fusionnables entre workers
+"""
+
+import logging
+import os
+import socket
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Any
+
+from .redis_session_backend import pack, unpack
+
+logger = logging.getLogger(__name__)
+
+class SessionStats:
+    """
+    Compteurs de sessions mis à jour à chaque mutation
+
+    Toutes les lectures sont en O(1) par rapport au nombre de sessions.
+    Les compteurs sont des sommes : les instantanés de plusieurs workers
+    se fusionnent par addition (voir merge).
+    """
+
+    def __init__(self):
+        self.sessions_created = 0
+        self.sessions_active = 0
+        self.sessions_closed: Counter = Counter()
+        self.messages_total = 0
+        self.messages_by_intent: Counter = Counter()
+
+    def session_created(self):
+        self.sessions_created += 1
+
+    def session_closed(self, reason: str = "ended", count: int = 1):
+        self.sessions_closed[reason] += count
+
+    def message_added(self, intent: Optional[str] = None):
+        self.messages_total += 1
+        if intent:
+            self.messages_by_intent[str(intent)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Retourne un instantané sérialisable des compteurs"""
+        return {
+            "sessions_created": self.sessions_created,
+            "sessions_active": self.sessions_active,
+            "sessions_closed": dict(self.sessions_closed),
+            "messages_total": self.messages_total,
+            "messages_by_intent": dict(self.messages_by_intent)
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "SessionStats":
+        stats = cls()
+        stats.sessions_created = int(snapshot.get("sessions_created", 0))
+        stats.sessions_active = int(snapshot.get("sessions_active", 0))
+        stats.sessions_closed = Counter(snapshot.get("sessions_closed", {}))
+        stats.messages_total = int(snapshot.get("messages_total", 0))
+        stats.messages_by_intent = Counter(snapshot.get("messages_by_intent", {}))
+        return stats
+
+    def merge(self, other: "SessionStats") -> "SessionStats":
+        """Additionne les compteurs d'un autre worker (nouvelle instance)"""
+        merged = SessionStats()
+        merged.sessions_created = self.sessions_created + other.sessions_created
+        merged.sessions_active = self.sessions_active + other.sessions_active
+        merged.sessions_closed = self.sessions_closed + other.sessions_closed
+        merged.messages_total = self.messages_total + other.messages_total
+        merged.messages_by_intent = self.messages_by_intent + other.messages_by_intent
+        return merged
+
+    @classmethod
+    def merge_all(cls, snapshots: Iterable[Dict[str, Any]]) -> "SessionStats":
+        merged = cls()
+        for snapshot in snapshots:
+            merged = merged.merge(cls.from_snapshot(snapshot))
+        return merged
+
+    def summary(self, top_intents: int = 5) -> Dict[str, Any]:
+        """Résumé au format de /chatbot/stats"""
+        return {
+            "total_sessions": self.sessions_created,
+            "active_sessions": self.sessions_active,
+            "total_messages": self.messages_total,
+            "average_messages_per_session": (
+                self.messages_total / self.sessions_created if self.sessions_created > 0 else 0
+            ),
+            "most_common_intents": [
+                {"intent": intent, "count": count}
+                for intent, count in self.messages_by_intent.most_common(top_intents)
+            ]
+        }
+
+
+class RedisStatsPublisher:
+    """
+    Publie l'instantané des compteurs de ce worker dans Redis et lit ceux des autres
+
+    Chaque worker écrit sa propre clé (avec TTL) : aucune écriture concurrente,
+    et la fusion se fait par addition à la lecture.
+    """
+
+    def __init__(self, redis_client, ttl: int = 180, key_prefix: str = "chat:stats:"):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def workers_key(self) -> str:
+        return f"{self.key_prefix}workers"
+
+    def worker_key(self, worker_id: str) -> str:
+        return f"{self.key_prefix}worker:{worker_id}"
+
+    async def publish(self, stats: SessionStats):
+        """Écrit l'instantané de ce worker"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.sadd(self.workers_key, self.worker_id)
+        pipe.set(self.worker_key(self.worker_id), pack(stats.snapshot()), ex=self.ttl)
+        await pipe.execute()
+
+    async def collect(self) -> List[Dict[str, Any]]:
+        """Lit les instantanés des autres workers encore actifs"""
+        members = await self.redis_client.smembers(self.workers_key)
+        worker_ids = [
+            member.decode("utf-8") if isinstance(member, bytes) else member
+            for member in members
+        ]
+        worker_ids = [worker_id for worker_id in worker_ids if worker_id != self.worker_id]
+        if not worker_ids:
+            return []
+
+        values = await self.redis_client.mget([self.worker_key(worker_id) for worker_id in worker_ids])
+
+        snapshots = []
+        expired = []
+        for worker_id, value in zip(worker_ids, values):
+            if value is None:
+                expired.append(worker_id)
+            else:
+                snapshots.append(unpack(value))
+
+        if expired:
+            await self.redis_client.srem(self.workers_key, *expired)
+
+        return snapshots
@@ -0,0 +1,208 @@
+"""
+Stockage local des sessions
+Cache borné des sessions avec éviction LRU et expiration TTL indexée dans le temps
+"""
+
+import heapq
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .conversation_history import ConversationHistory, serialize_default
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """
+    Stockage en mémoire des sessions, borné en nombre d'entrées et en octets.
+
+    Les expirations sont indexées dans un tas (heap) trié par date d'expiration :
+    le nettoyage ne parcourt que les sessions réellement expirées (O(k log n))
+    au lieu de toutes les sessions. L'ordre d'insertion de l'OrderedDict sert
+    d'index LRU pour l'éviction lorsque les limites sont atteintes.
+    """
+
+    def __init__(self,
+                 ttl_seconds: float = 3600,
+                 max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 on_evict: Optional[Callable[[str, Dict, str], None]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.total_bytes = 0
+
+        self.evictions = {"expired": 0, "lru": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        # Test d'appartenance sans effet de bord (ni promotion LRU, ni éviction)
+        expires_at = self._expires_at.get(session_id)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def __getitem__(self, session_id: str) -> Dict:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Dict):
+        self.set(session_id, session)
+
+    def __delitem__(self, session_id: str):
+        if self.pop(session_id) is None:
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries.keys()))
+
+    def get(self, session_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        """Retourne une session non expirée et la marque comme récemment utilisée"""
+        session = self._entries.get(session_id)
+        if session is None:
+            return default
+
+        if self._expires_at[session_id] <= time.monotonic():
+            self._remove(session_id, reason="expired")
+            return default
+
+        self._entries.move_to_end(session_id)
+        return session
+
+    def set(self, session_id: str, session: Dict):
+        """Ajoute ou remplace une session et repousse son expiration"""
+        size = self._estimate_size(session)
+
+        if session_id in self._entries:
+            self.total_bytes -= self._sizes[session_id]
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        self._entries[session_id] = session
+        self._entries.move_to_end(session_id)
+        self._sizes[session_id] = size
+        self._expires_at[session_id] = expires_at
+        self.total_bytes += size
+
+        heapq.heappush(self._expiry_heap, (expires_at, session_id))
+        self._compact_heap()
+        self._enforce_limits(protected=session_id)
+
+    def pop(self, session_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        """Supprime une session sans déclencher le callback d'éviction"""
+        if session_id not in self._entries:
+            return default
+
+        session = self._entries.pop(session_id)
+        self.total_bytes -= self._sizes.pop(session_id)
+        del self._expires_at[session_id]
+        # L'entrée du tas devient obsolète et sera ignorée lors du prochain nettoyage
+        return session
+
+    def values(self) -> List[Dict]:
+        return list(self._entries.values())
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        return list(self._entries.items())
+
+    def clear(self):
+        self._entries.clear()
+        self._expires_at.clear()
+        self._sizes.clear()
+        self._expiry_heap.clear()
+        self.total_bytes = 0
+
+    def evict_expired(self, now: Optional[float] = None) -> List[str]:
+        """
+        Supprime les sessions expirées en dépilant le tas d'expiration
+
+        Args:
+            now: Horloge monotone de référence (par défaut l'instant présent)
+
+        Returns:
+            Liste des IDs de sessions supprimées
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._expiry_heap)
+            # Ignorer les entrées obsolètes (session supprimée ou prolongée depuis)
+            if self._expires_at.get(session_id) != expires_at:
+                continue
+            self._remove(session_id, reason="expired")
+            expired.append(session_id)
+
+        return expired
+
+    def stats(self) -> Dict:
+        """Retourne l'occupation du stockage"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions)
+        }
+
+    def _remove(self, session_id: str, reason: str):
+        session = self.pop(session_id)
+        if session is None:
+            return
+
+        self.evictions[reason] = self.evictions.get(reason, 0) + 1
+        if self.on_evict:
+            try:
+                self.on_evict(session_id, session, reason)
+            except Exception as e:
+                logger.error(f"Erreur dans le callback d'éviction de session {session_id}: {e}")
+
+    def _enforce_limits(self, protected: Optional[str] = None):
+        """Évince les sessions les moins récemment utilisées au-delà des limites"""
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest_id = next(iter(self._entries))
+            if oldest_id == protected:
+                # Une seule session plus grosse que la limite : on la conserve
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(oldest_id)
+                continue
+            self._remove(oldest_id, reason="lru")
+
+    def _compact_heap(self):
+        """Reconstruit le tas lorsque les entrées obsolètes dominent"""
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [
+                (expires_at, session_id)
+                for session_id, expires_at in self._expires_at.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    @staticmethod
+    def _estimate_size(session: Dict) -> int:
+        """
+        Estime la taille sérialisée d'une session en octets
+
+        L'historique (ConversationHistory) tient sa taille à jour message par
+        message : seuls les autres champs, bornés, sont sérialisés ici.
+        """
+        try:
+            context = session.get("context")
+            history = context.get("conversation_history") if isinstance(context, dict) else None
+            if isinstance(history, ConversationHistory):
+                rest = {**session, "context": {key: value for key, value in context.items()
+                                               if key != "conversation_history"}}
+                size = len(json.dumps(rest, ensure_ascii=False, default=serialize_default).encode("utf-8"))
+                return size + history.nbytes
+            return len(json.dumps(session, ensure_ascii=False, default=serialize_default).encode("utf-8"))
+        except Exception:
+            return 0
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests du score de personnalisation vectorisé (comparé au calcul offre par offre)
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.batch_scorer import BatchPersonalizationScorer
+from chatbot.services.personalization_service import PersonalizationService
+
+CATEGORIES = [f"Catégorie {i}" for i in range(8)]
+BRANDS = [f"Marque {i}" for i in range(12)]
+
+USER_CONTEXT = {
+    "preferred_categories": CATEGORIES[:2] + ["Catégorie jamais vue"],
+    "preferred_brands": BRANDS[:3],
+    "price_range": {"min": 100, "max": 800},
+    "interaction_history": [{"action": "viewed", "count": 3}]
+}
+
+
+def make_offers(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    offers = []
+    for i in range(count):
+        offer = {"id": i, "price": rng.choice([0, None, 50, 100, 450, 800, 1500])}
+        if rng.random() < 0.9:
+            offer["category"] = {"nameFr": rng.choice(CATEGORIES)}
+        if rng.random() < 0.9:
+            offer["brand"] = {"nameFr": rng.choice(BRANDS)}
+        offers.append(offer)
+    return offers
+
+
+def scalar_score(offer, user_context):
+    """Calcul historique, une offre à la fois"""
+    score = 0.0
+    if user_context.get("preferred_categories"):
+        if offer.get("category", {}).get("nameFr", "") in user_context["preferred_categories"]:
+            score += 0.3
+    if user_context.get("preferred_brands"):
+        if offer.get("brand", {}).get("nameFr", "") in user_context["preferred_brands"]:
+            score += 0.3
+    if user_context.get("price_range") and offer.get("price"):
+        price_range = user_context["price_range"]
+        offer_price = offer["price"]
+        if price_range["min"] <= offer_price <= price_range["max"]:
+            score += 0.2
+        elif offer_price < price_range["min"]:
+            score += 0.1
+        elif offer_price > price_range["max"]:
+            score -= 0.1
+    if user_context.get("interaction_history"):
+        score += 0.2
+    return min(max(score, 0.0), 1.0)
+
+
+def scalar_ranking(offers, user_context):
+    """Ordre historique : tri stable par score décroissant"""
+    scored = [(scalar_score(offer, user_context), offer["id"]) for offer in offers]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [offer_id for _, offer_id in scored]
+
+
+def test_scores_match_the_scalar_scorer():
+    offers = make_offers(300)
+    scorer = BatchPersonalizationScorer()
+    scores = scorer.score(scorer.encode(offers), USER_CONTEXT)
+
+    for offer, score in zip(offers, scores.tolist()):
+        assert abs(score - scalar_score(offer, USER_CONTEXT)) < 1e-9, offer
+
+
+def test_rerank_order_matches_the_scalar_scorer():
+    offers = make_offers(300)
+    service = PersonalizationService()
+    ranked = service.rerank_offers([dict(offer) for offer in offers], USER_CONTEXT)
+
+    assert [offer["id"] for offer in ranked] == scalar_ranking(offers, USER_CONTEXT)
+
+
+def test_top_k_is_the_prefix_of_the_full_ranking():
+    offers = make_offers(300)
+    scorer = BatchPersonalizationScorer()
+    features = scorer.encode(offers)
+    expected = scalar_ranking(offers, USER_CONTEXT)
+
+    for top_k in (1, 5, 20, 299):
+        order, _ = scorer.rank(features, USER_CONTEXT, top_k=top_k)
+        assert [offers[index]["id"] for index in order.tolist()] == expected[:top_k]
+
+
+def test_empty_context_keeps_the_batch_order():
+    offers = make_offers(20)
+    scorer = BatchPersonalizationScorer()
+    order, scores = scorer.rank(scorer.encode(offers), {})
+
+    assert order.tolist() == list(range(20))
+    assert not scores.any()
+
+
+def test_encoded_batch_is_reused():
+    offers = make_offers(50)
+    service = PersonalizationService()
+    service.offer_features_cache.clear()
+
+    first = service._encode_candidates(offers)
+    assert service._encode_candidates(list(offers)) is first
+    assert service._encode_candidates(offers[:10]) is not first
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du score de personnalisation vectorisé")
+    print("=" * 50)
+
+    tests = [
+        test_scores_match_the_scalar_scorer,
+        test_rerank_order_matches_the_scalar_scorer,
+        test_top_k_is_the_prefix_of_the_full_ranking,
+        test_empty_context_keeps_the_batch_order,
+        test_encoded_batch_is_reused,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Tests du cache borné partagé (espaces de noms, TTL, cache négatif, valeurs périmées)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.bounded_cache import CacheNamespace, CacheRegistry
+
+
+def expire(namespace: CacheNamespace, key, stale: bool = True):
+    """Fait expirer une entrée (encore servable périmée si stale)"""
+    entry = namespace._entries[key]
+    entry.expires_at = 0
+    if not stale:
+        entry.stale_until = 0
+
+
+def test_fresh_entry_is_a_hit():
+    namespace = CacheNamespace("test", ttl=60)
+    namespace.set("a", {"x": 1})
+
+    assert namespace.get("a") == {"x": 1}
+    assert "a" in namespace
+    assert namespace.stats()["hits"] == 1
+
+
+def test_expired_entry_is_served_only_when_stale_is_allowed():
+    namespace = CacheNamespace("test", ttl=60, stale_ttl=3600)
+    namespace.set("a", 1)
+    expire(namespace, "a")
+
+    assert namespace.get("a") is None
+    assert "a" not in namespace
+    entry = namespace.get_entry("a", allow_stale=True)
+    assert entry is not None and entry.value == 1 and entry.is_stale()
+    assert namespace.stats()["stale_hits"] == 1
+
+
+def test_entry_past_its_stale_window_is_evicted():
+    namespace = CacheNamespace("test", ttl=60, stale_ttl=3600)
+    namespace.set("a", 1)
+    expire(namespace, "a", stale=False)
+
+    assert namespace.get_entry("a", allow_stale=True) is None
+    assert len(namespace) == 0
+    assert namespace.total_bytes == 0
+    assert namespace.stats()["evictions"]["expired"] == 1
+
+
+def test_negative_entry_has_no_stale_window():
+    namespace = CacheNamespace("test", ttl=60, negative_ttl=30, stale_ttl=3600)
+    namespace.set_negative("unknown")
+
+    entry = namespace.get_entry("unknown")
+    assert entry is not None and entry.negative and entry.value is None
+    assert namespace.stats()["negative_hits"] == 1
+    assert entry.stale_until == entry.expires_at
+
+
+def test_entry_limit_evicts_least_recently_used():
+    namespace = CacheNamespace("test", ttl=60, max_entries=2)
+    namespace.set("a", 1)
+    namespace.set("b", 2)
+    namespace.get("a")
+    namespace.set("c", 3)
+
+    assert namespace.get("b") is None
+    assert namespace.get("a") == 1 and namespace.get("c") == 3
+    assert namespace.stats()["evictions"]["lru"] == 1
+
+
+def test_byte_limit_is_enforced():
+    namespace = CacheNamespace("test", ttl=60, max_bytes=100)
+    namespace.set("a", "x" * 40)
+    namespace.set("b", "y" * 40)
+    namespace.set("c", "z" * 40)
+
+    assert namespace.total_bytes <= 100
+    assert "a" not in namespace
+    assert "c" in namespace
+
+
+def test_oversized_entry_is_kept_alone():
+    namespace = CacheNamespace("test", ttl=60, max_bytes=10)
+    namespace.set("a", 1)
+    namespace.set("big", "x" * 100)
+
+    assert "big" in namespace
+    assert len(namespace) == 1
+
+
+def test_replacing_an_entry_updates_the_byte_count():
+    namespace = CacheNamespace("test", ttl=60)
+    namespace.set("a", "x" * 100, size=100)
+    namespace.set("a", "x", size=1)
+
+    assert namespace.total_bytes == 1
+    assert namespace.invalidate("a")
+    assert namespace.total_bytes == 0
+    assert not namespace.invalidate("a")
+
+
+def test_registry_reuses_namespaces_and_sweeps_expired_entries():
+    registry = CacheRegistry()
+    first = registry.namespace("one", ttl=60)
+    assert registry.namespace("one", ttl=1) is first
+    assert first.ttl == 60
+
+    second = registry.namespace("two", ttl=60)
+    first.set("a", 1)
+    first.set("b", 2)
+    second.set("c", 3)
+    expire(first, "a", stale=False)
+    expire(second, "c", stale=False)
+
+    assert registry.evict_expired() == 2
+    assert set(registry.stats()) == {"one", "two"}
+    assert registry.stats()["one"]["entries"] == 1
+    assert registry.stats()["two"]["entries"] == 0
+
+
+async def _sweeper_evicts_in_the_background():
+    registry = CacheRegistry(sweep_interval=0.01)
+    namespace = registry.namespace("one", ttl=60)
+    namespace.set("a", 1)
+    expire(namespace, "a", stale=False)
+
+    registry.start_sweeper()
+    await asyncio.sleep(0.05)
+    await registry.stop_sweeper()
+
+    assert len(namespace) == 0
+    assert registry._sweep_task is None
+
+
+def test_sweeper_evicts_in_the_background():
+    asyncio.run(_sweeper_evicts_in_the_background())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du cache borné partagé")
+    print("=" * 50)
+
+    tests = [
+        test_fresh_entry_is_a_hit,
+        test_expired_entry_is_served_only_when_stale_is_allowed,
+        test_entry_past_its_stale_window_is_evicted,
+        test_negative_entry_has_no_stale_window,
+        test_entry_limit_evicts_least_recently_used,
+        test_byte_limit_is_enforced,
+        test_oversized_entry_is_kept_alone,
+        test_replacing_an_entry_updates_the_byte_count,
+        test_registry_reuses_namespaces_and_sweeps_expired_entries,
+        test_sweeper_evicts_in_the_background,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests de la file d'apprentissage hors requête
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.learning_queue import LearningQueue, merge_interactions
+
+
+class RecordingHandler:
+    """Handler d'apprentissage qui enregistre les appels"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, user_id, interaction):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.calls.append((user_id, interaction))
+
+
+async def _interactions_are_coalesced_per_user():
+    handler = RecordingHandler()
+    queue = LearningQueue(handler, flush_interval=3600)
+
+    for i in range(5):
+        queue.submit(1, {"viewed_offers": [{"id": i}], "intent": f"intent-{i}"})
+    queue.submit(2, {"liked_offers": [{"id": 99}]})
+
+    assert await queue.flush() == 2
+    assert len(handler.calls) == 2
+
+    user_id, merged = handler.calls[0]
+    assert user_id == 1
+    assert [offer["id"] for offer in merged["viewed_offers"]] == [0, 1, 2, 3, 4]
+    assert merged["intent"] == "intent-4"
+    assert merged["coalesced_interactions"] == 5
+    assert queue.stats()["coalesced"] == 4
+
+
+async def _backpressure_drops_and_counts():
+    queue = LearningQueue(RecordingHandler(), max_pending_users=2, max_events_per_user=3)
+
+    assert queue.submit(1, {})
+    assert queue.submit(2, {})
+    assert not queue.submit(3, {})
+    for _ in range(5):
+        queue.submit(1, {})
+
+    stats = queue.stats()
+    assert stats["pending_users"] == 2
+    assert stats["dropped"] == {"queue_full": 1, "user_overflow": 3}
+
+
+async def _submit_never_waits_and_stop_drains():
+    handler = RecordingHandler(delay=0.05)
+    queue = LearningQueue(handler, flush_interval=3600)
+    queue.start()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    queue.submit(1, {"viewed_offers": [{"id": 1}]})
+    assert loop.time() - start < 0.01
+    assert handler.calls == []
+
+    await queue.stop()
+    assert len(handler.calls) == 1
+
+
+def test_merge_interactions_concatenates_shown_offers():
+    merged = merge_interactions([
+        {"context": {"offers": [{"id": 1}], "summary": "a"}},
+        {"context": {"offers": [{"id": 2}], "summary": "b"}},
+    ])
+    assert [offer["id"] for offer in merged["context"]["offers"]] == [1, 2]
+    assert merged["context"]["summary"] == "b"
+
+
+def test_interactions_are_coalesced_per_user():
+    asyncio.run(_interactions_are_coalesced_per_user())
+
+
+def test_backpressure_drops_and_counts():
+    asyncio.run(_backpressure_drops_and_counts())
+
+
+def test_submit_never_waits_and_stop_drains():
+    asyncio.run(_submit_never_waits_and_stop_drains())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests de la file d'apprentissage")
+    print("=" * 50)
+
+    tests = [
+        test_merge_interactions_concatenates_shown_offers,
+        test_interactions_are_coalesced_per_user,
+        test_backpressure_drops_and_counts,
+        test_submit_never_waits_and_stop_drains,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
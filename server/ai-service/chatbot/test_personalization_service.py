@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests du service de personnalisation (cache des profils utilisateur)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services import personalization_service as personalization_module
+from chatbot.services.graph_preferences_service import GraphServiceUnavailable
+from chatbot.services.personalization_service import PersonalizationService
+
+
+class FakeGraphPreferences:
+    """Graph Service simulé : profil connu, utilisateur inconnu (None) ou panne"""
+
+    def __init__(self, profile=None, unavailable=False):
+        self.profile = profile
+        self.unavailable = unavailable
+        self.calls = 0
+
+    async def fetch_chatbot_profile(self, user_id):
+        self.calls += 1
+        if self.unavailable:
+            raise GraphServiceUnavailable("statut 503")
+        return self.profile
+
+
+async def with_graph(fake, coroutine):
+    original = personalization_module.graph_preferences_service
+    personalization_module.graph_preferences_service = fake
+    try:
+        return await coroutine
+    finally:
+        personalization_module.graph_preferences_service = original
+
+
+def make_service() -> PersonalizationService:
+    service = PersonalizationService()
+    service.user_profiles_cache.clear()
+    return service
+
+
+def expire(service: PersonalizationService, user_id: int):
+    """Rend l'entrée périmée (encore dans sa fenêtre stale_ttl)"""
+    entry = service.user_profiles_cache._entries[user_id]
+    entry.expires_at = 0
+
+
+async def _outage_keeps_the_stale_profile():
+    service = make_service()
+    profile = {"user_id": 1, "preferred_categories": ["Vélos"]}
+    await with_graph(FakeGraphPreferences(profile), service.get_user_context(1))
+    expire(service, 1)
+
+    graph = FakeGraphPreferences(unavailable=True)
+    assert await with_graph(graph, service._load_user_context(1)) == profile
+
+    entry = service.user_profiles_cache.get_entry(1, allow_stale=True)
+    assert entry is not None and not entry.negative
+    assert entry.value == profile
+    assert graph.calls == 1
+
+
+async def _outage_without_profile_is_not_cached():
+    service = make_service()
+    graph = FakeGraphPreferences(unavailable=True)
+
+    context = await with_graph(graph, service.get_user_context(2))
+    assert context == service._default_user_profile(2)
+    assert service.user_profiles_cache.get_entry(2, allow_stale=True) is None
+
+    # La requête suivante interroge de nouveau le Graph Service
+    await with_graph(graph, service.get_user_context(2))
+    assert graph.calls == 2
+
+
+async def _unknown_user_is_cached_negatively():
+    service = make_service()
+    graph = FakeGraphPreferences(profile=None)
+
+    context = await with_graph(graph, service.get_user_context(3))
+    assert context == service._default_user_profile(3)
+    assert service.user_profiles_cache.get_entry(3).negative
+
+    await with_graph(graph, service.get_user_context(3))
+    assert graph.calls == 1
+
+
+def test_outage_keeps_the_stale_profile():
+    asyncio.run(_outage_keeps_the_stale_profile())
+
+
+def test_outage_without_profile_is_not_cached():
+    asyncio.run(_outage_without_profile_is_not_cached())
+
+
+def test_unknown_user_is_cached_negatively():
+    asyncio.run(_unknown_user_is_cached_negatively())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du service de personnalisation")
+    print("=" * 50)
+
+    tests = [
+        test_outage_keeps_the_stale_profile,
+        test_outage_without_profile_is_not_cached,
+        test_unknown_user_is_cached_negatively,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
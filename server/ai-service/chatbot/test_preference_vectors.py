@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests des vecteurs de préférence utilisateur (mise à jour, décroissance, mélange)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.personalization_service import PersonalizationService
+from chatbot.services.preference_vectors import UserPreferenceVectors
+
+DAY = 24 * 3600
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingService:
+    """Embeddings d'offres fixes, en dimension 3"""
+
+    dimension = 3
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def get_offer_embeddings(self, offer_ids):
+        return {offer_id: self.embeddings[offer_id] for offer_id in offer_ids if offer_id in self.embeddings}
+
+
+def test_update_is_a_weighted_normalized_mean():
+    vectors = UserPreferenceVectors(dimension=3)
+    assert vectors.update(1, [(unit(1, 0, 0), 2.0), (unit(0, 1, 0), 1.0)], now=0)
+
+    vector, confidence = vectors.get(1, now=0)
+    assert np.allclose(vector, unit(2, 1, 0))
+    assert abs(confidence - 3.0 / (3.0 + vectors.confidence_weight)) < 1e-9
+
+
+def test_missing_embeddings_and_null_weights_are_ignored():
+    vectors = UserPreferenceVectors(dimension=3)
+    assert not vectors.update(1, [(None, 2.0), (unit(1, 0, 0), 0.0)], now=0)
+    assert vectors.get(1) is None
+    assert len(vectors) == 0
+
+
+def test_old_interactions_decay():
+    vectors = UserPreferenceVectors(dimension=3, half_life=7 * DAY)
+    vectors.update(1, [(unit(1, 0, 0), 1.0)], now=0)
+    vectors.update(1, [(unit(0, 1, 0), 1.0)], now=7 * DAY)
+
+    vector, _ = vectors.get(1, now=7 * DAY)
+    # L'interaction d'il y a une demi-vie compte pour moitié
+    assert np.allclose(vector, unit(0.5, 1, 0))
+
+    _, confidence_now = vectors.get(1, now=7 * DAY)
+    _, confidence_later = vectors.get(1, now=21 * DAY)
+    assert confidence_later < confidence_now
+
+
+def test_blend_is_bounded_by_confidence():
+    vectors = UserPreferenceVectors(dimension=3, confidence_weight=1.0)
+    query = unit(0, 0, 1)
+    assert vectors.blend(query, 1) is query
+    assert vectors.blend(query, None) is query
+
+    vectors.update(1, [(unit(1, 0, 0), 1.0)])
+    blended = vectors.blend(query, 1, max_weight=0.3)
+    # Confiance 0,5 : le vecteur utilisateur pèse 0,15 dans le mélange
+    assert np.allclose(blended, unit(0.15, 0, 0.85))
+    assert abs(np.linalg.norm(blended) - 1.0) < 1e-6
+    assert blended[2] > blended[0]
+
+
+def test_users_are_bounded_lru():
+    vectors = UserPreferenceVectors(dimension=3, max_users=2)
+    vectors.update(1, [(unit(1, 0, 0), 1.0)])
+    vectors.update(2, [(unit(1, 0, 0), 1.0)])
+    vectors.update(1, [(unit(0, 1, 0), 1.0)])
+    vectors.update(3, [(unit(1, 0, 0), 1.0)])
+
+    assert vectors.get(2) is None
+    assert vectors.get(1) is not None and vectors.get(3) is not None
+
+
+def test_learning_updates_the_vector_used_by_queries():
+    embeddings = {10: unit(1, 0, 0), 11: unit(0, 1, 0), 12: unit(0, 0, 1)}
+    service = PersonalizationService(embedding_service=FakeEmbeddingService(embeddings))
+    service.user_profiles_cache.clear()
+
+    assert service._update_preference_vector(5, {
+        "liked_offers": [{"id": 10}],
+        "viewed_offers": [{"id": 11}],
+        "context": {"offers": [{"id": 12}, {"id": 99}]}
+    })
+
+    vector, _ = service.preference_vectors.get(5)
+    weights = service.INTERACTION_WEIGHTS
+    assert np.allclose(vector, unit(weights["liked_offers"], weights["viewed_offers"], weights["shown_offers"]))
+
+    query = unit(0, 1, 1)
+    personalized = service.personalize_query_embedding(5, query)
+    assert personalized[0] > 0
+    assert np.array_equal(service.personalize_query_embedding(6, query), query)
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des vecteurs de préférence utilisateur")
+    print("=" * 50)
+
+    tests = [
+        test_update_is_a_weighted_normalized_mean,
+        test_missing_embeddings_and_null_weights_are_ignored,
+        test_old_interactions_decay,
+        test_blend_is_bounded_by_confidence,
+        test_users_are_bounded_lru,
+        test_learning_updates_the_vector_used_by_queries,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
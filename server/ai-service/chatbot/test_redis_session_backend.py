@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Tests du backend Redis des sessions contre un Redis simulé en mémoire
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.context_manager import ContextManager
+from chatbot.services.redis_session_backend import RedisSessionBackend
+
+
+class InMemoryPipeline:
+    """Pipeline simulé : les commandes sont exécutées en un seul aller-retour"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        if self.redis.latency:
+            await asyncio.sleep(self.redis.latency)
+        results = []
+        for name, args, kwargs in self.commands:
+            results.append(getattr(self.redis, f"_{name}")(*args, **kwargs))
+        self.commands = []
+        return results
+
+
+class InMemoryRedis:
+    """Sous-ensemble de redis.asyncio.Redis (decode_responses=False) en mémoire"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.data = {}
+        self.ttls = {}
+        self.round_trips = 0
+        self.commands = []
+
+    def pipeline(self, transaction: bool = True):
+        return InMemoryPipeline(self)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = getattr(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return command(*args, **kwargs)
+        return call
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def _hset(self, name, key=None, value=None, mapping=None):
+        self.commands.append("HSET")
+        fields = self.data.setdefault(name, {})
+        if key is not None:
+            fields[self._encode(key)] = self._encode(value)
+        for field, field_value in (mapping or {}).items():
+            fields[self._encode(field)] = self._encode(field_value)
+        return 1
+
+    def _hgetall(self, name):
+        self.commands.append("HGETALL")
+        return dict(self.data.get(name, {}))
+
+    def _hincrby(self, name, key, amount=1):
+        self.commands.append("HINCRBY")
+        fields = self.data.setdefault(name, {})
+        value = int(fields.get(self._encode(key), b"0")) + amount
+        fields[self._encode(key)] = self._encode(value)
+        return value
+
+    def _rpush(self, name, *values):
+        self.commands.append("RPUSH")
+        items = self.data.setdefault(name, [])
+        items.extend(self._encode(value) for value in values)
+        return len(items)
+
+    def _ltrim(self, name, start, end):
+        self.commands.append("LTRIM")
+        items = self.data.get(name, [])
+        end = len(items) + end if end < 0 else end
+        start = max(len(items) + start, 0) if start < 0 else start
+        self.data[name] = items[start:end + 1]
+        return True
+
+    def _lrange(self, name, start, end):
+        self.commands.append("LRANGE")
+        items = self.data.get(name, [])
+        end = len(items) + end if end < 0 else end
+        return list(items[start:end + 1])
+
+    def _expire(self, name, seconds):
+        self.commands.append("EXPIRE")
+        self.ttls[name] = seconds
+        return name in self.data
+
+    def _set(self, name, value, ex=None):
+        self.commands.append("SET")
+        self.data[name] = self._encode(value)
+        if ex:
+            self.ttls[name] = ex
+        return True
+
+    def _mget(self, names):
+        self.commands.append("MGET")
+        return [self.data.get(name) for name in names]
+
+    def _sadd(self, name, *values):
+        self.commands.append("SADD")
+        members = self.data.setdefault(name, set())
+        before = len(members)
+        members.update(self._encode(value) for value in values)
+        return len(members) - before
+
+    def _smembers(self, name):
+        self.commands.append("SMEMBERS")
+        return set(self.data.get(name, set()))
+
+    def _srem(self, name, *values):
+        self.commands.append("SREM")
+        members = self.data.get(name, set())
+        before = len(members)
+        members.difference_update(self._encode(value) for value in values)
+        return before - len(members)
+
+    def _delete(self, *names):
+        self.commands.append("DEL")
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def _zadd(self, name, mapping):
+        self.commands.append("ZADD")
+        members = self.data.setdefault(name, {})
+        added = sum(1 for member in mapping if self._encode(member) not in members)
+        members.update({self._encode(member): float(score) for member, score in mapping.items()})
+        return added
+
+    def _zrem(self, name, *values):
+        self.commands.append("ZREM")
+        members = self.data.get(name, {})
+        return sum(1 for value in values if members.pop(self._encode(value), None) is not None)
+
+    @staticmethod
+    def _score_range(members, low, high):
+        low, high = float(low), float(high)
+        return [member for member, score in members.items() if low <= score <= high]
+
+    def _zremrangebyscore(self, name, low, high):
+        self.commands.append("ZREMRANGEBYSCORE")
+        members = self.data.get(name, {})
+        removed = self._score_range(members, low, high)
+        for member in removed:
+            del members[member]
+        return len(removed)
+
+    def _zcount(self, name, low, high):
+        self.commands.append("ZCOUNT")
+        return len(self._score_range(self.data.get(name, {}), low, high))
+
+
+async def _round_trip_session():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+
+    session_id = await manager.create_session(user_id=7, session_data={"language": "fr"})
+    manager.sessions.clear()  # Forcer la relecture depuis Redis
+
+    session = await manager.get_session(session_id)
+    assert session is not None
+    assert session["user_id"] == 7
+    assert session["context"]["language"] == "fr"
+    assert session["context"]["conversation_history"] == []
+    assert session["metadata"]["message_count"] == 0
+
+
+async def _partial_updates_do_not_rewrite_session():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session(user_id=1)
+
+    redis.commands.clear()
+    assert await manager.update_intent_context(session_id, "product_search", {"brand": "apple"})
+    assert await manager.add_message_to_context(session_id, {"role": "user", "content": "iphone"})
+
+    # Aucune réécriture complète : seulement des champs, un RPUSH et un HINCRBY
+    assert "DEL" not in redis.commands
+    assert redis.commands.count("RPUSH") == 1
+    assert redis.commands.count("HINCRBY") == 1
+
+    key = manager.redis_backend.session_key(session_id)
+    assert set(redis.data[key].keys()) >= {b"ctx:current_intent", b"ctx:entities", b"last_activity"}
+
+    manager.sessions.clear()
+    session = await manager.get_session(session_id)
+    assert session["context"]["current_intent"] == "product_search"
+    assert session["context"]["entities"] == {"brand": "apple"}
+    assert session["metadata"]["message_count"] == 1
+    assert session["context"]["conversation_history"][0]["content"] == "iphone"
+
+
+async def _history_is_capped():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session()
+
+    for i in range(manager.max_context_length + 5):
+        await manager.add_message_to_context(session_id, {"role": "user", "content": str(i)})
+
+    history_key = manager.redis_backend.history_key(session_id)
+    assert len(redis.data[history_key]) == manager.max_context_length
+
+    manager.sessions.clear()
+    session = await manager.get_session(session_id)
+    assert session["metadata"]["message_count"] == manager.max_context_length + 5
+    assert session["context"]["conversation_history"][-1]["content"] == str(manager.max_context_length + 4)
+
+
+async def _history_slices_and_context_is_serializable():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session()
+    for i in range(4):
+        await manager.add_message_to_context(session_id, {"role": "user", "content": str(i)})
+
+    session = await manager.get_session(session_id)
+    history = session["context"]["conversation_history"]
+    assert [message["content"] for message in history[-2:]] == ["2", "3"]
+    assert [message["content"] for message in history[::2]] == ["0", "2"]
+    assert [message["content"] for message in history[::-1]] == ["3", "2", "1", "0"]
+
+    context = await manager.get_conversation_context(session_id)
+    assert isinstance(context["conversation_history"], list)
+    assert context["conversation_history"][0]["content"] == "0"
+    json.dumps(context)
+    # La copie ne remplace pas l'historique de la session en cache
+    assert session["context"]["conversation_history"] is history
+
+
+async def _batch_is_one_round_trip():
+    redis = InMemoryRedis()
+    backend = RedisSessionBackend(redis, max_history=10)
+
+    batch = backend.batch("s1")
+    batch.set_context_field("current_intent", "price_inquiry")
+    batch.append_message({"role": "user", "content": "prix ?"})
+    batch.append_message({"role": "bot", "content": "100€"})
+
+    redis.round_trips = 0
+    await batch.execute()
+    assert redis.round_trips == 1
+
+
+async def _clear_and_end_session():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session()
+    await manager.add_message_to_context(session_id, {"role": "user", "content": "bonjour"})
+
+    assert await manager.clear_session_context(session_id)
+    manager.sessions.clear()
+    session = await manager.get_session(session_id)
+    assert session["context"]["conversation_history"] == []
+
+    assert await manager.end_session(session_id)
+    assert await manager.get_session(session_id) is None
+
+    # Une seconde fin (ou une session inconnue) n'est pas comptée
+    assert await manager.end_session(session_id)
+    assert await manager.end_session("inconnue")
+    assert manager.stats.sessions_closed["ended"] == 1
+
+
+async def _stats_are_merged_across_workers():
+    redis = InMemoryRedis()
+    worker_a = ContextManager(redis_client=redis)
+    worker_b = ContextManager(redis_client=redis)
+    worker_b.stats_publisher.worker_id = "worker-b"
+
+    session_a = await worker_a.create_session()
+    await worker_a.add_message_to_context(session_a, {"role": "user", "content": "a", "intent": "product_search"})
+    session_b = await worker_b.create_session()
+    await worker_b.add_message_to_context(session_b, {"role": "user", "content": "b", "intent": "product_search"})
+    await worker_b.add_message_to_context(session_b, {"role": "bot", "content": "c", "intent": "price_inquiry"})
+
+    await worker_b.publish_stats()
+    stats = await worker_a.get_session_stats()
+
+    assert stats["total_sessions"] == 2
+    assert stats["total_messages"] == 3
+    assert stats["most_common_intents"][0] == {"intent": "product_search", "count": 2}
+
+
+async def _unit_of_work_flushes_once_on_commit():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session()
+
+    for write_behind in (False, True):
+        redis.round_trips = 0
+        async with manager.unit_of_work(session_id, write_behind=write_behind) as uow:
+            uow.update_intent_context("product_search", {"brand": "apple"})
+            uow.update({"context": {"active_filters": {"max_price": 500}}})
+            uow.add_message({"role": "user", "content": "iphone"})
+            uow.add_message({"role": "bot", "content": "voici"})
+            # Seul le chargement de la session a pu faire un aller-retour
+            loaded = redis.round_trips
+            assert loaded <= 1
+
+        await manager.flush_pending_commits()
+        assert redis.round_trips == loaded + 1
+        assert not uow.is_dirty
+
+    manager.sessions.clear()
+    session = await manager.get_session(session_id)
+    assert session["context"]["active_filters"] == {"max_price": 500}
+    assert session["metadata"]["message_count"] == 4
+    assert [message["content"] for message in session["context"]["conversation_history"]] == [
+        "iphone", "voici", "iphone", "voici"
+    ]
+
+
+async def _unit_of_work_writes_nothing_on_error():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis)
+    session_id = await manager.create_session()
+    await manager.add_message_to_context(session_id, {"role": "user", "content": "bonjour"})
+
+    for write_behind in (False, True):
+        redis.commands.clear()
+        try:
+            async with manager.unit_of_work(session_id, write_behind=write_behind) as uow:
+                uow.update_intent_context("product_search", {"brand": "apple"})
+                uow.add_message({"role": "user", "content": "iphone"})
+                raise RuntimeError("échec de la génération")
+        except RuntimeError:
+            pass
+        await manager.flush_pending_commits()
+
+        assert not any(command in redis.commands for command in ("HSET", "HINCRBY", "RPUSH"))
+        # La copie locale de la session est revenue à son état d'avant le tour
+        session = await manager.get_session(session_id)
+        assert session["context"]["current_intent"] is None
+        assert session["context"]["entities"] == {}
+        assert [message["content"] for message in session["context"]["conversation_history"]] == ["bonjour"]
+        assert session["metadata"]["message_count"] == 1
+
+    manager.sessions.clear()
+    session = await manager.get_session(session_id)
+    assert session["context"]["current_intent"] is None
+    assert session["metadata"]["message_count"] == 1
+
+
+async def _unit_of_work_rolls_back_without_redis():
+    manager = ContextManager()
+    session_id = await manager.create_session()
+    try:
+        async with manager.unit_of_work(session_id) as uow:
+            uow.update({"context": {"current_offers": [{"id": 1}], "new_field": True}})
+            uow.add_message({"role": "user", "content": "iphone"})
+            raise RuntimeError("échec")
+    except RuntimeError:
+        pass
+
+    session = await manager.get_session(session_id)
+    assert session["context"]["current_offers"] == []
+    assert "new_field" not in session["context"]
+    assert len(session["context"]["conversation_history"]) == 0
+    assert session["metadata"]["message_count"] == 0
+
+
+async def _lru_eviction_does_not_close_redis_sessions():
+    redis = InMemoryRedis()
+    manager = ContextManager(redis_client=redis, max_sessions=1)
+    first = await manager.create_session()
+    await manager.get_session(first)
+    second = await manager.create_session()
+    await manager.get_session(second)
+
+    # La première session a quitté le cache local mais existe toujours dans Redis
+    assert manager.sessions.evictions.get("lru") == 1
+    assert sum(manager.stats.sessions_closed.values()) == 0
+    assert await manager.get_session(first) is not None
+
+
+async def _expired_and_active_sessions_are_counted_once():
+    redis = InMemoryRedis()
+    worker_a = ContextManager(redis_client=redis)
+    worker_b = ContextManager(redis_client=redis)
+    worker_b.stats_publisher.worker_id = "worker-b"
+
+    expiring = await worker_a.create_session()
+    kept = await worker_a.create_session()
+    # La session est en cache dans les deux workers
+    await worker_b.get_session(expiring)
+    await worker_b.get_session(kept)
+
+    stats = await worker_a.get_session_stats()
+    assert stats["active_sessions"] == 2
+
+    # Le TTL Redis de la première session est échu
+    active_key = worker_a.redis_backend.active_key
+    redis.data[active_key][expiring.encode("utf-8")] = 0.0
+    await worker_a.cleanup_expired_sessions()
+    await worker_b.cleanup_expired_sessions()
+
+    assert worker_a.stats.sessions_closed["expired"] + worker_b.stats.sessions_closed["expired"] == 1
+    await worker_b.publish_stats()
+    stats = await worker_a.get_session_stats()
+    assert stats["active_sessions"] == 1
+
+    assert await worker_b.end_session(kept)
+    assert (await worker_a.get_session_stats())["active_sessions"] == 0
+
+
+def test_round_trip_session():
+    asyncio.run(_round_trip_session())
+
+
+def test_partial_updates_do_not_rewrite_session():
+    asyncio.run(_partial_updates_do_not_rewrite_session())
+
+
+def test_history_is_capped():
+    asyncio.run(_history_is_capped())
+
+
+def test_history_slices_and_context_is_serializable():
+    asyncio.run(_history_slices_and_context_is_serializable())
+
+
+def test_batch_is_one_round_trip():
+    asyncio.run(_batch_is_one_round_trip())
+
+
+def test_clear_and_end_session():
+    asyncio.run(_clear_and_end_session())
+
+
+def test_stats_are_merged_across_workers():
+    asyncio.run(_stats_are_merged_across_workers())
+
+
+def test_unit_of_work_flushes_once_on_commit():
+    asyncio.run(_unit_of_work_flushes_once_on_commit())
+
+
+def test_unit_of_work_writes_nothing_on_error():
+    asyncio.run(_unit_of_work_writes_nothing_on_error())
+
+
+def test_unit_of_work_rolls_back_without_redis():
+    asyncio.run(_unit_of_work_rolls_back_without_redis())
+
+
+def test_lru_eviction_does_not_close_redis_sessions():
+    asyncio.run(_lru_eviction_does_not_close_redis_sessions())
+
+
+def test_expired_and_active_sessions_are_counted_once():
+    asyncio.run(_expired_and_active_sessions_are_counted_once())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du backend Redis des sessions")
+    print("=" * 50)
+
+    tests = [
+        test_round_trip_session,
+        test_partial_updates_do_not_rewrite_session,
+        test_history_is_capped,
+        test_history_slices_and_context_is_serializable,
+        test_batch_is_one_round_trip,
+        test_clear_and_end_session,
+        test_stats_are_merged_across_workers,
+        test_unit_of_work_flushes_once_on_commit,
+        test_unit_of_work_writes_nothing_on_error,
+        test_unit_of_work_rolls_back_without_redis,
+        test_lru_eviction_does_not_close_redis_sessions,
+        test_expired_and_active_sessions_are_counted_once,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests du stockage local des sessions
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chatbot.services.conversation_history import ConversationHistory, serialize_default
+from chatbot.services.session_store import SessionStore
+
+
+def make_session(session_id: str, messages: int = 0):
+    history = ConversationHistory(10)
+    for i in range(messages):
+        history.append({"role": "user", "content": f"message {i} é", "timestamp": None})
+    return {"session_id": session_id, "context": {"conversation_history": history}, "metadata": {}}
+
+
+def test_history_size_is_tracked_incrementally():
+    history = ConversationHistory(3)
+    for i in range(5):
+        history.append({"role": "user", "content": "bonjour " * i, "timestamp": None})
+        serialized = json.dumps(history, ensure_ascii=False, default=serialize_default).encode("utf-8")
+        assert history.nbytes == len(serialized)
+
+    history.clear()
+    assert history.nbytes == 0
+
+
+def test_session_size_follows_appended_messages():
+    store = SessionStore()
+    session = make_session("a", 2)
+    store.set("a", session)
+    before = store.total_bytes
+
+    session["context"]["conversation_history"].append({"role": "assistant", "content": "x" * 500, "timestamp": None})
+    store.set("a", session)
+    assert store.total_bytes >= before + 500
+
+
+def test_membership_does_not_promote_or_evict():
+    store = SessionStore(max_entries=2)
+    store.set("a", make_session("a"))
+    store.set("b", make_session("b"))
+
+    assert "a" in store
+    assert "missing" not in store
+    # "a" reste la moins récemment utilisée : c'est elle qui est évincée
+    store.set("c", make_session("c"))
+    assert "a" not in store
+    assert "b" in store and "c" in store
+
+
+def test_expired_session_is_not_contained():
+    store = SessionStore(ttl_seconds=0)
+    store.set("a", make_session("a"))
+    assert "a" not in store
+    assert len(store) == 1
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du stockage local des sessions")
+    print("=" * 50)
+
+    tests = [
+        test_history_size_is_tracked_incrementally,
+        test_session_size_follows_appended_messages,
+        test_membership_does_not_promote_or_evict,
+        test_expired_session_is_not_contained,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrence du service Graph (nécessite un Neo4j accessible)
+
+Exécute les requêtes Cypher des endpoints avec un nombre croissant de
+requêtes simultanées et mesure le débit : avec le driver asynchrone, le débit
+doit croître avec le nombre de requêtes en vol jusqu'à saturation du pool.
+Le cache des réponses et le top-N matérialisé sont contournés : chaque appel
+atteint Neo4j.
+
+Usage:
+    python benchmark_concurrency.py [--requests 200] [--levels 1,4,16,64] [--user-id 1]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from main import TRENDING_LIVE_QUERY
+from materialized_recommendations import run_strategy_query
+from user_preferences import get_user_chatbot_profile
+from neo4j_driver import NEO4J_MAX_POOL_SIZE, NEO4J_FETCH_SIZE, init_driver, close_driver, get_pool_stats, neo4j_session
+
+async def run_trending_query(limit: int):
+    """Requête live des tendances (sans les compteurs glissants ni le cache)"""
+    async with neo4j_session() as session:
+        result = await session.run(TRENDING_LIVE_QUERY, limit=limit)
+        return [dict(record) async for record in result]
+
+def make_scenarios(user_id: int):
+    return {
+        "category": lambda: run_strategy_query("category", user_id, 20),
+        "trending": lambda: run_trending_query(20),
+        "chatbot-profile": lambda: get_user_chatbot_profile(user_id, limit=10)
+    }
+
+async def run_level(call, total: int, concurrency: int):
+    """Exécute total requêtes avec au plus concurrency requêtes en vol"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed, statistics.median(latencies), errors
+
+async def run(args):
+    levels = [int(level) for level in args.levels.split(",")]
+    init_driver()
+    scenarios = make_scenarios(args.user_id)
+
+    print(f"\n📊 Débit par niveau de concurrence (pool={NEO4J_MAX_POOL_SIZE}, fetch_size={NEO4J_FETCH_SIZE})")
+    print(f"{'Endpoint':<18}{'En vol':>8}{'req/s':>10}{'p50 ms':>10}{'Erreurs':>9}")
+    try:
+        for name, call in scenarios.items():
+            # Échauffement (ouverture des connexions)
+            await run_level(call, min(args.requests, 10), 1)
+            for concurrency in levels:
+                throughput, p50, errors = await run_level(call, args.requests, concurrency)
+                print(f"{name:<18}{concurrency:>8}{throughput:>10.1f}{p50:>10.2f}{errors:>9}")
+        print(f"\n🔌 Pool: {get_pool_stats()}")
+    finally:
+        await close_driver()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark de concurrence du service Graph")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par niveau")
+    parser.add_argument("--levels", default="1,4,16,64", help="Niveaux de concurrence")
+    parser.add_argument("--user-id", type=int, default=1, help="Utilisateur de test")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main_cli()
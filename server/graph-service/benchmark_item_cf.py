@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark du filtrage collaboratif item-item (données synthétiques, sans Neo4j)
+
+Mesure la construction du voisinage (par blocs, mono- et multi-processus)
+et la latence d'une recommandation (produit vecteur creux × voisinage).
+
+Usage:
+    python benchmark_item_cf.py [--users 20000] [--offers 20000] [--edges 400000] [--workers 4]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from item_cf import ItemCFModel, INTERACTION_WEIGHTS
+
+def make_dataset(users: int, offers: int, edges: int):
+    rng = random.Random(42)
+    # Popularité des offres en loi de puissance, comme sur la plateforme
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(offers)]
+    offer_ids = rng.choices(range(offers), weights=weights, k=edges)
+    triples = {}
+    for offer_id in offer_ids:
+        user_id = rng.randrange(users)
+        weight = INTERACTION_WEIGHTS['LIKED'] if rng.random() < 0.2 else INTERACTION_WEIGHTS['VIEWED']
+        triples[(user_id, offer_id)] = max(triples.get((user_id, offer_id), 0.0), weight)
+    catalogue = {
+        offer_id: {"id": offer_id, "title": f"Offre {offer_id}", "price": 100.0,
+                   "sellerId": rng.randrange(users), "available": rng.random() < 0.9}
+        for offer_id in range(offers)
+    }
+    return [(user_id, offer_id, weight) for (user_id, offer_id), weight in triples.items()], catalogue
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du filtrage collaboratif item-item")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--offers", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=400000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    edges, catalogue = make_dataset(args.users, args.offers, args.edges)
+    print(f"\n📊 {len(edges)} interactions, {args.users} utilisateurs, {args.offers} offres")
+
+    for workers in (1, args.workers):
+        start = time.perf_counter()
+        model = ItemCFModel.build(edges, catalogue, workers=workers)
+        print(f"Construction ({workers} processus): {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{model.neighbors.nnz} voisins")
+
+    users = list(model.user_index)
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(args.queries):
+        start = time.perf_counter()
+        model.recommend(rng.choice(users), 20)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"Recommandation: p50 {statistics.median(latencies):.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+
+    start = time.perf_counter()
+    updates = {(rng.choice(users), rng.randrange(args.offers)): INTERACTION_WEIGHTS['LIKED'] for _ in range(200)}
+    model.with_updates(updates, 50)
+    print(f"Rafraîchissement incrémental (200 interactions): {(time.perf_counter() - start) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
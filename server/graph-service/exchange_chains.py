@@ -0,0 +1,275 @@
+"""
+Index des chaînes d'échange
+Chaque chaîne REPLACED_BY est matérialisée par un nœud ExchangeChain (offre
+de tête, offre de queue, longueur, gain cumulé) et chaque offre de la chaîne
+porte chainId et chainPosition ; l'index est mis à jour à chaque lien
+replacedByOffer reçu par /sync/offer
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import time
+import logging
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 5000
+
+EXCHANGE_CHAIN_SCHEMA_QUERIES = (
+    "CREATE CONSTRAINT exchange_chain_id IF NOT EXISTS FOR (c:ExchangeChain) REQUIRE c.id IS UNIQUE",
+    "CREATE INDEX offer_chain_id IF NOT EXISTS FOR (o:Offer) ON (o.chainId)",
+    "CREATE INDEX offer_seller IF NOT EXISTS FOR (o:Offer) ON (o.sellerId)"
+)
+
+# Ajout d'un lien old -> new : la chaîne de new (ou new seul) est accrochée
+# à la queue de la chaîne de old. L'identifiant d'une chaîne est l'ID de son
+# offre de tête. Un lien qui créerait une bifurcation ou un cycle est ignoré.
+EXCHANGE_CHAIN_LINK_QUERY = """
+    MATCH (old:Offer {id: $offerId}), (new:Offer {id: $replacedById})
+    WHERE old <> new
+      AND NOT (old)-[:REPLACED_BY]->()
+      AND NOT ()-[:REPLACED_BY]->(new)
+      AND (old.chainId IS NULL OR new.chainId IS NULL OR old.chainId <> new.chainId)
+    MERGE (old)-[:REPLACED_BY]->(new)
+    WITH old, new
+    MERGE (chain:ExchangeChain {id: coalesce(old.chainId, old.id)})
+    ON CREATE SET chain.headOfferId = old.id,
+                  chain.sellerId = old.sellerId,
+                  chain.length = 0
+    SET old.chainId = chain.id,
+        old.chainPosition = coalesce(old.chainPosition, 0)
+    WITH old, new, chain
+    OPTIONAL MATCH (next:ExchangeChain {id: new.chainId})
+    WITH old, new, chain, next,
+         coalesce(next.length, 0) as appendedLength,
+         coalesce(next.tailOfferId, new.id) as tailId
+    CALL {
+        WITH old, new, chain, next
+        WITH old, new, chain, next WHERE next IS NULL
+        SET new.chainId = chain.id,
+            new.chainPosition = old.chainPosition + 1
+    }
+    CALL {
+        WITH old, chain, next
+        WITH old, chain, next WHERE next IS NOT NULL
+        MATCH (moved:Offer {chainId: next.id})
+        SET moved.chainId = chain.id,
+            moved.chainPosition = old.chainPosition + 1 + moved.chainPosition
+    }
+    WITH old, chain, next, appendedLength, tailId
+    MATCH (head:Offer {id: chain.headOfferId}), (tail:Offer {id: tailId})
+    SET chain.tailOfferId = tailId,
+        chain.length = old.chainPosition + 1 + appendedLength,
+        chain.gain = tail.price - head.price,
+        chain.updatedAt = datetime()
+    WITH chain, next
+    CALL {
+        WITH next
+        WITH next WHERE next IS NOT NULL
+        DELETE next
+    }
+    RETURN chain.id as chainId, chain.length as length
+"""
+
+# Gain cumulé à recalculer quand le prix d'une offre de tête ou de queue change
+EXCHANGE_CHAIN_GAIN_QUERY = """
+    MATCH (o:Offer {id: $offerId})
+    WHERE o.chainId IS NOT NULL
+    MATCH (chain:ExchangeChain {id: o.chainId})
+    WHERE chain.headOfferId = o.id OR chain.tailOfferId = o.id
+    MATCH (head:Offer {id: chain.headOfferId}), (tail:Offer {id: chain.tailOfferId})
+    SET chain.gain = tail.price - head.price
+"""
+
+# Chaînes d'un utilisateur : pour chacune de ses offres suivie d'au moins un
+# échange, le parcours jusqu'à la queue de sa chaîne
+USER_EXCHANGE_CHAINS_QUERY = """
+    MATCH (start:Offer {sellerId: $userId})
+    WHERE start.chainId IS NOT NULL
+    MATCH (chain:ExchangeChain {id: start.chainId})
+    WHERE start.chainPosition < chain.length
+    MATCH (end:Offer {id: chain.tailOfferId})
+    WITH start, end, chain.length - start.chainPosition as chainLength
+    ORDER BY chainLength DESC
+    RETURN start.title as initialOffer,
+           start.price as initialPrice,
+           end.title as currentOffer,
+           end.price as currentPrice,
+           chainLength,
+           (end.price - start.price) as gain,
+           ((end.price - start.price) / start.price * 100) as roiPercentage
+"""
+
+EXCHANGE_CHAIN_COUNT_QUERY = """
+    MATCH (c:ExchangeChain)
+    RETURN count(c) as chains
+"""
+
+REPLACED_BY_EDGES_QUERY = """
+    MATCH (old:Offer)-[:REPLACED_BY]->(new:Offer)
+    RETURN old.id as oldId, new.id as newId
+"""
+
+EXCHANGE_CHAIN_RESET_QUERY = """
+    MATCH (c:ExchangeChain)
+    DETACH DELETE c
+"""
+
+EXCHANGE_CHAIN_CLEAR_OFFERS_QUERY = """
+    MATCH (o:Offer)
+    WHERE o.chainId IS NOT NULL
+    REMOVE o.chainId, o.chainPosition
+"""
+
+EXCHANGE_CHAIN_WRITE_OFFERS_QUERY = """
+    UNWIND $offers AS offer
+    MATCH (o:Offer {id: offer.id})
+    SET o.chainId = offer.chainId,
+        o.chainPosition = offer.position
+"""
+
+EXCHANGE_CHAIN_WRITE_CHAINS_QUERY = """
+    UNWIND $chains AS chain
+    MATCH (head:Offer {id: chain.headOfferId}), (tail:Offer {id: chain.tailOfferId})
+    CREATE (c:ExchangeChain {
+        id: chain.headOfferId,
+        headOfferId: chain.headOfferId,
+        tailOfferId: chain.tailOfferId,
+        sellerId: head.sellerId,
+        length: chain.length,
+        gain: tail.price - head.price,
+        updatedAt: datetime()
+    })
+"""
+
+def build_chains(edges: List[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Chaînes (listes d'offres de la tête à la queue) à partir des liens old -> new
+
+    Seul le premier lien sortant et le premier lien entrant de chaque offre
+    sont retenus ; un cycle (aucune offre de tête) n'est pas indexé, comme
+    dans EXCHANGE_CHAIN_LINK_QUERY.
+    """
+    successor: Dict[int, int] = {}
+    has_predecessor = set()
+    for old_id, new_id in edges:
+        if old_id == new_id or old_id in successor or new_id in has_predecessor:
+            continue
+        successor[old_id] = new_id
+        has_predecessor.add(new_id)
+
+    chains = []
+    for head in successor:
+        if head in has_predecessor:
+            continue
+        chain, seen = [head], {head}
+        while chain[-1] in successor and successor[chain[-1]] not in seen:
+            chain.append(successor[chain[-1]])
+            seen.add(chain[-1])
+        chains.append(chain)
+    return chains
+
+class ExchangeChainIndex:
+    """
+    Index des chaînes d'échange
+
+    - link() : mise à jour incrémentale, en une transaction, à la réception
+      d'un replacedByOffer (fusion des deux chaînes concernées).
+    - rebuild() : reconstruction complète depuis les liens REPLACED_BY
+      existants (données migrées), lancée au démarrage si l'index est vide.
+    """
+
+    def __init__(self):
+        self._worker: Optional[asyncio.Task] = None
+        self.metrics = {"links": 0, "ignored_links": 0, "rebuilds": 0, "chains": 0, "rebuild_ms": 0.0}
+
+    async def ensure_schema(self):
+        async with neo4j_session() as session:
+            for query in EXCHANGE_CHAIN_SCHEMA_QUERIES:
+                await (await session.run(query)).consume()
+
+    async def link(self, session, offer_id: int, replaced_by_id: int) -> Optional[Dict[str, Any]]:
+        """Ajoute le lien offer_id -> replaced_by_id et fusionne les chaînes ; None si ignoré"""
+        async def write_link(tx):
+            result = await tx.run(EXCHANGE_CHAIN_LINK_QUERY, offerId=offer_id, replacedById=replaced_by_id)
+            record = await result.single()
+            return dict(record) if record else None
+
+        chain = await session.execute_write(write_link)
+        if chain is None:
+            self.metrics["ignored_links"] += 1
+            logger.warning(f"⚠️ Lien d'échange {offer_id} -> {replaced_by_id} ignoré (déjà lié, bifurcation ou cycle)")
+        else:
+            self.metrics["links"] += 1
+        return chain
+
+    async def refresh_gain(self, session, offer_id: int):
+        """Recalcule le gain cumulé si l'offre est en tête ou en queue d'une chaîne"""
+        await (await session.run(EXCHANGE_CHAIN_GAIN_QUERY, offerId=offer_id)).consume()
+
+    async def get_user_chains(self, user_id: int) -> List[Dict[str, Any]]:
+        async with neo4j_session() as session:
+            result = await session.run(USER_EXCHANGE_CHAINS_QUERY, userId=user_id)
+            return [dict(record) async for record in result]
+
+    async def rebuild(self):
+        """Reconstruit tout l'index depuis les liens REPLACED_BY"""
+        start = time.perf_counter()
+        async with neo4j_session() as session:
+            result = await session.run(REPLACED_BY_EDGES_QUERY)
+            edges = [(record["oldId"], record["newId"]) async for record in result]
+            chains = build_chains(edges)
+
+            offers = [
+                {"id": offer_id, "chainId": chain[0], "position": position}
+                for chain in chains
+                for position, offer_id in enumerate(chain)
+            ]
+            summaries = [
+                {"headOfferId": chain[0], "tailOfferId": chain[-1], "length": len(chain) - 1}
+                for chain in chains
+            ]
+
+            await (await session.run(EXCHANGE_CHAIN_RESET_QUERY)).consume()
+            await (await session.run(EXCHANGE_CHAIN_CLEAR_OFFERS_QUERY)).consume()
+            for i in range(0, len(offers), WRITE_BATCH_SIZE):
+                await (await session.run(EXCHANGE_CHAIN_WRITE_OFFERS_QUERY, offers=offers[i:i + WRITE_BATCH_SIZE])).consume()
+            for i in range(0, len(summaries), WRITE_BATCH_SIZE):
+                await (await session.run(EXCHANGE_CHAIN_WRITE_CHAINS_QUERY, chains=summaries[i:i + WRITE_BATCH_SIZE])).consume()
+
+        self.metrics["rebuilds"] += 1
+        self.metrics["chains"] = len(chains)
+        self.metrics["rebuild_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"🔗 Index des chaînes d'échange reconstruit: {len(chains)} chaînes en {self.metrics['rebuild_ms']:.0f} ms")
+
+    async def _initialize(self):
+        try:
+            await self.ensure_schema()
+            async with neo4j_session() as session:
+                record = await (await session.run(EXCHANGE_CHAIN_COUNT_QUERY)).single()
+            if record["chains"] == 0:
+                await self.rebuild()
+        except Exception as e:
+            logger.error(f"❌ Erreur initialisation de l'index des chaînes d'échange: {e}")
+
+    def start(self):
+        """Crée le schéma et reconstruit l'index en arrière-plan s'il est vide"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._initialize())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.metrics)
+
+# Instance globale de l'index des chaînes d'échange
+exchange_chain_index = ExchangeChainIndex()
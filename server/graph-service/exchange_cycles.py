@@ -0,0 +1,445 @@
+"""
+Cycles d'échange multi-parties
+Instantané du graphe des souhaits (une offre "veut" les offres des catégories
+auxquelles elle est liée par MATCHED_WITH), recherche de cycles A -> B -> C -> A
+de longueur bornée avec élagage, précalculée en parallèle pour toutes les
+offres et complétée à la demande, sous échéance, pour les offres récentes
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import multiprocessing
+import os
+import time
+import logging
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration des cycles d'échange
+EXCHANGE_CYCLES_MIN_LENGTH = int(os.getenv('EXCHANGE_CYCLES_MIN_LENGTH', '3'))
+EXCHANGE_CYCLES_MAX_LENGTH = int(os.getenv('EXCHANGE_CYCLES_MAX_LENGTH', '4'))
+EXCHANGE_CYCLES_PER_OFFER = int(os.getenv('EXCHANGE_CYCLES_PER_OFFER', '20'))
+EXCHANGE_CYCLES_MAX_EXPANSIONS = int(os.getenv('EXCHANGE_CYCLES_MAX_EXPANSIONS', '5000'))
+EXCHANGE_CYCLES_DEADLINE_MS = float(os.getenv('EXCHANGE_CYCLES_DEADLINE_MS', '200'))
+EXCHANGE_CYCLES_WORKERS = int(os.getenv('EXCHANGE_CYCLES_WORKERS', str(os.cpu_count() or 1)))
+EXCHANGE_CYCLES_PARALLEL_MIN_OFFERS = int(os.getenv('EXCHANGE_CYCLES_PARALLEL_MIN_OFFERS', '5000'))
+EXCHANGE_CYCLES_CHUNK_SIZE = int(os.getenv('EXCHANGE_CYCLES_CHUNK_SIZE', '500'))
+EXCHANGE_CYCLES_REBUILD_INTERVAL = float(os.getenv('EXCHANGE_CYCLES_REBUILD_INTERVAL', '600'))
+
+# Pénalité par participant supplémentaire au-delà d'un échange à deux
+CYCLE_LENGTH_DECAY = 0.8
+
+# Offres disponibles, leur catégorie et les catégories souhaitées en échange
+EXCHANGE_CYCLES_SNAPSHOT_QUERY = """
+    MATCH (o:Offer)
+    WHERE o.status = 'available' AND NOT coalesce(o.isDeleted, false)
+    RETURN o.id as id, o.title as title, o.price as price, o.sellerId as sellerId,
+           coalesce(o.categoryId, head([(o)-[:BELONGS_TO]->(c:Category) | c.id])) as categoryId,
+           [(o)-[:MATCHED_WITH]->(wanted:Category) | wanted.id] as wantedCategories
+"""
+
+EXCHANGE_CYCLES_OFFER_QUERY = """
+    MATCH (o:Offer {id: $offerId})
+    RETURN o.id as id, o.title as title, o.price as price, o.sellerId as sellerId,
+           coalesce(o.categoryId, head([(o)-[:BELONGS_TO]->(c:Category) | c.id])) as categoryId,
+           [(o)-[:MATCHED_WITH]->(wanted:Category) | wanted.id] as wantedCategories,
+           coalesce(o.status = 'available' AND NOT coalesce(o.isDeleted, false), false) as available
+"""
+
+class WantGraph:
+    """
+    Graphe des souhaits : arc A -> B si la catégorie de B fait partie des
+    catégories souhaitées par A (le vendeur de A recevrait B)
+
+    Le graphe des catégories (c1 -> c2 si une offre de c1 souhaite c2) sert
+    à l'élagage de la recherche de cycles.
+    """
+
+    def __init__(self, offers: Iterable[Dict[str, Any]]):
+        self.offers: Dict[int, Dict[str, Any]] = {}
+        self.offers_by_category: Dict[Any, List[int]] = {}
+        self.wanters_by_category: Dict[Any, List[int]] = {}
+        self.categories_wanting: Dict[Any, Set[Any]] = {}
+
+        for offer in offers:
+            offer = dict(offer)
+            offer["wantedCategories"] = tuple(dict.fromkeys(offer.get("wantedCategories") or ()))
+            self.offers[offer["id"]] = offer
+            if offer.get("categoryId") is not None:
+                self.offers_by_category.setdefault(offer["categoryId"], []).append(offer["id"])
+            for category_id in offer["wantedCategories"]:
+                self.wanters_by_category.setdefault(category_id, []).append(offer["id"])
+                if offer.get("categoryId") is not None:
+                    self.categories_wanting.setdefault(category_id, set()).add(offer["categoryId"])
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    def sources(self) -> List[int]:
+        """Offres pouvant faire partie d'un cycle (catégorie connue et au moins un souhait)"""
+        return [offer_id for offer_id, offer in self.offers.items()
+                if offer["wantedCategories"] and offer.get("categoryId") is not None]
+
+    def category_distances(self, category_id: Any, max_distance: int) -> Dict[Any, int]:
+        """
+        Minorant, par catégorie, du nombre d'arcs pour rejoindre une offre de
+        la catégorie donnée (parcours à rebours du graphe des catégories)
+        """
+        distances = {category_id: 0}
+        frontier = [category_id]
+        for step in range(1, max_distance + 1):
+            next_frontier = []
+            for target in frontier:
+                for category in self.categories_wanting.get(target, ()):
+                    if category not in distances:
+                        distances[category] = step
+                        next_frontier.append(category)
+            frontier = next_frontier
+            if not frontier:
+                break
+        return distances
+
+def _seller_key(offer: Dict[str, Any]):
+    return offer["sellerId"] if offer.get("sellerId") is not None else ("offer", offer["id"])
+
+def find_cycles(graph: WantGraph,
+                source: Dict[str, Any],
+                min_length: int = EXCHANGE_CYCLES_MIN_LENGTH,
+                max_length: int = EXCHANGE_CYCLES_MAX_LENGTH,
+                max_cycles: int = EXCHANGE_CYCLES_PER_OFFER * 5,
+                max_expansions: int = EXCHANGE_CYCLES_MAX_EXPANSIONS,
+                deadline: Optional[float] = None) -> Tuple[List[List[int]], bool]:
+    """
+    Cycles passant par l'offre source, de min_length à max_length offres
+
+    Élagage : un minorant de la distance de retour vers la source est
+    calculé par catégorie ; une catégorie (puis une offre) qui ne peut plus
+    refermer le cycle dans la longueur restante n'est pas explorée, et le
+    dernier maillon est choisi parmi les seules offres souhaitant la
+    catégorie de la source. Les vendeurs d'un cycle sont tous distincts. La
+    recherche s'arrête au nombre d'expansions, de cycles ou à l'échéance
+    (time.monotonic()).
+
+    Returns:
+        (cycles sous forme de listes d'IDs commençant par la source, recherche complète)
+    """
+    if not source.get("wantedCategories") or source.get("categoryId") is None or max_length < 2:
+        return [], True
+
+    source_id = source["id"]
+    category_distance = graph.category_distances(source["categoryId"], max_length - 1)
+    unreachable = max_length + 1
+
+    def lower_bound(offer: Dict[str, Any]) -> int:
+        return 1 + min((category_distance.get(category, unreachable) for category in offer["wantedCategories"]),
+                       default=unreachable)
+
+    # Dernier maillon possible : offres souhaitant la catégorie de la source, par catégorie
+    closers: Dict[Any, List[int]] = {}
+    for offer_id in graph.wanters_by_category.get(source["categoryId"], ()):
+        category = graph.offers[offer_id].get("categoryId")
+        if offer_id != source_id and category is not None:
+            closers.setdefault(category, []).append(offer_id)
+
+    # Échéance vérifiée aussi pendant le parcours des candidats : une grande
+    # catégorie entièrement élaguée ne produit aucune expansion
+    scanned = 0
+    timed_out = False
+
+    def past_deadline() -> bool:
+        nonlocal scanned, timed_out
+        scanned += 1
+        if deadline is not None and scanned % 64 == 0 and time.monotonic() > deadline:
+            timed_out = True
+        return timed_out
+
+    def next_offers(offer: Dict[str, Any], remaining: int):
+        for category in offer["wantedCategories"]:
+            if remaining == 1:
+                for candidate in closers.get(category, ()):
+                    if past_deadline():
+                        return
+                    yield candidate
+            elif category_distance.get(category, unreachable) <= remaining:
+                for candidate in graph.offers_by_category.get(category, ()):
+                    if past_deadline():
+                        return
+                    if lower_bound(graph.offers[candidate]) <= remaining:
+                        yield candidate
+
+    cycles: List[List[int]] = []
+    expansions = 0
+    complete = True
+    path = [source_id]
+    on_path = {source_id}
+    sellers = {_seller_key(source)}
+    # Pile d'itérateurs (parcours en profondeur sans récursion)
+    stack = [next_offers(source, max_length - 1)]
+
+    while stack:
+        next_offer = next(stack[-1], None)
+        if timed_out:
+            complete = False
+            break
+        if next_offer is None:
+            stack.pop()
+            if len(path) > 1:
+                removed = path.pop()
+                on_path.discard(removed)
+                sellers.discard(_seller_key(graph.offers[removed]))
+            continue
+
+        offer = graph.offers[next_offer]
+        seller = _seller_key(offer)
+        if next_offer in on_path or seller in sellers:
+            continue
+
+        expansions += 1
+        if expansions > max_expansions:
+            complete = False
+            break
+
+        length = len(path) + 1
+        if length >= min_length and source["categoryId"] in offer["wantedCategories"]:
+            cycles.append(path + [next_offer])
+            if len(cycles) >= max_cycles:
+                complete = False
+                break
+        if length < max_length:
+            path.append(next_offer)
+            on_path.add(next_offer)
+            sellers.add(seller)
+            stack.append(next_offers(offer, max_length - length))
+
+    return cycles, complete
+
+def rank_cycles(graph: WantGraph, source: Dict[str, Any], cycles: List[List[int]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Classe les cycles : équilibre des valeurs (prix min / prix max), pénalisé
+    par le nombre de participants
+
+    Dans un cycle [A, B, C], le vendeur de A reçoit B, celui de B reçoit C et
+    celui de C reçoit A.
+    """
+    ranked = []
+    for cycle in cycles:
+        offers = [source if offer_id == source["id"] else graph.offers[offer_id] for offer_id in cycle]
+        prices = [float(offer.get("price") or 0.0) for offer in offers]
+        balance = min(prices) / max(prices) if max(prices) > 0 else 0.0
+        ranked.append({
+            "length": len(cycle),
+            "valueBalance": balance,
+            "score": balance * CYCLE_LENGTH_DECAY ** (len(cycle) - 2),
+            "offers": [
+                {
+                    "offerId": offer["id"],
+                    "title": offer.get("title"),
+                    "price": offer.get("price"),
+                    "sellerId": offer.get("sellerId"),
+                    "categoryId": offer.get("categoryId"),
+                    "receivesOfferId": cycle[(position + 1) % len(cycle)]
+                }
+                for position, offer in enumerate(offers)
+            ]
+        })
+    ranked.sort(key=lambda cycle: cycle["score"], reverse=True)
+    return ranked[:limit]
+
+# Graphe partagé par les processus de calcul (initialisé une fois par processus)
+_worker_graph: Optional[WantGraph] = None
+
+def _init_worker(graph: WantGraph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _cycles_chunk(sources: List[int], per_offer: int) -> Dict[int, List[List[int]]]:
+    table = {}
+    for source_id in sources:
+        source = _worker_graph.offers[source_id]
+        cycles, _ = find_cycles(_worker_graph, source)
+        if cycles:
+            ranked = rank_cycles(_worker_graph, source, cycles, per_offer)
+            table[source_id] = [[step["offerId"] for step in cycle["offers"]] for cycle in ranked]
+    return table
+
+def compute_cycle_table(graph: WantGraph,
+                        per_offer: int = EXCHANGE_CYCLES_PER_OFFER,
+                        workers: int = EXCHANGE_CYCLES_WORKERS,
+                        chunk_size: int = EXCHANGE_CYCLES_CHUNK_SIZE) -> Dict[int, List[List[int]]]:
+    """
+    Meilleurs cycles de chaque offre, calculés par lots d'offres sources sur
+    plusieurs processus pour les grands catalogues
+
+    Returns:
+        {offre: [cycle, ...]} (seules les offres ayant au moins un cycle)
+    """
+    sources = graph.sources()
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+
+    # Le démarrage des processus ne se rentabilise que sur les grands catalogues
+    if workers > 1 and len(chunks) > 1 and len(sources) >= EXCHANGE_CYCLES_PARALLEL_MIN_OFFERS:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context,
+                                 initializer=_init_worker, initargs=(graph,)) as pool:
+            parts = list(pool.map(_cycles_chunk, chunks, [per_offer] * len(chunks)))
+    else:
+        _init_worker(graph)
+        parts = [_cycles_chunk(chunk, per_offer) for chunk in chunks]
+
+    table: Dict[int, List[List[int]]] = {}
+    for part in parts:
+        table.update(part)
+    return table
+
+class ExchangeCycleEngine:
+    """
+    Moteur de cycles d'échange
+
+    - Instantané du graphe des souhaits et table offre -> cycles reconstruits
+      toutes les EXCHANGE_CYCLES_REBUILD_INTERVAL secondes (pool de processus).
+    - Les cycles contenant une offre devenue indisponible sont écartés à la
+      lecture (statut répercuté par /sync/offer).
+    - Offre absente de la table (créée ou liée à de nouvelles catégories
+      depuis l'instantané) : recherche à la demande dans un thread, arrêtée
+      à EXCHANGE_CYCLES_DEADLINE_MS ; le résultat est alors marqué incomplet.
+    """
+
+    def __init__(self,
+                 rebuild_interval: float = EXCHANGE_CYCLES_REBUILD_INTERVAL,
+                 deadline_ms: float = EXCHANGE_CYCLES_DEADLINE_MS,
+                 workers: int = EXCHANGE_CYCLES_WORKERS):
+        self.rebuild_interval = rebuild_interval
+        self.deadline_ms = deadline_ms
+        self.workers = workers
+
+        self.graph: Optional[WantGraph] = None
+        self.table: Dict[int, List[List[int]]] = {}
+        self._unavailable: Set[int] = set()
+        self._stale: Set[int] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.metrics = {
+            "precomputed_hits": 0,
+            "live_searches": 0,
+            "live_timeouts": 0,
+            "rebuilds": 0,
+            "last_rebuild_ms": 0.0,
+            "last_live_search_ms": 0.0,
+            "max_live_search_ms": 0.0
+        }
+
+    def set_offer_available(self, offer_id: int, available: bool):
+        """Répercute un changement de statut d'offre sans attendre la reconstruction"""
+        if available:
+            self._unavailable.discard(offer_id)
+        else:
+            self._unavailable.add(offer_id)
+
+    def mark_stale(self, offer_id: int):
+        """Catégories souhaitées modifiées : l'offre sera recherchée à la demande"""
+        self._stale.add(offer_id)
+
+    async def rebuild(self):
+        """Reprend un instantané du graphe des souhaits et recalcule la table des cycles"""
+        start = time.perf_counter()
+        async with neo4j_session() as session:
+            result = await session.run(EXCHANGE_CYCLES_SNAPSHOT_QUERY)
+            offers = [dict(record) async for record in result]
+
+        stale, self._stale = self._stale, set()
+        graph = await asyncio.to_thread(WantGraph, offers)
+        table = await asyncio.to_thread(compute_cycle_table, graph, EXCHANGE_CYCLES_PER_OFFER, self.workers)
+
+        self.graph, self.table = graph, table
+        # Statuts reçus pendant la reconstruction : déjà pris en compte par l'instantané ou à conserver
+        self._unavailable = {offer_id for offer_id in self._unavailable if offer_id in graph.offers}
+        self._stale |= {offer_id for offer_id in stale if offer_id not in graph.offers}
+
+        self.metrics["rebuilds"] += 1
+        self.metrics["last_rebuild_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"🔄 Cycles d'échange: {len(graph)} offres, {len(table)} avec au moins un cycle "
+            f"en {self.metrics['last_rebuild_ms']:.0f} ms"
+        )
+
+    def _is_valid(self, cycle: List[int]) -> bool:
+        return not any(offer_id in self._unavailable for offer_id in cycle)
+
+    async def find(self, offer_id: int, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Cycles d'échange d'une offre, ou None si l'instantané n'est pas prêt
+
+        Returns:
+            {"cycles": [...], "complete": bool, "source": "precomputed" | "live"}
+        """
+        graph = self.graph
+        if graph is None:
+            return None
+
+        if offer_id in graph.offers and offer_id not in self._stale:
+            self.metrics["precomputed_hits"] += 1
+            source = graph.offers[offer_id]
+            cycles = [cycle for cycle in self.table.get(offer_id, []) if self._is_valid(cycle)]
+            return {"cycles": rank_cycles(graph, source, cycles, limit), "complete": True, "source": "precomputed"}
+
+        # Offre inconnue de l'instantané : attributs lus en direct, recherche sous échéance
+        async with neo4j_session() as session:
+            result = await session.run(EXCHANGE_CYCLES_OFFER_QUERY, offerId=offer_id)
+            record = await result.single()
+        if record is None or not record["available"]:
+            return {"cycles": [], "complete": True, "source": "live"}
+
+        source = dict(record)
+        source["wantedCategories"] = tuple(dict.fromkeys(source["wantedCategories"] or ()))
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.deadline_ms / 1000
+        cycles, complete = await asyncio.to_thread(find_cycles, graph, source, deadline=deadline)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.metrics["live_searches"] += 1
+        self.metrics["live_timeouts"] += 0 if complete else 1
+        self.metrics["last_live_search_ms"] = elapsed_ms
+        self.metrics["max_live_search_ms"] = max(self.metrics["max_live_search_ms"], elapsed_ms)
+
+        cycles = [cycle for cycle in cycles if self._is_valid(cycle)]
+        return {"cycles": rank_cycles(graph, source, cycles, limit), "complete": complete, "source": "live"}
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"❌ Erreur calcul des cycles d'échange: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.rebuild_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        graph = self.graph
+        return {
+            "ready": graph is not None,
+            "offers": len(graph) if graph is not None else 0,
+            "offers_with_cycles": len(self.table),
+            "unavailable_offers": len(self._unavailable),
+            "stale_offers": len(self._stale),
+            **self.metrics
+        }
+
+# Instance globale du moteur de cycles d'échange
+exchange_cycle_engine = ExchangeCycleEngine()
@@ -0,0 +1,113 @@
+"""
+Fil d'accueil combiné
+Exécution concurrente des stratégies de recommandation avec une échéance par
+stratégie, puis entrelacement pondéré des résultats sans doublons
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configuration du fil d'accueil
+FEED_LATENCY_BUDGET_MS = float(os.getenv('FEED_LATENCY_BUDGET_MS', '300'))
+
+# Poids de chaque stratégie dans l'entrelacement
+FEED_STRATEGY_WEIGHTS = {
+    "category": 0.35,
+    "collaborative": 0.30,
+    "brand": 0.20,
+    "trending": 0.15
+}
+
+# Échéance propre à chaque stratégie (bornée par le budget global)
+FEED_STRATEGY_DEADLINES_MS = {
+    "category": float(os.getenv('FEED_CATEGORY_DEADLINE_MS', '250')),
+    "collaborative": float(os.getenv('FEED_COLLABORATIVE_DEADLINE_MS', '250')),
+    "brand": float(os.getenv('FEED_BRAND_DEADLINE_MS', '250')),
+    "trending": float(os.getenv('FEED_TRENDING_DEADLINE_MS', '150'))
+}
+
+# Calculs abandonnés par le fil mais poursuivis pour remplir le cache
+_background: Set[asyncio.Task] = set()
+
+def _forget(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"❌ Erreur stratégie du fil d'accueil (hors délai): {task.exception()}")
+
+async def run_strategies(strategies: Dict[str, Callable[[], Awaitable[List[Dict[str, Any]]]]],
+                         budget_ms: float = FEED_LATENCY_BUDGET_MS,
+                         deadlines_ms: Dict[str, float] = FEED_STRATEGY_DEADLINES_MS
+                         ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """
+    Lance toutes les stratégies en parallèle et garde celles qui répondent à temps
+
+    Une stratégie hors délai est écartée de la réponse mais son calcul se
+    poursuit en arrière-plan : son résultat alimente le cache pour le
+    prochain appel.
+
+    Returns:
+        (résultats par stratégie, statut par stratégie : ok, timeout ou error)
+    """
+    tasks = {name: asyncio.create_task(compute()) for name, compute in strategies.items()}
+
+    async def wait(name: str, task: asyncio.Task):
+        timeout = min(deadlines_ms.get(name, budget_ms), budget_ms) / 1000
+        return await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+
+    outcomes = await asyncio.gather(*(wait(name, task) for name, task in tasks.items()), return_exceptions=True)
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    status: Dict[str, str] = {}
+    for (name, task), outcome in zip(tasks.items(), outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            status[name] = "timeout"
+            _background.add(task)
+            task.add_done_callback(_forget)
+        elif isinstance(outcome, Exception):
+            status[name] = "error"
+            logger.error(f"❌ Erreur stratégie {name} du fil d'accueil: {outcome}")
+        else:
+            status[name] = "ok"
+            results[name] = outcome
+    return results, status
+
+def interleave(results: Dict[str, List[Dict[str, Any]]],
+               limit: int,
+               weights: Dict[str, float] = FEED_STRATEGY_WEIGHTS) -> List[Dict[str, Any]]:
+    """
+    Entrelacement pondéré (round-robin pondéré lissé) sans doublons
+
+    À chaque position, la stratégie au plus fort crédit fournit sa prochaine
+    offre non encore retenue ; une stratégie épuisée sort du tirage. Chaque
+    offre garde la stratégie qui l'a apportée dans "source".
+    """
+    queues = {name: list(items) for name, items in results.items() if items and weights.get(name, 0) > 0}
+    positions = {name: 0 for name in queues}
+    credits = {name: 0.0 for name in queues}
+    seen: Set[int] = set()
+    feed: List[Dict[str, Any]] = []
+
+    while len(feed) < limit and queues:
+        total = sum(weights[name] for name in queues)
+        for name in queues:
+            credits[name] += weights[name]
+        name = max(queues, key=lambda candidate: credits[candidate])
+        credits[name] -= total
+
+        items = queues[name]
+        while positions[name] < len(items) and items[positions[name]]["id"] in seen:
+            positions[name] += 1
+        if positions[name] >= len(items):
+            del queues[name]
+            continue
+
+        item = items[positions[name]]
+        positions[name] += 1
+        seen.add(item["id"])
+        feed.append({**item, "source": name})
+
+    return feed
@@ -0,0 +1,268 @@
+"""
+Tampon d'ingestion des interactions
+Dédoublonne les interactions sur une fenêtre courte et les écrit par lots
+avec une seule requête UNWIND, toutes les N ms ou tous les M événements
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+import logging
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration du tampon
+INTERACTION_FLUSH_INTERVAL_MS = float(os.getenv('INTERACTION_FLUSH_INTERVAL_MS', '250'))
+INTERACTION_FLUSH_MAX_EVENTS = int(os.getenv('INTERACTION_FLUSH_MAX_EVENTS', '500'))
+INTERACTION_DEDUP_WINDOW = float(os.getenv('INTERACTION_DEDUP_WINDOW', '10'))
+INTERACTION_MAX_BUFFER = int(os.getenv('INTERACTION_MAX_BUFFER', '10000'))
+
+INTERACTION_TYPES = ('VIEW', 'LIKE', 'SEARCH')
+
+# Écriture d'un lot d'interactions (horodatage de l'événement, pas de l'écriture)
+INTERACTIONS_WRITE_QUERY = """
+    UNWIND $events AS event
+    MATCH (u:User {id: event.userId}), (o:Offer {id: event.offerId})
+    WITH u, o, event, datetime({epochMillis: event.timestamp}) as eventTime
+    FOREACH (_ IN CASE WHEN event.type = 'VIEW' THEN [1] ELSE [] END |
+        MERGE (u)-[v:VIEWED]->(o)
+        SET v.timestamp = eventTime,
+            v.duration = event.duration)
+    FOREACH (_ IN CASE WHEN event.type = 'LIKE' THEN [1] ELSE [] END |
+        MERGE (u)-[l:LIKED]->(o)
+        SET l.timestamp = eventTime)
+    FOREACH (_ IN CASE WHEN event.type = 'SEARCH' THEN [1] ELSE [] END |
+        MERGE (u)-[s:SEARCHES]->(o)
+        SET s.timestamp = eventTime,
+            s.keywords = event.keywords)
+"""
+
+EventKey = Tuple[int, int, str]
+
+class InteractionBufferFull(Exception):
+    """Tampon plein et Neo4j indisponible : l'interaction n'a pas été acceptée"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Tampon d'interactions plein, réessayer plus tard")
+        self.retry_after = retry_after
+
+class InteractionBuffer:
+    """
+    Tampon borné d'interactions écrites par lots
+
+    - Dans le tampon, un même (utilisateur, offre, type) n'apparaît qu'une
+      fois : la dernière occurrence l'emporte (durée de vue maximale).
+    - Un VIEW ou LIKE déjà écrit il y a moins de dedup_window secondes est
+      ignoré ; les SEARCH (mots-clés différents) sont toujours conservés.
+    - Tampon plein : submit() attend un vidage (contre-pression) plutôt que
+      de perdre des interactions ; si l'écriture échoue, submit() lève
+      InteractionBufferFull et l'appelant doit réessayer plus tard.
+    - Un lot en échec est remis en tête du tampon dans la limite de sa
+      capacité ; le surplus est perdu et compté (dropped_events).
+    - Après chaque lot écrit, on_flushed reçoit les événements écrits.
+    """
+
+    def __init__(self,
+                 flush_interval_ms: float = INTERACTION_FLUSH_INTERVAL_MS,
+                 max_events: int = INTERACTION_FLUSH_MAX_EVENTS,
+                 dedup_window: float = INTERACTION_DEDUP_WINDOW,
+                 max_buffer: int = INTERACTION_MAX_BUFFER,
+                 on_flushed: Optional[Callable[[List[Dict[str, Any]]], Awaitable[Any]]] = None):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self.dedup_window = dedup_window
+        self.max_buffer = max_buffer
+        self.on_flushed = on_flushed
+
+        self._pending: "OrderedDict[EventKey, Dict[str, Any]]" = OrderedDict()
+        self._recent: Dict[EventKey, float] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.metrics = {
+            "submitted": 0,
+            "accepted": 0,
+            "deduplicated": 0,
+            "flushes": 0,
+            "flushed_events": 0,
+            "failed_flushes": 0,
+            "backpressure_waits": 0,
+            "rejected_events": 0,
+            "dropped_events": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, interaction: Dict[str, Any]) -> bool:
+        """
+        Ajoute une interaction au tampon
+
+        Args:
+            interaction: userId, offerId, interactionType, duration, keywords
+
+        Returns:
+            True si l'interaction est nouvelle, False si elle a été dédoublonnée
+
+        Raises:
+            InteractionBufferFull: tampon plein et vidage en échec
+        """
+        self.metrics["submitted"] += 1
+        now = time.time()
+        key = (interaction["userId"], interaction["offerId"], interaction["interactionType"])
+
+        if key[2] != 'SEARCH' and now - self._recent.get(key, float('-inf')) < self.dedup_window:
+            self.metrics["deduplicated"] += 1
+            return False
+
+        event = {
+            "userId": key[0],
+            "offerId": key[1],
+            "type": key[2],
+            "duration": interaction.get("duration") or 0,
+            "keywords": interaction.get("keywords") or '',
+            "timestamp": int(now * 1000),
+            "queued_at": now
+        }
+
+        existing = self._pending.get(key)
+        if existing is not None:
+            event["duration"] = max(event["duration"], existing["duration"])
+            event["queued_at"] = existing["queued_at"]
+            self._pending[key] = event
+            self.metrics["deduplicated"] += 1
+            return False
+
+        if len(self._pending) >= self.max_buffer:
+            self.metrics["backpressure_waits"] += 1
+            try:
+                await self.flush()
+            except Exception:
+                pass
+            if len(self._pending) >= self.max_buffer:
+                self.metrics["rejected_events"] += 1
+                raise InteractionBufferFull(max(self.flush_interval, 1.0))
+
+        self._pending[key] = event
+        self.metrics["accepted"] += 1
+        if len(self._pending) >= self.max_events and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> int:
+        """Écrit les interactions en attente en une requête ; retourne le nombre écrit"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, OrderedDict()
+            events = list(batch.values())
+            start = time.perf_counter()
+
+            try:
+                async with neo4j_session() as session:
+                    async def write_events(tx):
+                        result = await tx.run(INTERACTIONS_WRITE_QUERY, events=[
+                            {field: event[field] for field in ("userId", "offerId", "type", "duration", "keywords", "timestamp")}
+                            for event in events
+                        ])
+                        await result.consume()
+
+                    await session.execute_write(write_events)
+            except Exception as e:
+                self.metrics["failed_flushes"] += 1
+                logger.error(f"❌ Erreur écriture de {len(events)} interactions: {e}")
+                # Remettre le lot en tête du tampon, dans la limite de sa capacité
+                dropped = 0
+                for key, event in reversed(batch.items()):
+                    if key in self._pending:
+                        continue
+                    if len(self._pending) < self.max_buffer:
+                        self._pending[key] = event
+                        self._pending.move_to_end(key, last=False)
+                    else:
+                        dropped += 1
+                if dropped:
+                    self.metrics["dropped_events"] += dropped
+                    logger.error(f"❌ {dropped} interactions perdues (tampon plein)")
+                raise
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            now = time.time()
+            for key in batch:
+                self._recent[key] = now
+            self._prune_recent(now)
+
+            self.metrics["flushes"] += 1
+            self.metrics["flushed_events"] += len(events)
+            self.metrics["last_flush_ms"] = elapsed_ms
+            self.metrics["total_flush_ms"] += elapsed_ms
+            self.metrics["max_flush_ms"] = max(self.metrics["max_flush_ms"], elapsed_ms)
+
+        if self.on_flushed is not None:
+            try:
+                await self.on_flushed(events)
+            except Exception as e:
+                logger.error(f"❌ Erreur après écriture des interactions: {e}")
+        return len(events)
+
+    def _prune_recent(self, now: float):
+        if len(self._recent) > self.max_buffer:
+            self._recent = {key: at for key, at in self._recent.items() if now - at < self.dedup_window}
+
+    def start(self):
+        """Démarre le worker de vidage (intervalle ou seuil d'événements)"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(
+                f"📥 Tampon d'interactions démarré (vidage {self.flush_interval * 1000:.0f} ms "
+                f"ou {self.max_events} événements)"
+            )
+
+    async def stop(self):
+        """Arrête le worker et écrit les interactions restantes"""
+        if self._worker is not None:
+            self._stop_event.set()
+            self._wakeup.set()
+            await self._worker
+            self._worker = None
+        try:
+            await self.flush()
+        except Exception:
+            pass
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Déjà journalisé ; nouvel essai au prochain intervalle
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = next(iter(self._pending.values()), None)
+        flushes = self.metrics["flushes"]
+        return {
+            "buffer_depth": len(self._pending),
+            "max_buffer": self.max_buffer,
+            "oldest_pending_ms": (time.time() - oldest["queued_at"]) * 1000 if oldest else 0.0,
+            "avg_flush_ms": self.metrics["total_flush_ms"] / flushes if flushes else 0.0,
+            **{key: value for key, value in self.metrics.items() if key != "total_flush_ms"}
+        }
@@ -0,0 +1,437 @@
+"""
+Filtrage collaboratif item-item en mémoire
+Instantané des relations LIKED/VIEWED en matrice creuse utilisateurs × offres (CSR),
+voisins cosinus top-k précalculés par blocs sur plusieurs cœurs, recommandations
+par produit vecteur creux × matrice de voisinage
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import multiprocessing
+import os
+import time
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration du moteur
+ITEM_CF_NEIGHBORS = int(os.getenv('ITEM_CF_NEIGHBORS', '50'))
+ITEM_CF_BLOCK_SIZE = int(os.getenv('ITEM_CF_BLOCK_SIZE', '2048'))
+ITEM_CF_WORKERS = int(os.getenv('ITEM_CF_WORKERS', str(os.cpu_count() or 1)))
+ITEM_CF_PARALLEL_MIN_OFFERS = int(os.getenv('ITEM_CF_PARALLEL_MIN_OFFERS', '50000'))
+ITEM_CF_REFRESH_INTERVAL = float(os.getenv('ITEM_CF_REFRESH_INTERVAL', '60'))
+ITEM_CF_REBUILD_INTERVAL = float(os.getenv('ITEM_CF_REBUILD_INTERVAL', '3600'))
+
+# Poids d'une relation utilisateur -> offre (le plus fort l'emporte)
+INTERACTION_WEIGHTS = {'LIKED': 1.0, 'VIEWED': 0.3}
+EVENT_RELATIONS = {'LIKE': 'LIKED', 'VIEW': 'VIEWED'}
+
+ITEM_CF_EDGES_QUERY = """
+    MATCH (u:User)-[r:LIKED|VIEWED]->(o:Offer)
+    RETURN u.id as userId, o.id as offerId,
+           max(CASE type(r) WHEN 'LIKED' THEN $likedWeight ELSE $viewedWeight END) as weight
+"""
+
+ITEM_CF_OFFERS_QUERY = """
+    MATCH (o:Offer)<-[:LIKED|VIEWED]-(:User)
+    WITH DISTINCT o
+    RETURN o.id as id, o.title as title, o.price as price, o.sellerId as sellerId,
+           coalesce(o.status = 'available' AND NOT coalesce(o.isDeleted, false), false) as available
+"""
+
+def top_k_rows(similarity: sp.csr_matrix, row_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Garde les k plus fortes similarités de chaque ligne, hors diagonale
+
+    Args:
+        similarity: Lignes offres × offres
+        row_ids: Index global de l'offre de chaque ligne
+
+    Returns:
+        (lignes, colonnes, valeurs) au format COO
+    """
+    rows, cols, vals = [], [], []
+    indptr, indices, data = similarity.indptr, similarity.indices, similarity.data
+    for local_row, row_id in enumerate(row_ids):
+        start, end = indptr[local_row], indptr[local_row + 1]
+        row_cols = indices[start:end]
+        row_vals = data[start:end]
+        keep = row_cols != row_id
+        row_cols, row_vals = row_cols[keep], row_vals[keep]
+        if len(row_vals) > k:
+            best = np.argpartition(row_vals, -k)[-k:]
+            row_cols, row_vals = row_cols[best], row_vals[best]
+        rows.append(np.full(len(row_cols), row_id, dtype=np.int32))
+        cols.append(row_cols)
+        vals.append(row_vals)
+    if not rows:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+# Matrices partagées par les processus de calcul (initialisées une fois par processus)
+_worker_items_by_users: Optional[sp.csr_matrix] = None
+_worker_users_by_items: Optional[sp.csr_matrix] = None
+
+def _init_worker(items_by_users: sp.csr_matrix, users_by_items: sp.csr_matrix):
+    global _worker_items_by_users, _worker_users_by_items
+    _worker_items_by_users = items_by_users
+    _worker_users_by_items = users_by_items
+
+def _neighbors_block(block: Tuple[int, int], k: int):
+    start, end = block
+    similarity = (_worker_items_by_users[start:end] @ _worker_users_by_items).tocsr()
+    return top_k_rows(similarity, np.arange(start, end), k)
+
+def compute_item_neighbors(ratings: sp.csr_matrix,
+                           k: int = ITEM_CF_NEIGHBORS,
+                           block_size: int = ITEM_CF_BLOCK_SIZE,
+                           workers: int = ITEM_CF_WORKERS,
+                           items: Optional[np.ndarray] = None) -> sp.csr_matrix:
+    """
+    Voisins cosinus top-k de chaque offre (ou des offres données)
+
+    Les colonnes de la matrice utilisateurs × offres sont normalisées, puis
+    la similarité est calculée par blocs de lignes item × item, en parallèle
+    sur plusieurs processus pour les matrices assez grandes.
+
+    Returns:
+        Matrice offres × offres (CSR) ; seules les lignes demandées sont remplies
+    """
+    n_items = ratings.shape[1]
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (ratings @ sp.diags(1.0 / norms)).astype(np.float32).tocsr()
+    items_by_users = normalized.T.tocsr()
+
+    if items is not None:
+        # Recalcul ciblé : lignes des offres modifiées uniquement
+        similarity = (items_by_users[items] @ normalized).tocsr()
+        rows, cols, vals = top_k_rows(similarity, items, k)
+        return sp.csr_matrix((vals, (rows, cols)), shape=(n_items, n_items), dtype=np.float32)
+
+    blocks = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+    # Le démarrage des processus ne se rentabilise que sur les grands catalogues
+    if workers > 1 and len(blocks) > 1 and n_items >= ITEM_CF_PARALLEL_MIN_OFFERS:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), mp_context=context,
+                                 initializer=_init_worker, initargs=(items_by_users, normalized)) as pool:
+            parts = list(pool.map(_neighbors_block, blocks, [k] * len(blocks)))
+    else:
+        _init_worker(items_by_users, normalized)
+        parts = [_neighbors_block(block, k) for block in blocks]
+
+    if not parts:
+        return sp.csr_matrix((n_items, n_items), dtype=np.float32)
+    rows = np.concatenate([part[0] for part in parts])
+    cols = np.concatenate([part[1] for part in parts])
+    vals = np.concatenate([part[2] for part in parts])
+    return sp.csr_matrix((vals, (rows, cols)), shape=(n_items, n_items), dtype=np.float32)
+
+class ItemCFModel:
+    """Instantané immuable : index, matrice des interactions, voisinage et métadonnées des offres"""
+
+    def __init__(self,
+                 user_index: Dict[int, int],
+                 item_ids: np.ndarray,
+                 ratings: sp.csr_matrix,
+                 neighbors: sp.csr_matrix,
+                 offers: Dict[int, Dict[str, Any]],
+                 available: Optional[np.ndarray] = None):
+        self.user_index = user_index
+        self.item_ids = item_ids
+        self.item_index = {int(item_id): idx for idx, item_id in enumerate(item_ids)}
+        self.ratings = ratings
+        self.neighbors = neighbors
+        self.offers = offers
+        if available is None:
+            available = np.array([bool(offers.get(int(item_id), {}).get("available")) for item_id in item_ids])
+        self.available = available
+        self.sellers = np.array([offers.get(int(item_id), {}).get("sellerId") or -1 for item_id in item_ids], dtype=np.int64)
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls,
+              edges: Iterable[Tuple[int, int, float]],
+              offers: Dict[int, Dict[str, Any]],
+              k: int = ITEM_CF_NEIGHBORS,
+              block_size: int = ITEM_CF_BLOCK_SIZE,
+              workers: int = ITEM_CF_WORKERS) -> "ItemCFModel":
+        """Construit le modèle depuis des triplets (utilisateur, offre, poids)"""
+        edges = list(edges)
+        user_ids = sorted({user_id for user_id, _, _ in edges})
+        item_ids = np.array(sorted({offer_id for _, offer_id, _ in edges}), dtype=np.int64)
+        user_index = {user_id: idx for idx, user_id in enumerate(user_ids)}
+        item_index = {int(item_id): idx for idx, item_id in enumerate(item_ids)}
+
+        rows = np.fromiter((user_index[user_id] for user_id, _, _ in edges), dtype=np.int32, count=len(edges))
+        cols = np.fromiter((item_index[offer_id] for _, offer_id, _ in edges), dtype=np.int32, count=len(edges))
+        vals = np.fromiter((weight for _, _, weight in edges), dtype=np.float32, count=len(edges))
+        ratings = sp.csr_matrix((vals, (rows, cols)), shape=(len(user_ids), len(item_ids)), dtype=np.float32)
+
+        neighbors = compute_item_neighbors(ratings, k=k, block_size=block_size, workers=workers)
+        return cls(user_index, item_ids, ratings, neighbors, offers)
+
+    def with_updates(self, updates: Dict[Tuple[int, int], float], k: int) -> Tuple["ItemCFModel", int]:
+        """
+        Nouveau modèle intégrant des interactions récentes
+
+        Les lignes de voisinage des offres touchées sont recalculées ; les
+        nouveaux utilisateurs sont ajoutés, les offres inconnues attendent la
+        prochaine reconstruction complète.
+
+        Returns:
+            (modèle, nombre d'interactions ignorées faute d'offre connue)
+        """
+        user_index = dict(self.user_index)
+        rows, cols, vals = [], [], []
+        skipped = 0
+        for (user_id, offer_id), weight in updates.items():
+            item = self.item_index.get(offer_id)
+            if item is None:
+                skipped += 1
+                continue
+            if user_id not in user_index:
+                user_index[user_id] = len(user_index)
+            rows.append(user_index[user_id])
+            cols.append(item)
+            vals.append(weight)
+
+        if not rows:
+            return self, skipped
+
+        ratings = self.ratings
+        if len(user_index) > ratings.shape[0]:
+            ratings = sp.vstack([ratings, sp.csr_matrix((len(user_index) - ratings.shape[0], ratings.shape[1]), dtype=np.float32)]).tocsr()
+        delta = sp.csr_matrix((np.array(vals, dtype=np.float32), (np.array(rows), np.array(cols))), shape=ratings.shape)
+        # Le poids le plus fort l'emporte (les relations sont idempotentes)
+        ratings = ratings.maximum(delta).tocsr()
+
+        dirty = np.unique(np.array(cols))
+        keep = np.ones(ratings.shape[1], dtype=np.float32)
+        keep[dirty] = 0.0
+        refreshed = compute_item_neighbors(ratings, k=k, items=dirty)
+        neighbors = (sp.diags(keep) @ self.neighbors + refreshed).tocsr()
+
+        # Disponibilités courantes (changements de statut reçus depuis la reconstruction)
+        model = ItemCFModel(user_index, self.item_ids, ratings, neighbors, self.offers, self.available.copy())
+        return model, skipped
+
+    def recommend(self, user_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Recommandations d'un utilisateur connu du modèle, ou None"""
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+
+        profile = self.ratings[row]
+        if profile.nnz == 0:
+            return []
+
+        scores = (profile @ self.neighbors).tocsr()
+        candidates, values = scores.indices, scores.data
+
+        # Offres déjà vues ou aimées, indisponibles ou vendues par l'utilisateur
+        mask = self.available[candidates] & (self.sellers[candidates] != user_id)
+        mask &= ~np.isin(candidates, profile.indices, assume_unique=True)
+        candidates, values = candidates[mask], values[mask]
+        if len(candidates) == 0:
+            return []
+
+        # Classement par (score, ID) décroissants, ordre stable pour la pagination keyset
+        order = np.lexsort((-self.item_ids[candidates], -values))[:limit]
+
+        recommendations = []
+        for idx in order:
+            offer_id = int(self.item_ids[candidates[idx]])
+            offer = self.offers[offer_id]
+            recommendations.append({
+                "id": offer_id,
+                "title": offer.get("title") or "",
+                "price": offer.get("price") or 0.0,
+                "relevanceScore": float(values[idx])
+            })
+        return recommendations
+
+class ItemCFEngine:
+    """
+    Moteur de filtrage collaboratif item-item
+
+    Reconstruction complète périodique depuis Neo4j (dans un thread, le
+    calcul du voisinage dans un pool de processus) et intégration
+    incrémentale des interactions écrites entre deux reconstructions.
+    """
+
+    def __init__(self,
+                 neighbors: int = ITEM_CF_NEIGHBORS,
+                 block_size: int = ITEM_CF_BLOCK_SIZE,
+                 workers: int = ITEM_CF_WORKERS,
+                 refresh_interval: float = ITEM_CF_REFRESH_INTERVAL,
+                 rebuild_interval: float = ITEM_CF_REBUILD_INTERVAL):
+        self.k = neighbors
+        self.block_size = block_size
+        self.workers = workers
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+
+        self.model: Optional[ItemCFModel] = None
+        self._updates: Dict[Tuple[int, int], float] = {}
+        # Utilisateurs dont des interactions ne sont pas encore dans le modèle
+        self._pending_users: Set[int] = set()
+        # Changements de statut reçus depuis le début de la dernière reconstruction,
+        # réappliqués à chaque nouveau modèle (calculé à partir d'un instantané)
+        self._status_changes: Dict[int, bool] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.metrics = {
+            "served": 0,
+            "fallbacks": 0,
+            "rebuilds": 0,
+            "incremental_refreshes": 0,
+            "skipped_updates": 0,
+            "last_rebuild_ms": 0.0,
+            "last_refresh_ms": 0.0,
+            "last_recommend_ms": 0.0
+        }
+
+    def apply_events(self, events: Iterable[Dict[str, Any]]):
+        """Enregistre des interactions écrites (VIEW, LIKE) pour le prochain rafraîchissement"""
+        for event in events:
+            relation = EVENT_RELATIONS.get(event.get("type"))
+            if relation is None:
+                continue
+            key = (event["userId"], event["offerId"])
+            self._updates[key] = max(self._updates.get(key, 0.0), INTERACTION_WEIGHTS[relation])
+            self._pending_users.add(event["userId"])
+
+    def _install(self, model: ItemCFModel):
+        """Publie un nouveau modèle avec les statuts d'offres reçus pendant son calcul"""
+        for offer_id, available in self._status_changes.items():
+            item = model.item_index.get(offer_id)
+            if item is not None:
+                model.available[item] = available
+        self.model = model
+        self._pending_users = {user_id for user_id, _ in self._updates}
+
+    async def rebuild(self):
+        """Reconstruit le modèle depuis le graphe"""
+        start = time.perf_counter()
+        # Les interactions reçues pendant la reconstruction sont réappliquées ensuite
+        updates, self._updates = self._updates, {}
+        self._status_changes = {}
+
+        async with neo4j_session() as session:
+            result = await session.run(
+                ITEM_CF_EDGES_QUERY,
+                likedWeight=INTERACTION_WEIGHTS['LIKED'],
+                viewedWeight=INTERACTION_WEIGHTS['VIEWED']
+            )
+            edges = [(record["userId"], record["offerId"], record["weight"]) async for record in result]
+            result = await session.run(ITEM_CF_OFFERS_QUERY)
+            offers = {record["id"]: dict(record) async for record in result}
+
+        model = await asyncio.to_thread(
+            ItemCFModel.build, edges, offers, self.k, self.block_size, self.workers
+        )
+        for key, weight in updates.items():
+            self._updates[key] = max(self._updates.get(key, 0.0), weight)
+        self._install(model)
+
+        self.metrics["rebuilds"] += 1
+        self.metrics["last_rebuild_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"🧮 Filtrage collaboratif: {self.model.ratings.shape[0]} utilisateurs × "
+            f"{self.model.ratings.shape[1]} offres en {self.metrics['last_rebuild_ms']:.0f} ms"
+        )
+
+    async def refresh(self):
+        """Intègre les interactions en attente au modèle courant"""
+        if self.model is None or not self._updates:
+            return
+        start = time.perf_counter()
+        updates, self._updates = self._updates, {}
+        try:
+            model, skipped = await asyncio.to_thread(self.model.with_updates, updates, self.k)
+        except Exception:
+            # Les interactions restent à intégrer au prochain rafraîchissement
+            for key, weight in updates.items():
+                self._updates[key] = max(self._updates.get(key, 0.0), weight)
+            raise
+        self._install(model)
+        self.metrics["incremental_refreshes"] += 1
+        self.metrics["skipped_updates"] += skipped
+        self.metrics["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+
+    def set_offer_available(self, offer_id: int, available: bool):
+        """Répercute un changement de statut d'offre sans attendre la reconstruction"""
+        self._status_changes[offer_id] = available
+        model = self.model
+        if model is not None:
+            item = model.item_index.get(offer_id)
+            if item is not None:
+                model.available[item] = available
+
+    def recommend(self, user_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Recommandations collaboratives, ou None si le modèle ne connaît pas
+        l'utilisateur ou n'intègre pas encore ses dernières interactions
+        """
+        model = self.model
+        if model is None or user_id in self._pending_users:
+            self.metrics["fallbacks"] += 1
+            return None
+        start = time.perf_counter()
+        recommendations = model.recommend(user_id, limit)
+        if recommendations is None:
+            self.metrics["fallbacks"] += 1
+            return None
+        self.metrics["served"] += 1
+        self.metrics["last_recommend_ms"] = (time.perf_counter() - start) * 1000
+        return recommendations
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+
+    async def _run(self):
+        last_rebuild = 0.0
+        while not self._stop_event.is_set():
+            try:
+                if self.model is None or time.monotonic() - last_rebuild >= self.rebuild_interval:
+                    await self.rebuild()
+                    last_rebuild = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Erreur filtrage collaboratif: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        model = self.model
+        return {
+            "ready": model is not None,
+            "users": model.ratings.shape[0] if model is not None else 0,
+            "offers": model.ratings.shape[1] if model is not None else 0,
+            "neighbor_entries": int(model.neighbors.nnz) if model is not None else 0,
+            "pending_updates": len(self._updates),
+            "pending_users": len(self._pending_users),
+            **self.metrics
+        }
+
+# Instance globale du moteur
+item_cf_engine = ItemCFEngine()
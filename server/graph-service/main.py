@@ -4,17 +4,30 @@ Service de recommandation Graph pour MyReprise
 Utilise Neo4j pour fournir des recommandations personnalisées
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from neo4j import GraphDatabase
 import os
 import logging
+import math
+import time
 from datetime import datetime
 
 # Import des nouveaux endpoints
 from user_preferences import router as user_preferences_router
+from neo4j_driver import init_driver, close_driver, neo4j_session, get_pool_stats
+from materialized_recommendations import recommendation_materializer, run_strategy_query
+from recommendation_cache import recommendation_cache, user_tag, offer_tag
+from trending_counters import trending_service
+from interaction_buffer import InteractionBuffer, InteractionBufferFull, INTERACTION_TYPES
+from item_cf import item_cf_engine
+from similar_offers_knn import similar_offers_knn
+from home_feed import run_strategies, interleave
+from exchange_chains import exchange_chain_index
+from exchange_cycles import exchange_cycle_engine
+from pagination import (paginate, decode_cursor, encode_cursor, set_next_cursor,
+                        NEXT_CURSOR_HEADER, RECOMMENDATION_MAX_LIMIT)
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO)
@@ -33,26 +46,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Inclure les routes des préférences utilisateur
 app.include_router(user_preferences_router)
 
-# Configuration Neo4j
-NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
-NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
-NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD', 'neo4j123')
-
-# Driver Neo4j global
-driver = None
-
-def get_neo4j_driver():
-    """Récupère le driver Neo4j"""
-    global driver
-    if driver is None:
-        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    return driver
-
 # Modèles Pydantic
 class OfferRecommendation(BaseModel):
     id: int
@@ -63,6 +62,15 @@ class OfferRecommendation(BaseModel):
     brand: Optional[str] = None
     similarity: Optional[float] = None
 
+class FeedRecommendation(OfferRecommendation):
+    source: str  # stratégie ayant apporté l'offre
+
+class HomeFeed(BaseModel):
+    userId: int
+    recommendations: List[FeedRecommendation]
+    strategies: Dict[str, str]  # ok, timeout ou error
+    elapsedMs: float
+
 class UserInteraction(BaseModel):
     userId: int
     offerId: int
@@ -70,6 +78,11 @@ class UserInteraction(BaseModel):
     duration: Optional[int] = 0
     keywords: Optional[str] = None
 
+MAX_INTERACTIONS_BATCH = 1000
+
+class InteractionBatch(BaseModel):
+    interactions: List[UserInteraction]
+
 class ExchangeChain(BaseModel):
     userId: int
     initialOffer: str
@@ -106,6 +119,283 @@ class OfferCategoryRelationSyncData(BaseModel):
 
 # Routes principales
 
+# Requêtes Cypher des endpoints (budgets de plan vérifiés par profile_queries.py)
+TRENDING_LIVE_QUERY = """
+    MATCH (o:Offer)<-[interaction:VIEWED|LIKED]-(u:User)
+    WHERE datetime() - interaction.timestamp < duration({days: 7})
+      AND o.status = 'available'
+    WITH o, count(interaction) as popularity
+    ORDER BY popularity DESC, o.id DESC
+    LIMIT $limit
+    RETURN o.id as id, o.title as title, o.price as price, 
+           popularity as relevanceScore
+"""
+
+SIMILAR_OFFERS_QUERY = """
+    MATCH (viewed:Offer {id: $offerId})-[:BELONGS_TO]->(cat:Category)
+    MATCH (viewed)-[:IS_BRAND]->(brand:Brand)
+    MATCH (similar:Offer)-[:BELONGS_TO]->(cat)
+    WHERE similar.status = 'available' 
+      AND similar.id <> viewed.id
+    OPTIONAL MATCH (similar)-[:IS_BRAND]->(brand)
+    WITH similar, 
+         CASE WHEN (similar)-[:IS_BRAND]->(brand) THEN 2 ELSE 1 END as relevance,
+         viewed.price as originalPrice
+    // Même marque d'abord, puis prix le plus proche : la fraction (0, 1] reste
+    // sous l'écart entre deux niveaux de pertinence
+    WITH similar, relevance + 1.0 / (1.0 + abs(similar.price - originalPrice)) as relevanceScore
+    ORDER BY relevanceScore DESC, similar.id DESC
+    RETURN similar.id as id, similar.title as title, similar.price as price, 
+           relevanceScore
+    LIMIT $limit
+"""
+
+EXCHANGE_PATTERNS_QUERY = """
+    MATCH (e:Exchange)-[:OFFERS]->(offered:Offer)-[:BELONGS_TO]->(catOffered:Category)
+    MATCH (e)-[:REQUESTS]->(requested:Offer)-[:BELONGS_TO]->(catRequested:Category)
+    WHERE e.status = 'completed'
+    WITH catOffered.nameFr as offeredCategory, 
+         catRequested.nameFr as requestedCategory, 
+         count(*) as exchangeCount
+    ORDER BY exchangeCount DESC
+    RETURN offeredCategory, requestedCategory, exchangeCount
+    LIMIT $limit
+"""
+
+POPULAR_CATEGORIES_QUERY = """
+    MATCH (o:Offer)-[:BELONGS_TO]->(cat:Category)
+    MATCH (o)<-[v:VIEWED]-(u:User)
+    WITH cat, count(v) as views, count(DISTINCT o) as offerCount
+    ORDER BY views DESC
+    RETURN cat.nameFr as category, views, offerCount
+    LIMIT $limit
+"""
+
+USER_CREATE_QUERY = """
+    MERGE (u:User {id: $userId})
+    SET u.firstName = $firstName,
+        u.lastName = $lastName,
+        u.email = $email,
+        u.phone = $phone,
+        u.authProvider = $authProvider,
+        u.primaryIdentifier = $primaryIdentifier,
+        u.isVerified = $isVerified,
+        u.role = $role,
+        u.createdAt = datetime($createdAt),
+        u.updatedAt = datetime($updatedAt),
+        u.googleId = $googleId,
+        u.facebookId = $facebookId,
+        u.facebookEmail = $facebookEmail,
+        u.facebookPhone = $facebookPhone,
+        u.lastSync = datetime()
+    RETURN u.id as userId, u.lastSync as lastSync
+"""
+
+USER_UPDATE_QUERY = """
+    MATCH (u:User {id: $userId})
+    SET u.firstName = $firstName,
+        u.lastName = $lastName,
+        u.email = $email,
+        u.phone = $phone,
+        u.isVerified = $isVerified,
+        u.role = $role,
+        u.updatedAt = datetime($updatedAt),
+        u.lastSync = datetime()
+    RETURN u.id as userId, u.lastSync as lastSync
+"""
+
+USER_DELETE_QUERY = """
+    MATCH (u:User {id: $userId})
+    DETACH DELETE u
+    RETURN count(u) as deleted
+"""
+
+USER_STATUS_QUERY = """
+    MATCH (u:User {id: $userId})
+    RETURN u.id as userId, u.lastSync as lastSync, u.authProvider as authProvider
+"""
+
+CATEGORY_CREATE_QUERY = """
+    MERGE (c:Category {id: $categoryId})
+    SET c.parentId = $parentId,
+        c.nameAr = $nameAr,
+        c.nameFr = $nameFr,
+        c.descriptionAr = $descriptionAr,
+        c.descriptionFr = $descriptionFr,
+        c.image = $image,
+        c.icon = $icon,
+        c.gender = $gender,
+        c.ageMin = $ageMin,
+        c.ageMax = $ageMax,
+        c.createdAt = datetime($createdAt),
+        c.updatedAt = datetime($updatedAt),
+        c.lastSync = datetime()
+    RETURN c.id as categoryId, c.lastSync as lastSync
+"""
+
+CATEGORY_UPDATE_QUERY = """
+    MATCH (c:Category {id: $categoryId})
+    SET c.parentId = $parentId,
+        c.nameAr = $nameAr,
+        c.nameFr = $nameFr,
+        c.descriptionAr = $descriptionAr,
+        c.descriptionFr = $descriptionFr,
+        c.image = $image,
+        c.icon = $icon,
+        c.gender = $gender,
+        c.ageMin = $ageMin,
+        c.ageMax = $ageMax,
+        c.updatedAt = datetime($updatedAt),
+        c.lastSync = datetime()
+    RETURN c.id as categoryId, c.lastSync as lastSync
+"""
+
+CATEGORY_DELETE_QUERY = """
+    MATCH (c:Category {id: $categoryId})
+    DETACH DELETE c
+    RETURN count(c) as deleted
+"""
+
+CATEGORY_STATUS_QUERY = """
+    MATCH (c:Category {id: $categoryId})
+    RETURN c.id as categoryId, c.lastSync as lastSync, c.nameFr as nameFr
+"""
+
+OFFER_CREATE_QUERY = """
+    MERGE (o:Offer {id: $offerId})
+    SET o.title = $title,
+        o.description = $description,
+        o.price = $price,
+        o.status = $status,
+        o.productCondition = $productCondition,
+        o.listingType = $listingType,
+        o.sellerId = $sellerId,
+        o.categoryId = $categoryId,
+        o.brandId = $brandId,
+        o.subjectId = $subjectId,
+        o.addressId = $addressId,
+        o.images = $images,
+        o.specificData = $specificData,
+        o.isDeleted = $isDeleted,
+        o.replacedByOffer = $replacedByOffer,
+        o.createdAt = datetime($createdAt),
+        o.updatedAt = datetime($updatedAt),
+        o.lastSync = datetime()
+    RETURN o.id as offerId, o.lastSync as lastSync
+"""
+
+OFFER_UPDATE_QUERY = """
+    MATCH (o:Offer {id: $offerId})
+    WITH o, o.status as previousStatus, o.isDeleted as previousIsDeleted,
+         o.replacedByOffer as previousReplacedByOffer
+    SET o.title = $title,
+        o.description = $description,
+        o.price = $price,
+        o.status = $status,
+        o.productCondition = $productCondition,
+        o.listingType = $listingType,
+        o.sellerId = $sellerId,
+        o.categoryId = $categoryId,
+        o.brandId = $brandId,
+        o.subjectId = $subjectId,
+        o.addressId = $addressId,
+        o.images = $images,
+        o.specificData = $specificData,
+        o.isDeleted = $isDeleted,
+        o.replacedByOffer = coalesce($replacedByOffer, o.replacedByOffer),
+        o.updatedAt = datetime($updatedAt),
+        o.lastSync = datetime()
+    RETURN o.id as offerId, o.lastSync as lastSync,
+           previousStatus, previousIsDeleted, o.status as status, o.isDeleted as isDeleted,
+           previousReplacedByOffer, o.replacedByOffer as replacedByOffer
+"""
+
+OFFER_DELETE_QUERY = """
+    MATCH (o:Offer {id: $offerId})
+    SET o.isDeleted = true,
+        o.updatedAt = datetime($updatedAt),
+        o.lastSync = datetime()
+    RETURN o.id as offerId
+"""
+
+OFFER_CATEGORY_CREATE_QUERY = """
+    MATCH (o:Offer {id: $offerId})
+    MATCH (c:Category {id: $categoryId})
+    MERGE (o)-[r:MATCHED_WITH]->(c)
+    SET r.createdAt = datetime($timestamp),
+        r.lastSync = datetime()
+    RETURN o.id as offerId, c.id as categoryId, r.createdAt as createdAt
+"""
+
+OFFER_CATEGORY_DELETE_QUERY = """
+    MATCH (o:Offer {id: $offerId})-[r:MATCHED_WITH]->(c:Category {id: $categoryId})
+    DELETE r
+    RETURN o.id as offerId, c.id as categoryId
+"""
+
+# Classement par (catégories communes, ID) décroissants ; page suivante strictement
+# après la clé ($afterCommon, $afterId) du curseur
+EXCHANGE_RECOMMENDATIONS_QUERY = """
+    MATCH (sourceOffer:Offer {id: $offerId})-[:MATCHED_WITH]->(category:Category)
+    MATCH (targetOffer:Offer)-[:MATCHED_WITH]->(category)
+    WHERE targetOffer.id <> $offerId
+    AND targetOffer.status = 'available'
+    WITH targetOffer, collect(DISTINCT category.nameFr) as matchingCategories, count(DISTINCT category) as commonCategories
+    WHERE $afterCommon IS NULL
+       OR commonCategories < $afterCommon
+       OR (commonCategories = $afterCommon AND targetOffer.id < $afterId)
+    ORDER BY commonCategories DESC, targetOffer.id DESC
+    LIMIT $limit
+    RETURN targetOffer.id as offerId,
+           targetOffer.title as title,
+           targetOffer.description as description,
+           targetOffer.price as price,
+           targetOffer.images as images,
+           targetOffer.listingType as listingType,
+           targetOffer.productCondition as productCondition,
+           targetOffer.sellerId as sellerId,
+           matchingCategories,
+           commonCategories
+"""
+
+# Correspondances par offre au plus (paramètre per_offer)
+USER_EXCHANGE_MAX_PER_OFFER = 20
+
+USER_EXCHANGE_RECOMMENDATIONS_QUERY = """
+    MATCH (userOffer:Offer {sellerId: $userId})
+    WHERE ($afterOfferId IS NULL OR userOffer.id > $afterOfferId)
+      AND (userOffer)-[:MATCHED_WITH]->(:Category)
+    WITH userOffer
+    ORDER BY userOffer.id
+    LIMIT $limit
+    CALL {
+        WITH userOffer
+        MATCH (userOffer)-[:MATCHED_WITH]->(category:Category)<-[:MATCHED_WITH]-(targetOffer:Offer)
+        WHERE targetOffer.sellerId <> $userId
+          AND targetOffer.status = 'available'
+        WITH targetOffer, collect(DISTINCT category.nameFr) as matchingCategories
+        ORDER BY size(matchingCategories) DESC, targetOffer.id
+        LIMIT $perOffer
+        RETURN collect({
+            offerId: targetOffer.id,
+            title: targetOffer.title,
+            description: targetOffer.description,
+            price: targetOffer.price,
+            images: targetOffer.images,
+            listingType: targetOffer.listingType,
+            productCondition: targetOffer.productCondition,
+            sellerId: targetOffer.sellerId,
+            matchingCategories: matchingCategories,
+            commonCategoriesCount: size(matchingCategories)
+        }) as recommendations
+    }
+    RETURN userOffer.id as userOfferId,
+           userOffer.title as userOfferTitle,
+           userOffer.price as userOfferPrice,
+           recommendations
+    ORDER BY userOfferId
+"""
+
 @app.get("/")
 async def root():
     """Point d'entrée de l'API"""
@@ -120,231 +410,214 @@ async def root():
 async def health_check():
     """Vérification de la santé du service"""
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            result = session.run("RETURN 'Neo4j connected' as status")
-            record = result.single()
-            return {"status": "healthy", "neo4j": record["status"]}
+        async with neo4j_session() as session:
+            result = await session.run("RETURN 'Neo4j connected' as status")
+            record = await result.single()
+            return {"status": "healthy", "neo4j": record["status"], "pool": get_pool_stats(),
+                    "materialization": recommendation_materializer.stats(),
+                    "cache": recommendation_cache.stats(),
+                    "trending": trending_service.stats(),
+                    "ingestion": interaction_buffer.stats(),
+                    "item_cf": item_cf_engine.stats(),
+                    "similar_knn": similar_offers_knn.stats(),
+                    "exchange_chains": exchange_chain_index.stats(),
+                    "exchange_cycles": exchange_cycle_engine.stats()}
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
 
+async def get_strategy_recommendations(strategy: str, user_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Sert le top-N matérialisé de la stratégie, sinon interroge Neo4j en live (réponse en cache)"""
+    async def compute():
+        records = None
+        if strategy == "collaborative":
+            # Filtrage collaboratif item-item en mémoire, si le modèle connaît l'utilisateur
+            # et intègre déjà ses dernières interactions
+            records = item_cf_engine.recommend(user_id, limit)
+        if records is None:
+            records = recommendation_materializer.get(user_id, strategy, limit)
+        if records is None:
+            records = await run_strategy_query(strategy, user_id, limit)
+        return [OfferRecommendation(**record).dict() for record in records]
+    
+    return await recommendation_cache.get_or_compute(strategy, user_id, limit, compute, tags=[user_tag(user_id)])
+
 @app.get("/recommendations/category/{user_id}", response_model=List[OfferRecommendation])
-async def get_category_recommendations(user_id: int, limit: int = 20):
+async def get_category_recommendations(response: Response, user_id: int,
+                                       limit: int = Query(20, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                       cursor: Optional[str] = None):
     """Recommandations basées sur les catégories aimées par l'utilisateur"""
-    driver = get_neo4j_driver()
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (u:User {id: $userId})-[:LIKED]->(liked:Offer)-[:BELONGS_TO]->(cat:Category)
-            MATCH (cat)<-[:BELONGS_TO]-(similar:Offer)
-            WHERE similar.status = 'available' 
-              AND similar.sellerId <> u.id
-              AND NOT (u)-[:VIEWED]->(similar)
-            WITH similar, count(*) as relevanceScore, cat.nameFr as category
-            ORDER BY relevanceScore DESC, similar.createdAt DESC
-            LIMIT $limit
-            RETURN similar.id as id, similar.title as title, similar.price as price, 
-                   relevanceScore, category
-        """, userId=user_id, limit=limit)
-        
-        recommendations = []
-        for record in result:
-            recommendations.append(OfferRecommendation(**dict(record)))
-        
-        return recommendations
+    return await paginate(lambda n: get_strategy_recommendations("category", user_id, n),
+                          limit, cursor, response)
 
 @app.get("/recommendations/collaborative/{user_id}", response_model=List[OfferRecommendation])
-async def get_collaborative_recommendations(user_id: int, limit: int = 15):
+async def get_collaborative_recommendations(response: Response, user_id: int,
+                                            limit: int = Query(15, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                            cursor: Optional[str] = None):
     """Recommandations collaborative filtering - utilisateurs similaires"""
-    driver = get_neo4j_driver()
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (u:User {id: $userId})-[:LIKED]->(o:Offer)<-[:LIKED]-(similar:User)
-            WHERE similar.id <> u.id
-            WITH similar, count(o) as commonLikes
-            ORDER BY commonLikes DESC
-            LIMIT 10
-            MATCH (similar)-[:LIKED]->(recommended:Offer)
-            WHERE recommended.status = 'available' 
-              AND recommended.sellerId <> u.id
-              AND NOT (u)-[:LIKED]->(recommended)
-              AND NOT (u)-[:VIEWED]->(recommended)
-            RETURN DISTINCT recommended.id as id, recommended.title as title, 
-                   recommended.price as price, commonLikes as relevanceScore
-            ORDER BY commonLikes DESC
-            LIMIT $limit
-        """, userId=user_id, limit=limit)
-        
-        recommendations = []
-        for record in result:
-            recommendations.append(OfferRecommendation(**dict(record)))
+    return await paginate(lambda n: get_strategy_recommendations("collaborative", user_id, n),
+                          limit, cursor, response)
+
+async def get_trending(limit: int) -> List[Dict[str, Any]]:
+    """Top des offres tendance (réponse en cache)"""
+    async def compute():
+        # Lecture du top-k dans les compteurs glissants ; requête live si non prêts
+        recommendations = await trending_service.get_trending(limit)
+        if recommendations is not None:
+            return [OfferRecommendation(**offer).dict() for offer in recommendations]
         
-        return recommendations
+        async with neo4j_session() as session:
+            result = await session.run(TRENDING_LIVE_QUERY, limit=limit)
+            
+            recommendations = []
+            async for record in result:
+                recommendations.append(OfferRecommendation(**dict(record)).dict())
+            
+            return recommendations
+    
+    # Réponse globale : TTL court, invalidée par les offres qu'elle contient
+    return await recommendation_cache.get_or_compute("trending", None, limit, compute, ttl=60)
 
 @app.get("/recommendations/trending", response_model=List[OfferRecommendation])
-async def get_trending_recommendations(limit: int = 20):
+async def get_trending_recommendations(response: Response,
+                                       limit: int = Query(20, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                       cursor: Optional[str] = None):
     """Offres tendance - populaires récemment"""
-    driver = get_neo4j_driver()
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (o:Offer)<-[interaction:VIEWED|LIKED]-(u:User)
-            WHERE datetime() - interaction.timestamp < duration({days: 7})
-              AND o.status = 'available'
-            WITH o, count(interaction) as popularity
-            ORDER BY popularity DESC
-            LIMIT $limit
-            RETURN o.id as id, o.title as title, o.price as price, 
-                   popularity as relevanceScore
-        """, limit=limit)
-        
-        recommendations = []
-        for record in result:
-            recommendations.append(OfferRecommendation(**dict(record)))
-        
-        return recommendations
+    return await paginate(get_trending, limit, cursor, response)
 
 @app.get("/recommendations/brand/{user_id}", response_model=List[OfferRecommendation])
-async def get_brand_recommendations(user_id: int, limit: int = 15):
-    """Recommandations par marque similaire"""
-    driver = get_neo4j_driver()
+async def get_brand_recommendations(response: Response, user_id: int,
+                                    limit: int = Query(15, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                    cursor: Optional[str] = None):
+    """Recommandations par marque similaire (classées par ID décroissant, sans score)"""
+    return await paginate(lambda n: get_strategy_recommendations("brand", user_id, n),
+                          limit, cursor, response)
+
+@app.get("/recommendations/feed/{user_id}", response_model=HomeFeed)
+async def get_home_feed(user_id: int, limit: int = Query(30, ge=1, le=RECOMMENDATION_MAX_LIMIT)):
+    """Fil d'accueil : catégories, collaboratif, marques et tendances combinés en un appel"""
+    start = time.perf_counter()
+    results, status = await run_strategies({
+        "category": lambda: get_strategy_recommendations("category", user_id, limit),
+        "collaborative": lambda: get_strategy_recommendations("collaborative", user_id, limit),
+        "brand": lambda: get_strategy_recommendations("brand", user_id, limit),
+        "trending": lambda: get_trending(limit)
+    })
     
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (u:User {id: $userId})-[:LIKED]->(liked:Offer)-[:IS_BRAND]->(brand:Brand)
-            MATCH (brand)<-[:IS_BRAND]-(similar:Offer)
-            WHERE similar.status = 'available' 
-              AND similar.sellerId <> u.id
-              AND NOT (u)-[:LIKED]->(similar)
-            WITH similar, brand.nameFr as brandName
-            ORDER BY similar.createdAt DESC
-            RETURN similar.id as id, similar.title as title, similar.price as price, 
-                   brandName as brand
-            LIMIT $limit
-        """, userId=user_id, limit=limit)
-        
-        recommendations = []
-        for record in result:
-            recommendations.append(OfferRecommendation(**dict(record)))
-        
-        return recommendations
+    return {
+        "userId": user_id,
+        "recommendations": interleave(results, limit),
+        "strategies": status,
+        "elapsedMs": (time.perf_counter() - start) * 1000
+    }
+
+async def get_similar(offer_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Offres similaires classées (réponse en cache)"""
+    async def compute():
+        # Table kNN précalculée (embeddings + catégorie/marque), sinon requête Cypher
+        records = similar_offers_knn.get(offer_id, limit)
+        if records is not None:
+            return [OfferRecommendation(**r).dict() for r in records]
+
+        async with neo4j_session() as session:
+            result = await session.run(SIMILAR_OFFERS_QUERY, offerId=offer_id, limit=limit)
+            
+            recommendations = []
+            async for record in result:
+                recommendations.append(OfferRecommendation(**dict(record)).dict())
+            
+            return recommendations
+    
+    return await recommendation_cache.get_or_compute("similar", offer_id, limit, compute, tags=[offer_tag(offer_id)])
 
 @app.get("/recommendations/similar/{offer_id}", response_model=List[OfferRecommendation])
-async def get_similar_offers(offer_id: int, limit: int = 8):
+async def get_similar_offers(response: Response, offer_id: int,
+                             limit: int = Query(8, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                             cursor: Optional[str] = None):
     """Offres similaires à une offre donnée"""
-    driver = get_neo4j_driver()
+    return await paginate(lambda n: get_similar(offer_id, n), limit, cursor, response)
+
+async def on_interactions_flushed(events: List[Dict[str, Any]]):
+    """Après écriture d'un lot : tendances, recommandations matérialisées et en cache à recalculer"""
+    # Tendances comptées une fois l'interaction écrite, à l'heure de l'événement
+    for event in events:
+        if event["type"] in ('VIEW', 'LIKE'):
+            trending_service.record(event["offerId"], event["timestamp"] / 1000)
+    item_cf_engine.apply_events(events)
+    for user_id in {event["userId"] for event in events}:
+        recommendation_materializer.mark_dirty(user_id)
+        await recommendation_cache.invalidate_user(user_id)
+
+# Tampon d'ingestion : dédoublonnage et écriture par lots (UNWIND)
+interaction_buffer = InteractionBuffer(on_flushed=on_interactions_flushed)
+
+async def record_interaction(interaction: UserInteraction) -> bool:
+    """
+    Met une interaction dans le tampon ; retourne False si ignorée ou dédoublonnée
+
+    Tampon plein pendant une indisponibilité de Neo4j : 503 avec Retry-After
+    """
+    if interaction.interactionType not in INTERACTION_TYPES:
+        return False
     
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (viewed:Offer {id: $offerId})-[:BELONGS_TO]->(cat:Category)
-            MATCH (viewed)-[:IS_BRAND]->(brand:Brand)
-            MATCH (similar:Offer)-[:BELONGS_TO]->(cat)
-            WHERE similar.status = 'available' 
-              AND similar.id <> viewed.id
-            OPTIONAL MATCH (similar)-[:IS_BRAND]->(brand)
-            WITH similar, 
-                 CASE WHEN (similar)-[:IS_BRAND]->(brand) THEN 2 ELSE 1 END as relevance,
-                 viewed.price as originalPrice
-            ORDER BY relevance DESC, abs(similar.price - originalPrice) ASC
-            RETURN similar.id as id, similar.title as title, similar.price as price, 
-                   relevance as relevanceScore
-            LIMIT $limit
-        """, offerId=offer_id, limit=limit)
-        
-        recommendations = []
-        for record in result:
-            recommendations.append(OfferRecommendation(**dict(record)))
-        
-        return recommendations
+    try:
+        return await interaction_buffer.submit(interaction.dict())
+    except InteractionBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
 
 @app.post("/interactions")
 async def log_interaction(interaction: UserInteraction):
-    """Enregistre une interaction utilisateur"""
-    driver = get_neo4j_driver()
+    """Enregistre une interaction utilisateur (écrite par lots en arrière-plan)"""
+    await record_interaction(interaction)
+    return {"status": "success", "message": "Interaction enregistrée"}
+
+@app.post("/interactions/batch")
+async def log_interactions_batch(batch: InteractionBatch):
+    """Enregistre un lot d'interactions utilisateur"""
+    if len(batch.interactions) > MAX_INTERACTIONS_BATCH:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_INTERACTIONS_BATCH} interactions par requête")
     
-    with driver.session() as session:
-        if interaction.interactionType == 'VIEW':
-            session.run("""
-                MATCH (u:User {id: $userId}), (o:Offer {id: $offerId})
-                MERGE (u)-[v:VIEWED]->(o)
-                SET v.timestamp = datetime(),
-                    v.duration = $duration
-            """, 
-            userId=interaction.userId, 
-            offerId=interaction.offerId,
-            duration=interaction.duration)
-        
-        elif interaction.interactionType == 'LIKE':
-            session.run("""
-                MATCH (u:User {id: $userId}), (o:Offer {id: $offerId})
-                MERGE (u)-[l:LIKED]->(o)
-                SET l.timestamp = datetime()
-            """, userId=interaction.userId, offerId=interaction.offerId)
-        
-        elif interaction.interactionType == 'SEARCH':
-            session.run("""
-                MATCH (u:User {id: $userId}), (o:Offer {id: $offerId})
-                MERGE (u)-[s:SEARCHES]->(o)
-                SET s.timestamp = datetime(),
-                    s.keywords = $keywords
-            """, 
-            userId=interaction.userId, 
-            offerId=interaction.offerId,
-            keywords=interaction.keywords or '')
-        
-        return {"status": "success", "message": "Interaction enregistrée"}
+    accepted = 0
+    for interaction in batch.interactions:
+        accepted += await record_interaction(interaction)
+    
+    return {
+        "status": "success",
+        "message": "Interactions enregistrées",
+        "received": len(batch.interactions),
+        "accepted": accepted,
+        "deduplicated": len(batch.interactions) - accepted
+    }
+
+@app.get("/interactions/stats")
+async def get_interaction_ingestion_stats():
+    """Profondeur du tampon et latence des écritures par lots"""
+    return interaction_buffer.stats()
 
 @app.get("/analytics/exchange-chain/{user_id}", response_model=List[ExchangeChain])
 async def get_user_exchange_chain(user_id: int):
     """Analyse de la chaîne d'échange d'un utilisateur"""
-    driver = get_neo4j_driver()
+    # Lecture indexée (ExchangeChain + chainId/chainPosition) au lieu d'un parcours REPLACED_BY*
+    records = await exchange_chain_index.get_user_chains(user_id)
     
-    with driver.session() as session:
-        result = session.run("""
-            MATCH path = (start:Offer {sellerId: $userId})-[:REPLACED_BY*]->(end:Offer)
-            WHERE NOT (end)-[:REPLACED_BY]->()
-            WITH path, start, end, length(path) as chainLength
-            ORDER BY chainLength DESC
-            RETURN start.title as initialOffer, 
-                   start.price as initialPrice,
-                   end.title as currentOffer, 
-                   end.price as currentPrice,
-                   chainLength,
-                   (end.price - start.price) as gain,
-                   ((end.price - start.price) / start.price * 100) as roiPercentage
-        """, userId=user_id)
-        
-        chains = []
-        for record in result:
-            chain = ExchangeChain(
-                userId=user_id,
-                **dict(record)
-            )
-            chains.append(chain)
-        
-        return chains
+    chains = []
+    for record in records:
+        chain = ExchangeChain(
+            userId=user_id,
+            **record
+        )
+        chains.append(chain)
+    
+    return chains
 
 @app.get("/analytics/exchange-patterns")
 async def get_exchange_patterns(limit: int = 20):
     """Analyse des patterns d'échange entre catégories"""
-    driver = get_neo4j_driver()
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (e:Exchange)-[:OFFERS]->(offered:Offer)-[:BELONGS_TO]->(catOffered:Category)
-            MATCH (e)-[:REQUESTS]->(requested:Offer)-[:BELONGS_TO]->(catRequested:Category)
-            WHERE e.status = 'completed'
-            WITH catOffered.nameFr as offeredCategory, 
-                 catRequested.nameFr as requestedCategory, 
-                 count(*) as exchangeCount
-            ORDER BY exchangeCount DESC
-            RETURN offeredCategory, requestedCategory, exchangeCount
-            LIMIT $limit
-        """, limit=limit)
+    async with neo4j_session() as session:
+        result = await session.run(EXCHANGE_PATTERNS_QUERY, limit=limit)
         
         patterns = []
-        for record in result:
+        async for record in result:
             patterns.append(dict(record))
         
         return {"patterns": patterns}
@@ -352,20 +625,11 @@ async def get_exchange_patterns(limit: int = 20):
 @app.get("/analytics/popular-categories")
 async def get_popular_categories(limit: int = 10):
     """Catégories les plus consultées"""
-    driver = get_neo4j_driver()
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (o:Offer)-[:BELONGS_TO]->(cat:Category)
-            MATCH (o)<-[v:VIEWED]-(u:User)
-            WITH cat, count(v) as views, count(DISTINCT o) as offerCount
-            ORDER BY views DESC
-            RETURN cat.nameFr as category, views, offerCount
-            LIMIT $limit
-        """, limit=limit)
+    async with neo4j_session() as session:
+        result = await session.run(POPULAR_CATEGORIES_QUERY, limit=limit)
         
         categories = []
-        for record in result:
+        async for record in result:
             categories.append(dict(record))
         
         return {"categories": categories}
@@ -373,31 +637,11 @@ async def get_popular_categories(limit: int = 10):
 @app.post("/sync/user")
 async def sync_user(sync_data: UserSyncData):
     """Synchronise un utilisateur avec Neo4j"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
+        async with neo4j_session() as session:
             if sync_data.action == 'CREATE':
                 # Créer un nouvel utilisateur dans Neo4j
-                result = session.run("""
-                    MERGE (u:User {id: $userId})
-                    SET u.firstName = $firstName,
-                        u.lastName = $lastName,
-                        u.email = $email,
-                        u.phone = $phone,
-                        u.authProvider = $authProvider,
-                        u.primaryIdentifier = $primaryIdentifier,
-                        u.isVerified = $isVerified,
-                        u.role = $role,
-                        u.createdAt = datetime($createdAt),
-                        u.updatedAt = datetime($updatedAt),
-                        u.googleId = $googleId,
-                        u.facebookId = $facebookId,
-                        u.facebookEmail = $facebookEmail,
-                        u.facebookPhone = $facebookPhone,
-                        u.lastSync = datetime()
-                    RETURN u.id as userId, u.lastSync as lastSync
-                """, 
+                result = await session.run(USER_CREATE_QUERY,
                 userId=sync_data.userId,
                 firstName=sync_data.userData.get('firstName'),
                 lastName=sync_data.userData.get('lastName'),
@@ -414,7 +658,7 @@ async def sync_user(sync_data: UserSyncData):
                 facebookEmail=sync_data.userData.get('facebookEmail'),
                 facebookPhone=sync_data.userData.get('facebookPhone'))
                 
-                record = result.single()
+                record = await result.single()
                 logger.info(f"✅ Utilisateur {sync_data.userId} créé dans Neo4j")
                 
                 return {
@@ -426,18 +670,7 @@ async def sync_user(sync_data: UserSyncData):
                 
             elif sync_data.action == 'UPDATE':
                 # Mettre à jour un utilisateur existant
-                result = session.run("""
-                    MATCH (u:User {id: $userId})
-                    SET u.firstName = $firstName,
-                        u.lastName = $lastName,
-                        u.email = $email,
-                        u.phone = $phone,
-                        u.isVerified = $isVerified,
-                        u.role = $role,
-                        u.updatedAt = datetime($updatedAt),
-                        u.lastSync = datetime()
-                    RETURN u.id as userId, u.lastSync as lastSync
-                """, 
+                result = await session.run(USER_UPDATE_QUERY,
                 userId=sync_data.userId,
                 firstName=sync_data.userData.get('firstName'),
                 lastName=sync_data.userData.get('lastName'),
@@ -447,7 +680,7 @@ async def sync_user(sync_data: UserSyncData):
                 role=sync_data.userData.get('role', 'user'),
                 updatedAt=sync_data.userData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Utilisateur {sync_data.userId} mis à jour dans Neo4j")
                     return {
@@ -461,13 +694,9 @@ async def sync_user(sync_data: UserSyncData):
                     
             elif sync_data.action == 'DELETE':
                 # Supprimer un utilisateur
-                result = session.run("""
-                    MATCH (u:User {id: $userId})
-                    DETACH DELETE u
-                    RETURN count(u) as deleted
-                """, userId=sync_data.userId)
+                result = await session.run(USER_DELETE_QUERY, userId=sync_data.userId)
                 
-                record = result.single()
+                record = await result.single()
                 if record["deleted"] > 0:
                     logger.info(f"✅ Utilisateur {sync_data.userId} supprimé de Neo4j")
                     return {
@@ -488,16 +717,11 @@ async def sync_user(sync_data: UserSyncData):
 @app.get("/users/{user_id}/status")
 async def get_user_sync_status(user_id: int):
     """Vérifie le statut de synchronisation d'un utilisateur"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (u:User {id: $userId})
-                RETURN u.id as userId, u.lastSync as lastSync, u.authProvider as authProvider
-            """, userId=user_id)
+        async with neo4j_session() as session:
+            result = await session.run(USER_STATUS_QUERY, userId=user_id)
             
-            record = result.single()
+            record = await result.single()
             if record:
                 return {
                     "exists": True,
@@ -518,29 +742,11 @@ async def get_user_sync_status(user_id: int):
 @app.post("/sync/category")
 async def sync_category(sync_data: CategorySyncData):
     """Synchronise une catégorie avec Neo4j"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
+        async with neo4j_session() as session:
             if sync_data.action == 'CREATE':
                 # Créer une nouvelle catégorie dans Neo4j
-                result = session.run("""
-                    MERGE (c:Category {id: $categoryId})
-                    SET c.parentId = $parentId,
-                        c.nameAr = $nameAr,
-                        c.nameFr = $nameFr,
-                        c.descriptionAr = $descriptionAr,
-                        c.descriptionFr = $descriptionFr,
-                        c.image = $image,
-                        c.icon = $icon,
-                        c.gender = $gender,
-                        c.ageMin = $ageMin,
-                        c.ageMax = $ageMax,
-                        c.createdAt = datetime($createdAt),
-                        c.updatedAt = datetime($updatedAt),
-                        c.lastSync = datetime()
-                    RETURN c.id as categoryId, c.lastSync as lastSync
-                """, 
+                result = await session.run(CATEGORY_CREATE_QUERY,
                 categoryId=sync_data.categoryId,
                 parentId=sync_data.categoryData.get('parentId'),
                 nameAr=sync_data.categoryData.get('nameAr'),
@@ -555,7 +761,7 @@ async def sync_category(sync_data: CategorySyncData):
                 createdAt=sync_data.categoryData.get('createdAt'),
                 updatedAt=sync_data.categoryData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 logger.info(f"✅ Catégorie {sync_data.categoryId} créée dans Neo4j")
                 
                 return {
@@ -567,22 +773,7 @@ async def sync_category(sync_data: CategorySyncData):
                 
             elif sync_data.action == 'UPDATE':
                 # Mettre à jour une catégorie existante
-                result = session.run("""
-                    MATCH (c:Category {id: $categoryId})
-                    SET c.parentId = $parentId,
-                        c.nameAr = $nameAr,
-                        c.nameFr = $nameFr,
-                        c.descriptionAr = $descriptionAr,
-                        c.descriptionFr = $descriptionFr,
-                        c.image = $image,
-                        c.icon = $icon,
-                        c.gender = $gender,
-                        c.ageMin = $ageMin,
-                        c.ageMax = $ageMax,
-                        c.updatedAt = datetime($updatedAt),
-                        c.lastSync = datetime()
-                    RETURN c.id as categoryId, c.lastSync as lastSync
-                """, 
+                result = await session.run(CATEGORY_UPDATE_QUERY,
                 categoryId=sync_data.categoryId,
                 parentId=sync_data.categoryData.get('parentId'),
                 nameAr=sync_data.categoryData.get('nameAr'),
@@ -596,7 +787,7 @@ async def sync_category(sync_data: CategorySyncData):
                 ageMax=sync_data.categoryData.get('ageMax'),
                 updatedAt=sync_data.categoryData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Catégorie {sync_data.categoryId} mise à jour dans Neo4j")
                     return {
@@ -610,13 +801,9 @@ async def sync_category(sync_data: CategorySyncData):
                     
             elif sync_data.action == 'DELETE':
                 # Supprimer une catégorie
-                result = session.run("""
-                    MATCH (c:Category {id: $categoryId})
-                    DETACH DELETE c
-                    RETURN count(c) as deleted
-                """, categoryId=sync_data.categoryId)
+                result = await session.run(CATEGORY_DELETE_QUERY, categoryId=sync_data.categoryId)
                 
-                record = result.single()
+                record = await result.single()
                 if record["deleted"] > 0:
                     logger.info(f"✅ Catégorie {sync_data.categoryId} supprimée de Neo4j")
                     return {
@@ -637,16 +824,11 @@ async def sync_category(sync_data: CategorySyncData):
 @app.get("/categories/{category_id}/status")
 async def get_category_sync_status(category_id: int):
     """Vérifie le statut de synchronisation d'une catégorie"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (c:Category {id: $categoryId})
-                RETURN c.id as categoryId, c.lastSync as lastSync, c.nameFr as nameFr
-            """, categoryId=category_id)
+        async with neo4j_session() as session:
+            result = await session.run(CATEGORY_STATUS_QUERY, categoryId=category_id)
             
-            record = result.single()
+            record = await result.single()
             if record:
                 return {
                     "exists": True,
@@ -664,36 +846,24 @@ async def get_category_sync_status(category_id: int):
         logger.error(f"❌ Erreur vérification statut catégorie {category_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur vérification: {str(e)}")
 
+def knn_attributes(offer_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Attributs d'une offre synchronisée utilisés par la table des offres similaires"""
+    return {
+        "title": offer_data.get('title'),
+        "price": offer_data.get('price'),
+        "categoryId": offer_data.get('categoryId'),
+        "brandId": offer_data.get('brandId'),
+        "available": offer_data.get('status') == 'available' and not offer_data.get('isDeleted', False)
+    }
+
 @app.post("/sync/offer")
 async def sync_offer(sync_data: OfferSyncData):
     """Synchronise une offre avec Neo4j"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
+        async with neo4j_session() as session:
             if sync_data.action == 'CREATE':
                 # Créer une nouvelle offre dans Neo4j
-                result = session.run("""
-                    MERGE (o:Offer {id: $offerId})
-                    SET o.title = $title,
-                        o.description = $description,
-                        o.price = $price,
-                        o.status = $status,
-                        o.productCondition = $productCondition,
-                        o.listingType = $listingType,
-                        o.sellerId = $sellerId,
-                        o.categoryId = $categoryId,
-                        o.brandId = $brandId,
-                        o.subjectId = $subjectId,
-                        o.addressId = $addressId,
-                        o.images = $images,
-                        o.specificData = $specificData,
-                        o.isDeleted = $isDeleted,
-                        o.createdAt = datetime($createdAt),
-                        o.updatedAt = datetime($updatedAt),
-                        o.lastSync = datetime()
-                    RETURN o.id as offerId, o.lastSync as lastSync
-                """, 
+                result = await session.run(OFFER_CREATE_QUERY,
                 offerId=sync_data.offerId,
                 title=sync_data.offerData.get('title'),
                 description=sync_data.offerData.get('description'),
@@ -709,11 +879,15 @@ async def sync_offer(sync_data: OfferSyncData):
                 images=sync_data.offerData.get('images'),
                 specificData=sync_data.offerData.get('specificData'),
                 isDeleted=sync_data.offerData.get('isDeleted', False),
+                replacedByOffer=sync_data.offerData.get('replacedByOffer'),
                 createdAt=sync_data.offerData.get('createdAt'),
                 updatedAt=sync_data.offerData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 logger.info(f"✅ Offre {sync_data.offerId} créée dans Neo4j")
+                similar_offers_knn.mark_changed(sync_data.offerId, knn_attributes(sync_data.offerData))
+                if sync_data.offerData.get('replacedByOffer'):
+                    await exchange_chain_index.link(session, sync_data.offerId, sync_data.offerData['replacedByOffer'])
                 
                 return {
                     "success": True,
@@ -724,26 +898,7 @@ async def sync_offer(sync_data: OfferSyncData):
                 
             elif sync_data.action == 'UPDATE':
                 # Mettre à jour une offre existante
-                result = session.run("""
-                    MATCH (o:Offer {id: $offerId})
-                    SET o.title = $title,
-                        o.description = $description,
-                        o.price = $price,
-                        o.status = $status,
-                        o.productCondition = $productCondition,
-                        o.listingType = $listingType,
-                        o.sellerId = $sellerId,
-                        o.categoryId = $categoryId,
-                        o.brandId = $brandId,
-                        o.subjectId = $subjectId,
-                        o.addressId = $addressId,
-                        o.images = $images,
-                        o.specificData = $specificData,
-                        o.isDeleted = $isDeleted,
-                        o.updatedAt = datetime($updatedAt),
-                        o.lastSync = datetime()
-                    RETURN o.id as offerId, o.lastSync as lastSync
-                """, 
+                result = await session.run(OFFER_UPDATE_QUERY,
                 offerId=sync_data.offerId,
                 title=sync_data.offerData.get('title'),
                 description=sync_data.offerData.get('description'),
@@ -759,11 +914,27 @@ async def sync_offer(sync_data: OfferSyncData):
                 images=sync_data.offerData.get('images'),
                 specificData=sync_data.offerData.get('specificData'),
                 isDeleted=sync_data.offerData.get('isDeleted', False),
+                replacedByOffer=sync_data.offerData.get('replacedByOffer'),
                 updatedAt=sync_data.offerData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Offre {sync_data.offerId} mise à jour dans Neo4j")
+                    similar_offers_knn.mark_changed(sync_data.offerId, knn_attributes(sync_data.offerData))
+                    # Un changement de statut invalide les réponses en cache contenant l'offre
+                    if (record["previousStatus"] != record["status"]
+                            or bool(record["previousIsDeleted"]) != bool(record["isDeleted"])):
+                        # Sources mises à jour avant l'invalidation : un recalcul ne relit pas l'ancien statut
+                        available = record["status"] == 'available' and not record["isDeleted"]
+                        item_cf_engine.set_offer_available(sync_data.offerId, available)
+                        recommendation_materializer.set_offer_available(sync_data.offerId, available)
+                        exchange_cycle_engine.set_offer_available(sync_data.offerId, available)
+                        await recommendation_cache.invalidate_offer(sync_data.offerId)
+                    # Nouvel échange : la chaîne de l'offre est prolongée ; sinon gain à jour si le prix a changé
+                    if record["replacedByOffer"] is not None and record["replacedByOffer"] != record["previousReplacedByOffer"]:
+                        await exchange_chain_index.link(session, sync_data.offerId, record["replacedByOffer"])
+                    else:
+                        await exchange_chain_index.refresh_gain(session, sync_data.offerId)
                     return {
                         "success": True,
                         "message": "Offre mise à jour avec succès",
@@ -775,19 +946,18 @@ async def sync_offer(sync_data: OfferSyncData):
                     
             elif sync_data.action == 'DELETE':
                 # Supprimer une offre (soft delete)
-                result = session.run("""
-                    MATCH (o:Offer {id: $offerId})
-                    SET o.isDeleted = true,
-                        o.updatedAt = datetime($updatedAt),
-                        o.lastSync = datetime()
-                    RETURN o.id as offerId
-                """, 
+                result = await session.run(OFFER_DELETE_QUERY,
                 offerId=sync_data.offerId,
                 updatedAt=sync_data.offerData.get('updatedAt'))
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Offre {sync_data.offerId} supprimée de Neo4j")
+                    item_cf_engine.set_offer_available(sync_data.offerId, False)
+                    recommendation_materializer.set_offer_available(sync_data.offerId, False)
+                    exchange_cycle_engine.set_offer_available(sync_data.offerId, False)
+                    await recommendation_cache.invalidate_offer(sync_data.offerId)
+                    similar_offers_knn.mark_changed(sync_data.offerId, {"available": False})
                     return {
                         "success": True,
                         "message": "Offre supprimée avec succès",
@@ -806,27 +976,21 @@ async def sync_offer(sync_data: OfferSyncData):
 @app.post("/sync/offer-category-relation")
 async def sync_offer_category_relation(sync_data: OfferCategoryRelationSyncData):
     """Synchronise une relation offre-catégorie avec Neo4j"""
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
+        async with neo4j_session() as session:
             if sync_data.action == 'CREATE':
                 # Créer la relation MATCHED_WITH entre l'offre et la catégorie
-                result = session.run("""
-                    MATCH (o:Offer {id: $offerId})
-                    MATCH (c:Category {id: $categoryId})
-                    MERGE (o)-[r:MATCHED_WITH]->(c)
-                    SET r.createdAt = datetime($timestamp),
-                        r.lastSync = datetime()
-                    RETURN o.id as offerId, c.id as categoryId, r.createdAt as createdAt
-                """, 
+                result = await session.run(OFFER_CATEGORY_CREATE_QUERY,
                 offerId=sync_data.offerId,
                 categoryId=sync_data.categoryId,
                 timestamp=sync_data.timestamp)
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Relation offre-catégorie {sync_data.offerId}-{sync_data.categoryId} créée dans Neo4j")
+                    # Catégories souhaitées modifiées : échanges possibles à recalculer
+                    exchange_cycle_engine.mark_stale(sync_data.offerId)
+                    await recommendation_cache.invalidate_offer(sync_data.offerId)
                     
                     return {
                         "success": True,
@@ -840,17 +1004,15 @@ async def sync_offer_category_relation(sync_data: OfferCategoryRelationSyncData)
                     
             elif sync_data.action == 'DELETE':
                 # Supprimer la relation MATCHED_WITH
-                result = session.run("""
-                    MATCH (o:Offer {id: $offerId})-[r:MATCHED_WITH]->(c:Category {id: $categoryId})
-                    DELETE r
-                    RETURN o.id as offerId, c.id as categoryId
-                """, 
+                result = await session.run(OFFER_CATEGORY_DELETE_QUERY,
                 offerId=sync_data.offerId,
                 categoryId=sync_data.categoryId)
                 
-                record = result.single()
+                record = await result.single()
                 if record:
                     logger.info(f"✅ Relation offre-catégorie {sync_data.offerId}-{sync_data.categoryId} supprimée de Neo4j")
+                    exchange_cycle_engine.mark_stale(sync_data.offerId)
+                    await recommendation_cache.invalidate_offer(sync_data.offerId)
                     
                     return {
                         "success": True,
@@ -874,36 +1036,26 @@ async def sync_offer_category_relation(sync_data: OfferCategoryRelationSyncData)
         raise HTTPException(status_code=500, detail=f"Erreur synchronisation: {str(e)}")
 
 @app.get("/recommendations/exchange/{offer_id}")
-async def get_exchange_recommendations(offer_id: int, limit: int = 10):
-    """Récupère les recommandations d'échange pour une offre donnée"""
-    driver = get_neo4j_driver()
+async def get_exchange_recommendations(response: Response, offer_id: int,
+                                       limit: int = Query(10, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                       cursor: Optional[str] = None):
+    """
+    Récupère les recommandations d'échange pour une offre donnée
+
+    Pagination keyset sur (catégories communes, ID de l'offre) : la page
+    suivante est lue dans Neo4j après la clé du curseur (X-Next-Cursor).
+    """
+    after_common, after_id = decode_cursor(cursor, 2) if cursor else (None, None)
     
-    try:
-        with driver.session() as session:
+    async def compute():
+        async with neo4j_session() as session:
             # Requête pour trouver les offres qui peuvent être échangées
-            # Basée sur les relations MATCHED_WITH
-            result = session.run("""
-                MATCH (sourceOffer:Offer {id: $offerId})-[:MATCHED_WITH]->(category:Category)
-                MATCH (targetOffer:Offer)-[:MATCHED_WITH]->(category)
-                WHERE targetOffer.id <> $offerId
-                AND targetOffer.status = 'available'
-                WITH targetOffer, category, count(category) as commonCategories
-                ORDER BY commonCategories DESC, targetOffer.createdAt DESC
-                LIMIT $limit
-                RETURN targetOffer.id as offerId,
-                       targetOffer.title as title,
-                       targetOffer.description as description,
-                       targetOffer.price as price,
-                       targetOffer.images as images,
-                       targetOffer.listingType as listingType,
-                       targetOffer.productCondition as productCondition,
-                       targetOffer.sellerId as sellerId,
-                       collect(DISTINCT category.nameFr) as matchingCategories,
-                       commonCategories
-            """, offerId=offer_id, limit=limit)
+            # Basée sur les relations MATCHED_WITH (une ligne de plus pour détecter la suite)
+            result = await session.run(EXCHANGE_RECOMMENDATIONS_QUERY, offerId=offer_id, limit=limit + 1,
+                                       afterCommon=after_common, afterId=after_id)
             
             recommendations = []
-            for record in result:
+            async for record in result:
                 recommendations.append({
                     "offerId": record["offerId"],
                     "title": record["title"],
@@ -918,54 +1070,90 @@ async def get_exchange_recommendations(offer_id: int, limit: int = 10):
                     "matchScore": min(record["commonCategories"] / 3.0, 1.0)  # Score de 0 à 1
                 })
             
-            logger.info(f"✅ {len(recommendations)} recommandations trouvées pour l'offre {offer_id}")
+            page = recommendations[:limit]
+            next_cursor = None
+            if len(recommendations) > limit:
+                next_cursor = encode_cursor((page[-1]["commonCategoriesCount"], page[-1]["offerId"]))
+            
+            logger.info(f"✅ {len(page)} recommandations trouvées pour l'offre {offer_id}")
             
             return {
                 "success": True,
-                "data": recommendations,
-                "total": len(recommendations),
+                "data": page,
+                "total": len(page),
+                "nextCursor": next_cursor,
                 "message": f"Recommandations d'échange pour l'offre {offer_id}"
             }
-            
+    
+    try:
+        result = await recommendation_cache.get_or_compute(
+            "exchange", offer_id, limit, compute, tags=[offer_tag(offer_id)], cursor=cursor
+        )
+        set_next_cursor(response, result["nextCursor"])
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erreur récupération recommandations pour offre {offer_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur recommandations: {str(e)}")
 
-@app.get("/recommendations/user/{user_id}")
-async def get_user_exchange_recommendations(user_id: int, limit: int = 20):
-    """Récupère toutes les recommandations d'échange pour un utilisateur"""
-    driver = get_neo4j_driver()
+@app.get("/recommendations/exchange-cycles/{offer_id}")
+async def get_exchange_cycles(offer_id: int, limit: int = Query(10, ge=1, le=RECOMMENDATION_MAX_LIMIT)):
+    """Échanges à plusieurs (A -> B -> C -> A) incluant une offre donnée"""
+    async def compute():
+        result = await exchange_cycle_engine.find(offer_id, limit)
+        if result is None:
+            raise HTTPException(status_code=503, detail="Cycles d'échange en cours de calcul")
+        
+        logger.info(f"✅ {len(result['cycles'])} cycles d'échange trouvés pour l'offre {offer_id}")
+        
+        return {
+            "success": True,
+            "data": result["cycles"],
+            "total": len(result["cycles"]),
+            "complete": result["complete"],
+            "source": result["source"],
+            "message": f"Cycles d'échange pour l'offre {offer_id}"
+        }
     
     try:
-        with driver.session() as session:
-            # Trouver toutes les offres de l'utilisateur et leurs recommandations
-            result = session.run("""
-                MATCH (userOffer:Offer {sellerId: $userId})-[:MATCHED_WITH]->(category:Category)
-                MATCH (targetOffer:Offer)-[:MATCHED_WITH]->(category)
-                WHERE targetOffer.sellerId <> $userId
-                AND targetOffer.status = 'available'
-                WITH userOffer, targetOffer, category, count(category) as commonCategories
-                ORDER BY userOffer.id, commonCategories DESC
-                WITH userOffer, collect({
-                    offerId: targetOffer.id,
-                    title: targetOffer.title,
-                    description: targetOffer.description,
-                    price: targetOffer.price,
-                    images: targetOffer.images,
-                    listingType: targetOffer.listingType,
-                    productCondition: targetOffer.productCondition,
-                    sellerId: targetOffer.sellerId,
-                    matchingCategories: collect(DISTINCT category.nameFr),
-                    commonCategoriesCount: commonCategories
-                })[0..5] as recommendations
-                RETURN userOffer.id as userOfferId,
-                       userOffer.title as userOfferTitle,
-                       userOffer.price as userOfferPrice,
-                       recommendations
-            """, userId=user_id, limit=limit)
+        # Invalidée par chacune des offres du cycle ; TTL court (recherche à la demande partielle)
+        return await recommendation_cache.get_or_compute(
+            "exchange_cycles", offer_id, limit, compute, tags=[offer_tag(offer_id)], ttl=60
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erreur récupération cycles d'échange pour offre {offer_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur cycles d'échange: {str(e)}")
+
+@app.get("/recommendations/user/{user_id}")
+async def get_user_exchange_recommendations(response: Response, user_id: int,
+                                            limit: int = Query(20, ge=1, le=RECOMMENDATION_MAX_LIMIT),
+                                            cursor: Optional[str] = None,
+                                            per_offer: int = Query(5, ge=1, le=USER_EXCHANGE_MAX_PER_OFFER)):
+    """
+    Récupère les recommandations d'échange pour un utilisateur
+
+    Pagination keyset sur les offres de l'utilisateur (triées par ID) :
+    `limit` offres par page, les `per_offer` meilleures correspondances par
+    offre ; la page suivante commence après l'offre du curseur (X-Next-Cursor).
+    """
+    after_offer_id = decode_cursor(cursor, 1)[0] if cursor else None
+    
+    async def compute():
+        async with neo4j_session() as session:
+            # Page d'offres de l'utilisateur, puis top-k des correspondances par offre
+            result = await session.run(USER_EXCHANGE_RECOMMENDATIONS_QUERY, userId=user_id, afterOfferId=after_offer_id,
+                                       limit=limit + 1, perOffer=per_offer)
             
             user_recommendations = {}
-            for record in result:
+            has_more = False
+            async for record in result:
+                # Ligne supplémentaire : il reste des offres après la page
+                if len(user_recommendations) == limit:
+                    has_more = True
+                    break
                 user_recommendations[record["userOfferId"]] = {
                     "userOffer": {
                         "id": record["userOfferId"],
@@ -982,13 +1170,23 @@ async def get_user_exchange_recommendations(user_id: int, limit: int = 20):
             
             logger.info(f"✅ Recommandations récupérées pour l'utilisateur {user_id}")
             
+            last_offer_id = next(reversed(user_recommendations), None)
             return {
                 "success": True,
                 "data": user_recommendations,
                 "totalOffers": len(user_recommendations),
+                "nextCursor": encode_cursor((last_offer_id,)) if has_more else None,
                 "message": f"Recommandations d'échange pour l'utilisateur {user_id}"
             }
-            
+    
+    try:
+        result = await recommendation_cache.get_or_compute(
+            f"user:{per_offer}", user_id, limit, compute, tags=[user_tag(user_id)], cursor=cursor
+        )
+        set_next_cursor(response, result["nextCursor"])
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erreur récupération recommandations utilisateur {user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur recommandations: {str(e)}")
@@ -998,22 +1196,54 @@ async def startup_event():
     """Initialisation du service"""
     logger.info("🚀 Démarrage du service de recommandation MyReprise")
     
+    # Driver partagé par tous les endpoints, fermé uniquement à l'arrêt
+    init_driver()
+    
     # Test de connexion Neo4j
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            result = session.run("RETURN 'connected' as status")
-            record = result.single()
+        async with neo4j_session() as session:
+            result = await session.run("RETURN 'connected' as status")
+            record = await result.single()
             logger.info(f"✅ Neo4j connecté: {record['status']}")
     except Exception as e:
         logger.error(f"❌ Erreur connexion Neo4j: {e}")
+    
+    # Niveau partagé (Redis) du cache des recommandations, s'il est configuré
+    await recommendation_cache.connect()
+    
+    # Compteurs de tendance reconstruits depuis le graphe
+    await trending_service.start()
+    
+    # Job de matérialisation des recommandations par utilisateur
+    recommendation_materializer.start()
+    
+    # Écriture des interactions par lots
+    interaction_buffer.start()
+    
+    # Filtrage collaboratif item-item (construit en arrière-plan)
+    item_cf_engine.start()
+    
+    # Graphe kNN des offres similaires (embeddings du chatbot)
+    similar_offers_knn.start()
+    
+    # Index des chaînes d'échange (reconstruit s'il est vide)
+    exchange_chain_index.start()
+    
+    # Cycles d'échange multi-parties (instantané périodique du graphe des souhaits)
+    exchange_cycle_engine.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Nettoyage à l'arrêt du service"""
-    global driver
-    if driver:
-        driver.close()
+    await interaction_buffer.stop()
+    await item_cf_engine.stop()
+    await similar_offers_knn.stop()
+    await exchange_chain_index.stop()
+    await exchange_cycle_engine.stop()
+    await recommendation_materializer.stop()
+    await trending_service.stop()
+    await recommendation_cache.close()
+    await close_driver()
     logger.info("👋 Service de recommandation arrêté")
 
 if __name__ == "__main__":
@@ -0,0 +1,393 @@
+"""
+Recommandations matérialisées par utilisateur
+Top-N précalculé par utilisateur et par stratégie (catégorie, collaborative, marque),
+stocké dans un fichier clé-valeur local (SQLite) et rafraîchi incrémentalement
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration de la matérialisation
+MATERIALIZED_PATH = os.getenv('MATERIALIZED_RECOMMENDATIONS_PATH', 'materialized_recommendations.sqlite3')
+MATERIALIZED_TOP_N = int(os.getenv('MATERIALIZED_TOP_N', '50'))
+MATERIALIZED_REFRESH_INTERVAL = float(os.getenv('MATERIALIZED_REFRESH_INTERVAL', '30'))
+MATERIALIZED_MAX_AGE = float(os.getenv('MATERIALIZED_MAX_AGE', '3600'))
+MATERIALIZED_CONCURRENCY = int(os.getenv('MATERIALIZED_CONCURRENCY', '8'))
+
+# Requêtes Cypher des stratégies matérialisées, classées par (score, ID) décroissants
+# pour la pagination keyset (pagination.py)
+CATEGORY_RECOMMENDATIONS_QUERY = """
+    MATCH (u:User {id: $userId})-[:LIKED]->(liked:Offer)-[:BELONGS_TO]->(cat:Category)
+    MATCH (cat)<-[:BELONGS_TO]-(similar:Offer)
+    WHERE similar.status = 'available'
+      AND similar.sellerId <> u.id
+      AND NOT (u)-[:VIEWED]->(similar)
+    WITH similar, count(*) as relevanceScore, cat.nameFr as category
+    ORDER BY relevanceScore DESC, similar.id DESC
+    LIMIT $limit
+    RETURN similar.id as id, similar.title as title, similar.price as price,
+           relevanceScore, category
+"""
+
+COLLABORATIVE_RECOMMENDATIONS_QUERY = """
+    MATCH (u:User {id: $userId})-[:LIKED]->(o:Offer)<-[:LIKED]-(similar:User)
+    WHERE similar.id <> u.id
+    WITH similar, count(o) as commonLikes
+    ORDER BY commonLikes DESC
+    LIMIT 10
+    MATCH (similar)-[:LIKED]->(recommended:Offer)
+    WHERE recommended.status = 'available'
+      AND recommended.sellerId <> u.id
+      AND NOT (u)-[:LIKED]->(recommended)
+      AND NOT (u)-[:VIEWED]->(recommended)
+    WITH recommended, max(commonLikes) as relevanceScore
+    RETURN recommended.id as id, recommended.title as title,
+           recommended.price as price, relevanceScore
+    ORDER BY relevanceScore DESC, id DESC
+    LIMIT $limit
+"""
+
+BRAND_RECOMMENDATIONS_QUERY = """
+    MATCH (u:User {id: $userId})-[:LIKED]->(liked:Offer)-[:IS_BRAND]->(brand:Brand)
+    MATCH (brand)<-[:IS_BRAND]-(similar:Offer)
+    WHERE similar.status = 'available'
+      AND similar.sellerId <> u.id
+      AND NOT (u)-[:LIKED]->(similar)
+    WITH DISTINCT similar, brand.nameFr as brandName
+    // Sans score : les plus récentes d'abord (IDs attribués à la création)
+    ORDER BY similar.id DESC
+    RETURN similar.id as id, similar.title as title, similar.price as price,
+           brandName as brand
+    LIMIT $limit
+"""
+
+STRATEGY_QUERIES = {
+    "category": CATEGORY_RECOMMENDATIONS_QUERY,
+    "collaborative": COLLABORATIVE_RECOMMENDATIONS_QUERY,
+    "brand": BRAND_RECOMMENDATIONS_QUERY
+}
+
+async def run_strategy_query(strategy: str, user_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Exécute la requête live d'une stratégie pour un utilisateur"""
+    async with neo4j_session() as session:
+        result = await session.run(STRATEGY_QUERIES[strategy], userId=user_id, limit=limit)
+        return [dict(record) async for record in result]
+
+class MaterializedStore:
+    """
+    Stockage clé-valeur local des recommandations précalculées
+
+    Une ligne par (utilisateur, stratégie) : la liste top-N sérialisée en JSON
+    compact et l'horodatage du calcul.
+    """
+
+    def __init__(self, path: str = MATERIALIZED_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS recommendations (
+                user_id INTEGER NOT NULL,
+                strategy TEXT NOT NULL,
+                computed_at REAL NOT NULL,
+                items TEXT NOT NULL,
+                PRIMARY KEY (user_id, strategy)
+            ) WITHOUT ROWID
+        """)
+
+    def get(self, user_id: int, strategy: str) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """Retourne (recommandations, horodatage du calcul) ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT items, computed_at FROM recommendations WHERE user_id = ? AND strategy = ?",
+                (user_id, strategy)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put_many(self, rows: Iterable[Tuple[int, str, float, List[Dict[str, Any]]]]):
+        """Enregistre plusieurs (utilisateur, stratégie, horodatage, recommandations) en une transaction"""
+        payload = [
+            (user_id, strategy, computed_at, json.dumps(items, separators=(',', ':'), default=str))
+            for user_id, strategy, computed_at, items in rows
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO recommendations (user_id, strategy, computed_at, items) VALUES (?, ?, ?, ?)",
+                    payload
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def users_older_than(self, timestamp: float, limit: int) -> List[int]:
+        """Utilisateurs dont au moins une stratégie a été calculée avant timestamp"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT user_id FROM recommendations WHERE computed_at < ? LIMIT ?",
+                (timestamp, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT user_id) FROM recommendations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RecommendationMaterializer:
+    """
+    Job de matérialisation des recommandations par utilisateur
+
+    - Un utilisateur dont les interactions changent est marqué « sale » : il
+      est servi en live jusqu'au prochain cycle, qui recalcule ses stratégies.
+    - Un utilisateur demandé sans entrée matérialisée est ajouté au prochain cycle.
+    - Les entrées plus anciennes que max_age sont recalculées (les likes des
+      autres utilisateurs et le statut des offres évoluent aussi).
+    - Une offre vendue ou supprimée est retirée des entrées servies dès la
+      synchronisation, sans attendre leur recalcul.
+    """
+
+    def __init__(self,
+                 path: str = MATERIALIZED_PATH,
+                 top_n: int = MATERIALIZED_TOP_N,
+                 refresh_interval: float = MATERIALIZED_REFRESH_INTERVAL,
+                 max_age: float = MATERIALIZED_MAX_AGE,
+                 concurrency: int = MATERIALIZED_CONCURRENCY,
+                 max_users_per_cycle: int = 2000):
+        self.path = path
+        self.top_n = top_n
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.max_users_per_cycle = max_users_per_cycle
+
+        self.store: Optional[MaterializedStore] = None
+        self._dirty: Set[int] = set()
+        self._pending: Set[int] = set()
+        # Utilisateurs sales du cycle en cours : servis en live jusqu'à leur recalcul
+        self._refreshing: Set[int] = set()
+        # Nombre d'utilisateurs matérialisés, compté hors de la boucle à chaque cycle
+        self._materialized_users = 0
+        # Offres devenues indisponibles -> horodatage du changement de statut
+        self._unavailable: Dict[int, float] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "dirty_fallbacks": 0,
+            "unavailable_filtered": 0,
+            "refreshed_users": 0,
+            "failed_users": 0,
+            "last_cycle_ms": 0.0
+        }
+
+    def open(self):
+        if self.store is None:
+            self.store = MaterializedStore(self.path)
+
+    def mark_dirty(self, user_id: int):
+        """Signale un changement d'interactions : l'utilisateur sera recalculé"""
+        self._dirty.add(user_id)
+
+    def set_offer_available(self, offer_id: int, available: bool):
+        """Statut d'une offre synchronisé : une offre indisponible n'est plus servie"""
+        if available:
+            self._unavailable.pop(offer_id, None)
+        else:
+            self._unavailable[offer_id] = time.time()
+
+    def get(self, user_id: int, strategy: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retourne les recommandations matérialisées, ou None s'il faut interroger Neo4j
+
+        Args:
+            user_id: ID de l'utilisateur
+            strategy: category, collaborative ou brand
+            limit: Nombre de recommandations demandées
+        """
+        if self.store is None or limit > self.top_n:
+            return None
+
+        if user_id in self._dirty or user_id in self._refreshing:
+            self.metrics["dirty_fallbacks"] += 1
+            return None
+
+        try:
+            entry = self.store.get(user_id, strategy)
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture recommandations matérialisées {user_id}/{strategy}: {e}")
+            return None
+
+        if entry is None or time.time() - entry[1] > self.max_age:
+            self.metrics["misses"] += 1
+            self._pending.add(user_id)
+            return None
+
+        items = entry[0]
+        if self._unavailable:
+            available = [item for item in items if item.get("id") not in self._unavailable]
+            if len(available) < len(items):
+                self.metrics["unavailable_filtered"] += len(items) - len(available)
+                # Top-N tronqué : la page demandée peut dépasser ce qui reste
+                if len(available) < limit and len(items) >= self.top_n:
+                    self._pending.add(user_id)
+                    self.metrics["misses"] += 1
+                    return None
+                items = available
+
+        self.metrics["hits"] += 1
+        return items[:limit]
+
+    async def refresh_users(self, user_ids: Iterable[int]) -> int:
+        """
+        Recalcule toutes les stratégies des utilisateurs donnés
+
+        Un utilisateur en échec est remis dans les utilisateurs sales (s'il
+        l'était) ou demandés, pour être retenté au cycle suivant.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def compute(user_id: int):
+            async with semaphore:
+                computed_at = time.time()
+                rows = []
+                for strategy in STRATEGY_QUERIES:
+                    items = await run_strategy_query(strategy, user_id, self.top_n)
+                    rows.append((user_id, strategy, computed_at, items))
+                return rows
+
+        results = await asyncio.gather(*(compute(user_id) for user_id in user_ids), return_exceptions=True)
+
+        rows = []
+        refreshed = 0
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                self.metrics["failed_users"] += 1
+                logger.error(f"❌ Erreur matérialisation utilisateur {user_id}: {result}")
+                self._requeue([user_id])
+                continue
+            rows.extend(result)
+            refreshed += 1
+
+        if rows:
+            try:
+                await asyncio.to_thread(self.store.put_many, rows)
+            except Exception:
+                self._requeue({row[0] for row in rows})
+                raise
+        self.metrics["refreshed_users"] += refreshed
+        return refreshed
+
+    def _requeue(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            if user_id in self._refreshing:
+                self._dirty.add(user_id)
+            else:
+                self._pending.add(user_id)
+
+    async def run_once(self) -> int:
+        """Un cycle : utilisateurs sales, demandés, puis entrées trop anciennes"""
+        self.open()
+        start = time.perf_counter()
+
+        # Les entrées antérieures à max_age ne sont plus servies : statuts inutiles
+        horizon = time.time() - self.max_age
+        self._unavailable = {
+            offer_id: changed_at for offer_id, changed_at in self._unavailable.items() if changed_at >= horizon
+        }
+
+        dirty, self._dirty = self._dirty, set()
+        pending, self._pending = self._pending, set()
+        users = dirty | pending
+        self._refreshing = dirty
+
+        try:
+            room = self.max_users_per_cycle - len(users)
+            if room > 0:
+                expired = await asyncio.to_thread(self.store.users_older_than, time.time() - self.max_age, room)
+                users.update(expired)
+            refreshed = await self.refresh_users(users)
+        except Exception:
+            # Cycle interrompu : les utilisateurs sales et demandés restent à recalculer
+            self._requeue(dirty | pending)
+            raise
+        finally:
+            self._refreshing = set()
+
+        try:
+            self._materialized_users = await asyncio.to_thread(self.store.count)
+        except Exception as e:
+            logger.error(f"❌ Erreur comptage des recommandations matérialisées: {e}")
+
+        self.metrics["last_cycle_ms"] = (time.perf_counter() - start) * 1000
+        if refreshed:
+            logger.info(f"📦 {refreshed} utilisateurs matérialisés en {self.metrics['last_cycle_ms']:.0f} ms")
+        return refreshed
+
+    def start(self):
+        """Démarre le job de rafraîchissement périodique"""
+        self.open()
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"📦 Matérialisation démarrée (top {self.top_n}, cycle {self.refresh_interval}s)")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Erreur cycle de matérialisation: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"] + self.metrics["dirty_fallbacks"]
+        return {
+            "materialized_users": self._materialized_users,
+            "dirty_users": len(self._dirty),
+            "pending_users": len(self._pending),
+            "unavailable_offers": len(self._unavailable),
+            "top_n": self.top_n,
+            **self.metrics,
+            "hit_ratio": self.metrics["hits"] / lookups if lookups else 0.0
+        }
+
+# Instance globale du job de matérialisation
+recommendation_materializer = RecommendationMaterializer()
@@ -0,0 +1,136 @@
+"""
+Accès Neo4j asynchrone pour le service Graph
+Driver unique partagé (créé au démarrage, fermé à l'arrêt), configuration
+du pool (taille, délai d'acquisition, fetch size) et métriques du pool
+"""
+
+from neo4j import AsyncGraphDatabase, AsyncDriver, AsyncSession
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Optional
+import asyncio
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configuration Neo4j
+NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
+NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD', 'neo4j123')
+
+# Configuration du pool de connexions
+NEO4J_MAX_POOL_SIZE = int(os.getenv('NEO4J_MAX_POOL_SIZE', '50'))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', '10'))
+NEO4J_FETCH_SIZE = int(os.getenv('NEO4J_FETCH_SIZE', '1000'))
+
+class PoolMetrics:
+    """
+    Métriques du pool de sessions
+
+    Le nombre de sessions ouvertes est borné à la taille du pool par un
+    sémaphore : le temps passé à l'attendre est le temps d'acquisition.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.semaphore = asyncio.Semaphore(max_size)
+        self.in_use = 0
+        self.waiting = 0
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def acquire(self, timeout: float):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        self.acquisitions += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "idle": self.max_size - self.in_use,
+            "waiting": self.waiting,
+            "acquisitions": self.acquisitions,
+            "acquisition_timeouts": self.timeouts,
+            "acquisition_wait_avg_ms": self.total_wait_ms / self.acquisitions if self.acquisitions else 0.0,
+            "acquisition_wait_max_ms": self.max_wait_ms
+        }
+
+# Driver Neo4j partagé par main.py et les routers
+_driver: Optional[AsyncDriver] = None
+_pool_metrics: Optional[PoolMetrics] = None
+
+def create_driver() -> AsyncDriver:
+    """Crée un driver Neo4j asynchrone avec la configuration du pool"""
+    logger.info(
+        f"🔌 Driver Neo4j asynchrone: pool={NEO4J_MAX_POOL_SIZE}, "
+        f"acquisition={NEO4J_ACQUISITION_TIMEOUT}s, fetch_size={NEO4J_FETCH_SIZE}"
+    )
+    return AsyncGraphDatabase.driver(
+        NEO4J_URI,
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT
+    )
+
+def init_driver() -> AsyncDriver:
+    """Crée le driver partagé (au démarrage du service)"""
+    global _driver, _pool_metrics
+    if _driver is None:
+        _driver = create_driver()
+        _pool_metrics = PoolMetrics(NEO4J_MAX_POOL_SIZE)
+    return _driver
+
+def get_driver() -> AsyncDriver:
+    """Récupère le driver partagé (créé à la demande s'il n'existe pas encore)"""
+    return _driver if _driver is not None else init_driver()
+
+async def close_driver():
+    """Ferme le driver partagé et son pool (à l'arrêt du service)"""
+    global _driver, _pool_metrics
+    if _driver is not None:
+        await _driver.close()
+        _driver = None
+        _pool_metrics = None
+        logger.info("🔌 Driver Neo4j fermé")
+
+def open_session(driver: AsyncDriver, **kwargs) -> AsyncSession:
+    """Ouvre une session asynchrone avec la fetch size configurée"""
+    return driver.session(fetch_size=NEO4J_FETCH_SIZE, **kwargs)
+
+@asynccontextmanager
+async def neo4j_session(**kwargs) -> AsyncIterator[AsyncSession]:
+    """Session sur le driver partagé, comptabilisée dans les métriques du pool"""
+    driver = get_driver()
+    metrics = _pool_metrics
+    await metrics.acquire(NEO4J_ACQUISITION_TIMEOUT)
+    try:
+        async with open_session(driver, **kwargs) as session:
+            yield session
+    finally:
+        metrics.release()
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Métriques du pool de sessions (vide si le driver n'est pas initialisé)"""
+    if _pool_metrics is None:
+        return {"initialized": False}
+    return {"initialized": True, **_pool_metrics.stats()}
@@ -0,0 +1,98 @@
+"""
+Pagination par curseur (keyset) des recommandations
+Les classements sont ordonnés par (score décroissant, ID décroissant) ; le
+curseur opaque porte la clé de la dernière offre reçue et la page suivante
+reprend strictement après cette clé. Le curseur de la page suivante est
+renvoyé dans l'en-tête X-Next-Cursor
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import base64
+import json
+import os
+
+from fastapi import HTTPException, Response
+
+# Fenêtre initiale du classement pour une page suivante, et profondeur maximale atteignable
+RECOMMENDATION_PAGE_WINDOW = int(os.getenv('RECOMMENDATION_PAGE_WINDOW', '50'))
+RECOMMENDATION_MAX_DEPTH = int(os.getenv('RECOMMENDATION_MAX_DEPTH', '500'))
+
+# Taille de page maximale acceptée par les endpoints paginés
+RECOMMENDATION_MAX_LIMIT = int(os.getenv('RECOMMENDATION_MAX_LIMIT', '100'))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+RankKey = Tuple[float, int]
+
+def ranking_key(item: Dict[str, Any], score: Optional[str] = "relevanceScore", key: str = "id") -> RankKey:
+    """Clé de classement (score, ID) ; sans score, le classement suit l'ID seul"""
+    value = item.get(score) if score else None
+    return (float(value) if value is not None else 0.0, item[key])
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(',', ':')).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """Clé portée par un curseur ; 400 si le curseur est illisible"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values)):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    return tuple(values)
+
+def slice_after(items: List[Dict[str, Any]],
+                after: Optional[RankKey],
+                limit: int,
+                key: Callable[[Dict[str, Any]], RankKey] = ranking_key) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Page de `limit` éléments classés strictement après la clé `after`
+
+    Le classement est trié par clé décroissante : une offre disparue du
+    classement (vendue, re-classée) ne fait ni sauter ni répéter d'élément.
+
+    Returns:
+        (page, curseur de la page suivante ou None)
+    """
+    ranked = sorted(items, key=key, reverse=True)
+    if after is not None:
+        ranked = [item for item in ranked if key(item) < after]
+    page = ranked[:limit]
+    return page, encode_cursor(key(page[-1])) if len(ranked) > limit else None
+
+async def paginate(fetch: Callable[[int], Awaitable[List[Dict[str, Any]]]],
+                   limit: int,
+                   cursor: Optional[str],
+                   response: Response,
+                   key: Callable[[Dict[str, Any]], RankKey] = ranking_key) -> List[Dict[str, Any]]:
+    """
+    Pagine un classement calculé par fetch(n) (n premiers éléments, ordonnés par clé)
+
+    Première page : fetch(limit + 1), le surplus ne sert qu'à savoir s'il
+    existe une suite. Pages suivantes : la fenêtre est doublée (à partir de
+    RECOMMENDATION_PAGE_WINDOW) jusqu'à contenir une page complète après la
+    clé du curseur, ou jusqu'à la fin du classement. Un curseur au-delà de
+    RECOMMENDATION_MAX_DEPTH donne 410 : le client repart de la première page.
+    """
+    after = decode_cursor(cursor, 2) if cursor else None
+    window = limit + 1 if after is None else max(RECOMMENDATION_PAGE_WINDOW, limit + 1)
+    while True:
+        items = await fetch(window)
+        remaining = items if after is None else [item for item in items if key(item) < after]
+        if len(remaining) > limit or len(items) < window:
+            break
+        if window >= RECOMMENDATION_MAX_DEPTH:
+            if after is not None and not remaining:
+                raise HTTPException(status_code=410, detail="Curseur au-delà de la profondeur du classement")
+            break
+        window = min(window * 2, RECOMMENDATION_MAX_DEPTH)
+
+    page, next_cursor = slice_after(items, after, limit, key)
+    set_next_cursor(response, next_cursor)
+    return page
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
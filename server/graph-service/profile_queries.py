@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Suite de non-régression des plans Cypher du service Graph (nécessite un Neo4j de test)
+
+Exécute chaque requête *_QUERY des modules du service avec PROFILE sur un jeu
+de données synthétique déterministe, relève les db hits, les lignes et les
+opérateurs du plan, et échoue si une requête dépasse le budget enregistré
+dans query_budgets.json ou utilise un opérateur interdit (parcours complet
+d'un label pour une requête ancrée sur un identifiant, par exemple).
+
+Les requêtes d'écriture sont profilées dans une transaction annulée : la base
+de test n'est jamais modifiée en dehors de l'amorçage.
+
+Neo4j de test (jamais la base du service) :
+    docker run --rm -p 7688:7687 -e NEO4J_AUTH=neo4j/profile123 neo4j:5.15
+
+Une base injoignable, une requête sans budget ou des seuils non encore
+enregistrés font échouer la suite (code de sortie non nul).
+
+Usage:
+    python profile_queries.py                 # vérification des budgets
+    python profile_queries.py --record        # enregistre les budgets mesurés (+ marge)
+    python profile_queries.py --only 'main\\.' --report plans.json
+    python profile_queries.py --skip-if-unavailable   # poste sans Neo4j de test
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import random
+import re
+import sys
+
+from neo4j import AsyncGraphDatabase
+
+from exchange_chains import EXCHANGE_CHAIN_SCHEMA_QUERIES, build_chains
+
+# Base de test dédiée (port distinct de la base du service)
+PROFILE_NEO4J_URI = os.getenv('PROFILE_NEO4J_URI', 'bolt://localhost:7688')
+PROFILE_NEO4J_USER = os.getenv('PROFILE_NEO4J_USER', 'neo4j')
+PROFILE_NEO4J_PASSWORD = os.getenv('PROFILE_NEO4J_PASSWORD', 'profile123')
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_budgets.json')
+
+# Modules dont les requêtes *_QUERY sont profilées
+PROFILED_MODULES = (
+    "main",
+    "user_preferences",
+    "materialized_recommendations",
+    "trending_counters",
+    "interaction_buffer",
+    "item_cf",
+    "similar_offers_knn",
+    "exchange_chains",
+    "exchange_cycles"
+)
+
+# Une requête ancrée sur un identifiant ne doit jamais parcourir tout un label
+ANCHORED_PATTERN = re.compile(r"\{(?:id|sellerId): ")
+SCAN_OPERATORS = ["AllNodesScan", "NodeByLabelScan"]
+
+SEED_BATCH_SIZE = 1000
+
+# Schéma effectivement créé en production : contraintes de la migration
+# MySQL -> Neo4j (scripts/migrate_mysql_to_neo4j.py) pour les labels du jeu de
+# données, puis index créés par le service (chaînes d'échange)
+SCHEMA_QUERIES = (
+    "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+    "CREATE CONSTRAINT category_id IF NOT EXISTS FOR (c:Category) REQUIRE c.id IS UNIQUE",
+    "CREATE CONSTRAINT brand_id IF NOT EXISTS FOR (b:Brand) REQUIRE b.id IS UNIQUE",
+    "CREATE CONSTRAINT offer_id IF NOT EXISTS FOR (o:Offer) REQUIRE o.id IS UNIQUE"
+) + EXCHANGE_CHAIN_SCHEMA_QUERIES
+
+SEED_MARKER_QUERY = "MATCH (m:ProfileSeedMarker) RETURN m.signature as signature"
+NODE_COUNT_QUERY = "MATCH (n) RETURN count(n) as nodes"
+WIPE_QUERY = "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+
+SEED_USERS_QUERY = """
+    UNWIND $rows AS row
+    CREATE (u:User {id: row.id, firstName: row.firstName, lastName: row.lastName,
+                    email: row.email, role: 'user', isVerified: true})
+"""
+
+SEED_CATEGORIES_QUERY = """
+    UNWIND $rows AS row
+    CREATE (c:Category {id: row.id, nameFr: row.nameFr, nameAr: row.nameFr, parentId: row.parentId})
+"""
+
+SEED_BRANDS_QUERY = """
+    UNWIND $rows AS row
+    CREATE (b:Brand {id: row.id, name: row.name})
+"""
+
+SEED_OFFERS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (c:Category {id: row.categoryId})
+    CREATE (o:Offer {id: row.id, title: row.title, price: row.price, status: row.status,
+                     sellerId: row.sellerId, categoryId: row.categoryId, brandId: row.brandId,
+                     isDeleted: false, createdAt: row.createdAt, updatedAt: row.createdAt})
+    CREATE (o)-[:BELONGS_TO]->(c)
+    WITH o, row
+    OPTIONAL MATCH (b:Brand {id: row.brandId})
+    FOREACH (_ IN CASE WHEN b IS NULL THEN [] ELSE [1] END | CREATE (o)-[:IS_BRAND]->(b))
+"""
+
+SEED_MATCHED_WITH_QUERY = """
+    UNWIND $rows AS row
+    MATCH (o:Offer {id: row.offerId}), (c:Category {id: row.categoryId})
+    CREATE (o)-[:MATCHED_WITH {createdAt: row.createdAt}]->(c)
+"""
+
+SEED_INTERACTIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (u:User {id: row.userId}), (o:Offer {id: row.offerId})
+    FOREACH (_ IN CASE WHEN row.type = 'VIEWED' THEN [1] ELSE [] END |
+        CREATE (u)-[:VIEWED {timestamp: row.timestamp, duration: row.duration}]->(o))
+    FOREACH (_ IN CASE WHEN row.type = 'LIKED' THEN [1] ELSE [] END |
+        CREATE (u)-[:LIKED {timestamp: row.timestamp}]->(o))
+    FOREACH (_ IN CASE WHEN row.type = 'SEARCHES' THEN [1] ELSE [] END |
+        CREATE (u)-[:SEARCHES {timestamp: row.timestamp, keywords: row.keywords}]->(o))
+"""
+
+SEED_EXCHANGES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (offered:Offer {id: row.offeredId}), (requested:Offer {id: row.requestedId})
+    CREATE (e:Exchange {id: row.id, status: row.status})
+    CREATE (e)-[:OFFERS]->(offered)
+    CREATE (e)-[:REQUESTS]->(requested)
+"""
+
+SEED_REPLACED_BY_QUERY = """
+    UNWIND $rows AS row
+    MATCH (old:Offer {id: row.oldId}), (new:Offer {id: row.newId})
+    SET old.replacedByOffer = new.id
+    CREATE (old)-[:REPLACED_BY]->(new)
+"""
+
+SEED_CHAIN_OFFERS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (o:Offer {id: row.id})
+    SET o.chainId = row.chainId, o.chainPosition = row.position
+"""
+
+SEED_CHAINS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (head:Offer {id: row.headOfferId}), (tail:Offer {id: row.tailOfferId})
+    CREATE (:ExchangeChain {id: row.headOfferId, headOfferId: row.headOfferId,
+                            tailOfferId: row.tailOfferId, sellerId: head.sellerId,
+                            length: row.length, gain: tail.price - head.price})
+"""
+
+# Utilisateur et offre de référence des requêtes profilées (profil le plus actif)
+PROFILE_USER_ID = 1
+PROFILE_OFFER_ID = 1
+PROFILE_REPLACEMENT_ID = 2
+PROFILE_OWN_OFFERS = 20
+
+def generate_dataset(users: int, offers: int, categories: int, brands: int) -> Dict[str, Any]:
+    """Jeu de données synthétique déterministe (mêmes tailles -> mêmes données)"""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    roots = max(1, categories // 5)
+
+    data: Dict[str, Any] = {
+        "users": [
+            {"id": i, "firstName": f"Prénom{i}", "lastName": f"Nom{i}", "email": f"user{i}@example.test"}
+            for i in range(1, users + 1)
+        ],
+        "categories": [
+            {"id": i, "nameFr": f"Catégorie {i}", "parentId": None if i <= roots else rng.randint(1, roots)}
+            for i in range(1, categories + 1)
+        ],
+        "brands": [{"id": i, "name": f"Marque {i}"} for i in range(1, brands + 1)]
+    }
+
+    # Popularité des offres en loi de puissance, comme sur la plateforme
+    offer_ids = list(range(1, offers + 1))
+    popularity = [1.0 / rank ** 0.8 for rank in offer_ids]
+
+    data["offers"] = [
+        {
+            "id": i,
+            "title": f"Offre {i}",
+            "price": float(rng.randint(5, 500)),
+            "status": "available" if i <= PROFILE_OWN_OFFERS or rng.random() < 0.85 else "exchanged",
+            "sellerId": PROFILE_USER_ID if i <= PROFILE_OWN_OFFERS else rng.randint(2, users),
+            "categoryId": rng.randint(1, categories),
+            "brandId": rng.randint(1, brands) if rng.random() < 0.8 else None,
+            "createdAt": now - timedelta(days=rng.randint(0, 180))
+        }
+        for i in offer_ids
+    ]
+
+    data["matched_with"] = [
+        {"offerId": offer["id"], "categoryId": category_id, "createdAt": offer["createdAt"]}
+        for offer in data["offers"]
+        for category_id in rng.sample(range(1, categories + 1),
+                                      rng.randint(1 if offer["id"] <= PROFILE_OWN_OFFERS else 0, 3))
+    ]
+
+    interactions = {}
+    for user_id in range(1, users + 1):
+        views, likes, searches = (150, 40, 10) if user_id == PROFILE_USER_ID else (
+            rng.randint(0, 30), rng.randint(0, 10), rng.randint(0, 3))
+        for kind, count in (("VIEWED", views), ("LIKED", likes), ("SEARCHES", searches)):
+            for offer_id in rng.choices(offer_ids, weights=popularity, k=count):
+                interactions[(user_id, offer_id, kind)] = {
+                    "userId": user_id, "offerId": offer_id, "type": kind,
+                    "timestamp": now - timedelta(hours=rng.randint(0, 24 * 14)),
+                    "duration": rng.randint(1, 120), "keywords": f"mot{rng.randint(1, 50)}"
+                }
+    data["interactions"] = list(interactions.values())
+
+    data["exchanges"] = [
+        {"id": i, "status": "completed" if rng.random() < 0.7 else "pending",
+         "offeredId": rng.choice(offer_ids), "requestedId": rng.choice(offer_ids)}
+        for i in range(1, offers // 10 + 1)
+    ]
+
+    # Chaînes d'échange entre offres d'un même vendeur (hors offres de référence)
+    by_seller: Dict[int, List[int]] = {}
+    for offer in data["offers"][PROFILE_OWN_OFFERS:]:
+        by_seller.setdefault(offer["sellerId"], []).append(offer["id"])
+    edges = [
+        (seller_offers[k], seller_offers[k + 1])
+        for seller_offers in by_seller.values() if len(seller_offers) > 1 and rng.random() < 0.3
+        for k in range(len(seller_offers) - 1)
+    ]
+    chains = build_chains(edges)
+    data["replaced_by"] = [{"oldId": old_id, "newId": new_id} for old_id, new_id in edges]
+    data["chain_offers"] = [
+        {"id": offer_id, "chainId": chain[0], "position": position}
+        for chain in chains
+        for position, offer_id in enumerate(chain)
+    ]
+    data["chains"] = [
+        {"headOfferId": chain[0], "tailOfferId": chain[-1], "length": len(chain) - 1}
+        for chain in chains
+    ]
+    # Les budgets dépendent des tailles ; les interactions sont datées par
+    # rapport au jour d'amorçage, d'où un réamorçage quotidien
+    data["signature"] = f"users={users},offers={offers},categories={categories},brands={brands}"
+    data["seed_signature"] = f"{data['signature']},day={now.date()}"
+    data["now"] = now
+    return data
+
+async def seed(session, data: Dict[str, Any]):
+    """Crée le schéma de production puis charge le jeu de données par lots"""
+    for query in SCHEMA_QUERIES:
+        await (await session.run(query)).consume()
+    await (await session.run("CALL db.awaitIndexes(300)")).consume()
+
+    steps = (
+        (SEED_USERS_QUERY, "users"),
+        (SEED_CATEGORIES_QUERY, "categories"),
+        (SEED_BRANDS_QUERY, "brands"),
+        (SEED_OFFERS_QUERY, "offers"),
+        (SEED_MATCHED_WITH_QUERY, "matched_with"),
+        (SEED_INTERACTIONS_QUERY, "interactions"),
+        (SEED_EXCHANGES_QUERY, "exchanges"),
+        (SEED_REPLACED_BY_QUERY, "replaced_by"),
+        (SEED_CHAIN_OFFERS_QUERY, "chain_offers"),
+        (SEED_CHAINS_QUERY, "chains")
+    )
+    for query, key in steps:
+        rows = data[key]
+        for i in range(0, len(rows), SEED_BATCH_SIZE):
+            await (await session.run(query, rows=rows[i:i + SEED_BATCH_SIZE])).consume()
+        print(f"   {key}: {len(rows)}")
+
+    await (await session.run("CREATE (:ProfileSeedMarker {signature: $signature})",
+                             signature=data["seed_signature"])).consume()
+
+async def prepare_database(session, data: Dict[str, Any], reseed: bool) -> bool:
+    """
+    Amorce la base de test si nécessaire
+
+    Refuse toute base non vide qui n'a pas été amorcée par ce script
+    (protection contre un PROFILE_NEO4J_URI pointant vers une vraie base).
+    """
+    marker = await (await session.run(SEED_MARKER_QUERY)).single()
+    if marker is None:
+        nodes = (await (await session.run(NODE_COUNT_QUERY)).single())["nodes"]
+        if nodes > 0:
+            print(f"❌ Base non vide ({nodes} nœuds) sans marqueur d'amorçage : refus de l'utiliser")
+            return False
+    elif marker["signature"] == data["seed_signature"] and not reseed:
+        return True
+    else:
+        print("🧹 Suppression de l'ancien jeu de données synthétique")
+        await (await session.run(WIPE_QUERY)).consume()
+
+    print(f"🌱 Amorçage du jeu de données ({data['seed_signature']})")
+    await seed(session, data)
+    return True
+
+def discover_queries(pattern: Optional[str] = None) -> Dict[str, str]:
+    """
+    Toutes les constantes *_QUERY des modules profilés, par "module.NOM"
+
+    Une requête importée d'un autre module n'est profilée qu'une fois.
+    """
+    queries: Dict[str, str] = {}
+    for module_name in PROFILED_MODULES:
+        module = importlib.import_module(module_name)
+        for name, value in vars(module).items():
+            key = f"{module_name}.{name}"
+            if not name.endswith("_QUERY") or not isinstance(value, str) or value in queries.values():
+                continue
+            if not pattern or re.search(pattern, key):
+                queries[key] = value
+    return queries
+
+def sample_parameters(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Valeurs des paramètres $xxx, prises dans le jeu de données"""
+    now = data["now"]
+    chained = {row["id"] for row in data["chain_offers"]}
+    free_offers = [offer["id"] for offer in data["offers"][PROFILE_OWN_OFFERS:] if offer["id"] not in chained]
+    return {
+        "userId": PROFILE_USER_ID,
+        "offerId": PROFILE_OFFER_ID,
+        "categoryId": 1,
+        "replacedById": PROFILE_REPLACEMENT_ID,
+        "limit": 20,
+        "perOffer": 5,
+        "afterOfferId": None,
+        "userIds": [user["id"] for user in data["users"][:50]],
+        "offerIds": [offer["id"] for offer in data["offers"][:50]],
+        "since": int((now - timedelta(days=7)).timestamp()),
+        "bucketSeconds": 3600,
+        "likedWeight": 1.0,
+        "viewedWeight": 0.3,
+        "events": [
+            {"userId": interaction["userId"], "offerId": interaction["offerId"],
+             "type": {"VIEWED": "VIEW", "LIKED": "LIKE", "SEARCHES": "SEARCH"}[interaction["type"]],
+             "timestamp": int(now.timestamp() * 1000), "duration": interaction["duration"],
+             "keywords": interaction["keywords"]}
+            for interaction in data["interactions"][:500]
+        ],
+        "offers": data["chain_offers"][:5000],
+        # Chaînes nouvelles (les têtes existantes violeraient la contrainte d'unicité)
+        "chains": [
+            {"headOfferId": head, "tailOfferId": tail, "length": 1}
+            for head, tail in zip(free_offers[:1000:2], free_offers[1:1000:2])
+        ],
+        "createdAt": now.isoformat(),
+        "updatedAt": now.isoformat(),
+        "timestamp": now.isoformat(),
+        "status": "available",
+        "isDeleted": False,
+        "price": 100.0,
+        "sellerId": PROFILE_USER_ID
+    }
+
+def parameters_for(query: str, samples: Dict[str, Any]) -> Dict[str, Any]:
+    """Paramètres de la requête ; ceux sans valeur d'exemple valent null"""
+    return {name: samples.get(name) for name in set(re.findall(r"\$(\w+)", query))}
+
+def walk_plan(plan: Dict[str, Any]) -> Tuple[int, List[str]]:
+    """Somme des db hits et opérateurs (avec doublons) d'un plan PROFILE"""
+    db_hits = plan.get("dbHits", 0)
+    operators = [plan.get("operatorType", "").split("@")[0]]
+    for child in plan.get("children", []):
+        child_hits, child_operators = walk_plan(child)
+        db_hits += child_hits
+        operators += child_operators
+    return db_hits, operators
+
+async def profile_query(session, query: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """PROFILE dans une transaction toujours annulée (requêtes d'écriture comprises)"""
+    tx = await session.begin_transaction()
+    try:
+        result = await tx.run("PROFILE " + query, parameters)
+        summary = await result.consume()
+    finally:
+        await tx.rollback()
+
+    db_hits, operators = walk_plan(summary.profile)
+    return {
+        "db_hits": db_hits,
+        "rows": summary.profile.get("rows", 0),
+        "operators": sorted(set(operators)),
+        "elapsed_ms": (summary.result_available_after or 0) + (summary.result_consumed_after or 0)
+    }
+
+def default_budget(query: str) -> Dict[str, Any]:
+    """Budget d'une nouvelle requête : seuils à enregistrer, parcours interdits si ancrée"""
+    return {
+        "max_db_hits": None,
+        "max_rows": None,
+        "forbidden_operators": list(SCAN_OPERATORS) if ANCHORED_PATTERN.search(query) else ["AllNodesScan"]
+    }
+
+def check_budget(measure: Dict[str, Any], budget: Optional[Dict[str, Any]]) -> List[str]:
+    """Dépassements de budget (liste vide si la requête respecte son budget)"""
+    if budget is None:
+        return ["aucun budget (lancer --record)"]
+
+    failures = []
+    for metric in ("db_hits", "rows"):
+        limit = budget.get(f"max_{metric}")
+        if limit is None:
+            failures.append(f"{metric} sans seuil (lancer --record)")
+        elif measure[metric] > limit:
+            failures.append(f"{metric} {measure[metric]} > {limit}")
+    forbidden = sorted(set(measure["operators"]) & set(budget.get("forbidden_operators", [])))
+    if forbidden:
+        failures.append(f"opérateurs interdits: {', '.join(forbidden)}")
+    return failures
+
+def record_budgets(budgets: Dict[str, Any], queries: Dict[str, str], measures: Dict[str, Dict[str, Any]]):
+    """Seuils = mesure × marge (les opérateurs interdits existants sont conservés)"""
+    headroom = budgets.get("headroom", 1.25)
+    for key, measure in measures.items():
+        entry = budgets["queries"].get(key) or default_budget(queries[key])
+        entry["max_db_hits"] = math.ceil(measure["db_hits"] * headroom)
+        entry["max_rows"] = math.ceil(measure["rows"] * headroom)
+        budgets["queries"][key] = entry
+    budgets["queries"] = dict(sorted(budgets["queries"].items()))
+
+def load_budgets() -> Dict[str, Any]:
+    if not os.path.exists(BUDGETS_PATH):
+        return {"headroom": 1.25, "queries": {}}
+    with open(BUDGETS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_budgets(budgets: Dict[str, Any]):
+    tmp_path = f"{BUDGETS_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(budgets, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, BUDGETS_PATH)
+
+async def run(args) -> int:
+    data = generate_dataset(args.users, args.offers, args.categories, args.brands)
+    queries = discover_queries(args.only)
+    samples = sample_parameters(data)
+    budgets = load_budgets()
+
+    driver = AsyncGraphDatabase.driver(PROFILE_NEO4J_URI, auth=(PROFILE_NEO4J_USER, PROFILE_NEO4J_PASSWORD))
+    try:
+        try:
+            await driver.verify_connectivity()
+        except Exception as e:
+            if args.skip_if_unavailable:
+                print(f"⏭️ Neo4j de test injoignable ({PROFILE_NEO4J_URI}): {e} — suite ignorée")
+                return 0
+            print(f"❌ Neo4j de test injoignable ({PROFILE_NEO4J_URI}): {e}")
+            return 2
+
+        async with driver.session() as session:
+            if not await prepare_database(session, data, args.reseed):
+                return 2
+
+            measures, errors = {}, {}
+            for key, query in queries.items():
+                try:
+                    measures[key] = await profile_query(session, query, parameters_for(query, samples))
+                except Exception as e:
+                    errors[key] = str(e)
+    finally:
+        await driver.close()
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"dataset": data["signature"], "measures": measures, "errors": errors}, f, indent=2)
+
+    if args.record:
+        record_budgets(budgets, queries, measures)
+        budgets["dataset"] = data["signature"]
+        save_budgets(budgets)
+        print(f"💾 {len(measures)} budgets enregistrés dans {BUDGETS_PATH}")
+    elif budgets.get("dataset") not in (None, data["signature"]):
+        print(f"⚠️ Budgets enregistrés sur un autre jeu de données ({budgets['dataset']})")
+
+    print(f"\n📊 Plans PROFILE ({data['signature']})")
+    print(f"{'Requête':<58}{'db hits':>10}{'budget':>10}{'lignes':>8}  Statut")
+    failed = 0
+    for key in queries:
+        if key in errors:
+            failed += 1
+            print(f"{key:<58}{'-':>10}{'-':>10}{'-':>8}  ❌ erreur: {errors[key]}")
+            continue
+        measure = measures[key]
+        budget = budgets["queries"].get(key)
+        failures = check_budget(measure, budget)
+        limit = budget.get("max_db_hits") if budget else None
+        status = "✅" if not failures else "❌ " + "; ".join(failures)
+        failed += bool(failures)
+        print(f"{key:<58}{measure['db_hits']:>10}{'-' if limit is None else limit:>10}{measure['rows']:>8}  {status}")
+
+    print(f"\n{len(queries) - failed}/{len(queries)} requêtes dans leur budget")
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Non-régression des plans Cypher (PROFILE) du service Graph")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--offers", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--brands", type=int, default=30)
+    parser.add_argument("--only", help="expression régulière sur module.NOM_QUERY")
+    parser.add_argument("--record", action="store_true", help="enregistre les budgets mesurés")
+    parser.add_argument("--reseed", action="store_true", help="réamorce le jeu de données synthétique")
+    parser.add_argument("--skip-if-unavailable", action="store_true",
+                        help="réussit sans rien vérifier si le Neo4j de test est injoignable")
+    parser.add_argument("--report", help="fichier JSON des mesures (plans, opérateurs, durées)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Cache des réponses de recommandation
+Clé (endpoint, utilisateur ou offre, limit), niveau en mémoire et niveau
+partagé Redis optionnel, invalidation par étiquettes (utilisateur, offre)
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import json
+import os
+import time
+import logging
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - niveau partagé optionnel
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration du cache
+RECOMMENDATION_CACHE_TTL = float(os.getenv('RECOMMENDATION_CACHE_TTL', '300'))
+RECOMMENDATION_CACHE_LOCAL_TTL = float(os.getenv('RECOMMENDATION_CACHE_LOCAL_TTL', '30'))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv('RECOMMENDATION_CACHE_MAX_ENTRIES', '20000'))
+RECOMMENDATION_CACHE_REDIS_URL = os.getenv('RECOMMENDATION_CACHE_REDIS_URL', os.getenv('REDIS_URL', ''))
+
+KEY_PREFIX = "graph:rec:"
+TAG_PREFIX = "graph:rec-tag:"
+
+# Clés dont la valeur entière désigne une offre présente dans une réponse
+OFFER_ID_KEYS = ("id", "offerId", "userOfferId")
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def offer_tag(offer_id: int) -> str:
+    return f"offer:{offer_id}"
+
+def collect_offer_ids(value: Any, found: Optional[Set[int]] = None) -> Set[int]:
+    """Collecte les IDs d'offres contenus dans une réponse (listes et dictionnaires imbriqués)"""
+    found = set() if found is None else found
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in OFFER_ID_KEYS and isinstance(item, int):
+                found.add(item)
+            else:
+                collect_offer_ids(item, found)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            collect_offer_ids(item, found)
+    return found
+
+class LocalTier:
+    """Niveau en mémoire : LRU borné, TTL par entrée et index étiquette -> clés"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() >= entry[1]:
+            self._remove(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[0]
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str]):
+        self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (value, time.monotonic() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_tag(self, tag: str) -> int:
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class RecommendationCache:
+    """
+    Cache des réponses de recommandation à deux niveaux
+
+    Chaque entrée porte des étiquettes : user:<id> pour les endpoints par
+    utilisateur, offer:<id> pour l'offre demandée et pour chaque offre
+    présente dans la réponse. Invalider une étiquette supprime exactement les
+    entrées concernées, dans les deux niveaux.
+
+    Les invalidations ne sont reçues que par l'instance qui traite
+    l'événement : le niveau en mémoire garde donc un TTL court
+    (RECOMMENDATION_CACHE_LOCAL_TTL) lorsque plusieurs instances partagent Redis.
+    """
+
+    def __init__(self,
+                 ttl: float = RECOMMENDATION_CACHE_TTL,
+                 local_ttl: float = RECOMMENDATION_CACHE_LOCAL_TTL,
+                 max_entries: int = RECOMMENDATION_CACHE_MAX_ENTRIES,
+                 redis_url: str = RECOMMENDATION_CACHE_REDIS_URL):
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.local = LocalTier(max_entries)
+        self.redis_url = redis_url
+        self.redis = None
+        self.metrics: Dict[str, Dict[str, int]] = {}
+        self.invalidations = {"user": 0, "offer": 0, "entries": 0}
+        # Générations par étiquette : numéro de la dernière invalidation de
+        # chaque étiquette. Une réponse dont une étiquette a été invalidée
+        # pendant son calcul n'est pas mise en cache (elle peut être périmée)
+        self._generation = 0
+        self._tag_generations: Dict[str, int] = {}
+        # Générations de départ des calculs en cours (génération -> nombre)
+        self._inflight: Dict[int, int] = {}
+
+    async def connect(self):
+        """Active le niveau partagé si Redis est configuré et disponible"""
+        if not self.redis_url or aioredis is None or self.redis is not None:
+            return
+        try:
+            client = aioredis.from_url(self.redis_url)
+            await client.ping()
+            self.redis = client
+            logger.info("🗄️ Cache des recommandations: niveau Redis partagé activé")
+        except Exception as e:
+            logger.error(f"❌ Redis indisponible pour le cache des recommandations: {e}")
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
+    @staticmethod
+    def make_key(endpoint: str, subject: Optional[int], limit: int, cursor: Optional[str] = None) -> str:
+        key = f"{endpoint}:{'' if subject is None else subject}:{limit}"
+        return key if cursor is None else f"{key}:{cursor}"
+
+    def _endpoint_metrics(self, endpoint: str) -> Dict[str, int]:
+        metrics = self.metrics.get(endpoint)
+        if metrics is None:
+            metrics = self.metrics[endpoint] = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        return metrics
+
+    async def get_or_compute(self,
+                             endpoint: str,
+                             subject: Optional[int],
+                             limit: int,
+                             compute: Callable[[], Awaitable[Any]],
+                             tags: Iterable[str] = (),
+                             ttl: Optional[float] = None,
+                             cursor: Optional[str] = None) -> Any:
+        """
+        Retourne la réponse en cache, sinon la calcule et la met en cache
+
+        Args:
+            endpoint: Nom de l'endpoint (category, similar, ...)
+            subject: ID de l'utilisateur ou de l'offre demandé (None si global)
+            limit: Nombre de résultats demandé
+            compute: Calcul de la réponse (valeur sérialisable en JSON)
+            tags: Étiquettes propres à la requête (ex. user:<id>)
+            ttl: TTL spécifique à l'endpoint
+            cursor: Curseur de pagination keyset pour une page suivante
+        """
+        key = self.make_key(endpoint, subject, limit, cursor)
+        metrics = self._endpoint_metrics(endpoint)
+        ttl = self.ttl if ttl is None else ttl
+
+        found, value = self.local.get(key)
+        if found:
+            metrics["local_hits"] += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(KEY_PREFIX + key)
+                if data is not None:
+                    value = json.loads(data)
+                    self.local.set(key, value, min(self.local_ttl, ttl), self._tags_for(value, tags))
+                    metrics["shared_hits"] += 1
+                    return value
+            except Exception as e:
+                logger.error(f"❌ Erreur lecture cache Redis {key}: {e}")
+
+        metrics["misses"] += 1
+        started = self._generation
+        self._inflight[started] = self._inflight.get(started, 0) + 1
+        try:
+            value = await compute()
+        finally:
+            self._inflight[started] -= 1
+            if not self._inflight[started]:
+                del self._inflight[started]
+
+        all_tags = self._tags_for(value, tags)
+        if any(self._tag_generations.get(tag, 0) > started for tag in all_tags):
+            return value
+
+        self.local.set(key, value, min(self.local_ttl if self.redis is not None else ttl, ttl), all_tags)
+
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(KEY_PREFIX + key, json.dumps(value, separators=(',', ':'), default=str), ex=int(ttl))
+                for tag in all_tags:
+                    pipe.sadd(TAG_PREFIX + tag, key)
+                    pipe.expire(TAG_PREFIX + tag, int(ttl))
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"❌ Erreur écriture cache Redis {key}: {e}")
+
+        return value
+
+    @staticmethod
+    def _tags_for(value: Any, tags: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys([*tags, *(offer_tag(offer_id) for offer_id in collect_offer_ids(value))]))
+
+    async def invalidate_tag(self, tag: str) -> int:
+        """Supprime toutes les entrées portant l'étiquette (deux niveaux)"""
+        self._generation += 1
+        self._tag_generations[tag] = self._generation
+        self._prune_generations()
+        removed = self.local.invalidate_tag(tag)
+
+        if self.redis is not None:
+            try:
+                keys = await self.redis.smembers(TAG_PREFIX + tag)
+                if keys:
+                    await self.redis.delete(*(KEY_PREFIX + key.decode() for key in keys))
+                    removed = max(removed, len(keys))
+                await self.redis.delete(TAG_PREFIX + tag)
+            except Exception as e:
+                logger.error(f"❌ Erreur invalidation cache Redis {tag}: {e}")
+
+        self.invalidations["entries"] += removed
+        return removed
+
+    def _prune_generations(self):
+        """Oublie les générations antérieures à tous les calculs en cours"""
+        if len(self._tag_generations) <= self.local.max_entries:
+            return
+        oldest = min(self._inflight, default=self._generation)
+        self._tag_generations = {
+            tag: generation for tag, generation in self._tag_generations.items() if generation > oldest
+        }
+
+    async def invalidate_user(self, user_id: int) -> int:
+        self.invalidations["user"] += 1
+        return await self.invalidate_tag(user_tag(user_id))
+
+    async def invalidate_offer(self, offer_id: int) -> int:
+        self.invalidations["offer"] += 1
+        return await self.invalidate_tag(offer_tag(offer_id))
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, metrics in self.metrics.items():
+            lookups = metrics["local_hits"] + metrics["shared_hits"] + metrics["misses"]
+            endpoints[endpoint] = {
+                **metrics,
+                "hit_ratio": (lookups - metrics["misses"]) / lookups if lookups else 0.0
+            }
+        return {
+            "local_entries": len(self.local),
+            "shared_tier": self.redis is not None,
+            "invalidations": dict(self.invalidations),
+            "endpoints": endpoints
+        }
+
+# Instance globale du cache des recommandations
+recommendation_cache = RecommendationCache()
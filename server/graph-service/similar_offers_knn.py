@@ -0,0 +1,403 @@
+"""
+Graphe kNN des offres similaires
+Voisins les plus proches de chaque offre calculés hors requête avec FAISS à
+partir des embeddings d'offres du chatbot, combinés aux contraintes de
+catégorie et de marque, et servis depuis une table offre -> voisins
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import time
+import logging
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - la table kNN est désactivée sans FAISS
+    faiss = None
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration du graphe kNN
+OFFER_EMBEDDINGS_INDEX_PATH = os.getenv('OFFER_EMBEDDINGS_INDEX_PATH', 'data/offer_embeddings')
+SIMILAR_KNN_NEIGHBORS = int(os.getenv('SIMILAR_KNN_NEIGHBORS', '20'))
+SIMILAR_KNN_CANDIDATES = int(os.getenv('SIMILAR_KNN_CANDIDATES', '100'))
+SIMILAR_KNN_CATEGORY_BONUS = float(os.getenv('SIMILAR_KNN_CATEGORY_BONUS', '0.15'))
+SIMILAR_KNN_BRAND_BONUS = float(os.getenv('SIMILAR_KNN_BRAND_BONUS', '0.10'))
+SIMILAR_KNN_CHECKPOINT_PATH = os.getenv('SIMILAR_KNN_CHECKPOINT_PATH', 'similar_offers_knn.json')
+SIMILAR_KNN_REFRESH_INTERVAL = float(os.getenv('SIMILAR_KNN_REFRESH_INTERVAL', '60'))
+SIMILAR_KNN_REBUILD_INTERVAL = float(os.getenv('SIMILAR_KNN_REBUILD_INTERVAL', str(24 * 3600)))
+
+SEARCH_BATCH_SIZE = 4096
+ATTRIBUTES_BATCH_SIZE = 5000
+
+SIMILAR_KNN_OFFERS_QUERY = """
+    UNWIND $offerIds AS offerId
+    MATCH (o:Offer {id: offerId})
+    RETURN o.id as id, o.title as title, o.price as price,
+           o.categoryId as categoryId, o.brandId as brandId,
+           coalesce(o.status = 'available' AND NOT coalesce(o.isDeleted, false), false) as available
+"""
+
+def load_offer_embeddings(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Relit l'index FAISS et les métadonnées sauvegardés par le chatbot (save_index)
+
+    Returns:
+        (IDs des offres, vecteurs normalisés), une ligne par offre ; si une
+        offre a été indexée plusieurs fois, sa dernière position l'emporte
+    """
+    index = faiss.read_index(f"{path}.faiss")
+    with open(f"{path}.metadata", 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+
+    positions: Dict[int, int] = {}
+    for key, entry in metadata.items():
+        offer_id = int(entry.get('offer_id', key))
+        position = int(entry['index_position'])
+        if position < index.ntotal and position > positions.get(offer_id, -1):
+            positions[offer_id] = position
+
+    offer_ids = np.array(sorted(positions), dtype=np.int64)
+    rows = np.array([positions[offer_id] for offer_id in offer_ids], dtype=np.int64)
+    vectors = index.reconstruct_n(0, index.ntotal)[rows] if len(rows) else np.empty((0, index.d), np.float32)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return offer_ids, vectors
+
+def compute_neighbors(query_ids: Iterable[int],
+                      offer_ids: np.ndarray,
+                      vectors: np.ndarray,
+                      offers: Dict[int, Dict[str, Any]],
+                      k: int = SIMILAR_KNN_NEIGHBORS,
+                      candidates: int = SIMILAR_KNN_CANDIDATES,
+                      category_bonus: float = SIMILAR_KNN_CATEGORY_BONUS,
+                      brand_bonus: float = SIMILAR_KNN_BRAND_BONUS) -> Dict[int, List[Tuple[int, float]]]:
+    """
+    Voisins des offres demandées parmi les offres disponibles
+
+    Les candidats sont les plus proches en cosinus (IndexFlatIP sur vecteurs
+    normalisés) ; leur score est ensuite relevé s'ils partagent la catégorie
+    ou la marque de l'offre, et les k meilleurs sont conservés.
+
+    Returns:
+        {offre: [(voisin, score), ...]} trié par score décroissant
+    """
+    position_of = {int(offer_id): position for position, offer_id in enumerate(offer_ids)}
+    available = np.array([position for position, offer_id in enumerate(offer_ids)
+                          if offers.get(int(offer_id), {}).get("available")], dtype=np.int64)
+    queries = [offer_id for offer_id in query_ids if offer_id in position_of]
+    if len(available) == 0 or not queries:
+        return {offer_id: [] for offer_id in queries}
+
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors[available])
+    search_k = min(candidates + 1, len(available))
+
+    neighbors: Dict[int, List[Tuple[int, float]]] = {}
+    for start in range(0, len(queries), SEARCH_BATCH_SIZE):
+        batch = queries[start:start + SEARCH_BATCH_SIZE]
+        scores, positions = index.search(vectors[[position_of[offer_id] for offer_id in batch]], search_k)
+
+        for offer_id, row_scores, row_positions in zip(batch, scores, positions):
+            offer = offers.get(offer_id, {})
+            blended = []
+            for score, position in zip(row_scores, row_positions):
+                if position < 0:
+                    continue
+                candidate_id = int(offer_ids[available[position]])
+                if candidate_id == offer_id:
+                    continue
+                candidate = offers[candidate_id]
+                if offer.get("categoryId") is not None and candidate.get("categoryId") == offer.get("categoryId"):
+                    score += category_bonus
+                if offer.get("brandId") is not None and candidate.get("brandId") == offer.get("brandId"):
+                    score += brand_bonus
+                blended.append((candidate_id, float(score)))
+            blended.sort(key=lambda item: item[1], reverse=True)
+            neighbors[offer_id] = blended[:k]
+
+    return neighbors
+
+def reverse_neighbors(changed_ids: Iterable[int],
+                      offer_ids: np.ndarray,
+                      vectors: np.ndarray,
+                      offers: Dict[int, Dict[str, Any]],
+                      neighbors: Dict[int, List[Tuple[int, float]]],
+                      k: int = SIMILAR_KNN_NEIGHBORS,
+                      max_bonus: float = SIMILAR_KNN_CATEGORY_BONUS + SIMILAR_KNN_BRAND_BONUS) -> Set[int]:
+    """
+    Offres dont la liste de voisins doit être recalculée après la modification
+    des offres changed_ids (hors ces offres elles-mêmes)
+
+    - Listes contenant une offre modifiée (statut, catégorie ou marque changés).
+    - Listes où une offre modifiée disponible peut entrer : cosinus plus le
+      bonus maximal au moins égal au k-ième score actuel, ou liste incomplète.
+    """
+    changed = set(changed_ids)
+    affected = {offer_id for offer_id, neighbor_list in neighbors.items()
+                if any(neighbor_id in changed for neighbor_id, _ in neighbor_list)}
+
+    position_of = {int(offer_id): position for position, offer_id in enumerate(offer_ids)}
+    entering = [position_of[offer_id] for offer_id in sorted(changed)
+                if offer_id in position_of and offers.get(offer_id, {}).get("available")]
+    if not entering:
+        return affected - changed
+
+    thresholds = np.full(len(offer_ids), -np.inf, dtype=np.float32)
+    for offer_id, neighbor_list in neighbors.items():
+        position = position_of.get(offer_id)
+        if position is not None and len(neighbor_list) >= k:
+            thresholds[position] = neighbor_list[k - 1][1]
+
+    changed_vectors = vectors[entering].T
+    for start in range(0, len(offer_ids), SEARCH_BATCH_SIZE):
+        best = (vectors[start:start + SEARCH_BATCH_SIZE] @ changed_vectors).max(axis=1)
+        rows = np.nonzero(best + max_bonus >= thresholds[start:start + SEARCH_BATCH_SIZE])[0]
+        affected.update(int(offer_ids[start + row]) for row in rows)
+
+    return affected - changed
+
+class SimilarOffersKNN:
+    """
+    Table offre -> voisins, lue en O(1) par /recommendations/similar
+
+    - Reconstruction complète au démarrage (sauf point de sauvegarde valide
+      pour l'index courant) puis toutes les SIMILAR_KNN_REBUILD_INTERVAL secondes.
+    - Rafraîchissement incrémental : offres modifiées (/sync/offer) et
+      offres nouvellement indexées par le chatbot (index plus récent), ainsi
+      que les offres dont elles peuvent devenir ou cesser d'être voisines.
+    - Les voisins devenus indisponibles sont filtrés à la lecture.
+    """
+
+    def __init__(self,
+                 index_path: str = OFFER_EMBEDDINGS_INDEX_PATH,
+                 checkpoint_path: str = SIMILAR_KNN_CHECKPOINT_PATH,
+                 k: int = SIMILAR_KNN_NEIGHBORS,
+                 refresh_interval: float = SIMILAR_KNN_REFRESH_INTERVAL,
+                 rebuild_interval: float = SIMILAR_KNN_REBUILD_INTERVAL):
+        self.index_path = index_path
+        self.checkpoint_path = checkpoint_path
+        self.k = k
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+
+        self._neighbors: Dict[int, List[Tuple[int, float]]] = {}
+        self._offers: Dict[int, Dict[str, Any]] = {}
+        self._offer_ids: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._index_mtime: Optional[float] = None
+        self._dirty: Set[int] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "rebuilds": 0,
+            "incremental_refreshes": 0,
+            "refreshed_offers": 0,
+            "reverse_refreshed_offers": 0,
+            "last_rebuild_ms": 0.0,
+            "last_refresh_ms": 0.0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return faiss is not None
+
+    def get(self, offer_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Voisins disponibles de l'offre, ou None si l'offre n'est pas dans la table ou sans voisin disponible"""
+        recommendations = []
+        for neighbor_id, score in self._neighbors.get(offer_id, ()):
+            offer = self._offers.get(neighbor_id)
+            if not offer or not offer.get("available"):
+                continue
+            recommendations.append({
+                "id": neighbor_id,
+                "title": offer.get("title") or "",
+                "price": offer.get("price") or 0.0,
+                "relevanceScore": score
+            })
+            if len(recommendations) >= limit:
+                break
+
+        # Tous les voisins vendus : la requête Cypher en trouve d'autres
+        if not recommendations:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        return recommendations
+
+    def mark_changed(self, offer_id: int, attributes: Optional[Dict[str, Any]] = None):
+        """Signale une offre modifiée ; ses attributs connus sont mis à jour immédiatement"""
+        if attributes is not None:
+            self._offers[offer_id] = {**self._offers.get(offer_id, {}), **attributes}
+        self._dirty.add(offer_id)
+
+    def _index_file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(f"{self.index_path}.faiss")
+        except OSError:
+            return None
+
+    async def _fetch_attributes(self, offer_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        attributes = {}
+        async with neo4j_session() as session:
+            for start in range(0, len(offer_ids), ATTRIBUTES_BATCH_SIZE):
+                result = await session.run(
+                    SIMILAR_KNN_OFFERS_QUERY, offerIds=offer_ids[start:start + ATTRIBUTES_BATCH_SIZE]
+                )
+                async for record in result:
+                    attributes[record["id"]] = dict(record)
+        return attributes
+
+    async def rebuild(self):
+        """Recalcule les voisins de toutes les offres indexées"""
+        mtime = self._index_file_mtime()
+        if not self.enabled or mtime is None:
+            return
+
+        start = time.perf_counter()
+        self._dirty.clear()
+        offer_ids, vectors = await asyncio.to_thread(load_offer_embeddings, self.index_path)
+        offers = await self._fetch_attributes([int(offer_id) for offer_id in offer_ids])
+        neighbors = await asyncio.to_thread(
+            compute_neighbors, [int(offer_id) for offer_id in offer_ids], offer_ids, vectors, offers, self.k
+        )
+
+        self._offer_ids, self._vectors, self._index_mtime = offer_ids, vectors, mtime
+        self._offers, self._neighbors = offers, neighbors
+        self.metrics["rebuilds"] += 1
+        self.metrics["last_rebuild_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"🧭 Offres similaires (kNN): {len(neighbors)} offres en {self.metrics['last_rebuild_ms']:.0f} ms")
+        await self.checkpoint()
+
+    async def refresh(self):
+        """Recalcule les voisins des offres modifiées et des offres nouvellement indexées"""
+        if not self.enabled:
+            return
+
+        mtime = self._index_file_mtime()
+        if mtime is None:
+            return
+        if self._vectors is None or mtime != self._index_mtime:
+            self._offer_ids, self._vectors = await asyncio.to_thread(load_offer_embeddings, self.index_path)
+            self._index_mtime = mtime
+
+        indexed = {int(offer_id) for offer_id in self._offer_ids}
+        known = set(self._neighbors)
+        targets = indexed - known
+        dirty, self._dirty = self._dirty, set()
+        targets |= dirty & indexed
+        if not targets:
+            return
+
+        start = time.perf_counter()
+        # Attributs à jour des offres recalculées et des offres indexées encore inconnues
+        missing = [offer_id for offer_id in indexed if offer_id not in self._offers]
+        self._offers.update(await self._fetch_attributes(sorted(targets | set(missing))))
+        # Listes des autres offres où les offres modifiées entrent ou dont elles sortent
+        reverse = await asyncio.to_thread(
+            reverse_neighbors, targets, self._offer_ids, self._vectors, self._offers, self._neighbors, self.k
+        )
+        reverse &= indexed
+        neighbors = await asyncio.to_thread(
+            compute_neighbors, sorted(targets | reverse), self._offer_ids, self._vectors, self._offers, self.k
+        )
+        self._neighbors.update(neighbors)
+
+        self.metrics["incremental_refreshes"] += 1
+        self.metrics["refreshed_offers"] += len(neighbors)
+        self.metrics["reverse_refreshed_offers"] += len(reverse)
+        self.metrics["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+        await self.checkpoint()
+
+    def _write_checkpoint(self, data: Dict[str, Any]):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), default=str)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def checkpoint(self):
+        """Sauvegarde la table (valable tant que l'index d'embeddings ne change pas)"""
+        data = {
+            "index_mtime": self._index_mtime,
+            "neighbors": {str(offer_id): neighbors for offer_id, neighbors in self._neighbors.items()},
+            "offers": {str(offer_id): offer for offer_id, offer in self._offers.items()}
+        }
+        try:
+            await asyncio.to_thread(self._write_checkpoint, data)
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde des offres similaires: {e}")
+
+    def _read_checkpoint(self) -> bool:
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("index_mtime") is None or data["index_mtime"] != self._index_file_mtime():
+            return False
+        self._neighbors = {
+            int(offer_id): [(int(neighbor_id), score) for neighbor_id, score in neighbors]
+            for offer_id, neighbors in data["neighbors"].items()
+        }
+        self._offers = {int(offer_id): offer for offer_id, offer in data["offers"].items()}
+        self._index_mtime = data["index_mtime"]
+        return True
+
+    def start(self):
+        if not self.enabled:
+            logger.info("🧭 FAISS non installé : offres similaires servies par Cypher")
+            return
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+
+    async def _run(self):
+        last_rebuild = 0.0
+        try:
+            if await asyncio.to_thread(self._read_checkpoint):
+                last_rebuild = time.monotonic()
+                logger.info(f"🧭 Offres similaires rechargées: {len(self._neighbors)} offres")
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture sauvegarde des offres similaires: {e}")
+
+        while not self._stop_event.is_set():
+            try:
+                if not last_rebuild or time.monotonic() - last_rebuild >= self.rebuild_interval:
+                    await self.rebuild()
+                    if self._index_mtime is not None:
+                        last_rebuild = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Erreur calcul des offres similaires: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "enabled": self.enabled,
+            "offers": len(self._neighbors),
+            "dirty_offers": len(self._dirty),
+            **self.metrics,
+            "hit_ratio": self.metrics["hits"] / lookups if lookups else 0.0
+        }
+
+# Instance globale du graphe kNN
+similar_offers_knn = SimilarOffersKNN()
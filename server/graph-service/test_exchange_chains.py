@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests de la reconstruction des chaînes d'échange (liens en mémoire, sans Neo4j)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from exchange_chains import build_chains
+
+
+def test_links_are_followed_from_head_to_tail():
+    edges = [(2, 3), (1, 2), (3, 4), (10, 11)]
+    assert sorted(build_chains(edges)) == [[1, 2, 3, 4], [10, 11]]
+
+
+def test_first_outgoing_and_incoming_links_win():
+    # Bifurcation 1 -> 2 / 1 -> 5 et convergence 2 -> 3 / 4 -> 3 : premiers liens retenus
+    edges = [(1, 2), (1, 5), (2, 3), (4, 3)]
+    assert sorted(build_chains(edges)) == [[1, 2, 3]]
+
+
+def test_cycles_and_self_links_are_not_indexed():
+    assert build_chains([(1, 2), (2, 3), (3, 1)]) == []
+    assert build_chains([(7, 7)]) == []
+    # Un cycle refermé sur une chaîne existante est coupé au lien entrant déjà pris
+    assert build_chains([(0, 1), (1, 2), (2, 1)]) == [[0, 1, 2]]
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des chaînes d'échange")
+    print("=" * 50)
+
+    tests = [
+        test_links_are_followed_from_head_to_tail,
+        test_first_outgoing_and_incoming_links_win,
+        test_cycles_and_self_links_are_not_indexed,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
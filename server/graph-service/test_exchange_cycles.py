@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests de la recherche de cycles d'échange multi-parties (graphe en mémoire, sans Neo4j)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from exchange_cycles import WantGraph, compute_cycle_table, find_cycles, rank_cycles
+
+
+def offer(offer_id, category, wanted, seller=None, price=100.0):
+    return {"id": offer_id, "title": f"Offre {offer_id}", "price": price,
+            "sellerId": offer_id if seller is None else seller,
+            "categoryId": category, "wantedCategories": wanted}
+
+
+def triangle(extra=()):
+    # 1 (cat A) veut B, 2 (cat B) veut C, 3 (cat C) veut A
+    return WantGraph([offer(1, "A", ["B"]), offer(2, "B", ["C"]), offer(3, "C", ["A"]), *extra])
+
+
+def test_finds_three_party_cycle():
+    graph = triangle()
+    cycles, complete = find_cycles(graph, graph.offers[1], min_length=3, max_length=4)
+    assert cycles == [[1, 2, 3]]
+    assert complete
+
+
+def test_two_party_exchanges_respect_min_length():
+    graph = WantGraph([offer(1, "A", ["B"]), offer(2, "B", ["A"])])
+    assert find_cycles(graph, graph.offers[1], min_length=3, max_length=4)[0] == []
+    assert find_cycles(graph, graph.offers[1], min_length=2, max_length=4)[0] == [[1, 2]]
+
+
+def test_sellers_are_distinct():
+    # Le vendeur de 1 vend aussi 3 : il ne peut pas se céder une offre à lui-même
+    graph = triangle()
+    graph.offers[3]["sellerId"] = 1
+    assert find_cycles(graph, graph.offers[1], min_length=3, max_length=4)[0] == []
+
+
+def test_pruning_skips_categories_that_cannot_close_the_cycle():
+    # La catégorie D ne mène jamais vers A : ses 500 offres ne sont pas explorées
+    dead_end = [offer(100 + index, "D", ["E"]) for index in range(500)]
+    graph = triangle([offer(4, "B", ["D"]), *dead_end])
+
+    cycles, complete = find_cycles(graph, graph.offers[1], min_length=3, max_length=4, max_expansions=10)
+    assert cycles == [[1, 2, 3]]
+    assert complete
+
+
+def test_deadline_stops_a_scan_without_expansions():
+    # 5000 offres de B, toutes élaguées (elles ne souhaitent rien) : aucune expansion,
+    # seul le parcours des candidats peut constater l'échéance
+    pruned = [offer(100 + index, "B", ["Z"]) for index in range(5000)]
+    graph = triangle(pruned)
+
+    cycles, complete = find_cycles(graph, graph.offers[1], min_length=3, max_length=4,
+                                   deadline=time.monotonic() - 1)
+    assert not complete
+
+    cycles, complete = find_cycles(graph, graph.offers[1], min_length=3, max_length=4)
+    assert complete
+    assert cycles == [[1, 2, 3]]
+
+
+def test_rank_cycles_prefers_balanced_and_short_cycles():
+    graph = WantGraph([
+        offer(1, "A", ["B", "C"], price=100.0),
+        offer(2, "B", ["A"], price=100.0),
+        offer(3, "C", ["D"], price=100.0),
+        offer(4, "D", ["A"], price=100.0),
+        offer(5, "B", ["A"], price=10.0)
+    ])
+    source = graph.offers[1]
+    ranked = rank_cycles(graph, source, [[1, 3, 4], [1, 2], [1, 5]], limit=3)
+
+    assert [cycle["length"] for cycle in ranked] == [2, 3, 2]
+    assert [step["offerId"] for step in ranked[0]["offers"]] == [1, 2]
+    # Chaque vendeur reçoit l'offre suivante du cycle
+    assert [step["receivesOfferId"] for step in ranked[1]["offers"]] == [3, 4, 1]
+    assert rank_cycles(graph, source, [[1, 3, 4], [1, 2]], limit=1)[0]["length"] == 2
+
+
+def test_cycle_table_lists_every_participant():
+    table = compute_cycle_table(triangle(), per_offer=5, workers=1)
+    assert table == {1: [[1, 2, 3]], 2: [[2, 3, 1]], 3: [[3, 1, 2]]}
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des cycles d'échange")
+    print("=" * 50)
+
+    tests = [
+        test_finds_three_party_cycle,
+        test_two_party_exchanges_respect_min_length,
+        test_sellers_are_distinct,
+        test_pruning_skips_categories_that_cannot_close_the_cycle,
+        test_deadline_stops_a_scan_without_expansions,
+        test_rank_cycles_prefers_balanced_and_short_cycles,
+        test_cycle_table_lists_every_participant,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests du fil d'accueil combiné (stratégies simulées, sans Neo4j)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import home_feed
+from home_feed import interleave, run_strategies
+
+
+def items(*offer_ids):
+    return [{"id": offer_id, "title": f"Offre {offer_id}"} for offer_id in offer_ids]
+
+
+def test_interleave_follows_weights_without_duplicates():
+    results = {"a": items(1, 2, 3, 4, 5, 6), "b": items(1, 7, 8, 9)}
+    feed = interleave(results, 6, weights={"a": 2.0, "b": 1.0})
+
+    assert [item["id"] for item in feed] == [1, 7, 2, 3, 8, 4]
+    assert [item["source"] for item in feed] == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_interleave_skips_exhausted_and_unweighted_strategies():
+    results = {"a": items(1), "b": items(2, 3, 4), "c": items(5), "d": []}
+    feed = interleave(results, 10, weights={"a": 1.0, "b": 1.0, "d": 1.0})
+
+    assert [item["id"] for item in feed] == [1, 2, 3, 4]
+    assert "c" not in {item["source"] for item in feed}
+
+
+def test_interleave_respects_limit():
+    assert len(interleave({"a": items(*range(50))}, 5, weights={"a": 1.0})) == 5
+
+
+async def _late_strategy_is_dropped_but_keeps_running():
+    finished = asyncio.Event()
+
+    async def fast():
+        return items(1)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.set()
+        return items(2)
+
+    async def broken():
+        raise RuntimeError("Neo4j indisponible")
+
+    results, status = await run_strategies({"fast": fast, "slow": slow, "broken": broken},
+                                           budget_ms=100, deadlines_ms={"slow": 10})
+
+    assert status == {"fast": "ok", "slow": "timeout", "broken": "error"}
+    assert list(results) == ["fast"]
+    # Le calcul hors délai se poursuit (il remplit le cache pour l'appel suivant)
+    await asyncio.wait_for(finished.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert not home_feed._background
+
+
+def test_late_strategy_is_dropped_but_keeps_running():
+    asyncio.run(_late_strategy_is_dropped_but_keeps_running())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du fil d'accueil")
+    print("=" * 50)
+
+    tests = [
+        test_interleave_follows_weights_without_duplicates,
+        test_interleave_skips_exhausted_and_unweighted_strategies,
+        test_interleave_respects_limit,
+        test_late_strategy_is_dropped_but_keeps_running,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
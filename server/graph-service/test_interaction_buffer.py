@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests du tampon d'ingestion des interactions (session Neo4j simulée)
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import interaction_buffer
+from interaction_buffer import InteractionBuffer, InteractionBufferFull
+
+
+class FakeSession:
+    """Session dont les écritures échouent tant que `down` est vrai"""
+
+    def __init__(self):
+        self.down = False
+        self.written = []
+
+    async def execute_write(self, work):
+        await asyncio.sleep(0)
+        if self.down:
+            raise ConnectionError("Neo4j indisponible")
+        session = self
+
+        class Tx:
+            async def run(self, query, events):
+                session.written.extend(events)
+
+                class Result:
+                    async def consume(self):
+                        pass
+                return Result()
+
+        await work(Tx())
+
+
+def use_session(session: FakeSession):
+    @asynccontextmanager
+    async def neo4j_session():
+        yield session
+    interaction_buffer.neo4j_session = neo4j_session
+
+
+def interaction(user_id: int, offer_id: int, interaction_type: str = "VIEW"):
+    return {"userId": user_id, "offerId": offer_id, "interactionType": interaction_type}
+
+
+async def _full_buffer_during_outage_rejects_instead_of_failing():
+    session = FakeSession()
+    use_session(session)
+    buffer = InteractionBuffer(max_buffer=2)
+    session.down = True
+
+    assert await buffer.submit(interaction(1, 10))
+    assert await buffer.submit(interaction(1, 11))
+    try:
+        await buffer.submit(interaction(1, 12))
+    except InteractionBufferFull as e:
+        assert e.retry_after >= 1
+    else:
+        raise AssertionError("interaction acceptée dans un tampon plein")
+
+    # Le lot en échec est remis dans l'ordre ; rien n'est perdu
+    assert [key[1] for key in buffer._pending] == [10, 11]
+    assert buffer.metrics["rejected_events"] == 1
+    assert buffer.metrics["dropped_events"] == 0
+
+    session.down = False
+    assert await buffer.submit(interaction(1, 12))
+    assert [event["offerId"] for event in session.written] == [10, 11]
+
+
+async def _put_back_overflow_is_counted():
+    session = FakeSession()
+    use_session(session)
+    buffer = InteractionBuffer(max_buffer=3)
+    for offer_id in (10, 11):
+        await buffer.submit(interaction(1, offer_id))
+
+    session.down = True
+    write = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0)
+    # Nouvelles interactions arrivées pendant l'écriture en échec
+    for offer_id in (12, 13):
+        await buffer.submit(interaction(2, offer_id))
+    try:
+        await write
+    except ConnectionError:
+        pass
+
+    assert buffer.depth == 3
+    assert buffer.metrics["dropped_events"] == 1
+
+
+async def _flushed_events_are_reported_once_written():
+    session = FakeSession()
+    use_session(session)
+    flushed = []
+
+    async def on_flushed(events):
+        flushed.extend(event["offerId"] for event in events)
+
+    buffer = InteractionBuffer(on_flushed=on_flushed)
+    await buffer.submit(interaction(1, 10, "LIKE"))
+    session.down = True
+    try:
+        await buffer.flush()
+    except ConnectionError:
+        pass
+    assert flushed == []
+
+    session.down = False
+    await buffer.flush()
+    assert flushed == [10]
+
+
+def test_full_buffer_during_outage_rejects_instead_of_failing():
+    asyncio.run(_full_buffer_during_outage_rejects_instead_of_failing())
+
+
+def test_put_back_overflow_is_counted():
+    asyncio.run(_put_back_overflow_is_counted())
+
+
+def test_flushed_events_are_reported_once_written():
+    asyncio.run(_flushed_events_are_reported_once_written())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du tampon d'ingestion des interactions")
+    print("=" * 50)
+
+    tests = [
+        test_full_buffer_during_outage_rejects_instead_of_failing,
+        test_put_back_overflow_is_counted,
+        test_flushed_events_are_reported_once_written,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
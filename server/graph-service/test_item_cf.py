@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests du filtrage collaboratif item-item (modèle en mémoire, sans Neo4j)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from item_cf import ItemCFEngine, ItemCFModel
+
+
+def make_model() -> ItemCFModel:
+    # L'utilisateur 1 partage ses goûts avec 2 et 3, qui ont aimé 12 et 13
+    edges = [
+        (1, 10, 1.0), (1, 11, 1.0),
+        (2, 10, 1.0), (2, 11, 1.0), (2, 12, 1.0),
+        (3, 10, 1.0), (3, 13, 1.0)
+    ]
+    offers = {
+        offer_id: {"id": offer_id, "title": f"Offre {offer_id}", "price": 10.0, "sellerId": 99, "available": True}
+        for offer_id in (10, 11, 12, 13)
+    }
+    return ItemCFModel.build(edges, offers, k=10, workers=1)
+
+
+def recommended_ids(engine_or_model, user_id: int = 1):
+    return [offer["id"] for offer in engine_or_model.recommend(user_id, 10)]
+
+
+def test_recommend_excludes_seen_offers():
+    assert sorted(recommended_ids(make_model())) == [12, 13]
+
+
+def test_status_change_survives_incremental_refresh():
+    model = make_model()
+    model.available[model.item_index[12]] = False
+
+    refreshed, skipped = model.with_updates({(3, 11): 1.0}, k=10)
+
+    assert skipped == 0
+    assert 12 not in recommended_ids(refreshed)
+
+
+async def _engine_reapplies_status_changes_to_new_models():
+    engine = ItemCFEngine(neighbors=10, workers=1)
+    engine._install(make_model())
+
+    engine.set_offer_available(12, False)
+    assert recommended_ids(engine) == [13]
+
+    # Modèle recalculé depuis un instantané antérieur à la vente
+    engine._install(make_model())
+    assert recommended_ids(engine) == [13]
+
+    engine.apply_events([{"userId": 3, "offerId": 11, "type": "LIKE"}])
+    await engine.refresh()
+    assert recommended_ids(engine) == [13]
+
+
+async def _pending_interactions_bypass_the_model():
+    engine = ItemCFEngine(neighbors=10, workers=1)
+    engine._install(make_model())
+
+    engine.apply_events([{"userId": 1, "offerId": 12, "type": "LIKE"}])
+    assert engine.recommend(1, 10) is None
+    assert engine.recommend(2, 10) is not None
+
+    await engine.refresh()
+    assert recommended_ids(engine) == [13]
+
+
+def test_engine_reapplies_status_changes_to_new_models():
+    asyncio.run(_engine_reapplies_status_changes_to_new_models())
+
+
+def test_pending_interactions_bypass_the_model():
+    asyncio.run(_pending_interactions_bypass_the_model())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du filtrage collaboratif item-item")
+    print("=" * 50)
+
+    tests = [
+        test_recommend_excludes_seen_offers,
+        test_status_change_survives_incremental_refresh,
+        test_engine_reapplies_status_changes_to_new_models,
+        test_pending_interactions_bypass_the_model,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
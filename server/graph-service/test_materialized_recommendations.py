@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests des recommandations matérialisées (stockage SQLite temporaire, sans Neo4j)
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import materialized_recommendations
+from materialized_recommendations import RecommendationMaterializer
+
+
+def make_materializer(directory: str, top_n: int = 5) -> RecommendationMaterializer:
+    materializer = RecommendationMaterializer(path=str(Path(directory) / "materialized.sqlite3"), top_n=top_n)
+    materializer.open()
+    return materializer
+
+
+def store_items(materializer: RecommendationMaterializer, user_id: int, offer_ids):
+    items = [{"id": offer_id, "title": f"Offre {offer_id}", "price": 10.0} for offer_id in offer_ids]
+    materializer.store.put_many([(user_id, "category", time.time(), items)])
+
+
+def served_ids(materializer: RecommendationMaterializer, user_id: int, limit: int):
+    items = materializer.get(user_id, "category", limit)
+    return None if items is None else [item["id"] for item in items]
+
+
+def test_unavailable_offers_are_not_served():
+    with tempfile.TemporaryDirectory() as directory:
+        materializer = make_materializer(directory)
+        store_items(materializer, 1, [10, 11, 12])
+
+        materializer.set_offer_available(11, False)
+        assert served_ids(materializer, 1, 3) == [10, 12]
+
+        materializer.set_offer_available(11, True)
+        assert served_ids(materializer, 1, 3) == [10, 11, 12]
+        materializer.store.close()
+
+
+def test_truncated_top_n_falls_back_to_live_query():
+    with tempfile.TemporaryDirectory() as directory:
+        materializer = make_materializer(directory, top_n=3)
+        store_items(materializer, 1, [10, 11, 12])
+
+        materializer.set_offer_available(10, False)
+        # La 3e recommandation se trouve au-delà du top-N matérialisé
+        assert served_ids(materializer, 1, 3) is None
+        assert 1 in materializer._pending
+        assert served_ids(materializer, 1, 2) == [11, 12]
+        materializer.store.close()
+
+
+async def _failed_users_stay_dirty_and_are_served_live():
+    with tempfile.TemporaryDirectory() as directory:
+        materializer = make_materializer(directory)
+        store_items(materializer, 1, [10, 11])
+        store_items(materializer, 2, [12])
+        materializer.mark_dirty(1)
+        materializer.mark_dirty(2)
+        served_during_refresh = {}
+
+        async def run_strategy_query(strategy, user_id, limit):
+            # Pendant le recalcul, l'ancienne entrée n'est pas servie
+            served_during_refresh[user_id] = served_ids(materializer, user_id, 2)
+            if user_id == 2:
+                raise RuntimeError("Neo4j indisponible")
+            return [{"id": 13, "title": "Offre 13", "price": 10.0}]
+
+        original = materialized_recommendations.run_strategy_query
+        materialized_recommendations.run_strategy_query = run_strategy_query
+        try:
+            assert await materializer.run_once() == 1
+        finally:
+            materialized_recommendations.run_strategy_query = original
+
+        assert served_during_refresh == {1: None, 2: None}
+        assert materializer._dirty == {2}
+        assert served_ids(materializer, 1, 2) == [13]
+        assert served_ids(materializer, 2, 2) is None
+        assert materializer.stats()["materialized_users"] == 2
+        materializer.store.close()
+
+
+def test_failed_users_stay_dirty_and_are_served_live():
+    asyncio.run(_failed_users_stay_dirty_and_are_served_live())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des recommandations matérialisées")
+    print("=" * 50)
+
+    tests = [
+        test_unavailable_offers_are_not_served,
+        test_truncated_top_n_falls_back_to_live_query,
+        test_failed_users_stay_dirty_and_are_served_live,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
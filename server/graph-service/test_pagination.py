@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests de la pagination keyset des recommandations
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import HTTPException, Response
+
+import pagination
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate, slice_after
+
+
+def ranking(size: int):
+    """Classement (score, ID) décroissants avec des ex aequo"""
+    items = [{"id": offer_id, "relevanceScore": float(offer_id // 10)} for offer_id in range(1, size + 1)]
+    return sorted(items, key=lambda item: (item["relevanceScore"], item["id"]), reverse=True)
+
+
+def make_fetch(items, calls=None):
+    async def fetch(n):
+        if calls is not None:
+            calls.append(n)
+        return items[:n]
+    return fetch
+
+
+async def read_all(fetch, limit):
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        pages.append([item["id"] for item in await paginate(fetch, limit, cursor, response)])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor((3.5, 42)), 2) == (3.5, 42)
+
+
+def test_invalid_cursor_is_rejected():
+    for cursor in ("not-a-cursor", encode_cursor((1,)), encode_cursor(("a", 2))):
+        try:
+            decode_cursor(cursor, 2)
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError(f"curseur accepté: {cursor}")
+
+
+def test_slice_after_skips_nothing_when_cursor_offer_disappears():
+    items = ranking(30)
+    page, cursor = slice_after(items, None, 10)
+    assert cursor is not None
+
+    # L'offre du curseur est vendue entre deux pages
+    remaining = [item for item in items if item["id"] != page[-1]["id"]]
+    next_page, _ = slice_after(remaining, decode_cursor(cursor, 2), 10)
+    assert [item["id"] for item in next_page] == [item["id"] for item in items[10:20]]
+
+
+async def _pages_cover_the_ranking_beyond_the_first_window():
+    items = ranking(180)
+    calls = []
+    pages = await read_all(make_fetch(items, calls), 25)
+
+    flattened = [offer_id for page in pages for offer_id in page]
+    assert flattened == [item["id"] for item in items]
+    assert max(calls) > pagination.RECOMMENDATION_PAGE_WINDOW
+
+
+async def _cursor_beyond_max_depth_is_gone():
+    items = ranking(2000)
+    cursor = encode_cursor((items[-1]["relevanceScore"], items[-1]["id"]))
+    try:
+        await paginate(make_fetch(items), 10, cursor, Response())
+    except HTTPException as e:
+        assert e.status_code == 410
+    else:
+        raise AssertionError("curseur hors profondeur accepté")
+
+
+async def _last_page_has_no_cursor():
+    response = Response()
+    page = await paginate(make_fetch(ranking(5)), 5, None, response)
+    assert len(page) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_pages_cover_the_ranking_beyond_the_first_window():
+    asyncio.run(_pages_cover_the_ranking_beyond_the_first_window())
+
+
+def test_cursor_beyond_max_depth_is_gone():
+    asyncio.run(_cursor_beyond_max_depth_is_gone())
+
+
+def test_last_page_has_no_cursor():
+    asyncio.run(_last_page_has_no_cursor())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests de la pagination keyset")
+    print("=" * 50)
+
+    tests = [
+        test_cursor_round_trip,
+        test_invalid_cursor_is_rejected,
+        test_slice_after_skips_nothing_when_cursor_offer_disappears,
+        test_pages_cover_the_ranking_beyond_the_first_window,
+        test_cursor_beyond_max_depth_is_gone,
+        test_last_page_has_no_cursor,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
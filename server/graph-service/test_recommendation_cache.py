@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests du cache des recommandations (niveau en mémoire, sans Redis)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from recommendation_cache import LocalTier, RecommendationCache, collect_offer_ids, offer_tag, user_tag
+
+
+def make_cache() -> RecommendationCache:
+    return RecommendationCache(ttl=60, local_ttl=60, max_entries=100, redis_url="")
+
+
+def test_collect_offer_ids_walks_nested_responses():
+    response = {"offers": [{"id": 1, "title": "A"}, {"offerId": 2}], "chain": [{"userOfferId": 3, "userId": 9}]}
+    assert collect_offer_ids(response) == {1, 2, 3}
+
+
+def test_local_tier_invalidates_exactly_the_tagged_entries():
+    tier = LocalTier(max_entries=10)
+    tier.set("a", 1, 60, ["user:1", "offer:10"])
+    tier.set("b", 2, 60, ["user:2", "offer:10"])
+    tier.set("c", 3, 60, ["user:2"])
+
+    assert tier.invalidate_tag("offer:10") == 2
+    assert tier.get("a") == (False, None)
+    assert tier.get("b") == (False, None)
+    assert tier.get("c") == (True, 3)
+    # L'index des étiquettes ne garde pas de clé supprimée
+    assert tier.invalidate_tag("user:2") == 1
+    assert not tier._tags
+
+
+def test_local_tier_evicts_least_recently_used():
+    tier = LocalTier(max_entries=2)
+    tier.set("a", 1, 60, ["t"])
+    tier.set("b", 2, 60, ["t"])
+    tier.get("a")
+    tier.set("c", 3, 60, ["t"])
+
+    assert tier.get("b") == (False, None)
+    assert tier.get("a") == (True, 1)
+    assert tier._tags["t"] == {"a", "c"}
+
+
+async def _response_is_tagged_with_its_offers():
+    cache = make_cache()
+
+    async def compute():
+        return [{"id": 10}, {"id": 11}]
+
+    await cache.get_or_compute("category", 1, 2, compute, tags=[user_tag(1)])
+    assert await cache.invalidate_offer(11) == 1
+    assert len(cache.local) == 0
+
+
+async def _invalidation_during_compute_only_skips_affected_responses():
+    cache = make_cache()
+    release = asyncio.Event()
+
+    def slow(offer_id):
+        async def compute():
+            await release.wait()
+            return [{"id": offer_id}]
+        return compute
+
+    first = asyncio.create_task(cache.get_or_compute("similar", 1, 1, slow(10)))
+    second = asyncio.create_task(cache.get_or_compute("similar", 2, 1, slow(20)))
+    await asyncio.sleep(0)
+
+    await cache.invalidate_offer(10)
+    release.set()
+    await asyncio.gather(first, second)
+
+    # Seule la réponse contenant l'offre invalidée est écartée
+    assert cache.local.get(cache.make_key("similar", 1, 1))[0] is False
+    assert cache.local.get(cache.make_key("similar", 2, 1))[0] is True
+    assert not cache._inflight
+
+
+async def _generations_are_pruned_when_idle():
+    cache = make_cache()
+    cache.local.max_entries = 2
+    for offer_id in range(5):
+        await cache.invalidate_tag(offer_tag(offer_id))
+    assert len(cache._tag_generations) <= 2
+
+
+def test_response_is_tagged_with_its_offers():
+    asyncio.run(_response_is_tagged_with_its_offers())
+
+
+def test_invalidation_during_compute_only_skips_affected_responses():
+    asyncio.run(_invalidation_during_compute_only_skips_affected_responses())
+
+
+def test_generations_are_pruned_when_idle():
+    asyncio.run(_generations_are_pruned_when_idle())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests du cache des recommandations")
+    print("=" * 50)
+
+    tests = [
+        test_collect_offer_ids_walks_nested_responses,
+        test_local_tier_invalidates_exactly_the_tagged_entries,
+        test_local_tier_evicts_least_recently_used,
+        test_response_is_tagged_with_its_offers,
+        test_invalidation_during_compute_only_skips_affected_responses,
+        test_generations_are_pruned_when_idle,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
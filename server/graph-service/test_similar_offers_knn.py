@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests du graphe kNN des offres similaires (index FAISS temporaire, sans Neo4j)
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import faiss
+import numpy as np
+
+from similar_offers_knn import SimilarOffersKNN, reverse_neighbors
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def write_index(path: str, vectors: dict):
+    """Index et métadonnées au format sauvegardé par le chatbot"""
+    index = faiss.IndexFlatIP(2)
+    index.add(np.stack(list(vectors.values())))
+    faiss.write_index(index, f"{path}.faiss")
+    metadata = {str(offer_id): {"offer_id": offer_id, "index_position": position}
+                for position, offer_id in enumerate(vectors)}
+    with open(f"{path}.metadata", 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
+
+
+def attributes(offer_id: int, available: bool = True):
+    return {"id": offer_id, "title": f"Offre {offer_id}", "price": 10.0,
+            "categoryId": None, "brandId": None, "available": available}
+
+
+def make_knn(directory: str, vectors: dict, k: int = 2) -> SimilarOffersKNN:
+    path = str(Path(directory) / "offer_embeddings")
+    write_index(path, vectors)
+    knn = SimilarOffersKNN(index_path=path, checkpoint_path=str(Path(directory) / "knn.json"), k=k)
+    knn.attributes = {offer_id: attributes(offer_id) for offer_id in vectors}
+
+    async def fetch_attributes(offer_ids):
+        return {offer_id: dict(knn.attributes[offer_id]) for offer_id in offer_ids if offer_id in knn.attributes}
+
+    knn._fetch_attributes = fetch_attributes
+    return knn
+
+
+def neighbor_ids(knn: SimilarOffersKNN, offer_id: int):
+    return [neighbor_id for neighbor_id, _ in knn._neighbors[offer_id]]
+
+
+BASE_VECTORS = {1: unit(1, 0), 2: unit(1, 0.5), 3: unit(1, 1), 4: unit(0, 1)}
+
+
+async def _new_offer_enters_existing_lists():
+    with tempfile.TemporaryDirectory() as directory:
+        knn = make_knn(directory, BASE_VECTORS)
+        await knn.rebuild()
+        assert neighbor_ids(knn, 1) == [2, 3]
+
+        # Nouvelle offre indexée, presque identique à 1
+        write_index(knn.index_path, {**BASE_VECTORS, 5: unit(1, 0.05)})
+        knn.attributes[5] = attributes(5)
+        knn._index_mtime = None
+        await knn.refresh()
+
+        assert neighbor_ids(knn, 5) == [1, 2]
+        assert neighbor_ids(knn, 1) == [5, 2]
+        assert knn.metrics["reverse_refreshed_offers"] > 0
+
+
+async def _sold_offer_leaves_existing_lists():
+    with tempfile.TemporaryDirectory() as directory:
+        knn = make_knn(directory, BASE_VECTORS)
+        await knn.rebuild()
+
+        knn.attributes[2] = attributes(2, available=False)
+        knn.mark_changed(2, {"available": False})
+        await knn.refresh()
+
+        # La liste de 1 est recalculée : elle garde k voisins disponibles
+        assert neighbor_ids(knn, 1) == [3, 4]
+
+
+def test_reverse_neighbors_only_selects_lists_the_offer_can_enter():
+    offer_ids = np.array([1, 2, 3, 4], dtype=np.int64)
+    vectors = np.stack([BASE_VECTORS[offer_id] for offer_id in offer_ids])
+    offers = {offer_id: attributes(offer_id) for offer_id in (1, 2, 3, 4)}
+    neighbors = {1: [(2, 0.99)], 2: [(1, 0.99)], 3: [(4, 0.70)], 4: [(3, 0.71)]}
+
+    # 1 est trop éloignée de 4 (cosinus 0) pour entrer dans sa liste
+    assert reverse_neighbors([1], offer_ids, vectors, offers, neighbors, k=1, max_bonus=0.0) == {2, 3}
+
+
+def test_get_returns_none_when_every_neighbor_is_unavailable():
+    knn = SimilarOffersKNN(k=2)
+    knn._neighbors = {1: [(2, 0.9), (3, 0.8)]}
+    knn._offers = {2: attributes(2, available=False), 3: attributes(3)}
+    assert [item["id"] for item in knn.get(1, 5)] == [3]
+
+    knn._offers[3]["available"] = False
+    assert knn.get(1, 5) is None
+    assert knn.get(99, 5) is None
+    assert knn.metrics["misses"] == 2
+
+
+def test_new_offer_enters_existing_lists():
+    asyncio.run(_new_offer_enters_existing_lists())
+
+
+def test_sold_offer_leaves_existing_lists():
+    asyncio.run(_sold_offer_leaves_existing_lists())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des offres similaires (kNN)")
+    print("=" * 50)
+
+    tests = [
+        test_reverse_neighbors_only_selects_lists_the_offer_can_enter,
+        test_get_returns_none_when_every_neighbor_is_unavailable,
+        test_new_offer_enters_existing_lists,
+        test_sold_offer_leaves_existing_lists,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests des compteurs de tendance en fenêtre glissante (sans Neo4j)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from trending_counters import TrendingCounters
+
+HOUR = 3600
+NOW = 1_000 * HOUR
+
+
+def make_counters() -> TrendingCounters:
+    return TrendingCounters(bucket_seconds=HOUR, window_buckets=3)
+
+
+def test_totals_sum_the_window():
+    counters = make_counters()
+    counters.record(1, NOW - 2 * HOUR, now=NOW)
+    counters.record(1, NOW, count=2, now=NOW)
+    counters.record(2, NOW, now=NOW)
+
+    assert counters.top_k(10, now=NOW) == [(1, 3), (2, 1)]
+
+
+def test_expired_buckets_leave_the_totals():
+    counters = make_counters()
+    counters.record(1, NOW, count=5, now=NOW)
+    counters.record(2, NOW + 2 * HOUR, count=2, now=NOW + 2 * HOUR)
+
+    assert counters.top_k(10, now=NOW + 2 * HOUR) == [(1, 5), (2, 2)]
+    # La tranche de NOW sort de la fenêtre de 3 tranches
+    assert counters.top_k(10, now=NOW + 3 * HOUR) == [(2, 2)]
+    assert len(counters) == 1
+    assert counters.top_k(10, now=NOW + 10 * HOUR) == []
+    assert counters.stats()["buckets"] == 0
+
+
+def test_late_interactions_keep_buckets_ordered():
+    counters = make_counters()
+    counters.record(1, NOW, now=NOW)
+    # Interaction en retard, dans une tranche antérieure encore dans la fenêtre
+    counters.record(2, NOW - HOUR, count=4, now=NOW)
+    assert list(counters._buckets) == [counters.bucket_of(NOW - HOUR), counters.bucket_of(NOW)]
+
+    # Elle expire avant la tranche plus récente
+    assert counters.top_k(10, now=NOW + 2 * HOUR) == [(1, 1)]
+
+
+def test_interactions_outside_the_window_are_ignored():
+    counters = make_counters()
+    counters.record(1, NOW - 3 * HOUR, now=NOW)
+    counters.record(2, NOW, count=0, now=NOW)
+    assert counters.top_k(10, now=NOW) == []
+
+
+def test_ties_are_ranked_by_offer_id():
+    counters = make_counters()
+    for offer_id in (5, 9, 7):
+        counters.record(offer_id, NOW, now=NOW)
+    assert [offer_id for offer_id, _ in counters.top_k(2, now=NOW)] == [9, 7]
+
+
+def test_checkpoint_round_trip():
+    counters = make_counters()
+    counters.record(1, NOW - HOUR, count=3, now=NOW)
+    counters.record(2, NOW, now=NOW)
+
+    data = counters.to_dict()
+    restored = make_counters()
+    restored.load_buckets({int(bucket): {int(offer_id): count for offer_id, count in counts.items()}
+                           for bucket, counts in data["buckets"].items()}, now=NOW)
+    assert restored.top_k(10, now=NOW) == counters.top_k(10, now=NOW)
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des compteurs de tendance")
+    print("=" * 50)
+
+    tests = [
+        test_totals_sum_the_window,
+        test_expired_buckets_leave_the_totals,
+        test_late_interactions_keep_buckets_ordered,
+        test_interactions_outside_the_window_are_ignored,
+        test_ties_are_ranked_by_offer_id,
+        test_checkpoint_round_trip,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Tests des préférences utilisateur : le profil chatbot (une requête) et
+/user-preferences/{id} (requêtes unitaires) rendent les mêmes préférences
+"""
+
+import asyncio
+import sys
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import user_preferences
+from user_preferences import (
+    BATCH_PROFILE_QUERY, BRAND_PREFERENCES_QUERY, BRAND_SCORES, CATEGORY_PREFERENCES_QUERY,
+    CATEGORY_SCORES, CHATBOT_PROFILE_QUERY, INTERACTION_TOTALS, PREFERENCES_STATS_QUERY,
+    PREFERRED_BRANDS_QUERY, PREFERRED_CATEGORIES_QUERY
+)
+
+# Interactions (type, catégorie, marque, prix) d'un utilisateur de test
+INTERACTIONS = [
+    ("LIKED", 1, 10, 120.0),
+    ("VIEWED", 1, 11, 80.0),
+    ("VIEWED", 2, 10, 300.0),
+    ("VIEWED", 2, 12, 50.0),
+    ("VIEWED", 2, 12, 60.0),
+    ("LIKED", 3, 11, 900.0),
+    ("SEARCHED", None, None, 20.0),
+]
+
+
+def scores(key_index: int, limit=None):
+    """Évaluation en Python des fragments CATEGORY_SCORES / BRAND_SCORES"""
+    counts, totals = defaultdict(int), defaultdict(int)
+    for interaction in INTERACTIONS:
+        kind, key = interaction[0], interaction[key_index]
+        if kind in ("LIKED", "VIEWED") and key is not None:
+            counts[key] += 1
+            totals[key] += 2 if kind == "LIKED" else 1
+    ordered = sorted(counts, key=lambda key: (-totals[key], key))
+    return [(key, counts[key], totals[key]) for key in ordered[:limit]]
+
+
+def category(key, count, score):
+    return {"category_id": key, "category_name": f"cat{key}", "category_name_fr": f"Catégorie {key}",
+            "interaction_count": count, "preference_score": score}
+
+
+def brand(key, count, score):
+    return {"brand_id": key, "brand_name": f"brand{key}", "brand_name_fr": f"Marque {key}",
+            "interaction_count": count, "preference_score": score}
+
+
+def totals():
+    prices = [interaction[3] for interaction in INTERACTIONS]
+    return {
+        "total_views": sum(1 for interaction in INTERACTIONS if interaction[0] == "VIEWED"),
+        "total_likes": sum(1 for interaction in INTERACTIONS if interaction[0] == "LIKED"),
+        "total_searches": sum(1 for interaction in INTERACTIONS if interaction[0] == "SEARCHED"),
+        "avg_session_duration": 0,
+        "price_range": {"min": min(prices), "max": max(prices)},
+    }
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    async def single(self):
+        return self.records[0] if self.records else None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self.records:
+            yield record
+
+
+class FakeSession:
+    """Répond à chaque requête à partir de INTERACTIONS"""
+
+    async def run(self, query, userId=None, limit=None, **params):
+        if query == CHATBOT_PROFILE_QUERY:
+            return FakeResult([{
+                "categories": [category(*row) for row in scores(1, limit)],
+                "brands": [brand(*row) for row in scores(2, limit)],
+                **totals()
+            }])
+        now = "2024-01-01T00:00:00"
+        if query in (PREFERRED_CATEGORIES_QUERY, CATEGORY_PREFERENCES_QUERY):
+            return FakeResult([{**category(*row), "last_interaction": now} for row in scores(1, limit)])
+        if query in (PREFERRED_BRANDS_QUERY, BRAND_PREFERENCES_QUERY):
+            return FakeResult([{**brand(*row), "last_interaction": now} for row in scores(2, limit)])
+        if query == PREFERENCES_STATS_QUERY:
+            return FakeResult([{"user_id": userId, "most_active_hours": list(range(24)), **totals()}])
+        raise AssertionError(f"requête inattendue: {query}")
+
+
+@asynccontextmanager
+async def fake_neo4j_session(**kwargs):
+    yield FakeSession()
+
+
+def without_timestamps(preferences):
+    payload = preferences.dict()
+    payload.pop("last_updated")
+    for item in payload["preferred_categories"] + payload["preferred_brands"]:
+        item.pop("last_interaction")
+    return payload
+
+
+def test_profile_and_unit_queries_share_the_scoring():
+    for query in (CHATBOT_PROFILE_QUERY, BATCH_PROFILE_QUERY, PREFERRED_CATEGORIES_QUERY, CATEGORY_PREFERENCES_QUERY):
+        assert CATEGORY_SCORES in query
+    for query in (CHATBOT_PROFILE_QUERY, BATCH_PROFILE_QUERY, PREFERRED_BRANDS_QUERY, BRAND_PREFERENCES_QUERY):
+        assert BRAND_SCORES in query
+    for query in (CHATBOT_PROFILE_QUERY, BATCH_PROFILE_QUERY, PREFERENCES_STATS_QUERY):
+        assert INTERACTION_TOTALS in query
+
+
+async def _profile_matches_the_unit_endpoint():
+    original = user_preferences.neo4j_session
+    user_preferences.neo4j_session = fake_neo4j_session
+    try:
+        full = await user_preferences.get_user_preferences(1)
+        profile = await user_preferences.get_user_chatbot_profile(1, limit=len(INTERACTIONS))
+        limited = await user_preferences.get_user_chatbot_profile(1, limit=2)
+        categories = await user_preferences.get_user_category_preferences(1, limit=2)
+    finally:
+        user_preferences.neo4j_session = original
+
+    assert without_timestamps(profile) == without_timestamps(full)
+    # Un LIKE compte double : catégorie 1 (1 LIKE + 1 VIEW) devant catégorie 2 (3 VIEW)
+    assert [item["category_id"] for item in full.preferred_categories] == [1, 2, 3]
+    assert [item["preference_score"] for item in full.preferred_categories] == [3.0, 3.0, 2.0]
+    assert [item["category_id"] for item in limited.preferred_categories] == \
+        [item.category_id for item in categories]
+
+
+def test_profile_matches_the_unit_endpoint():
+    asyncio.run(_profile_matches_the_unit_endpoint())
+
+
+def main():
+    """Fonction principale de test"""
+    print("🚀 Tests des préférences utilisateur")
+    print("=" * 50)
+
+    tests = [
+        test_profile_and_unit_queries_share_the_scoring,
+        test_profile_matches_the_unit_endpoint,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+
+    print("=" * 50)
+    if failures:
+        print(f"⚠️ {failures} test(s) en échec")
+        sys.exit(1)
+    print("🎉 Tous les tests sont passés !")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Compteurs de tendance en fenêtre glissante
+Compteurs par offre et par tranche horaire sur les 7 derniers jours, alimentés
+par /interactions, reconstruits depuis le graphe au démarrage et sauvegardés
+périodiquement sur disque
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import json
+import os
+import time
+import logging
+
+from neo4j_driver import neo4j_session
+
+logger = logging.getLogger(__name__)
+
+# Configuration des tendances
+TRENDING_BUCKET_SECONDS = int(os.getenv('TRENDING_BUCKET_SECONDS', '3600'))
+TRENDING_WINDOW_BUCKETS = int(os.getenv('TRENDING_WINDOW_BUCKETS', str(7 * 24)))
+TRENDING_CHECKPOINT_PATH = os.getenv('TRENDING_CHECKPOINT_PATH', 'trending_checkpoint.json')
+TRENDING_CHECKPOINT_INTERVAL = float(os.getenv('TRENDING_CHECKPOINT_INTERVAL', '300'))
+
+# Interactions par offre et par tranche sur la fenêtre (reconstruction)
+TRENDING_REBUILD_QUERY = """
+    MATCH (o:Offer)<-[interaction:VIEWED|LIKED]-(:User)
+    WHERE interaction.timestamp >= datetime({epochSeconds: $since})
+    RETURN o.id as offerId,
+           interaction.timestamp.epochSeconds / $bucketSeconds as bucket,
+           count(*) as interactions
+"""
+
+# Détails des offres candidates encore disponibles
+TRENDING_OFFERS_QUERY = """
+    UNWIND $offerIds AS offerId
+    MATCH (o:Offer {id: offerId})
+    WHERE o.status = 'available'
+    RETURN o.id as id, o.title as title, o.price as price
+"""
+
+class TrendingCounters:
+    """
+    Compteurs glissants : une tranche (offre -> nombre) par intervalle de
+    bucket_seconds, et le total par offre sur les window_buckets dernières
+    tranches, mis à jour à l'entrée et à la sortie de chaque tranche.
+    """
+
+    def __init__(self, bucket_seconds: int = TRENDING_BUCKET_SECONDS, window_buckets: int = TRENDING_WINDOW_BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self._buckets: "OrderedDict[int, Dict[int, int]]" = OrderedDict()
+        self._totals: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    def bucket_of(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def _expire(self, current_bucket: int):
+        """Retire de la fenêtre les tranches trop anciennes"""
+        oldest = current_bucket - self.window_buckets + 1
+        while self._buckets:
+            bucket = next(iter(self._buckets))
+            if bucket >= oldest:
+                break
+            for offer_id, count in self._buckets.pop(bucket).items():
+                remaining = self._totals.get(offer_id, 0) - count
+                if remaining > 0:
+                    self._totals[offer_id] = remaining
+                else:
+                    self._totals.pop(offer_id, None)
+
+    def record(self, offer_id: int, timestamp: Optional[float] = None, count: int = 1, now: Optional[float] = None):
+        """Compte une interaction sur une offre"""
+        now = time.time() if now is None else now
+        timestamp = now if timestamp is None else timestamp
+        current = self.bucket_of(now)
+        bucket = self.bucket_of(timestamp)
+        if bucket <= current - self.window_buckets or count <= 0:
+            return
+
+        self._expire(current)
+        counts = self._buckets.get(bucket)
+        if counts is None:
+            newest = self.last_bucket()
+            counts = self._buckets[bucket] = {}
+            # Les tranches restent ordonnées (insertion hors ordre : interaction en retard)
+            if newest is not None and bucket < newest:
+                self._buckets = OrderedDict(sorted(self._buckets.items()))
+        counts[offer_id] = counts.get(offer_id, 0) + count
+        self._totals[offer_id] = self._totals.get(offer_id, 0) + count
+
+    def top_k(self, k: int, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """Retourne les k offres les plus actives sur la fenêtre : [(offre, interactions)]"""
+        self._expire(self.bucket_of(time.time() if now is None else now))
+        return heapq.nlargest(k, self._totals.items(), key=lambda item: (item[1], item[0]))
+
+    def last_bucket(self) -> Optional[int]:
+        return next(reversed(self._buckets)) if self._buckets else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": {str(bucket): {str(offer_id): count for offer_id, count in counts.items()}
+                        for bucket, counts in self._buckets.items()}
+        }
+
+    def load_buckets(self, buckets: Dict[int, Dict[int, int]], now: Optional[float] = None):
+        """Remplace le contenu par des tranches {bucket: {offre: nombre}}"""
+        now = time.time() if now is None else now
+        self._buckets = OrderedDict()
+        self._totals = {}
+        for bucket, counts in sorted(buckets.items()):
+            for offer_id, count in counts.items():
+                self.record(offer_id, bucket * self.bucket_seconds, count, now=now)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "offers": len(self._totals),
+            "buckets": len(self._buckets),
+            "window_buckets": self.window_buckets,
+            "bucket_seconds": self.bucket_seconds
+        }
+
+class TrendingService:
+    """
+    Tendances servies depuis les compteurs en mémoire
+
+    Au démarrage, la fenêtre est reconstruite depuis le graphe puis complétée
+    par le dernier point de sauvegarde : les relations VIEWED/LIKED ne gardent
+    que le dernier horodatage, la sauvegarde conserve le décompte réel des
+    interactions pour les tranches qu'elle couvre.
+    """
+
+    def __init__(self,
+                 counters: Optional[TrendingCounters] = None,
+                 checkpoint_path: str = TRENDING_CHECKPOINT_PATH,
+                 checkpoint_interval: float = TRENDING_CHECKPOINT_INTERVAL):
+        self.counters = counters or TrendingCounters()
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.ready = False
+        self._worker: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self.metrics = {"recorded": 0, "checkpoints": 0, "last_checkpoint_ms": 0.0, "rebuild_ms": 0.0}
+
+    def record(self, offer_id: int, timestamp: Optional[float] = None):
+        self.counters.record(offer_id, timestamp)
+        self.metrics["recorded"] += 1
+
+    def _read_checkpoint(self) -> Dict[int, Dict[int, int]]:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("bucket_seconds") != self.counters.bucket_seconds:
+            return {}
+        return {
+            int(bucket): {int(offer_id): count for offer_id, count in counts.items()}
+            for bucket, counts in data.get("buckets", {}).items()
+        }
+
+    async def rebuild(self):
+        """Reconstruit la fenêtre depuis le graphe et le dernier point de sauvegarde"""
+        start = time.perf_counter()
+        since = int(time.time()) - self.counters.bucket_seconds * self.counters.window_buckets
+
+        buckets: Dict[int, Dict[int, int]] = {}
+        async with neo4j_session() as session:
+            result = await session.run(
+                TRENDING_REBUILD_QUERY, since=since, bucketSeconds=self.counters.bucket_seconds
+            )
+            async for record in result:
+                buckets.setdefault(record["bucket"], {})[record["offerId"]] = record["interactions"]
+
+        try:
+            checkpoint = await asyncio.to_thread(self._read_checkpoint)
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture sauvegarde des tendances: {e}")
+            checkpoint = {}
+
+        if checkpoint:
+            # Tranches couvertes par la sauvegarde : décompte exact ; au-delà : graphe
+            last_saved = max(checkpoint)
+            buckets = {bucket: counts for bucket, counts in buckets.items() if bucket > last_saved}
+            buckets.update(checkpoint)
+
+        self.counters.load_buckets(buckets)
+        self.ready = True
+        self.metrics["rebuild_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"📈 Tendances reconstruites: {len(self.counters)} offres en {self.metrics['rebuild_ms']:.0f} ms")
+
+    def _write_checkpoint(self, data: Dict[str, Any]):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def checkpoint(self):
+        """Sauvegarde les tranches de la fenêtre sur disque (écriture atomique)"""
+        if not self.ready:
+            return
+        start = time.perf_counter()
+        await asyncio.to_thread(self._write_checkpoint, self.counters.to_dict())
+        self.metrics["checkpoints"] += 1
+        self.metrics["last_checkpoint_ms"] = (time.perf_counter() - start) * 1000
+
+    async def get_trending(self, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top des offres disponibles sur la fenêtre, ou None si les compteurs ne sont pas prêts
+
+        Les candidats sont lus dans les compteurs puis complétés (titre, prix,
+        disponibilité) par une seule requête sur leurs IDs.
+        """
+        if not self.ready:
+            return None
+
+        candidates = limit * 2 + 10
+        while True:
+            top = self.counters.top_k(candidates)
+            counts = dict(top)
+            async with neo4j_session() as session:
+                result = await session.run(TRENDING_OFFERS_QUERY, offerIds=list(counts))
+                offers = [dict(record) async for record in result]
+            # Assez d'offres disponibles, ou plus aucun candidat à ajouter
+            if len(offers) >= limit or len(top) < candidates:
+                break
+            candidates *= 2
+
+        for offer in offers:
+            offer["relevanceScore"] = counts[offer["id"]]
+        offers.sort(key=lambda offer: (offer["relevanceScore"], offer["id"]), reverse=True)
+        return offers[:limit]
+
+    async def start(self):
+        """Reconstruit les compteurs puis démarre la sauvegarde périodique"""
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"❌ Erreur reconstruction des tendances: {e}")
+        if self._worker is None or self._worker.done():
+            self._stop_event = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._stop_event.set()
+            await self._worker
+            self._worker = None
+        try:
+            await self.checkpoint()
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde des tendances: {e}")
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.checkpoint_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                if not self.ready:
+                    await self.rebuild()
+                await self.checkpoint()
+            except Exception as e:
+                logger.error(f"❌ Erreur sauvegarde des tendances: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, **self.counters.stats(), **self.metrics}
+
+# Instance globale des tendances
+trending_service = TrendingService()
@@ -5,20 +5,12 @@ Endpoints pour la récupération des préférences utilisateur depuis Neo4j
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from neo4j import GraphDatabase
-import os
+from datetime import datetime
 import logging
 
-logger = logging.getLogger(__name__)
-
-# Configuration Neo4j
-NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
-NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
-NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD', 'neo4j123')
+from neo4j_driver import neo4j_session
 
-def get_neo4j_driver():
-    """Récupère le driver Neo4j"""
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+logger = logging.getLogger(__name__)
 
 # Modèles Pydantic
 class UserPreferences(BaseModel):
@@ -57,9 +49,253 @@ class UserInteractionStats(BaseModel):
     most_active_hours: List[int]
     preferred_price_range: Dict[str, float]
 
+class BatchPreferencesRequest(BaseModel):
+    """Requête de préférences pour plusieurs utilisateurs"""
+    user_ids: List[int]
+    limit: int = 10
+
 # Router pour les préférences utilisateur
 router = APIRouter(prefix="/user-preferences", tags=["User Preferences"])
 
+# Score de préférence des catégories et des marques d'un utilisateur `u` déjà
+# lié : un LIKE compte double par rapport à un VIEW. Fragments partagés par les
+# requêtes unitaires (/user-preferences/{id}, /categories, /brands) et par le
+# profil chatbot, pour que les deux chemins classent les préférences à l'identique.
+CATEGORY_SCORES = """
+        MATCH (u)-[r:LIKED|VIEWED]->(:Offer)-[:BELONGS_TO]->(cat:Category)
+        WITH cat, count(r) as interaction_count,
+             sum(CASE WHEN type(r) = 'LIKED' THEN 2 ELSE 1 END) as preference_score
+        ORDER BY preference_score DESC, cat.id
+"""
+
+BRAND_SCORES = """
+        MATCH (u)-[r:LIKED|VIEWED]->(:Offer)-[:IS_BRAND]->(brand:Brand)
+        WITH brand, count(r) as interaction_count,
+             sum(CASE WHEN type(r) = 'LIKED' THEN 2 ELSE 1 END) as preference_score
+        ORDER BY preference_score DESC, brand.id
+"""
+
+# Statistiques d'interaction de `u` sur les relations r -> o
+INTERACTION_TOTALS = """
+               count(CASE WHEN type(r) = 'VIEWED' THEN 1 END) as total_views,
+               count(CASE WHEN type(r) = 'LIKED' THEN 1 END) as total_likes,
+               count(CASE WHEN type(r) = 'SEARCHED' THEN 1 END) as total_searches,
+               coalesce(avg(r.duration), 0) as avg_session_duration,
+               {min: coalesce(min(o.price), 0), max: coalesce(max(o.price), 10000)} as price_range
+"""
+
+CATEGORY_COLUMNS = """
+    RETURN cat.id as category_id, cat.name as category_name, cat.nameFr as category_name_fr,
+           interaction_count, preference_score,
+           datetime() as last_interaction
+"""
+
+BRAND_COLUMNS = """
+    RETURN brand.id as brand_id, brand.name as brand_name, brand.nameFr as brand_name_fr,
+           interaction_count, preference_score,
+           datetime() as last_interaction
+"""
+
+# Agrégats du profil chatbot : catégories, marques et statistiques
+# calculées dans des sous-requêtes
+PROFILE_SUBQUERIES = """
+    CALL {
+        WITH u""" + CATEGORY_SCORES + """
+        LIMIT $limit
+        RETURN collect({
+            category_id: cat.id, category_name: cat.name, category_name_fr: cat.nameFr,
+            interaction_count: interaction_count, preference_score: preference_score
+        }) as categories
+    }
+    CALL {
+        WITH u""" + BRAND_SCORES + """
+        LIMIT $limit
+        RETURN collect({
+            brand_id: brand.id, brand_name: brand.name, brand_name_fr: brand.nameFr,
+            interaction_count: interaction_count, preference_score: preference_score
+        }) as brands
+    }
+    CALL {
+        WITH u
+        OPTIONAL MATCH (u)-[r:VIEWED|LIKED|SEARCHED]->(o:Offer)
+        RETURN""" + INTERACTION_TOTALS + """    }
+"""
+
+# Profil complet pour le chatbot en une seule requête Cypher
+CHATBOT_PROFILE_QUERY = """
+    MATCH (u:User {id: $userId})
+""" + PROFILE_SUBQUERIES + """
+    RETURN categories, brands, total_views, total_likes, total_searches,
+           avg_session_duration, price_range
+"""
+
+# Profils de plusieurs utilisateurs en une seule requête (UNWIND)
+BATCH_PROFILE_QUERY = """
+    UNWIND $userIds as userId
+    OPTIONAL MATCH (u:User {id: userId})
+    WITH userId, u
+""" + PROFILE_SUBQUERIES + """
+    RETURN userId as user_id, u IS NOT NULL as found,
+           categories, brands, total_views, total_likes, total_searches,
+           avg_session_duration, price_range
+"""
+
+# Nombre maximum d'utilisateurs par requête batch
+MAX_BATCH_USERS = 500
+
+PREFERRED_CATEGORIES_QUERY = """
+    MATCH (u:User {id: $userId})""" + CATEGORY_SCORES + CATEGORY_COLUMNS
+
+PREFERRED_BRANDS_QUERY = """
+    MATCH (u:User {id: $userId})""" + BRAND_SCORES + BRAND_COLUMNS
+
+# Aucune ligne si l'utilisateur n'a aucune interaction (regroupement par u)
+PREFERENCES_STATS_QUERY = """
+    MATCH (u:User {id: $userId})-[r:VIEWED|LIKED|SEARCHED]->(o:Offer)
+    RETURN u.id as user_id,
+           [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23] as most_active_hours,""" + INTERACTION_TOTALS
+
+CATEGORY_PREFERENCES_QUERY = """
+    MATCH (u:User {id: $userId})""" + CATEGORY_SCORES + """
+    LIMIT $limit""" + CATEGORY_COLUMNS
+
+BRAND_PREFERENCES_QUERY = """
+    MATCH (u:User {id: $userId})""" + BRAND_SCORES + """
+    LIMIT $limit""" + BRAND_COLUMNS
+
+PRICE_RANGE_QUERY = """
+    MATCH (u:User {id: $userId})-[r:VIEWED|LIKED]->(o:Offer)
+    WHERE o.price IS NOT NULL
+    WITH collect(o.price) as prices
+    RETURN {min: coalesce(min(prices), 0), max: coalesce(max(prices), 10000)} as price_range
+"""
+
+INTERACTION_STATS_QUERY = """
+    MATCH (u:User {id: $userId})-[r:VIEWED|LIKED|SEARCHED]->(o:Offer)
+    WITH u, 
+         count(CASE WHEN type(r) = 'VIEWED' THEN 1 END) as total_views,
+         count(CASE WHEN type(r) = 'LIKED' THEN 1 END) as total_likes,
+         count(CASE WHEN type(r) = 'SEARCHED' THEN 1 END) as total_searches,
+         avg(r.duration) as avg_duration,
+         collect(DISTINCT o.price) as prices
+    RETURN total_views, total_likes, total_searches, 
+           coalesce(avg_duration, 0) as avg_session_duration,
+           [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23] as most_active_hours,
+           {min: coalesce(min(prices), 0), max: coalesce(max(prices), 10000)} as preferred_price_range
+"""
+
+def empty_user_preferences(user_id: int) -> UserPreferences:
+    """Préférences d'un utilisateur inconnu ou sans interactions"""
+    return UserPreferences(
+        user_id=user_id,
+        preferred_categories=[],
+        preferred_brands=[],
+        price_range={"min": 0, "max": 10000},
+        interaction_stats={
+            "total_views": 0,
+            "total_likes": 0,
+            "total_searches": 0,
+            "avg_session_duration": 0.0,
+            "most_active_hours": [],
+            "preferred_price_range": {"min": 0, "max": 10000}
+        },
+        last_updated=datetime.now().isoformat()
+    )
+
+def build_chatbot_profile(user_id: int, record) -> UserPreferences:
+    """Construit les préférences à partir d'un enregistrement de CHATBOT_PROFILE_QUERY"""
+    if not record:
+        return empty_user_preferences(user_id)
+    
+    now = datetime.now().isoformat()
+    preferred_categories = [
+        CategoryPreference(**category, last_interaction=now).dict()
+        for category in record["categories"]
+    ]
+    preferred_brands = [
+        BrandPreference(**brand, last_interaction=now).dict()
+        for brand in record["brands"]
+    ]
+    
+    return UserPreferences(
+        user_id=user_id,
+        preferred_categories=preferred_categories,
+        preferred_brands=preferred_brands,
+        price_range=record["price_range"],
+        interaction_stats={
+            "total_views": record["total_views"],
+            "total_likes": record["total_likes"],
+            "total_searches": record["total_searches"],
+            "avg_session_duration": float(record["avg_session_duration"]),
+            "most_active_hours": list(range(24)),
+            "preferred_price_range": record["price_range"]
+        },
+        last_updated=now
+    )
+
+@router.post("/batch", response_model=List[UserPreferences])
+async def get_users_preferences_batch(request: BatchPreferencesRequest):
+    """
+    Récupère les préférences de plusieurs utilisateurs en une seule transaction
+    
+    Les agrégats de catégories, marques et statistiques de tous les
+    utilisateurs sont calculés par une seule requête Cypher (UNWIND).
+    
+    Args:
+        request: IDs des utilisateurs et nombre maximum de catégories/marques
+        
+    Returns:
+        Préférences de chaque utilisateur, dans l'ordre des IDs demandés
+    """
+    user_ids = list(dict.fromkeys(request.user_ids))
+    if len(user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_BATCH_USERS} utilisateurs par requête")
+    if not user_ids:
+        return []
+    
+    try:
+        async with neo4j_session() as session:
+            async def read_profiles(tx):
+                result = await tx.run(BATCH_PROFILE_QUERY, userIds=user_ids, limit=request.limit)
+                return [record async for record in result]
+            
+            records = await session.execute_read(read_profiles)
+            
+            profiles = {
+                record["user_id"]: build_chatbot_profile(record["user_id"], record if record["found"] else None)
+                for record in records
+            }
+            return [profiles.get(user_id) or empty_user_preferences(user_id) for user_id in user_ids]
+            
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des préférences en batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des préférences: {str(e)}")
+
+@router.get("/{user_id}/chatbot-profile", response_model=UserPreferences)
+async def get_user_chatbot_profile(user_id: int, limit: int = 10):
+    """
+    Récupère en un seul aller-retour tout ce dont le chatbot a besoin
+    
+    Catégories, marques, gamme de prix et statistiques d'interaction sont
+    calculées par une seule requête Cypher (au lieu de trois).
+    
+    Args:
+        user_id: ID de l'utilisateur
+        limit: Nombre maximum de catégories et de marques
+        
+    Returns:
+        Préférences utilisateur complètes
+    """
+    try:
+        async with neo4j_session() as session:
+            result = await session.run(CHATBOT_PROFILE_QUERY, userId=user_id, limit=limit)
+            record = await result.single()
+            return build_chatbot_profile(user_id, record)
+            
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération du profil chatbot {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération du profil chatbot: {str(e)}")
+
 @router.get("/{user_id}", response_model=UserPreferences)
 async def get_user_preferences(user_id: int):
     """
@@ -71,26 +307,13 @@ async def get_user_preferences(user_id: int):
     Returns:
         Préférences utilisateur complètes
     """
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
+        async with neo4j_session() as session:
             # Récupérer les catégories préférées
-            categories_result = session.run("""
-                MATCH (u:User {id: $userId})-[:LIKED|VIEWED]->(o:Offer)-[:BELONGS_TO]->(cat:Category)
-                WITH cat, count(*) as interaction_count, 
-                     max(CASE WHEN type(last(relationships(u))) = 'LIKED' THEN 1 ELSE 0 END) as likes_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'VIEWED' THEN 1 ELSE 0 END) as views_count
-                WITH cat, interaction_count, likes_count, views_count,
-                     (likes_count * 2 + views_count) as preference_score
-                ORDER BY preference_score DESC
-                RETURN cat.id as category_id, cat.name as category_name, cat.nameFr as category_name_fr,
-                       interaction_count, preference_score,
-                       datetime() as last_interaction
-            """, userId=user_id)
+            categories_result = await session.run(PREFERRED_CATEGORIES_QUERY, userId=user_id)
             
             preferred_categories = []
-            for record in categories_result:
+            async for record in categories_result:
                 preferred_categories.append(CategoryPreference(
                     category_id=record["category_id"],
                     category_name=record["category_name"],
@@ -101,21 +324,10 @@ async def get_user_preferences(user_id: int):
                 ).dict())
             
             # Récupérer les marques préférées
-            brands_result = session.run("""
-                MATCH (u:User {id: $userId})-[:LIKED|VIEWED]->(o:Offer)-[:IS_BRAND]->(brand:Brand)
-                WITH brand, count(*) as interaction_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'LIKED' THEN 1 ELSE 0 END) as likes_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'VIEWED' THEN 1 ELSE 0 END) as views_count
-                WITH brand, interaction_count, likes_count, views_count,
-                     (likes_count * 2 + views_count) as preference_score
-                ORDER BY preference_score DESC
-                RETURN brand.id as brand_id, brand.name as brand_name, brand.nameFr as brand_name_fr,
-                       interaction_count, preference_score,
-                       datetime() as last_interaction
-            """, userId=user_id)
+            brands_result = await session.run(PREFERRED_BRANDS_QUERY, userId=user_id)
             
             preferred_brands = []
-            for record in brands_result:
+            async for record in brands_result:
                 preferred_brands.append(BrandPreference(
                     brand_id=record["brand_id"],
                     brand_name=record["brand_name"],
@@ -126,21 +338,9 @@ async def get_user_preferences(user_id: int):
                 ).dict())
             
             # Récupérer les statistiques d'interaction
-            stats_result = session.run("""
-                MATCH (u:User {id: $userId})-[r:VIEWED|LIKED|SEARCHED]->(o:Offer)
-                WITH u, 
-                     count(CASE WHEN type(r) = 'VIEWED' THEN 1 END) as total_views,
-                     count(CASE WHEN type(r) = 'LIKED' THEN 1 END) as total_likes,
-                     count(CASE WHEN type(r) = 'SEARCHED' THEN 1 END) as total_searches,
-                     avg(r.duration) as avg_duration,
-                     collect(DISTINCT o.price) as prices
-                RETURN total_views, total_likes, total_searches, 
-                       coalesce(avg_duration, 0) as avg_session_duration,
-                       [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23] as most_active_hours,
-                       {min: coalesce(min(prices), 0), max: coalesce(max(prices), 10000)} as price_range
-            """, userId=user_id)
+            stats_result = await session.run(PREFERENCES_STATS_QUERY, userId=user_id)
             
-            stats_record = stats_result.single()
+            stats_record = await stats_result.single()
             if not stats_record:
                 # Utilisateur non trouvé ou pas d'interactions
                 return UserPreferences(
@@ -180,8 +380,6 @@ async def get_user_preferences(user_id: int):
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des préférences utilisateur {user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des préférences: {str(e)}")
-    finally:
-        driver.close()
 
 @router.get("/{user_id}/categories", response_model=List[CategoryPreference])
 async def get_user_category_preferences(user_id: int, limit: int = 10):
@@ -195,26 +393,12 @@ async def get_user_category_preferences(user_id: int, limit: int = 10):
     Returns:
         Liste des préférences de catégories
     """
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (u:User {id: $userId})-[:LIKED|VIEWED]->(o:Offer)-[:BELONGS_TO]->(cat:Category)
-                WITH cat, count(*) as interaction_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'LIKED' THEN 1 ELSE 0 END) as likes_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'VIEWED' THEN 1 ELSE 0 END) as views_count
-                WITH cat, interaction_count, likes_count, views_count,
-                     (likes_count * 2 + views_count) as preference_score
-                ORDER BY preference_score DESC
-                LIMIT $limit
-                RETURN cat.id as category_id, cat.name as category_name, cat.nameFr as category_name_fr,
-                       interaction_count, preference_score,
-                       datetime() as last_interaction
-            """, userId=user_id, limit=limit)
+        async with neo4j_session() as session:
+            result = await session.run(CATEGORY_PREFERENCES_QUERY, userId=user_id, limit=limit)
             
             categories = []
-            for record in result:
+            async for record in result:
                 categories.append(CategoryPreference(
                     category_id=record["category_id"],
                     category_name=record["category_name"],
@@ -229,8 +413,6 @@ async def get_user_category_preferences(user_id: int, limit: int = 10):
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des catégories préférées: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des catégories: {str(e)}")
-    finally:
-        driver.close()
 
 @router.get("/{user_id}/brands", response_model=List[BrandPreference])
 async def get_user_brand_preferences(user_id: int, limit: int = 10):
@@ -244,26 +426,12 @@ async def get_user_brand_preferences(user_id: int, limit: int = 10):
     Returns:
         Liste des préférences de marques
     """
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (u:User {id: $userId})-[:LIKED|VIEWED]->(o:Offer)-[:IS_BRAND]->(brand:Brand)
-                WITH brand, count(*) as interaction_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'LIKED' THEN 1 ELSE 0 END) as likes_count,
-                     max(CASE WHEN type(last(relationships(u))) = 'VIEWED' THEN 1 ELSE 0 END) as views_count
-                WITH brand, interaction_count, likes_count, views_count,
-                     (likes_count * 2 + views_count) as preference_score
-                ORDER BY preference_score DESC
-                LIMIT $limit
-                RETURN brand.id as brand_id, brand.name as brand_name, brand.nameFr as brand_name_fr,
-                       interaction_count, preference_score,
-                       datetime() as last_interaction
-            """, userId=user_id, limit=limit)
+        async with neo4j_session() as session:
+            result = await session.run(BRAND_PREFERENCES_QUERY, userId=user_id, limit=limit)
             
             brands = []
-            for record in result:
+            async for record in result:
                 brands.append(BrandPreference(
                     brand_id=record["brand_id"],
                     brand_name=record["brand_name"],
@@ -278,8 +446,6 @@ async def get_user_brand_preferences(user_id: int, limit: int = 10):
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des marques préférées: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des marques: {str(e)}")
-    finally:
-        driver.close()
 
 @router.get("/{user_id}/price-range")
 async def get_user_price_range(user_id: int):
@@ -292,18 +458,11 @@ async def get_user_price_range(user_id: int):
     Returns:
         Gamme de prix préférée
     """
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (u:User {id: $userId})-[r:VIEWED|LIKED]->(o:Offer)
-                WHERE o.price IS NOT NULL
-                WITH collect(o.price) as prices
-                RETURN {min: coalesce(min(prices), 0), max: coalesce(max(prices), 10000)} as price_range
-            """, userId=user_id)
+        async with neo4j_session() as session:
+            result = await session.run(PRICE_RANGE_QUERY, userId=user_id)
             
-            record = result.single()
+            record = await result.single()
             if not record:
                 return {"min": 0, "max": 10000}
             
@@ -312,8 +471,6 @@ async def get_user_price_range(user_id: int):
     except Exception as e:
         logger.error(f"Erreur lors de la récupération de la gamme de prix: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération de la gamme de prix: {str(e)}")
-    finally:
-        driver.close()
 
 @router.get("/{user_id}/interaction-stats", response_model=UserInteractionStats)
 async def get_user_interaction_stats(user_id: int):
@@ -326,25 +483,11 @@ async def get_user_interaction_stats(user_id: int):
     Returns:
         Statistiques d'interaction
     """
-    driver = get_neo4j_driver()
-    
     try:
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (u:User {id: $userId})-[r:VIEWED|LIKED|SEARCHED]->(o:Offer)
-                WITH u, 
-                     count(CASE WHEN type(r) = 'VIEWED' THEN 1 END) as total_views,
-                     count(CASE WHEN type(r) = 'LIKED' THEN 1 END) as total_likes,
-                     count(CASE WHEN type(r) = 'SEARCHED' THEN 1 END) as total_searches,
-                     avg(r.duration) as avg_duration,
-                     collect(DISTINCT o.price) as prices
-                RETURN total_views, total_likes, total_searches, 
-                       coalesce(avg_duration, 0) as avg_session_duration,
-                       [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23] as most_active_hours,
-                       {min: coalesce(min(prices), 0), max: coalesce(max(prices), 10000)} as preferred_price_range
-            """, userId=user_id)
+        async with neo4j_session() as session:
+            result = await session.run(INTERACTION_STATS_QUERY, userId=user_id)
             
-            record = result.single()
+            record = await result.single()
             if not record:
                 return UserInteractionStats(
                     total_views=0,
@@ -367,5 +510,3 @@ async def get_user_interaction_stats(user_id: int):
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des statistiques: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des statistiques: {str(e)}")
-    finally:
-        driver.close()
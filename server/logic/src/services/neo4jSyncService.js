@@ -762,6 +762,7 @@ class Neo4jSyncService {
                 images: offerData.images,
                 specificData: offerData.specificData,
                 isDeleted: offerData.isDeleted,
+                replacedByOffer: offerData.replacedByOffer,
                 createdAt: new Date().toISOString(),
                 updatedAt: new Date().toISOString()
             },